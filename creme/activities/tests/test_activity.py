@@ -15,9 +15,10 @@ try:
     from django.utils.translation import gettext as _
 
     from creme.creme_core.auth.entity_credentials import EntityCredentials
+    from creme.creme_core.creme_jobs import trash_cleaner_type
     from creme.creme_core.gui import actions
     from creme.creme_core.models import (RelationType, Relation, SetCredentials,
-             EntityFilter, SettingValue)
+             EntityFilter, SettingValue, Job)
     from creme.creme_core.tests.base import skipIfNotInstalled
 
     from creme.persons.constants import REL_SUB_EMPLOYED_BY, REL_SUB_MANAGES
@@ -1295,6 +1296,10 @@ class ActivityTestCase(_ActivitiesTestCase):
         self.assertDoesNotExist(rel)
         self.assertStillExists(musashi)
 
+    def _empty_trash(self):
+        self.assertPOST200(reverse('creme_core__empty_trash'))
+        trash_cleaner_type.execute(self.get_object_or_fail(Job, type_id=trash_cleaner_type.id))
+
     @skipIfCustomContact
     def test_delete_all01(self):
         "Relations constants.REL_SUB_PART_2_ACTIVITY are removed when the Activity is deleted (empty_trash)"
@@ -1309,7 +1314,7 @@ class ActivityTestCase(_ActivitiesTestCase):
                                       object_entity=activity,
                                      )
 
-        self.assertPOST200(reverse('creme_core__empty_trash'))
+        self._empty_trash()
         self.assertDoesNotExist(activity)
         self.assertDoesNotExist(rel)
         self.assertStillExists(musashi)
@@ -1341,7 +1346,7 @@ class ActivityTestCase(_ActivitiesTestCase):
         musashi.trash()
         kojiro.trash()
 
-        self.assertPOST200(reverse('creme_core__empty_trash'))
+        self._empty_trash()
         self.assertDoesNotExist(activity)
         self.assertDoesNotExist(musashi)
         self.assertDoesNotExist(kojiro)
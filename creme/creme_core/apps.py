@@ -2,7 +2,7 @@
 
 ################################################################################
 #    Creme is a free/open-source Customer Relationship Management software
-#    Copyright (C) 2015-2019  Hybird
+#    Copyright (C) 2015-2020  Hybird
 #
 #    This program is free software: you can redistribute it and/or modify
 #    it under the terms of the GNU Affero General Public License as published by
@@ -181,9 +181,11 @@ class CremeAppConfig(AppConfig):
             #     logger.critical('The AppConfig for "%s" has a method register_creme_app() which is now useless.', self.name)
 
             from .core import (
+                brick_cache, entity_count,  # NB: connect some signals
                 entity_filter, enumerable, function_field, imprint, reminder,
                 sandbox, setting_key, sorter,
             )
+            from .core.entity_filter import materialization  # NB: connect some signals
             from .gui import (
                 actions, bricks, bulk_update, button_menu, fields_config,
                 field_printers, icons, listview, mass_import, menu, merge,
@@ -49,7 +49,8 @@ class EntityCredentials:
     class FilteringError(Exception):
         pass
 
-    def _sandbox_is_allowed(self, sandbox, user):
+    @staticmethod
+    def _sandbox_is_allowed(sandbox, user):
         if sandbox.role_id:
             return sandbox.role_id == user.role_id
 
@@ -62,11 +63,19 @@ class EntityCredentials:
 
         return False
 
-    def __init__(self, user, entity):
+    def __init__(self, user, entity, value=None):
         """Constructor.
         @param user: django.contrib.auth.models.User instance.
         @param entity: CremeEntity (or child class) instance.
+        @param value: Integer (combination of VIEW, CHANGE...) ; if it's given,
+               the permissions are not computed (see populate()).
         """
+        if value is None:
+            value = self._compute_value(user=user, entity=entity)
+
+        self._value = value
+
+    def _compute_value(self, user, entity):
         if user.is_superuser:
             value = self._ALL_CREDS
         else:
@@ -80,7 +89,7 @@ class EntityCredentials:
             else:
                 value = self.NONE
 
-        self._value = value
+        return value
 
     def __str__(self):
         return 'EntityCredentials(value="{}")'.format(self._value)
@@ -103,6 +112,67 @@ class EntityCredentials:
     def has_perm(self, string_permission):
         return bool(self._PERMS_MAP.get(string_permission) & self._value)
 
+    @classmethod
+    def populate(cls, user, entities):
+        """Compute the credentials of a user for several entities, with a few
+        queries (instead of some queries per entity), & store them in the cache
+        used by the methods CremeUser.has_perm_to_*().
+        @param user: A get_user_model() instance.
+        @param entities: Sequence of CremeEntities (or child classes) instances.
+        """
+        entities = [
+            entity for entity in entities
+                if user.id not in getattr(entity, '_credentials_map', ())
+        ]
+
+        if not entities:
+            return
+
+        if user.is_superuser:
+            values = dict.fromkeys((entity.id for entity in entities), cls._ALL_CREDS)
+        else:
+            role = user.role
+            assert role is not None
+
+            cls._populate_sandboxes(entities)
+
+            allowed_entities = [
+                entity for entity in entities
+                    if entity.sandbox_id is None or
+                       cls._sandbox_is_allowed(sandbox=entity.sandbox, user=user)
+            ]
+            values = dict.fromkeys((entity.id for entity in entities), cls.NONE)
+            values.update(role.get_perms_for_entities(user, allowed_entities))
+
+        user_id = user.id
+
+        for entity in entities:
+            creds_map = getattr(entity, '_credentials_map', None)
+
+            if creds_map is None:
+                entity._credentials_map = creds_map = {}
+
+            creds_map[user_id] = cls(user, entity, value=values[entity.id])
+
+    @staticmethod
+    def _populate_sandboxes(entities):
+        from creme.creme_core.models import CremeEntity, Sandbox
+
+        is_cached = CremeEntity.sandbox.is_cached
+        sandbox_ids = {
+            entity.sandbox_id for entity in entities
+                if entity.sandbox_id is not None and not is_cached(entity)
+        }
+
+        if sandbox_ids:
+            sandboxes = Sandbox.objects.in_bulk(sandbox_ids)
+
+            for entity in entities:
+                sandbox_id = entity.sandbox_id
+
+                if sandbox_id in sandbox_ids:
+                    entity.sandbox = sandboxes[sandbox_id]
+
     @classmethod
     def _build_sandbox_Q(cls, user):
         teams = user.teams
@@ -51,10 +51,16 @@ class ExportBackend:
     id: unique export backend identifier: the file extension matching this backend.
     verbose_name: defines the backend for the user, used in the select backend popup.
     help_text: currently unused.
+    streamable: True if the backend implements the streaming API
+                (ie: the methods iter_chunks() & streaming_response()).
+    background: True if the backend can write the file in background
+                (ie: the method write_file()).
     """
     id = "OVERLOAD ME"
     verbose_name = "OVERLOAD ME"
     help_text = "OVERLOAD ME"
+    streamable = False
+    background = False
 
     def writerow(self, row):
         """
@@ -69,3 +75,30 @@ class ExportBackend:
         @param filename: file name
         """
         raise NotImplementedError
+
+    def iter_chunks(self, pages):
+        """Generator which writes the rows & yields the content of the file
+        progressively, so the used memory does not depend on the number of rows.
+        @param pages: Iterable of pages ; a page is an iterable of rows
+               (see writerow()). It can be a generator.
+        @return: Generator of chunks (bytes or strings) of the file's content.
+        """
+        raise NotImplementedError
+
+    def streaming_response(self, pages, filename):
+        """Build a response which streams the file.
+        @param pages: see iter_chunks().
+        @param filename: file name.
+        @return: An instance of <django.http.StreamingHttpResponse>.
+        """
+        raise NotImplementedError
+
+    def write_file(self, pages, path):
+        """Write the rows in a file (used by the exports in background).
+        The default implementation uses iter_chunks().
+        @param pages: see iter_chunks().
+        @param path: Path of the (existing) file.
+        """
+        with open(path, 'wb') as f:
+            for chunk in self.iter_chunks(pages):
+                f.write(chunk.encode() if isinstance(chunk, str) else chunk)
@@ -20,28 +20,69 @@
 
 import csv
 
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.template.defaultfilters import slugify
 from django.utils.translation import gettext_lazy as _
 
 from .base import ExportBackend
 
 
+class _Buffer:
+    "File-like object which keeps the written strings until they are popped."
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, value):
+        self._chunks.append(value)
+
+    def pop(self):
+        chunks = self._chunks
+        value = ''.join(chunks)
+        chunks.clear()
+
+        return value
+
+
 class CSVExportBackend(ExportBackend):
     id = 'csv'
     verbose_name = _("CSV File (delimiter: ',')")
     delimiter = ','
     help_text = ''
+    streamable = True
+    background = True
 
     def __init__(self):
         self.response = HttpResponse(content_type='text/csv')
-        self.writer = csv.writer(self.response, quoting=csv.QUOTE_ALL, delimiter=self.delimiter)
+        self.writer = self._build_writer(self.response)
+
+    def _build_writer(self, f):
+        return csv.writer(f, quoting=csv.QUOTE_ALL, delimiter=self.delimiter)
+
+    @staticmethod
+    def _content_disposition(filename):
+        return 'attachment; filename={}.csv'.format(slugify(filename))
 
     def writerow(self, row):
         return self.writer.writerow(row)
 
     def save(self, filename):
-        self.response['Content-Disposition'] = 'attachment; filename={}.csv'.format(slugify(filename))
+        self.response['Content-Disposition'] = self._content_disposition(filename)
+
+    def iter_chunks(self, pages):
+        buffer = _Buffer()
+        writerow = self._build_writer(buffer).writerow
+
+        for rows in pages:
+            for row in rows:
+                writerow(row)
+
+            yield buffer.pop()
+
+    def streaming_response(self, pages, filename):
+        response = StreamingHttpResponse(self.iter_chunks(pages), content_type='text/csv')
+        response['Content-Disposition'] = self._content_disposition(filename)
+
+        return response
 
 
 class SemiCSVExportBackend(CSVExportBackend):
@@ -34,10 +34,17 @@ from .base import ExportBackend
 
 
 class XLSExportBackend(XlwtWriter, ExportBackend):
+    """Export in a XLS file.
+
+    Notice that the file cannot be streamed: xlwt builds the whole workbook
+    (sheet data, strings table, compound document) in memory when it is saved.
+    So the big exports should be done in background (see creme_jobs.mass_export).
+    """
     id = 'xls'
     verbose_name = _('XLS File')
     help_text = ''
     dir_parts = ('xls',)  # Sub-directory under {settings.MEDIA_ROOT}/upload
+    background = True
 
     def __init__(self, encoding='utf-8'):
         super().__init__(encoding=encoding)
@@ -56,3 +63,12 @@ class XLSExportBackend(XlwtWriter, ExportBackend):
         self.response = HttpResponseRedirect(reverse('creme_core__dl_file', args=(fileref.filedata,)))
 
         super().save(path)
+
+    def write_file(self, pages, path):
+        writerow = self.writerow
+
+        for rows in pages:
+            for row in rows:
+                writerow(row)
+
+        XlwtWriter.save(self, path)
@@ -40,6 +40,7 @@ logger = logging.getLogger(__name__)
 class PropertiesBrick(QuerysetBrick):
     id_           = QuerysetBrick.generate_id('creme_core', 'properties')
     dependencies  = (CremeProperty,)
+    cacheable     = True
     verbose_name  = _('Properties')
     template_name = 'creme_core/bricks/properties.html'
     order_by = 'type__text'  # TODO: in model ??
@@ -135,6 +136,7 @@ class RelationsBrick(QuerysetBrick):
 class CustomFieldsBrick(Brick):
     id_           = Brick.generate_id('creme_core', 'customfields')
     dependencies  = (CustomField,)
+    cacheable     = True
     verbose_name  = _('Custom fields')
     template_name = 'creme_core/bricks/custom-fields.html'
 
@@ -157,6 +159,7 @@ class HistoryBrick(QuerysetBrick):
     read_only     = True
     # order_by      = '-date'
     order_by      = '-id'
+    flow_pagination = True  # The history can be very long
     verbose_name  = _('History')
     template_name = 'creme_core/bricks/history.html'
 
@@ -225,6 +228,7 @@ class ImprintsBrick(QuerysetBrick):
     dependencies  = (Imprint,)
     read_only     = True
     order_by      = '-id'  # faster than '-date'
+    flow_pagination = True
     verbose_name  = _('History of consultation')
     template_name = 'creme_core/bricks/imprints.html'
 
@@ -380,6 +384,18 @@ class MassImportJobErrorsBrick(JobErrorsBrick):
     template_name = 'creme_core/bricks/massimport-errors.html'
 
 
+class MassExportJobErrorsBrick(JobErrorsBrick):
+    id_           = QuerysetBrick.generate_id('creme_core', 'mass_export_job_errors')
+    verbose_name  = 'Mass export job errors'
+    template_name = 'creme_core/bricks/massexport-errors.html'
+
+    def _extra_context(self, job):
+        ctxt = super()._extra_context(job)
+        ctxt['fileref'] = job.type._get_fileref(job)
+
+        return ctxt
+
+
 class JobsBrick(QuerysetBrick):
     id_           = QuerysetBrick.generate_id('creme_core', 'jobs')
     dependencies  = (Job,)
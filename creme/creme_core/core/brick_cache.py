@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+#    Creme is a free/open-source Customer Relationship Management software
+#    Copyright (C) 2020  Hybird
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+"""Cache for the rendered HTML of the bricks which have the attribute
+"cacheable=True" (see creme_core.gui.bricks.Brick).
+"""
+
+from hashlib import sha1
+from json import dumps as json_dump
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import signals, ForeignKey, Model
+from django.dispatch import receiver
+from django.utils.timezone import get_current_timezone_name
+from django.utils.translation import get_language
+
+from ..models import CremeEntity, UserRole, SetCredentials
+from ..signals import post_replace_in_bulk
+from ..utils.media import get_current_theme_from_context
+from .config_cache import ConfigCache
+
+logger = logging.getLogger(__name__)
+
+
+class BrickCache(ConfigCache):
+    """The rendered bricks are stored in the cache settings.BRICKS_CACHE_ALIAS.
+
+    The key of a rendered brick contains:
+      - the ID of the brick & the ID of the entity (detail-views).
+      - the user, the language, the time zone & the theme.
+      - the state of the brick, its stored context (pagination, order...),
+        the GET arguments related to the brick & its reloading info.
+      - the generation numbers of:
+          - the entity ; it's incremented when the entity, or an instance
+            with a ForeignKey to it (Relation, CremeProperty...), is saved/deleted.
+          - the models of the brick's dependencies which are not linked to
+            the entity (i.e. entity types & other models), & all the models of
+            the dependencies on the home page.
+          - the credentials models.
+
+    So a cacheable brick must only display the entity, the instances of its
+    dependencies & data which rarely change (the entries expire after
+    settings.BRICKS_CACHE_TIMEOUT seconds).
+    """
+    key_prefix = 'creme_core-brick_cache'
+
+    def __init__(self):
+        self._entity_fks = {}
+
+    @property
+    def backend(self):
+        "@return: A Django's cache instance, or None if the cache is disabled."
+        alias = settings.BRICKS_CACHE_ALIAS
+        return caches[alias] if alias else None
+
+    def _entity_generation_key(self, entity_id):
+        return '{}-entity-{}-generation'.format(self.key_prefix, entity_id)
+
+    def _entity_fk_attnames(self, model):
+        "@return: Names of the attributes containing the IDs of linked entities."
+        attnames = self._entity_fks.get(model)
+
+        if attnames is None:
+            self._entity_fks[model] = attnames = [
+                field.attname
+                    for field in model._meta.concrete_fields
+                        if isinstance(field, ForeignKey) and
+                           issubclass(field.remote_field.model, CremeEntity)
+            ]
+
+        return attnames
+
+    def _is_linked_to_entities(self, model):
+        return bool(self._entity_fk_attnames(model)) and not issubclass(model, CremeEntity)
+
+    def invalidate_entity(self, entity_id):
+        "All the cached bricks of an entity become outdated."
+        backend = self.backend
+
+        if backend is not None:
+            self._invalidate_key(backend, self._entity_generation_key(entity_id))
+
+    def concerned_by(self, instance):
+        """Get the models & the entities concerned by the modification of an instance.
+        @return: Tuple (models, entities_ids).
+        """
+        model = type(instance)
+        entities_ids = {
+            entity_id
+                for entity_id in (getattr(instance, attname)
+                                    for attname in self._entity_fk_attnames(model)
+                                 )
+                    if entity_id is not None
+        }
+
+        if isinstance(instance, CremeEntity) and instance.id is not None:
+            entities_ids.add(instance.id)
+
+        return (model, *model._meta.get_parent_list()), entities_ids
+
+    def invalidate_instance(self, instance):
+        """Outdate the cached bricks which depend on the model of an instance,
+        or on the entities linked to it.
+        """
+        self.invalidate_concerned(*self.concerned_by(instance))
+
+    def invalidate_concerned(self, models, entities_ids):
+        "See concerned_by()."
+        for model in models:
+            self.invalidate(model)
+
+        for entity_id in entities_ids:
+            self.invalidate_entity(entity_id)
+
+    def invalidate_concerned_on_commit(self, models, entities_ids):
+        "See invalidate_concerned() & invalidate_on_commit()."
+        self._invalidate_keys_on_commit([
+            *(self._generation_key(model) for model in models),
+            *(self._entity_generation_key(entity_id) for entity_id in entities_ids),
+        ])
+
+    def _build_key(self, backend, brick, context):
+        request = context['request']
+        user = context['user']
+        entity = context.get('object') if isinstance(context.get('object'), CremeEntity) else None
+        brick_id = brick.id_
+
+        models = [UserRole, SetCredentials]
+        for dep in brick.dependencies:
+            if isinstance(dep, type) and issubclass(dep, Model) and \
+               (entity is None or not self._is_linked_to_entities(dep)):
+                models.append(dep)
+
+        base_url = request.GET.get('base_url', request.path)
+        try:
+            brick_context = request.session['brickcontexts_manager'][base_url][brick_id]
+        except KeyError:
+            brick_context = None
+
+        # NB: the state is retrieved from the BricksManager, which caches the
+        #     states of all the bricks of the page.
+        from ..gui.bricks import BricksManager
+        state = BricksManager.get(context).get_state(brick_id, user)
+
+        prefix = brick_id + '_'
+        key_data = json_dump(
+            [
+                brick_id,
+                entity.id if entity else None,
+                self._get_generation_by_key(backend, self._entity_generation_key(entity.id))
+                    if entity else None,
+                self.get_generations(*models),
+                user.id, user.role_id, user.is_superuser,
+                get_language(), get_current_timezone_name(),
+                get_current_theme_from_context(context),
+                state.is_open, state.show_empty_fields,
+                brick_context,
+                sorted((k, v) for k, v in request.GET.lists() if k.startswith(prefix)),
+                brick.reloading_info,
+            ],
+            default=str,
+        )
+
+        return '{}-{}'.format(self.key_prefix, sha1(key_data.encode()).hexdigest())
+
+    def render(self, brick, context, render_function):
+        """Get the rendered HTML of a brick from the cache, or render it.
+        @param brick: Instance of <creme_core.gui.bricks.Brick>.
+        @param context: Template context (dictionary).
+        @param render_function: Callable which takes the context as argument &
+               returns the HTML (e.g. brick.detailview_display).
+        @return: HTML string (or None, like some render functions).
+        """
+        backend = self.backend
+
+        if backend is None or not getattr(brick, 'cacheable', False) or brick.dependencies == '*':
+            return render_function(context)
+
+        try:
+            key = self._build_key(backend, brick, context)
+        except Exception:
+            logger.exception('BrickCache: cannot build the key of the brick "%s"', brick.id_)
+            return render_function(context)
+
+        cached = backend.get(key)
+        request = context['request']
+        base_url = request.GET.get('base_url', request.path)
+
+        if cached is not None:
+            html, brick_context = cached
+
+            # NB: the context of the brick (pagination...) would have been
+            #     stored in the session by the rendering.
+            if brick_context is not None:
+                contexts = request.session.setdefault('brickcontexts_manager', {}) \
+                                          .setdefault(base_url, {})
+
+                if contexts.get(brick.id_) != brick_context:
+                    contexts[brick.id_] = brick_context
+                    request.session.modified = True
+
+            return html
+
+        html = render_function(context)
+
+        try:
+            brick_context = request.session['brickcontexts_manager'][base_url][brick.id_]
+        except KeyError:
+            brick_context = None
+
+        backend.set(key, (html, brick_context), timeout=settings.BRICKS_CACHE_TIMEOUT)
+
+        return html
+
+
+brick_cache = BrickCache()
+
+
+@receiver((signals.post_save, signals.post_delete))
+def _invalidate_bricks(sender, instance, **kwargs):
+    if settings.BRICKS_CACHE_ALIAS:
+        # NB: computed now, because the ID of a deleted instance is set to None.
+        brick_cache.invalidate_concerned_on_commit(*brick_cache.concerned_by(instance))
+
+
+@receiver(post_replace_in_bulk)
+def _invalidate_bricks_on_bulk_replace(sender, instances, **kwargs):
+    # NB: the job "Deletor" has updated some instances without sending post_save.
+    if settings.BRICKS_CACHE_ALIAS:
+        entities_ids = set()
+
+        for instance in instances:
+            entities_ids.update(brick_cache.concerned_by(instance)[1])
+
+        brick_cache.invalidate_concerned((sender, *sender._meta.get_parent_list()), entities_ids)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+#    Creme is a free/open-source Customer Relationship Management software
+#    Copyright (C) 2020  Hybird
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+from random import randint
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import signals
+
+
+class ConfigCache:
+    """Cache for instances of configuration models (eg: FieldsConfig), shared
+    between the requests ; it's built on the cache framework of Django
+    (see settings.CONFIG_CACHE_ALIAS).
+
+    Each registered model has a generation number, stored in the cache too,
+    which is incremented when an instance is saved/deleted. The keys of the
+    cached instances contain this number, so the outdated values are just
+    ignored (& evicted later by the backend) ; with a backend shared by several
+    processes (file-based, memcached...) the invalidation is seen by all of them.
+    """
+    key_prefix = 'creme_core-config_cache'
+
+    @property
+    def backend(self):
+        "@return: A Django's cache instance, or None if the cache is disabled."
+        alias = settings.CONFIG_CACHE_ALIAS
+        return caches[alias] if alias else None
+
+    def _generation_key(self, model):
+        return '{}-{}-generation'.format(self.key_prefix, model._meta.label_lower)
+
+    def _get_generation(self, backend, model):
+        return self._get_generation_by_key(backend, self._generation_key(model))
+
+    def _get_generation_by_key(self, backend, key):
+        generation = backend.get(key)
+
+        if generation is None:
+            # NB: we do not start from 0 (but from a random number), because old
+            #     values could still be cached (if the generation has been
+            #     evicted but not them).
+            backend.add(key, randint(0, 2 ** 48), timeout=None)
+            # NB: another process may have added its own value before us.
+            generation = backend.get(key)
+
+        return generation
+
+    def _build_key_formatter(self, backend, model):
+        return '{}-{}-{}-{{}}'.format(
+            self.key_prefix,
+            model._meta.label_lower,
+            self._get_generation(backend, model),
+        ).format
+
+    def get_many(self, model, keys):
+        """Get some cached instances.
+        @param model: Registered model.
+        @param keys: Iterable of keys (strings, integers...).
+        @return: A dictionary {key: instance} ; the keys which are not found
+                 in the cache are missing.
+        """
+        backend = self.backend
+
+        if backend is None:
+            return {}
+
+        fmt = self._build_key_formatter(backend, model)
+        full_keys = {fmt(key): key for key in keys}
+
+        if not full_keys:
+            return {}
+
+        return {
+            full_keys[full_key]: instance
+                for full_key, instance in backend.get_many(full_keys.keys()).items()
+        }
+
+    def set_many(self, model, instances):
+        """Store some instances in the cache.
+        @param model: Registered model.
+        @param instances: Dictionary {key: instance}.
+        """
+        backend = self.backend
+
+        if backend is not None and instances:
+            fmt = self._build_key_formatter(backend, model)
+            backend.set_many({fmt(key): instance for key, instance in instances.items()})
+
+    def get_generations(self, *models):
+        """Get the current generations of some registered models ; it's useful
+        to know if some data computed from the instances of these models are outdated.
+        @return: A tuple of integers, or None if the cache is disabled.
+        """
+        backend = self.backend
+
+        if backend is None:
+            return None
+
+        keys = [self._generation_key(model) for model in models]
+        generations = backend.get_many(keys)
+
+        return tuple(
+            generations.get(key) or self._get_generation(backend, model)
+                for key, model in zip(keys, models)
+        )
+
+    def invalidate(self, model):
+        "All the cached instances of the model become outdated."
+        backend = self.backend
+
+        if backend is not None:
+            self._invalidate_key(backend, self._generation_key(model))
+
+    def _invalidate_key(self, backend, key):
+        try:
+            backend.incr(key)
+        except ValueError:  # Generation not in cache -> a new one is created
+            self._get_generation_by_key(backend, key)
+
+    def _invalidate_keys_on_commit(self, keys):
+        "See invalidate_on_commit()."
+        def invalidate():
+            backend = self.backend
+
+            if backend is not None:
+                for key in keys:
+                    self._invalidate_key(backend, key)
+
+        invalidate()
+
+        # NB: a concurrent request could have retrieved the old values from the
+        #     DB & cached them (with the new generation) before the commit.
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(invalidate)
+
+    def invalidate_on_commit(self, *models):
+        """All the cached instances of the models become outdated, now & after
+        the commit of the current transaction (if there is one) ; useful in
+        the receivers of the signals post_save/post_delete.
+        """
+        self._invalidate_keys_on_commit([self._generation_key(model) for model in models])
+
+    def _handle_change(self, sender, **kwargs):
+        self.invalidate_on_commit(sender)
+
+    def register(self, *models):
+        "The instances of these models are invalidated when one of them is saved/deleted."
+        for model in models:
+            uid = 'creme_core-config_cache-{}'.format(model._meta.label_lower)
+            signals.post_save.connect(self._handle_change, sender=model, dispatch_uid=uid)
+            signals.post_delete.connect(self._handle_change, sender=model, dispatch_uid=uid)
+
+
+config_cache = ConfigCache()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+#    Creme is a free/open-source Customer Relationship Management software
+#    Copyright (C) 2020  Hybird
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+"""Strategies used (by the list-views) to count the entities of a list.
+See settings.ENTITIES_COUNT_MODE.
+"""
+
+from hashlib import sha1
+import logging
+
+from django.conf import settings
+from django.db.models import signals
+from django.dispatch import receiver
+
+from ..models import (CremeEntity, UserRole, SetCredentials,
+        EntityFilter, EntityFilterCondition)
+from ..signals import post_replace_in_bulk
+from ..utils.db import estimate_rows_count
+from .config_cache import config_cache
+
+logger = logging.getLogger(__name__)
+
+MODE_EXACT     = 'exact'
+MODE_CACHED    = 'cached'
+MODE_ESTIMATED = 'estimated'
+
+
+class EntitiesCounter:
+    """Count the entities of a list with a query each time (mode "exact").
+
+    The counters return a tuple (count, is_estimated) ; <is_estimated> is a
+    boolean which indicates that <count> is approximative.
+    """
+    def count(self, *, model, user, compute, key='', unfiltered=False):
+        """Count the entities of a list.
+        @param model: Class inheriting CremeEntity.
+        @param user: Instance of <django.contrib.auth.get_user_model()> ; the
+               owner of the list.
+        @param compute: Callable without argument which performs the exact count.
+        @param key: String which identifies the filtering of the list (filter,
+               search...) ; it's used by cache.
+        @param unfiltered: Boolean ; True means that all the (not deleted)
+               entities of the model viewable by the user are counted.
+        @return: Tuple (count, is_estimated).
+        """
+        return compute(), False
+
+
+class CachedEntitiesCounter(EntitiesCounter):
+    """The counts are stored in the cache used by <config_cache> (see
+    settings.CONFIG_CACHE_ALIAS) ; they are invalidated when an entity of the
+    model is saved/deleted, when the credentials/filters configuration changes,
+    or after a timeout (a count can depend on other models, like Relation).
+    If the cache is disabled, the counts are exact.
+    """
+    key_prefix = 'creme_core-entities_count'
+
+    def __init__(self, timeout):
+        "@param timeout: Lifetime of a cached count, in seconds."
+        self.timeout = timeout
+
+    def _build_key(self, model, user, key):
+        generations = config_cache.get_generations(
+            model, UserRole, SetCredentials, EntityFilter, EntityFilterCondition,
+        )
+
+        # NB: the key is hashed because it can be long & contain any character
+        #     (the caches like memcached are strict about the keys).
+        return '{}-{}'.format(
+            self.key_prefix,
+            sha1('{}#{}#{}#{}'.format(
+                model._meta.label_lower, generations, user.id, key,
+            ).encode()).hexdigest(),
+        )
+
+    def count(self, *, model, user, compute, key='', unfiltered=False):
+        backend = config_cache.backend
+
+        if backend is None:
+            return super().count(model=model, user=user, compute=compute,
+                                 key=key, unfiltered=unfiltered,
+                                )
+
+        full_key = self._build_key(model, user, key)
+        count = backend.get(full_key)
+
+        if count is None:
+            count = compute()
+            backend.set(full_key, count, timeout=self.timeout)
+
+        return count, False
+
+
+class EstimatedEntitiesCounter(CachedEntitiesCounter):
+    """When all the entities of a model are counted (no filter, no search, &
+    the user is a super-user), the count is estimated from the statistics of
+    the DB if it's big enough (see settings.FAST_QUERY_MODE_THRESHOLD) ;
+    the other counts are cached (see CachedEntitiesCounter).
+    """
+    def _estimate(self, model):
+        try:
+            return estimate_rows_count(model)
+        except Exception as e:
+            logger.warning('EstimatedEntitiesCounter: the estimation failed (%s)', e)
+
+    def count(self, *, model, user, compute, key='', unfiltered=False):
+        if unfiltered and user.is_superuser:
+            estimation = self._estimate(model)
+
+            # NB: small tables are counted exactly (it's cheap).
+            if estimation is not None and estimation >= settings.FAST_QUERY_MODE_THRESHOLD:
+                return estimation, True
+
+        return super().count(model=model, user=user, compute=compute,
+                             key=key, unfiltered=unfiltered,
+                            )
+
+
+def get_entities_counter():
+    "@return: An instance of EntitiesCounter corresponding to settings.ENTITIES_COUNT_MODE."
+    mode = settings.ENTITIES_COUNT_MODE
+
+    if mode == MODE_CACHED:
+        return CachedEntitiesCounter(timeout=settings.ENTITIES_COUNT_CACHE_TIMEOUT)
+
+    if mode == MODE_ESTIMATED:
+        return EstimatedEntitiesCounter(timeout=settings.ENTITIES_COUNT_CACHE_TIMEOUT)
+
+    if mode != MODE_EXACT:
+        logger.warning('Invalid settings.ENTITIES_COUNT_MODE: "%s" (exact mode is used)', mode)
+
+    return EntitiesCounter()
+
+
+@receiver((signals.post_save, signals.post_delete))
+def _invalidate_counts(sender, instance, **kwargs):
+    if isinstance(instance, CremeEntity) and settings.ENTITIES_COUNT_MODE != MODE_EXACT:
+        config_cache.invalidate_on_commit(type(instance))
+
+
+@receiver(post_replace_in_bulk)
+def _invalidate_counts_on_bulk_replace(sender, **kwargs):
+    # NB: the job "Deletor" has updated some entities without sending post_save
+    #     (the filtered counts can be changed by the new values).
+    if issubclass(sender, CremeEntity) and settings.ENTITIES_COUNT_MODE != MODE_EXACT:
+        config_cache.invalidate(sender)
@@ -2,7 +2,7 @@
 
 ################################################################################
 #    Creme is a free/open-source Customer Relationship Management software
-#    Copyright (C) 2009-2019  Hybird
+#    Copyright (C) 2009-2020  Hybird
 #
 #    This program is free software: you can redistribute it and/or modify
 #    it under the terms of the GNU Affero General Public License as published by
@@ -28,6 +28,7 @@ from django.db.models import (
     BooleanField,
     ForeignKey, ManyToManyField,
     Q,
+    prefetch_related_objects,
 )
 from django.db.models.fields import FieldDoesNotExist
 from django.utils.formats import date_format
@@ -43,8 +44,10 @@ from creme.creme_core.models import (
 )
 from creme.creme_core.models.custom_field import _TABLES
 from creme.creme_core.forms.entity_filter import fields as ef_fields
-from creme.creme_core.utils.date_range import date_range_registry
+from creme.creme_core.utils.date_range import (date_range_registry,
+        EmptyRange, NotEmptyRange)
 from creme.creme_core.utils.dates import make_aware_dt, date_2_dict
+from creme.creme_core.utils.db import populate_related
 from creme.creme_core.utils.meta import is_date_field, FieldInfo
 
 from . import operators, entity_filter_registries, EF_USER
@@ -93,6 +96,18 @@ class FilterConditionHandler:
         """
         raise NotImplementedError
 
+    def accept_many(self, *, entities, user):
+        """Bulk version of accept() ; the data used by the handler (relations,
+        properties...) are retrieved once for all the entities.
+
+        @param entities: Sequence of instances of <CremeEntity> (not an iterator).
+        @param user: See accept().
+        @return: A set containing the IDs of the accepted entities.
+        """
+        accept = self.accept
+
+        return {entity.id for entity in entities if accept(entity=entity, user=user)}
+
     @property
     def applicable_on_entity_base(self):
         """Can this handler be applied on CremeEntity (QuerySet or simple instance)?
@@ -120,6 +135,15 @@ class FilterConditionHandler:
         """
         return None
 
+    @property
+    def is_volatile(self):
+        """Does the result depend on the context (current user, current date...)?
+        Volatile conditions cannot be materialised (see EntityFilter.is_materialized).
+        """
+        subfilter = self.subfilter
+
+        return bool(subfilter) and subfilter.is_volatile
+
     @classmethod
     def formfield(cls, form_class=None, **kwargs):
         raise NotImplementedError
@@ -137,6 +161,17 @@ class FilterConditionHandler:
     def model(self):
         return self._model
 
+    @property
+    def related_entity_models(self):
+        """Get the models of the entities which are not filtered, but whose
+        modification can change the result (e.g. entities of a sub-filter
+        through relationships).
+        @return: A set of classes inheriting <creme_core.models.CremeEntity>.
+        """
+        subfilter = self.subfilter
+
+        return subfilter.get_related_entity_models() if subfilter else set()
+
     @classmethod
     def query_for_related_conditions(cls, instance):
         """"Get a Q instance to retrieve EntityFilterConditions which are
@@ -205,6 +240,9 @@ class SubFilterConditionHandler(FilterConditionHandler):
     def accept(self, *, entity, user):
         return self.subfilter.accept(entity=entity, user=user)
 
+    def accept_many(self, *, entities, user):
+        return self.subfilter.accept_many(entities=entities, user=user)
+
     @property
     def applicable_on_entity_base(self):
         return self.subfilter.applicable_on_entity_base
@@ -276,6 +314,12 @@ class OperatorConditionHandlerMixin:
     def get_operand(cls, value, user):
         return cls.efilter_registry.get_operand(type_id=value, user=user)
 
+    @property
+    def is_volatile(self):
+        get_operand = self.get_operand
+
+        return any(get_operand(value=value, user=None) is not None for value in self._values)
+
     @classmethod
     def get_operator(cls, operator_id):
         return cls.efilter_registry.get_operator(operator_id)
@@ -315,6 +359,15 @@ class BaseRegularFieldConditionHandler(FilterConditionHandler):
     def field_info(self):
         return FieldInfo(self._model, self._field_name)  # TODO: cache ?
 
+    @property
+    def related_entity_models(self):
+        # NB: e.g. "image__name" => the modification of the image can change the result.
+        return {
+            field.remote_field.model
+                for field in self.field_info[:-1]
+                    if field.is_relation and issubclass(field.remote_field.model, CremeEntity)
+        }
+
 
 class RegularFieldConditionHandler(OperatorConditionHandlerMixin,
                                    BaseRegularFieldConditionHandler):
@@ -371,6 +424,15 @@ class RegularFieldConditionHandler(OperatorConditionHandlerMixin,
                if isinstance(field_value, list) else \
                accept(field_value=field_value)
 
+    def accept_many(self, *, entities, user):
+        field_info = self.field_info
+
+        if len(field_info) > 1:
+            # NB: the instances which contain the last field are retrieved in bulk.
+            populate_related(entities, ['__'.join(field.name for field in field_info[:-1])])
+
+        return super().accept_many(entities=entities, user=user)
+
     # TODO: multi-value is stupid for some operator (LT, GT etc...) => improve checking ???
     @classmethod
     def build(cls, *, model, name, data):
@@ -535,6 +597,13 @@ class DateFieldHandlerMixin:
         self._start = start
         self._end = end
 
+    @property
+    def is_volatile(self):
+        # NB: the named ranges (e.g. "current_year") depend on the current
+        #     date, excepted the ranges on the emptiness.
+        return bool(self._range_name) and \
+               self._range_name not in {EmptyRange.name, NotEmptyRange.name}
+
     @classmethod
     def _build_daterange_dict(cls, date_range=None, start=None, end=None):
         """Get a serializable dictionary corresponding to a
@@ -838,6 +907,31 @@ class CustomFieldConditionHandler(OperatorConditionHandlerMixin,
                if isinstance(field_value, list) else \
                accept(field_value=field_value)
 
+    def accept_many(self, *, entities, user):
+        cfield = self.custom_field
+
+        if cfield:
+            cf_id = cfield.id
+            CremeEntity.populate_custom_values(
+                [entity for entity in entities if cf_id not in entity._cvalues_map],
+                [cfield],
+            )
+
+            if cfield.field_type == CustomField.MULTI_ENUM:
+                # NB: the choices of all the values are retrieved with one query
+                #     (& cached for get_enumvalues()).
+                cvalues = [
+                    cvalue
+                        for cvalue in (entity._cvalues_map[cf_id] for entity in entities)
+                            if cvalue is not None and cvalue._enumvalues is None
+                ]
+                prefetch_related_objects(cvalues, 'value')
+
+                for cvalue in cvalues:
+                    cvalue._enumvalues = [*cvalue.value.all()]
+
+        return super().accept_many(entities=entities, user=user)
+
     @classmethod
     def build(cls, *, model, name, data):
         try:
@@ -1178,8 +1272,8 @@ class RelationConditionHandler(BaseRelationConditionHandler):
 
     def accept(self, *, entity, user):
         # NB: we use get_relations() in order to get a cached result, & so avoid
-        #     additional queries when calling several times this method.
-        # TODO: add a system to populate relations when checking several entities
+        #     additional queries when calling several times this method
+        #     (see accept_many() to populate the relations of several entities).
         relations = entity.get_relations(relation_type_id=self._rtype_id)
 
         if self._entity_id:
@@ -1197,6 +1291,15 @@ class RelationConditionHandler(BaseRelationConditionHandler):
 
         return not found if self._exclude else found
 
+    def accept_many(self, *, entities, user):
+        rtype_id = self._rtype_id
+        not_cached = [entity for entity in entities if rtype_id not in entity._relations_map]
+
+        if not_cached:
+            CremeEntity.populate_relations(not_cached, [rtype_id])
+
+        return super().accept_many(entities=entities, user=user)
+
     @classmethod
     def build(cls, *, model, name, data):
         try:
@@ -1459,6 +1562,15 @@ class RelationSubFilterConditionHandler(BaseRelationConditionHandler):
         #     a RelationSubFilterConditionHandler on another model.
         return Q(type=cls.type_id)
 
+    @property
+    def related_entity_models(self):
+        subfilter = self.subfilter
+
+        return {
+            subfilter.entity_type.model_class(),
+            *subfilter.get_related_entity_models(),
+        } if subfilter else set()
+
     @property
     def subfilter_id(self):
         return self._subfilter_id
@@ -1498,12 +1610,20 @@ class PropertyConditionHandler(FilterConditionHandler):
     def accept(self, *, entity, user):
         ptype_id = self._ptype_id
         # NB: we use get_properties() in order to get a cached result, & so avoid
-        #     additional queries when calling several times this method.
-        # TODO: add a system to populate properties when checking several entities
+        #     additional queries when calling several times this method
+        #     (see accept_many() to populate the properties of several entities).
         accepted = any(prop.type_id == ptype_id for prop in entity.get_properties())
 
         return not accepted if self._exclude else accepted
 
+    def accept_many(self, *, entities, user):
+        not_cached = [entity for entity in entities if entity._properties is None]
+
+        if not_cached:
+            CremeEntity.populate_properties(not_cached)
+
+        return super().accept_many(entities=entities, user=user)
+
     @classmethod
     def build(cls, *, model, name, data):
         if not isinstance(data, bool):
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+#    Creme is a free/open-source Customer Relationship Management software
+#    Copyright (C) 2020  Hybird
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+"""Incremental update of the results of the materialised EntityFilters
+(see the field EntityFilter.is_materialized & settings.ENTITY_FILTERS_MATERIALIZATION).
+
+When an entity, or one of its relationships/properties/custom-values, is
+saved/deleted, the entity is checked again by the materialised filters on its
+type. The filters which depend on the entities of the modified type indirectly
+(sub-filters through relationships, conditions on fields of related entities)
+are marked as outdated ; they are computed again by the job "materialized_filters".
+
+The saving of an entity never waits for the computing of the results
+(see EntityFilter.materialize()) : when the row of a filter is locked, the
+modification is recorded & applied later by the job.
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import signals, ForeignKey
+from django.dispatch import receiver
+
+from ...global_info import get_per_request_cache
+from ...models import (CremeEntity, Relation, CremeProperty,
+        CustomFieldValue, CustomFieldMultiEnum, EntityFilter, EntityFilterCondition)
+from ...signals import post_replace_in_bulk
+from ..config_cache import config_cache
+from . import EF_USER
+
+_CACHE_KEY = 'materialized_filters'
+_TRACKED_MODELS = (CremeEntity, Relation, CremeProperty, CustomFieldValue)
+_entity_fks = {}
+
+
+def get_materialized_filters_info():
+    """Get information about the materialised filters ; they are stored in the
+    per-request cache, & in the cache of <config_cache> (the cache is
+    invalidated when the filters or their conditions are modified).
+    @return: A list of tuples (filter_id, ctype_id, related_ctype_ids) ;
+             "related_ctype_ids" is a frozenset of IDs of the ContentTypes
+             which the filter depends on indirectly
+             (see FilterConditionHandler.related_entity_models).
+    """
+    request_cache = get_per_request_cache()
+    info = request_cache.get(_CACHE_KEY)
+
+    if info is None:
+        # NB: the related models depend on the conditions too.
+        generations = config_cache.get_generations(EntityFilterCondition)
+        key = '{}-{}'.format(_CACHE_KEY, generations[0]) if generations else _CACHE_KEY
+        info = config_cache.get_many(EntityFilter, [key]).get(key)
+
+        if info is None:
+            get_ct = ContentType.objects.get_for_model
+            info = [
+                (efilter.id,
+                 efilter.entity_type_id,
+                 frozenset(get_ct(model).id for model in efilter.get_related_entity_models()),
+                ) for efilter in EntityFilter.objects.filter(is_materialized=True,
+                                                             filter_type=EF_USER,
+                                                            )
+            ]
+            config_cache.set_many(EntityFilter, {key: info})
+
+        request_cache[_CACHE_KEY] = info
+
+    return info
+
+
+def _entity_foreign_keys(model):
+    fks = _entity_fks.get(model)
+
+    if fks is None:
+        _entity_fks[model] = fks = [
+            field
+                for field in model._meta.concrete_fields
+                    if isinstance(field, ForeignKey) and
+                       issubclass(field.remote_field.model, CremeEntity)
+        ]
+
+    return fks
+
+
+def concerned_entities(instance):
+    """Get the entities whose acceptance can be changed by the modification
+    of an instance (entity, relationship, property, custom-value).
+    @return: A dictionary {entity_id: ctype_id} ; "ctype_id" is None when
+             the type of the entity is not known without a query.
+    """
+    if isinstance(instance, CremeEntity):
+        return {instance.id: instance.entity_type_id}
+
+    concerned = {}
+
+    for field in _entity_foreign_keys(type(instance)):
+        entity_id = getattr(instance, field.attname)
+
+        if entity_id is not None:
+            entity = field.get_cached_value(instance, default=None)
+            concerned[entity_id] = None if entity is None else entity.entity_type_id
+
+    return concerned
+
+
+def update_materialized_filters(entities):
+    """Update the results of the materialised filters for some entities.
+    @param entities: Dictionary {entity_id: ctype_id} (see concerned_entities()).
+    """
+    filters_info = get_materialized_filters_info()
+
+    if not filters_info or not entities:
+        return
+
+    unknown_ids = [entity_id for entity_id, ctype_id in entities.items() if ctype_id is None]
+    if unknown_ids:
+        entities = {
+            **entities,
+            **dict(CremeEntity.objects.filter(id__in=unknown_ids)
+                                      .values_list('id', 'entity_type')),
+        }
+
+    ids_per_ctype = defaultdict(set)
+    for entity_id, ctype_id in entities.items():
+        if ctype_id is not None:
+            ids_per_ctype[ctype_id].add(entity_id)
+
+    updated = {}  # Filter ID => IDs of entities
+    stale_ids = []
+
+    for efilter_id, ctype_id, related_ctype_ids in filters_info:
+        entities_ids = ids_per_ctype.get(ctype_id)
+
+        if entities_ids:
+            updated[efilter_id] = entities_ids
+
+        if not related_ctype_ids.isdisjoint(ids_per_ctype):
+            stale_ids.append(efilter_id)
+
+    refresh_job = False
+
+    if stale_ids:
+        # NB: the entities related to the modified ones are not checked ;
+        #     the results are computed again by the job.
+        refresh_job = EntityFilter.outdate_materializations(stale_ids)
+
+    if updated:
+        # NB: the outdated filters are ignored (the job will compute them).
+        # NB: the rows are locked in the same order everywhere to avoid dead-locks.
+        for efilter in EntityFilter.objects.filter(id__in=[*updated],
+                                                   materialized_at__isnull=False,
+                                                  ).order_by('id'):
+            if not efilter.update_materialization(updated[efilter.id]):
+                # NB: the entities are checked again by the job.
+                refresh_job = True
+
+    if refresh_job:
+        from ...creme_jobs import materialized_filters_type
+
+        transaction.on_commit(materialized_filters_type.refresh_job)
+
+
+def update_materialized_filters_4_instances(instances):
+    """Update the results of the materialised filters for some modified
+    instances (entities, relationships, properties, custom-values) ; it's useful
+    when they have been updated without sending the signal post_save
+    (eg: QuerySet.update()). The other instances are ignored.
+    """
+    entities = {}
+
+    for instance in instances:
+        if isinstance(instance, _TRACKED_MODELS):
+            entities.update(concerned_entities(instance))
+
+    update_materialized_filters(entities)
+
+
+@receiver((signals.post_save, signals.post_delete))
+def _update_on_change(sender, instance, **kwargs):
+    if settings.ENTITY_FILTERS_MATERIALIZATION and isinstance(instance, _TRACKED_MODELS):
+        update_materialized_filters(concerned_entities(instance))
+
+
+@receiver(post_replace_in_bulk)
+def _update_on_bulk_replace(sender, instances, **kwargs):
+    # NB: the job "Deletor" has updated some instances without sending post_save.
+    if settings.ENTITY_FILTERS_MATERIALIZATION:
+        update_materialized_filters_4_instances(instances)
+
+
+@receiver((signals.post_save, signals.post_delete), sender=EntityFilter)
+@receiver((signals.post_save, signals.post_delete), sender=EntityFilterCondition)
+def _invalidate_filters_info(sender, **kwargs):
+    get_per_request_cache().pop(_CACHE_KEY, None)
+
+
+@receiver(signals.m2m_changed, sender=CustomFieldMultiEnum.value.through)
+def _update_on_multienum_change(sender, instance, action, **kwargs):
+    if settings.ENTITY_FILTERS_MATERIALIZATION and \
+       isinstance(instance, CustomFieldMultiEnum) and \
+       action in ('post_add', 'post_remove', 'post_clear'):
+        update_materialized_filters(concerned_entities(instance))
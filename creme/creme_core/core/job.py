@@ -21,25 +21,51 @@
 from collections import deque
 from datetime import timedelta, datetime, MAXYEAR
 from heapq import heappush, heappop, heapify
+from json import loads as json_load
 import logging
+import os
+from select import select
+import socket
+from subprocess import PIPE
+import sys
+import traceback
+from urllib.parse import urlparse
 from uuid import uuid1
 
 from django.conf import settings
+from django.db import close_old_connections
 from django.db.models import Q
 from django.utils.formats import date_format
 from django.utils.timezone import now, localtime
 from django.utils.translation import gettext_lazy as _, gettext, activate
 
 from ..creme_jobs.base import JobType
-from ..global_info import set_global_info
+from ..global_info import set_global_info, clear_global_info
 from ..models import Job
 from ..utils.dates import make_aware_dt
 from ..utils.imports import import_apps_sub_modules
+from ..utils.serializers import json_encode
 from ..utils.system import python_subprocess, enable_exit_handler
 
+try:
+    from resource import getrusage, RUSAGE_SELF
+except ImportError:  # Not available on Windows
+    getrusage = None
+
 logger = logging.getLogger(__name__)
 
 
+def _get_max_rss():
+    "Peak memory usage of the current process (in KB ; 0 if unknown)."
+    if getrusage is None:
+        return 0
+
+    max_rss = getrusage(RUSAGE_SELF).ru_maxrss
+
+    # NB: the value is in bytes on macOS (in KB on Linux/BSD).
+    return max_rss // 1024 if sys.platform == 'darwin' else max_rss
+
+
 class _JobTypeRegistry:
     class Error(Exception):
         pass
@@ -63,6 +89,47 @@ class _JobTypeRegistry:
 
         job_type.execute(job)
 
+    def serve(self, input_file=None, output_file=None, close_connections=True):
+        """Run the jobs which IDs are read in a file (one ID per line), until
+        the end of the file. It's the main loop of the pre-initialised
+        processes of the job manager (see _JobWorkersPool).
+
+        After each job, a line "<job_id>-<max_rss>" is written in the output
+        file, where <max_rss> is the peak memory usage of the process (in KB).
+
+        @param input_file: File-like object ; default value is the standard input.
+        @param output_file: File-like object ; default value is the standard output
+               (notice that the jobs' outputs are redirected to the standard error).
+        @param close_connections: Boolean ; True means the obsolete/broken
+               connections to the DB are closed after each job.
+        """
+        if input_file is None:
+            input_file = sys.stdin
+
+        if output_file is None:
+            # NB: the jobs could write on the standard output (print()...) ;
+            #     so we keep a copy of it for our messages, & the standard
+            #     output is redirected to the standard error.
+            stdout_fd = sys.stdout.fileno()
+            output_file = os.fdopen(os.dup(stdout_fd), 'w')
+            os.dup2(sys.stderr.fileno(), stdout_fd)
+
+        for line in input_file:
+            job_id = int(line)
+
+            try:
+                self(job_id)
+            except Exception:
+                logger.exception('Error when running the job with id=%s', job_id)
+            finally:
+                clear_global_info()
+
+                if close_connections:
+                    close_old_connections()
+
+            output_file.write('{}-{}\n'.format(job_id, _get_max_rss()))
+            output_file.flush()
+
     def get(self, job_type_id):
         try:
             return self._job_types[job_type_id]
@@ -102,6 +169,45 @@ class Command:
         self.data = data
 
 
+def _build_start_command(data):
+    return Command(cmd_type=CMD_START, data_id=int(data))
+
+
+def _build_end_command(data):
+    return Command(cmd_type=CMD_END, data_id=int(data))
+
+
+def _build_refresh_command(data):
+    job_id, refresh_data = data.split('-', 1)
+
+    return Command(cmd_type=CMD_REFRESH, data_id=int(job_id), data=json_load(refresh_data))
+
+
+def _build_ping_command(data):
+    return Command(cmd_type=CMD_PING, data_id=data)
+
+
+COMMANDS = {
+    CMD_START:   _build_start_command,
+    CMD_END:     _build_end_command,
+    CMD_REFRESH: _build_refresh_command,
+    CMD_PING:    _build_ping_command,
+}
+
+
+def _decode_command(raw_cmd):
+    """Build a Command from a string like "START-12".
+    @return: A Command instance, or None if the string is invalid.
+    """
+    try:
+        cmd_type, data = raw_cmd.split('-', 1)
+        return COMMANDS[cmd_type](data)
+    except Exception:
+        logger.warning('Job manager queue: invalid command "%s"\n%s',
+                       raw_cmd, traceback.format_exc(),
+                      )
+
+
 class _BaseJobManagerQueue:
     verbose_name = 'Abstract queue'  # Overload me
     _main_queue = None
@@ -174,6 +280,131 @@ class _BaseJobManagerQueue:
         raise NotImplementedError
 
 
+class _UnixSocketJobManagerQueue(_BaseJobManagerQueue):
+    """Queue which uses a Unix domain socket (datagram mode) ; no external
+    service (like Redis) is needed, but the job manager & the web server must
+    run on the same machine (& be able to read/write the socket's file).
+
+    The job manager binds the socket ; the commands are sent as datagrams.
+    The commands sent when the job manager is not running are lost ; it's not
+    a problem because the jobs list is rebuilt from the RDBMS when the job
+    manager starts.
+
+    URL pattern: unix_socket:///path/to/the/socket
+    """
+    verbose_name = _('Local queue')
+    MAX_COMMAND_SIZE = 65536  # In bytes
+    PING_TIMEOUT = 3  # In seconds
+
+    def __init__(self, path=None):
+        "@param path: Path of the socket ; by default, it's given by settings.JOBMANAGER_BROKER."
+        self._path = path or urlparse(settings.JOBMANAGER_BROKER).path
+        self._socket = None  # Socket bound by the job manager.
+
+    @staticmethod
+    def _send(path, message):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto(message.encode(), path)
+
+    def _send_command(self, cmd_type, data):
+        try:
+            self._send(self._path, '{}-{}'.format(cmd_type, data))
+        except OSError as e:
+            logger.critical('Error when sending command to the job manager [%s]', e)
+            return True
+
+        return False
+
+    def _get_socket(self):
+        sock = self._socket
+
+        if sock is None:
+            path = self._path
+
+            try:
+                os.unlink(path)  # Socket of a previous job manager
+            except FileNotFoundError:
+                pass
+
+            self._socket = sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(path)
+
+        return sock
+
+    def clear(self):
+        "The socket is (re-)created, so the pending commands are dropped."
+        self.close()
+        self._get_socket()
+
+    def close(self):
+        sock = self._socket
+
+        if sock is not None:
+            sock.close()
+            self._socket = None
+
+            try:
+                os.unlink(self._path)
+            except FileNotFoundError:
+                pass
+
+    def start_job(self, job):
+        logger.info('Job manager queue: request START "%s"', job)
+        return self._send_command(CMD_START, job.id)
+
+    def end_job(self, job):
+        logger.info('Job manager queue: request END "%s"', job)
+        self._send_command(CMD_END, job.id)
+
+    def refresh_job(self, job, data):
+        logger.info('Job manager queue: request REFRESH "%s" (data=%s)', job, data)
+        return self._send_command(CMD_REFRESH, '{}-{}'.format(job.id, json_encode(data)))
+
+    def get_command(self, timeout):
+        sock = self._get_socket()
+        # NB: a timeout equal to 0 means "no timeout" (like with Redis' BRPOP).
+        sock.settimeout(timeout or None)
+
+        try:
+            raw_cmd = sock.recv(self.MAX_COMMAND_SIZE)
+        except socket.timeout:
+            return None
+
+        return _decode_command(raw_cmd.decode())
+
+    def _build_pong_path(self, ping_value):
+        return '{}-pong-{}'.format(self._path, ping_value)
+
+    def ping(self):
+        value = str(uuid1())
+        logger.info('Job manager queue: request PING id="%s"', value)
+        pong_path = self._build_pong_path(value)
+
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+                sock.bind(pong_path)
+
+                try:
+                    sock.settimeout(self.PING_TIMEOUT)
+                    self._send(self._path, '{}-{}'.format(CMD_PING, value))
+                    sock.recv(16)
+                finally:
+                    os.unlink(pong_path)
+        except (socket.timeout, FileNotFoundError, ConnectionRefusedError):
+            # NB: the socket of the job manager does not exist if it's not running.
+            return str(self._manager_error)
+        except OSError as e:
+            return self._queue_error('{}.{}: {}'.format(
+                e.__module__, e.__class__, e
+            ))
+
+    def pong(self, ping_value):
+        try:
+            self._send(self._build_pong_path(ping_value), 'PONG')
+        except OSError as e:
+            logger.warning('Job manager queue: error when sending PONG [%s]', e)
+
+
 if settings.TESTS_ON:
     class JobManagerQueue(_BaseJobManagerQueue):
         "Mocking JobManagerQueue"
@@ -207,18 +438,15 @@ if settings.TESTS_ON:
 
         def pong(self, ping_value):
             pass
+elif urlparse(settings.JOBMANAGER_BROKER).scheme == 'unix_socket':
+    JobManagerQueue = _UnixSocketJobManagerQueue
 else:
     from functools import wraps
-    # from json import dumps as json_dump, loads as json_load
-    from json import loads as json_load
-    import traceback
     from time import sleep
 
     from redis import StrictRedis  # TODO: "Redis" with redis3
     from redis.exceptions import RedisError
 
-    from creme.creme_core.utils.serializers import json_encode
-
     def _redis_errors_2_bool(f):
         @wraps(f)
         def _aux(*args, **kwargs):
@@ -232,35 +460,13 @@ else:
 
         return _aux
 
-
-    def _build_start_command(data):
-        return Command(cmd_type=CMD_START, data_id=int(data))
-
-    def _build_end_command(data):
-        return Command(cmd_type=CMD_END, data_id=int(data))
-
-    def _build_refresh_command(data):
-        job_id, refresh_data = data.split('-', 1)
-
-        return Command(cmd_type=CMD_REFRESH, data_id=int(job_id), data=json_load(refresh_data))
-
-    def _build_ping_command(data):
-        return Command(cmd_type=CMD_PING, data_id=data)
-
-    COMMANDS = {
-        CMD_START:   _build_start_command,
-        CMD_END:     _build_end_command,
-        CMD_REFRESH: _build_refresh_command,
-        CMD_PING:    _build_ping_command,
-    }
-
     # NB: we do not need to build a reliable redis queue (see http://redis.io/commands/rpoplpush )
     #     because the only reliable data come from our RDBMS; Redis is just used an
     #     event broker. If there is a crash, the jobs list is rebuilt from the RDBMS.
 
     # TODO: should we rely on a watch dog ??
     # TODO: pub-sub allows to watch the numbers of readers -> use it to (re-)launch the command ?
-    # TODO: base class -> children: Redis, AMQP, etc...
+    # TODO: other children of _BaseJobManagerQueue: AMQP, etc...
     class JobManagerQueue(_BaseJobManagerQueue):
         verbose_name = _('Redis queue')
         JOBS_COMMANDS_KEY = 'creme_jobs'
@@ -299,13 +505,7 @@ else:
 
             if result is not None:  # None == timeout
                 # NB: result == (self.JOBS_KEY, command)
-                try:
-                    cmd_type, data = result[1].decode().split('-', 1)
-                    cmd = COMMANDS[cmd_type](data)
-                except Exception:
-                    logger.warning('Job manager queue: invalid command "%s"\n%s',
-                                   result, traceback.format_exc(),
-                                  )
+                cmd = _decode_command(result[1].decode())
 
             return cmd
 
@@ -342,6 +542,152 @@ else:
             self._redis.setex(self._build_pong_key(ping_value), value=1, time=10)  # TODO: '10' in settings ?
 
 
+class _JobWorker:
+    """Pre-initialised process (Django is already set up) which runs jobs.
+    The IDs of the jobs are sent through a pipe (see _JobTypeRegistry.serve()).
+    """
+    def __init__(self):
+        self.process = python_subprocess('import django; '
+                                         'django.setup(); '
+                                         'from creme.creme_core.core.job import job_type_registry; '
+                                         'job_type_registry.serve()',
+                                         stdin=PIPE, stdout=PIPE, universal_newlines=True,
+                                        )
+        self.jobs_count = 0
+        self.max_rss = 0  # In KB
+
+    def run_job(self, job_id):
+        "Can raise OSError if the process is dead."
+        stdin = self.process.stdin
+        stdin.write('{}\n'.format(job_id))
+        stdin.flush()
+
+        self.jobs_count += 1
+
+    @staticmethod
+    def finished(workers):
+        """Get the workers which have finished their current job (i.e. the
+        line written at the end of the job can be read, see wait_job()), or
+        which are dead ; it does not block.
+        Notice that the pipes cannot be polled on Windows (no worker is returned).
+        @param workers: Iterable of _JobWorker instances.
+        @return: List of _JobWorker instances.
+        """
+        if sys.platform == 'win32':
+            return []
+
+        workers = {worker.process.stdout: worker for worker in workers}
+        if not workers:
+            return []
+
+        return [workers[stdout] for stdout in select([*workers.keys()], [], [], 0)[0]]
+
+    def wait_job(self):
+        """Wait for the end of the current job.
+        @return: Boolean ; False means the process is dead.
+        """
+        line = self.process.stdout.readline()
+
+        if not line:
+            return False
+
+        self.max_rss = int(line.split('-', 1)[1])
+
+        return True
+
+    def stop(self):
+        "The process ends when its input is closed."
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+
+        self.process.wait()
+
+
+class _JobWorkersPool:
+    """Pool of _JobWorkers, used by the JobManager to avoid the initialisation
+    of Django for each job.
+    The workers are replaced after having run a given number of jobs, or when
+    their memory usage is too high.
+    """
+    def __init__(self, size, max_jobs, max_memory):
+        """Constructor.
+        @param size: Minimal number of workers (idle or busy).
+        @param max_jobs: Number of jobs after which a worker is replaced.
+        @param max_memory: Peak memory usage (in MB) after which a worker is
+               replaced ; 0 means no limit.
+        """
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_memory = max_memory
+        self._idle_workers = deque()
+        self._busy_count = 0
+
+    def _must_be_recycled(self, worker):
+        max_memory = self.max_memory
+
+        return worker.jobs_count >= self.max_jobs or \
+               (max_memory and worker.max_rss > max_memory * 1024)
+
+    def start(self):
+        "Fork the missing workers."
+        idle_workers = self._idle_workers
+
+        while len(idle_workers) + self._busy_count < self.size:
+            idle_workers.append(_JobWorker())
+
+    def stop(self):
+        "Stop the idle workers (the busy ones stop after their current job)."
+        idle_workers = self._idle_workers
+
+        while idle_workers:
+            idle_workers.pop().stop()
+
+    def run_job(self, job_id):
+        """Send a job to an idle worker (a new worker is created if needed).
+        @return: The _JobWorker instance ; give it to release() at the end of the job.
+        """
+        idle_workers = self._idle_workers
+
+        while idle_workers:
+            worker = idle_workers.popleft()
+
+            try:
+                worker.run_job(job_id)
+            except OSError:
+                logger.warning('JobWorkersPool: the worker %s is dead', worker.process.pid)
+                worker.stop()
+            else:
+                break
+        else:
+            worker = _JobWorker()
+            worker.run_job(job_id)
+
+        self._busy_count += 1
+
+        return worker
+
+    def release(self, worker):
+        "The job run by the worker is finished."
+        self._busy_count -= 1
+
+        if not worker.wait_job():
+            logger.warning('JobWorkersPool: the worker %s is dead', worker.process.pid)
+            worker.stop()
+        elif self._must_be_recycled(worker):
+            logger.info('JobWorkersPool: the worker %s is recycled (jobs=%s, memory=%sKB)',
+                        worker.process.pid, worker.jobs_count, worker.max_rss,
+                       )
+            worker.stop()
+        elif len(self._idle_workers) + self._busy_count >= self.size:
+            worker.stop()
+        else:
+            self._idle_workers.append(worker)
+
+        self.start()
+
+
 class JobManager:
     """Job scheduler ; it should run it its own process (see 'creme_job_manager'
     command), receive command (START...) from an inter-process queue, and spawn
@@ -361,11 +707,21 @@ class JobManager:
     The "period" of pseudo-periodic is computed each time they are run. But
     the manager runs them regularly (see settings.PSEUDO_PERIOD) in order to
     reduce the aftermath of a redis/... connection problem.
+
+    When settings.JOBMANAGER_WORKERS_POOL is True, the jobs are not run in new
+    processes, but by a pool of pre-initialised processes (see _JobWorkersPool).
     """
+    workers_poll_period = 5  # In seconds ; see _release_finished_workers()
+
     def __init__(self):
         self._max_user_jobs = settings.MAX_USER_JOBS
         self._queue = JobManagerQueue.get_main_queue()
         self._procs = {}  # key: job.id; value: subprocess.Popen instance
+        self._workers = {}  # key: job.id; value: _JobWorker instance
+        self._pool = _JobWorkersPool(size=settings.MAX_USER_JOBS,
+                                     max_jobs=settings.JOBMANAGER_WORKER_MAX_JOBS,
+                                     max_memory=settings.JOBMANAGER_WORKER_MAX_MEMORY,
+                                    ) if settings.JOBMANAGER_WORKERS_POOL else None
 
         self._system_jobs = []  # Heap, which elements are (wakeup_date, job_instance) => closer wakeup in the first element.
         self._system_jobs_starts = {}
@@ -464,20 +820,51 @@ class JobManager:
     def _start_job(self, job):
         logger.info('JobManager: start %s', repr(job))
 
-        self._procs[job.id] = python_subprocess('import django; '
-                                                'django.setup(); '
-                                                'from creme.creme_core.core.job import job_type_registry; '
-                                                'job_type_registry({})'.format(job.id)
-                                               )
+        pool = self._pool
+
+        if pool is not None:
+            self._workers[job.id] = pool.run_job(job.id)
+        else:
+            self._procs[job.id] = python_subprocess('import django; '
+                                                    'django.setup(); '
+                                                    'from creme.creme_core.core.job import job_type_registry; '
+                                                    'job_type_registry({})'.format(job.id)
+                                                   )
 
     def _end_job(self, job):
         logger.info('JobManager: end %s', repr(job))
+        worker = self._workers.pop(job.id, None)
+        if worker is not None:
+            self._pool.release(worker)
+
         proc = self._procs.pop(job.id, None)
         if proc is not None:
             proc.wait()  # TODO: use return code ??
 
+    def _release_finished_workers(self):
+        """Release the workers which have finished their job, even if the
+        command END has not been received (the job has crashed before sending
+        it, or the worker is dead) ; so the workers & the slots of user-jobs
+        are not leaked.
+        """
+        workers = self._workers
+        finished = _JobWorker.finished(workers.values())
+
+        for job_id, worker in [*workers.items()]:
+            if worker in finished:
+                logger.info('JobManager: the worker of the job id=%s is released', job_id)
+                del workers[job_id]
+                self._pool.release(worker)
+
+                # NB: the command END will only discard the ID again (if it comes).
+                self._running_userjob_ids.discard(job_id)
+
     def _handle_kill(self, *args):
-        logger.info('Job manager stops: %d running job(s)', len(self._procs))
+        logger.info('Job manager stops: %d running job(s)', len(self._procs) + len(self._workers))
+
+        if self._pool is not None:
+            self._pool.stop()
+
         exit()
 
     def _handle_command_end(self, cmd):
@@ -591,6 +978,9 @@ class JobManager:
         self._queue.clear()
         self._retrieve_jobs()
 
+        if self._pool is not None:
+            self._pool.start()
+
         enable_exit_handler(self._handle_kill)
 
         users_jobs = self._users_jobs
@@ -668,11 +1058,20 @@ class JobManager:
                 # No timeout (because we do not need to be woken up by a time-out -- user-jobs are not periodic)
                 timeout = 0
 
+            if self._workers:
+                self._release_finished_workers()
+
             while len(running_userjob_ids) <= MAX_USER_JOBS and users_jobs:
                 job = users_jobs.pop()
                 self._start_job(job)
                 running_userjob_ids.add(job.id)
 
+            if self._workers:
+                # NB: we wake up regularly to release the workers of the jobs
+                #     which have crashed (see _release_finished_workers()).
+                poll_period = self.workers_poll_period
+                timeout = min(timeout, poll_period) if timeout else poll_period
+
             cmd = self._queue.get_command(timeout)
             if cmd is None:  # Time out -> time to run a system job
                 continue
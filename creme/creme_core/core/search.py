@@ -19,13 +19,167 @@
 ################################################################################
 
 from functools import reduce
+import logging
 from operator import or_
+import re
+from unicodedata import category, normalize
 
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
 from django.db.models.query import Q
+from django.db.transaction import atomic
+from django.utils.module_loading import import_string
 
-from ..models import SearchConfigItem, FieldsConfig
+from ..models import SearchConfigItem, SearchIndexToken, FieldsConfig
+from ..utils.meta import FieldInfo
+from .config_cache import config_cache
 from ..utils.string import smart_split
 
+logger = logging.getLogger(__name__)
+
+
+class SearchBackend:
+    """Base class for the ways to retrieve the entities containing some words
+    (see settings.SEARCH_BACKEND & Searcher).
+    """
+    def search(self, model, words, fields):
+        """Get the entities containing all the given words.
+        @param model: Class inheriting <creme_core.models.CremeEntity>.
+        @param words: Searched strings.
+        @param fields: Sequence of <creme_core.models.search.SearchField> objects.
+        @return: Instance of QuerySet on model.
+        """
+        raise NotImplementedError
+
+    def index_entities(self, model, entities):
+        """Called when some entities are created/modified.
+        @param model: Class inheriting <creme_core.models.CremeEntity>.
+        @param entities: Sequence of instances of model.
+        """
+        pass
+
+
+class FieldsSearchBackend(SearchBackend):
+    """Search directly in the fields of the entities (with "icontains").
+    It needs no index, but it means a sequential scan of the tables.
+    """
+    def _build_query(self, words, fields):
+        """Build a Q with given fields for the given search.
+        Each word must be contained in (at least) one field.
+
+        @param words: Searched strings.
+        @param fields: Sequence of <creme_core.models.search.SearchField> objects.
+        @return: Instance of <django.db.models.query.Q>.
+        """
+        result_q = Q()
+
+        for word in words:
+            result_q &= reduce(or_, (Q(**{'{}__icontains'.format(field.name): word}) for field in fields))
+
+        return result_q
+
+    def search(self, model, words, fields):
+        # TODO: distinct() only if there is a JOIN...
+        return model.objects.filter(self._build_query(words, fields)).distinct()
+
+
+class IndexSearchBackend(SearchBackend):
+    """Search in a table of normalised tokens (see the model SearchIndexToken),
+    which is updated when the entities are saved. The tokens are lower-cased
+    words without accent ; a searched word matches with the tokens starting
+    with it (so the DB-index on tokens is used).
+
+    The indexed fields are all the fields used by the instances of
+    SearchConfigItem related to the model.
+    Notice that the index is not updated when a related instance is modified
+    (eg: the title of the sector of a contact, a ManyToManyField...), or when
+    the search configuration is modified ; use the command "creme_search_index"
+    to rebuild it.
+    """
+    token_max_length = SearchIndexToken._meta.get_field('token').max_length
+    _word_re = re.compile(r'\w+')
+
+    def tokenize(self, text):
+        "@return: Set of tokens (strings)."
+        text = ''.join(c for c in normalize('NFKD', str(text).lower()) if category(c) != 'Mn')
+        max_length = self.token_max_length
+
+        return {word[:max_length] for word in self._word_re.findall(text)}
+
+    def get_indexed_field_names(self, model):
+        """@return: Set of field names (strings) ; it's stored in the cache of
+                    <config_cache>, like the items of SearchConfigItem.get_4_models()
+                    (this method is called each time an entity is saved).
+        """
+        ctype = ContentType.objects.get_for_model(model)
+        key = 'indexed_fields-{}'.format(ctype.id)
+        field_names = config_cache.get_many(SearchConfigItem, [key]).get(key)
+
+        if field_names is None:
+            items = [*SearchConfigItem.objects.filter(content_type=ctype)] or \
+                    [SearchConfigItem(content_type=ctype)]
+            field_names = frozenset(
+                sfield.name for sci in items if not sci.disabled for sfield in sci.searchfields
+            )
+            config_cache.set_many(SearchConfigItem, {key: field_names})
+
+        return field_names
+
+    def _iter_values(self, model, field_name, entity):
+        value = FieldInfo(model, field_name).value_from(entity)
+
+        if isinstance(value, list):
+            yield from (v for v in value if v is not None)
+        elif value is not None:
+            yield value
+
+    def index_entities(self, model, entities):
+        field_names = self.get_indexed_field_names(model)
+        tokenize = self.tokenize
+        lines = []
+
+        for entity in entities:
+            for field_name in field_names:
+                try:
+                    values = [*self._iter_values(model, field_name, entity)]
+                except Exception as e:
+                    logger.warning('IndexSearchBackend: cannot index the field "%s" (%s)', field_name, e)
+                    continue
+
+                lines.extend(
+                    SearchIndexToken(entity_id=entity.id, field_name=field_name, token=token)
+                        for value in values
+                            for token in tokenize(value)
+                )
+
+        with atomic():
+            SearchIndexToken.objects.filter(entity__in=[e.id for e in entities]).delete()
+            SearchIndexToken.objects.bulk_create(lines)
+
+    def search(self, model, words, fields):
+        max_length = self.token_max_length
+        tokens = SearchIndexToken.objects.filter(field_name__in=[f.name for f in fields])
+        qs = model.objects.all()
+
+        for word in words:
+            word_tokens = self.tokenize(word)
+
+            if not word_tokens:
+                # NB: a word without token (eg: "!!") cannot be found in the index.
+                return qs.none()
+
+            for token in word_tokens:
+                qs = qs.filter(id__in=tokens.filter(token__startswith=token[:max_length])
+                                            .values('entity_id')
+                              )
+
+        return qs
+
+
+def get_search_backend():
+    "@return: Instance of the class of SearchBackend indicated by settings.SEARCH_BACKEND."
+    return import_string(settings.SEARCH_BACKEND)()
+
 
 class Searcher:
     """Build QuerySets to search strings contained in instances of some given models.
@@ -34,13 +188,16 @@ class Searcher:
     which fields to use.
     Hidden fields (see model FieldsConfig) are ignored.
     """
-    def __init__(self, models, user):
+    def __init__(self, models, user, backend=None):
         """Constructor.
 
         @param models: Iterable of classes inheriting <django.db.models.Model>.
         @param user: Instance of <django.contrib.auth.get_user_model()>.
+        @param backend: Instance of <SearchBackend> ; None means the backend
+               indicated by settings.SEARCH_BACKEND.
         """
         self.user = user
+        self.backend = backend or get_search_backend()
         self._search_map = search_map = {}
         models = [*models]  # Several iterations
         fconfigs = FieldsConfig.get_4_models(models)
@@ -55,28 +212,6 @@ class Searcher:
                                             if not is_hidden(sfield.name.split('__', 1)[0])
                                     ]
 
-    # def _build_query(self, research, fields):
-    #     result_q = Q()
-    #
-    #     for f in fields:
-    #         result_q |= Q(**{'{}__icontains'.format(f.name): research})
-    #
-    #     return result_q
-    def _build_query(self, words, fields):
-        """Build a Q with given fields for the given search.
-        Each word must be contained in (at least) one field.
-
-        @param words: Searched strings.
-        @param fields: Sequence of <creme_core.models.search.SearchField> objects.
-        @return: Instance of <django.db.models.query.Q>.
-        """
-        result_q = Q()
-
-        for word in words:
-            result_q &= reduce(or_, (Q(**{'{}__icontains'.format(field.name): word}) for field in fields))
-
-        return result_q
-
     def get_fields(self, model):
         """Get the list of SearchFields instances used to search in 'model'.
 
@@ -100,10 +235,5 @@ class Searcher:
 
         assert searchfields is not None  # search on a disabled model ?
 
-        strings = smart_split(research)
-
-        # TODO: distinct() only if there is a JOIN...
-        # return model.objects.filter(self._build_query(research, searchfields)).distinct() \
-        #        if searchfields else None
-        return model.objects.filter(self._build_query(strings, searchfields)).distinct() \
+        return self.backend.search(model, smart_split(research), searchfields) \
                if searchfields else None
@@ -2,7 +2,10 @@ from .temp_files_cleaner import temp_files_cleaner_type
 from .deletor import deletor_type
 from .batch_process import batch_process_type
 from .mass_import import mass_import_type
+from .mass_export import mass_export_type
 from .reminder import reminder_type
+from .trash_cleaner import trash_cleaner_type
+from .materialized_filters import materialized_filters_type
 
 
 jobs = (
@@ -10,5 +13,8 @@ jobs = (
     deletor_type,
     batch_process_type,
     mass_import_type,
+    mass_export_type,
     reminder_type,
+    trash_cleaner_type,
+    materialized_filters_type,
 )
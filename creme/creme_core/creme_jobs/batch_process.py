@@ -29,7 +29,7 @@ from django.utils.translation import gettext_lazy as _, ngettext, gettext
 
 from ..core.batch_process import BatchAction
 from ..core.paginator import FlowPaginator
-from ..models import EntityFilter, EntityCredentials, EntityJobResult
+from ..models import EntityFilter, EntityCredentials, EntityJobResult, HistoryLine
 from .base import JobType, JobProgress
 
 logger = logging.getLogger(__name__)
@@ -96,14 +96,17 @@ class _BatchProcessType(JobType):
         actions = [*self._get_actions(model, job_data)]
         create_result = partial(EntityJobResult.objects.create, job=job)
 
+        # NB: each page is processed in a transaction (the results are saved
+        #     with the entities, so the job can be resumed), & the HistoryLines
+        #     are inserted in bulk.
         for entities_page in paginator.pages():
-            for entity in entities_page.object_list:
-                if entity.id in already_processed:
-                    continue
+            with atomic(), HistoryLine.buffered():
+                for entity in entities_page.object_list:
+                    if entity.id in already_processed:
+                        continue
 
-                changed = False
+                    changed = False
 
-                with atomic():
                     try:
                         final_entity = model.objects.select_for_update().get(id=entity.id)
                     except model.DoesNotExist:
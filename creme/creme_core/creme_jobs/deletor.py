@@ -2,7 +2,7 @@
 
 ################################################################################
 #    Creme is a free/open-source Customer Relationship Management software
-#    Copyright (C) 2019 Hybird
+#    Copyright (C) 2019-2020 Hybird
 #
 #    This program is free software: you can redistribute it and/or modify
 #    it under the terms of the GNU Affero General Public License as published by
@@ -20,23 +20,136 @@
 
 from collections import Counter
 
-from django.db.models import ProtectedError, F
+from django.db.models import Model, ProtectedError, F, signals
 from django.db.transaction import atomic
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _, gettext, ngettext
 
-from ..models import DeletionCommand, JobResult, FieldsConfig
-from ..signals import pre_replace_and_delete
+from ..models import CremeEntity, DeletionCommand, JobResult, FieldsConfig, HistoryLine
+from ..models.entity import _SEARCH_FIELD_MAX_LENGTH
+from ..signals import pre_replace_and_delete, post_replace_in_bulk
 from ..utils.translation import get_model_verbose_name
 
 from .base import JobType, JobProgress
 
 
+def _has_save_logic(model):
+    """Does a model have some business logic when its instances are saved
+    (i.e. an overridden save() method, or some receivers of the signals
+    pre_save/post_save which are specific to this model) ?
+    """
+    if model.save not in (Model.save, CremeEntity.save):
+        return True
+
+    model_id = id(model)  # NB: see django.dispatch.dispatcher._make_id()
+
+    return any(sender_id == model_id
+                   for signal in (signals.pre_save, signals.post_save)
+                       for (__, sender_id), __ in signal.receivers
+              )
+
+
 # TODO: possibility to resume the job if it failed ?
 class _DeletorType(JobType):
-    """Job which updates ForeignKeys referencing an instance before deleting it."""
+    """Job which updates ForeignKeys referencing an instance before deleting it.
+
+    The instances are updated by batches, with an UPDATE query (the
+    HistoryLines are created in bulk) ; the instances of the models which
+    have some business logic when they are saved (see _has_save_logic()),
+    & the ManyToManyFields, are updated one by one.
+    The global receivers of post_save are not called by the UPDATE queries ;
+    their work is done for each batch (see _post_bulk_update()).
+    """
     id           = JobType.generate_id('creme_core', 'deletor')
     verbose_name = _('Replace & delete')
 
+    batch_size = 1024
+
+    def _update_count(self, dcom, count):
+        DeletionCommand.objects.filter(pk=dcom.pk).update(updated_count=F('updated_count') + count)
+
+    def _replace_one_by_one(self, dcom, instance_2_del, model_field, new_value):
+        rel_mngr   = model_field.model._default_manager
+        field_name = model_field.name
+
+        for pk in rel_mngr.filter(**{field_name: instance_2_del.pk}).values_list('pk', flat=True):
+            # NB1: we perform a .save(), not an .update() in order to:
+            #       - let the model compute it's business logic (if there is one).
+            #       - get an HistoryLine for entities.
+            # NB2: as in edition view, we perform a select_for_update() to avoid
+            #      overriding other fields (if there are concurrent accesses)
+            with atomic():
+                related_instance = rel_mngr.select_for_update().filter(pk=pk).first()
+                if related_instance is not None:
+                    if model_field.many_to_many:
+                        getattr(related_instance, field_name).add(new_value)
+                    else:
+                        setattr(related_instance, field_name, new_value)
+                        related_instance.save()
+
+                self._update_count(dcom, 1)
+
+    @staticmethod
+    def _post_bulk_update(model_field, instances):
+        """Update the data which depend on instances updated by an UPDATE query
+        (search index, cached bricks, materialised filters, counters...) ; the
+        subsystems which receive the signal post_save globally receive the
+        signal "post_replace_in_bulk" too.
+        @param model_field: Updated field.
+        @param instances: List of updated instances (their attributes have the new values).
+        """
+        post_replace_in_bulk.send_robust(sender=model_field.model,
+                                         model_field=model_field,
+                                         instances=instances,
+                                        )
+
+    def _replace_in_bulk(self, dcom, instance_2_del, model_field, new_value):
+        model      = model_field.model
+        rel_mngr   = model._default_manager
+        field_name = model_field.name
+        is_entity  = issubclass(model, CremeEntity)
+        with_history = is_entity or hasattr(model, 'get_related_entity')
+        old_instances_qs = rel_mngr.filter(**{field_name: instance_2_del.pk})
+
+        while True:
+            with atomic(), HistoryLine.buffered():
+                pks = [*old_instances_qs.values_list('pk', flat=True)[:self.batch_size]]
+
+                if not pks:
+                    break
+
+                batch_qs = rel_mngr.filter(pk__in=pks)
+                values = {field_name: new_value}
+
+                # NB: the instances are retrieved for the HistoryLines & for
+                #     the work of the receivers of post_save (see _post_bulk_update()).
+                instances = [*batch_qs.select_for_update()]
+
+                if is_entity:
+                    values['modified'] = now()
+
+                count = batch_qs.update(**values)
+
+                for instance in instances:
+                    for fname, value in values.items():
+                        setattr(instance, fname, value)
+
+                    if with_history:
+                        HistoryLine.log_edition(instance)
+
+                        if is_entity:
+                            # NB: the representation of the entity can depend on the field.
+                            search_value = instance._search_field_value()[:_SEARCH_FIELD_MAX_LENGTH]
+
+                            if search_value != instance.header_filter_search_field:
+                                CremeEntity.objects.filter(pk=instance.pk) \
+                                                   .update(header_filter_search_field=search_value)
+
+                self._update_count(dcom, count)
+
+            # NB: after the commit, so the concurrent requests cannot cache the old data.
+            self._post_bulk_update(model_field, instances)
+
     def _execute(self, job):
         dcom_mngr = DeletionCommand.objects
         dcom = dcom_mngr.get(job=job)
@@ -49,32 +162,17 @@ class _DeletorType(JobType):
         # TODO: regroup by same CType & update several fields at once when its possible
         for replacer in dcom.replacers:
             new_value = replacer.get_value()
-
             model_field = replacer.model_field
-            rel_mngr   = model_field.model._default_manager
-            field_name = model_field.name
 
             pre_replace_and_delete.send_robust(sender=instance_2_del,
                                                model_field=model_field,
                                                replacing_instance=new_value,
                                               )
 
-            for pk in rel_mngr.filter(**{field_name: instance_2_del.pk}).values_list('pk', flat=True):
-                # NB1: we perform a .save(), not an .update() in order to:
-                #       - let the model compute it's business logic (if there is one).
-                #       - get an HistoryLine for entities.
-                # NB2: as in edition view, we perform a select_for_update() to avoid
-                #      overriding other fields (if there are concurrent accesses)
-                with atomic():
-                    related_instance = rel_mngr.select_for_update().filter(pk=pk).first()
-                    if related_instance is not None:
-                        if model_field.many_to_many:
-                            getattr(related_instance, field_name).add(new_value)
-                        else:
-                            setattr(related_instance, field_name, new_value)
-                            related_instance.save()
-
-                    dcom_mngr.filter(pk=dcom.pk).update(updated_count=F('updated_count') + 1)
+            if model_field.many_to_many or _has_save_logic(model_field.model):
+                self._replace_one_by_one(dcom, instance_2_del, model_field, new_value)
+            else:
+                self._replace_in_bulk(dcom, instance_2_del, model_field, new_value)
 
         try:
             instance_2_del.delete()
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+#    Creme is a free/open-source Customer Relationship Management software
+#    Copyright (C) 2020  Hybird
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+import logging
+from os.path import basename, join
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.mail import EmailMessage, get_connection
+from django.http import Http404, HttpRequest, QueryDict
+from django.template.defaultfilters import slugify
+from django.urls import reverse
+from django.utils.translation import gettext_lazy as _, gettext, ngettext
+
+from ..models import FileRef, JobResult
+from ..utils.file_handling import FileCreator
+
+from .base import JobType, JobProgress
+
+logger = logging.getLogger(__name__)
+
+
+class _MassExportType(JobType):
+    """Export the entities of a list-view in a (temporary) file, in background.
+
+    The data of the Job contains the parameters of the view
+    <creme_core.views.mass_export.MassExport>, which is used to build the file
+    (so the export is exactly the same as the synchronous one).
+    The backend of export must be able to write files in background
+    (see ExportBackend.background).
+    """
+    id           = JobType.generate_id('creme_core', 'mass_export')
+    verbose_name = _('Mass export')
+
+    dir_parts = ('mass_export',)  # Sub-directory under {settings.MEDIA_ROOT}/upload
+
+    def _build_GET(self, job_data):
+        return QueryDict(job_data['GET'].encode('utf8'))
+
+    def _get_ctype(self, job_data):
+        return ContentType.objects.get_for_id(job_data['ctype'])
+
+    def _build_view(self, job):
+        from ..views.mass_export import MassExport
+
+        request = HttpRequest()
+        request.method = 'GET'
+        request.user = job.user
+        request.GET = self._build_GET(job.data)
+
+        view = MassExport()
+        view.setup(request)
+
+        return view
+
+    def _get_fileref(self, job):
+        fileref_id = job.data.get('fileref')
+
+        return FileRef.objects.filter(id=fileref_id).first() if fileref_id else None
+
+    def _update_count(self, job, count):
+        job_data = job.data
+        job_data['count'] = count
+        job.data = job_data
+        job.save(update_fields=('raw_data',))
+
+    def _write_file(self, job, writer, pages):
+        ctype = self._get_ctype(job.data)
+        dir_path = join(settings.MEDIA_ROOT, 'upload', *self.dir_parts)
+        name = '{}.{}'.format(slugify(ctype.model), writer.id)
+        path = FileCreator(dir_path=dir_path, name=name).create()
+
+        writer.write_file(self._count_pages(job, pages), path)
+
+        return FileRef.objects.create(
+            user=job.user,
+            basename=name,
+            filedata='upload/{}/{}'.format('/'.join(self.dir_parts), basename(path)),
+        )
+
+    def _count_pages(self, job, pages):
+        "Generator which updates the progress of the job after each page of entities."
+        yield next(pages)  # Header
+
+        count = 0
+
+        for rows in pages:
+            yield rows
+
+            count += len(rows)
+            self._update_count(job, count)
+
+    def _notify(self, job, fileref):
+        email = job.user.email or getattr(settings, 'DEFAULT_USER_EMAIL', None)
+
+        if not email:
+            logger.warning('_MassExportType: the user "%s" has no e-mail address ; '
+                           'no notification is sent.', job.user,
+                          )
+            return
+
+        message = EmailMessage(
+            subject=gettext('The export is ready'),
+            body=gettext('Your export «{model}» is ready.\n'
+                         'You can download the file here: {url}'
+                        ).format(
+                model=self._get_ctype(job.data).model_class()._meta.verbose_name_plural,
+                url=settings.SITE_DOMAIN + reverse('creme_core__dl_file', args=(fileref.filedata,)),
+            ),
+            from_email=settings.EMAIL_SENDER,
+            to=[email],
+        )
+
+        try:
+            with get_connection() as connection:
+                connection.send_messages([message])
+        except Exception as e:
+            logger.critical('Error while sending the e-mail of export (%s)', e)
+            JobResult.objects.create(
+                job=job,
+                messages=[
+                    gettext('An error occurred while sending the e-mail of notification'),
+                    gettext('Original error: {}').format(e),
+                ],
+            )
+
+    def _execute(self, job):
+        view = self._build_view(job)
+
+        try:
+            writer = view.get_backend()()
+
+            if not writer.background:
+                raise self.Error(
+                    gettext('The type of file «{}» cannot be exported in background').format(
+                        writer.verbose_name,
+                    )
+                )
+
+            pages = view.get_pages()
+        except Http404 as e:
+            raise self.Error(gettext('Invalid data [{}]').format(e)) from e
+
+        fileref = self._write_file(job, writer, pages)
+
+        job_data = job.data
+        job_data['fileref'] = fileref.id
+        job.data = job_data
+
+        self._notify(job, fileref)
+
+    def progress(self, job):
+        count = job.data.get('count', 0)
+        return JobProgress(
+            percentage=None,
+            label=ngettext('{count} entity has been exported.',
+                           '{count} entities have been exported.',
+                           count
+                          ).format(count=count),
+        )
+
+    @property
+    def results_bricks(self):
+        from ..bricks import MassExportJobErrorsBrick
+        return [MassExportJobErrorsBrick()]
+
+    def get_description(self, job):
+        try:
+            job_data = job.data
+            desc = [
+                gettext('Export «{model}» (format: {format})').format(
+                    model=self._get_ctype(job_data).model_class()._meta.verbose_name_plural,
+                    format=self._build_GET(job_data).get('type'),
+                ),
+            ]
+        except Exception:
+            logger.exception('Error in _MassExportType.get_description')
+            desc = ['?']
+
+        return desc
+
+    def get_stats(self, job):
+        count = job.data.get('count', 0)
+
+        return [ngettext('{count} entity has been exported.',
+                         '{count} entities have been exported.',
+                         count
+                        ).format(count=count),
+               ]
+
+
+mass_export_type = _MassExportType()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+#    Creme is a free/open-source Customer Relationship Management software
+#    Copyright (C) 2020  Hybird
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.db.models import Min, Q
+from django.utils.timezone import now
+from django.utils.translation import gettext_lazy as _, gettext
+
+from ..core.entity_filter import EF_USER
+from ..models import EntityFilter, EntityFilterChange
+from .base import JobType
+
+logger = logging.getLogger(__name__)
+
+
+class _MaterializedFiltersType(JobType):
+    """Job which computes the results of the materialised EntityFilters which
+    are outdated (see EntityFilter.is_materialized) ; i.e. the results which
+    have never been computed, which have been marked as outdated, or which are
+    older than settings.ENTITY_FILTERS_MATERIALIZATION_REFRESH seconds.
+    It applies the modifications recorded while the filters were locked too
+    (see EntityFilter.update_materialization()).
+    """
+    id           = JobType.generate_id('creme_core', 'materialized_filters')
+    verbose_name = _('Materialised filters')
+    periodic     = JobType.PSEUDO_PERIODIC
+
+    @staticmethod
+    def _get_materialized_filters():
+        return EntityFilter.objects.filter(is_materialized=True, filter_type=EF_USER)
+
+    def _execute(self, job):
+        if not settings.ENTITY_FILTERS_MATERIALIZATION:
+            return
+
+        limit = now() - timedelta(seconds=settings.ENTITY_FILTERS_MATERIALIZATION_REFRESH)
+
+        for efilter in self._get_materialized_filters().filter(
+            Q(materialized_at__isnull=True) | Q(materialized_at__lt=limit)
+        ):
+            try:
+                efilter.materialize()
+            except EntityFilter.MaterializationError as e:
+                # NB: the filter would be computed again & again.
+                logger.warning('MaterializedFiltersType: %s => the option is disabled', e)
+                EntityFilter.objects.filter(id=efilter.id).update(is_materialized=False)
+
+        # NB: the filters which have just been computed have no change anymore.
+        for efilter in self._get_materialized_filters().filter(
+            id__in=EntityFilterChange.objects.values('efilter'),
+            materialized_at__isnull=False,
+        ):
+            efilter.apply_materialization_changes()
+
+    def get_description(self, job):
+        return [gettext('Compute the results of the materialised filters which are outdated')]
+
+    def next_wakeup(self, job, now_value):  # We have to implement it because it is a PSEUDO_PERIODIC JobType
+        if not settings.ENTITY_FILTERS_MATERIALIZATION:
+            return None
+
+        efilters = self._get_materialized_filters()
+
+        if efilters.filter(Q(materialized_at__isnull=True) |
+                           Q(id__in=EntityFilterChange.objects.values('efilter'))
+                          ).exists():
+            return now_value
+
+        oldest = efilters.aggregate(oldest=Min('materialized_at'))['oldest']
+
+        return None if oldest is None else \
+               oldest + timedelta(seconds=settings.ENTITY_FILTERS_MATERIALIZATION_REFRESH)
+
+
+materialized_filters_type = _MaterializedFiltersType()
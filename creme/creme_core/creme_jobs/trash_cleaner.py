@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+#    Creme is a free/open-source Customer Relationship Management software
+#    Copyright (C) 2020  Hybird
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+from collections import defaultdict
+from functools import partial
+from itertools import groupby, islice
+import logging
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import ForeignKey, ProtectedError, PROTECT
+from django.db.transaction import atomic
+from django.utils.translation import gettext_lazy as _, gettext, ngettext
+
+from ..models import CremeEntity, EntityCredentials, EntityJobResult, HistoryLine
+from ..utils.dependence_sort import dependence_sort, DependenciesLoopError
+
+from .base import JobType, JobProgress
+
+logger = logging.getLogger(__name__)
+
+
+class _TrashCleanerType(JobType):
+    """Job which deletes the entities in the trash (the ones the user can delete).
+
+    The entities are deleted by batches of entities with the same type ; the
+    entities referenced by other deleted entities (with a ForeignKey on_delete=PROTECT)
+    are deleted after them. The entities which cannot be deleted because of
+    their dependencies (internal relationships...) are retried while the
+    previous attempt deleted some entities.
+    """
+    id           = JobType.generate_id('creme_core', 'trash_cleaner')
+    verbose_name = _('Empty the trash')
+
+    batch_size = 256
+
+    def _get_trashed_entities(self, user):
+        "@return: List of tuples (entity_id, ctype_id), ordered by ContentType."
+        ctype_ids = {
+            *CremeEntity.objects.filter(is_deleted=True)
+                                .values_list('entity_type', flat=True)
+                                .order_by()
+                                .distinct()
+        }
+        entities = []
+
+        for ctype_id in sorted(ctype_ids):
+            model = ContentType.objects.get_for_id(ctype_id).model_class()
+            entities.extend(
+                (entity_id, ctype_id)
+                    for entity_id in EntityCredentials.filter(
+                        user,
+                        model.objects.filter(is_deleted=True),
+                        EntityCredentials.DELETE,
+                    ).order_by('id').values_list('id', flat=True)
+            )
+
+        return entities
+
+    @staticmethod
+    def _get_dependencies(entities_ids):
+        """Get the entities which must be deleted before other entities
+        (because they reference them with a ForeignKey on_delete=PROTECT).
+        @param entities_ids: Set of IDs of the entities to delete.
+        @return: Dictionary {entity_id: set of IDs of the entities to delete before}.
+        """
+        dependencies = defaultdict(set)
+
+        for model in apps.get_models():
+            if not issubclass(model, CremeEntity):
+                continue
+
+            for field in model._meta.concrete_fields:
+                if isinstance(field, ForeignKey) and \
+                   field.remote_field.on_delete is PROTECT and \
+                   issubclass(field.remote_field.model, CremeEntity):
+                    # NB: the query only retrieves couples of trashed entities.
+                    for referencing_id, referenced_id in model._default_manager.filter(
+                        is_deleted=True,
+                        **{field.name + '__is_deleted': True}
+                    ).values_list('id', field.attname):
+                        if referencing_id in entities_ids and referenced_id in entities_ids:
+                            dependencies[referenced_id].add(referencing_id)
+
+        return dependencies
+
+    def _sort(self, entities):
+        "@return: The entities (see _get_trashed_entities()) in the deletion order."
+        dependencies = self._get_dependencies({entity_id for entity_id, __ in entities})
+
+        if not dependencies:
+            return entities
+
+        try:
+            # NB: the sort is stable, so the entities without dependency stay
+            #     regrouped by ContentType.
+            return dependence_sort(entities,
+                                   get_key=lambda e: e[0],
+                                   get_dependencies=lambda e: dependencies.get(e[0], ()),
+                                  )
+        except DependenciesLoopError as e:
+            logger.warning('TrashCleaner: loop in the dependencies of the entities (%s)', e)
+            return entities
+
+    def _batches(self, entities):
+        "@return: Iterator on tuples (model, list of IDs)."
+        batch_size = self.batch_size
+        get_ct = ContentType.objects.get_for_id
+
+        for ctype_id, group in groupby(entities, key=lambda e: e[1]):
+            model = get_ct(ctype_id).model_class()
+            ids = (entity_id for entity_id, __ in group)
+
+            while True:
+                batch = [*islice(ids, batch_size)]
+
+                if not batch:
+                    break
+
+                yield model, batch
+
+    def _execute(self, job):
+        user = job.user
+        create_result = partial(EntityJobResult.objects.create, job=job)
+        deleted_count = 0
+
+        entities = self._sort(self._get_trashed_entities(user))
+
+        while entities:
+            protected = []  # Entities which could not be deleted because of their dependencies
+            errors = {}  # Messages of the protected entities, by ID
+            progress = False
+
+            for model, entities_ids in self._batches(entities):
+                with atomic(), HistoryLine.buffered():
+                    entities_map = model.objects.select_for_update().in_bulk(entities_ids)
+
+                    for entity_id in entities_ids:
+                        entity = entities_map.get(entity_id)
+
+                        # NB: the entity could have been deleted/restored in the meantime
+                        if entity is None or not entity.is_deleted:
+                            continue
+
+                        try:
+                            # NB: the changes made before a failure (deleted
+                            #     relationships...) are rolled back.
+                            with atomic(), HistoryLine.buffered():
+                                entity.delete()
+                        except ProtectedError:
+                            protected.append((entity_id, entity.entity_type_id))
+                            errors[entity_id] = (
+                                entity,
+                                gettext('«{entity}» can not be deleted because of its dependencies.').format(
+                                    entity=entity.allowed_str(user),
+                                ),
+                            )
+                        except Exception as e:
+                            logger.exception('Error when trying to empty the trash')
+                            create_result(
+                                entity=entity,
+                                messages=[
+                                    gettext('«{entity}» deletion caused an unexpected error [{error}].').format(
+                                        entity=entity.allowed_str(user),
+                                        error=e,
+                                    ),
+                                ],
+                            )
+                        else:
+                            deleted_count += 1
+                            progress = True
+
+                job.data = {'deleted_count': deleted_count}
+                job.save()
+
+            # NB: the deletion of an entity can remove the dependencies of
+            #     another one (e.g. the internal relationships of an Activity).
+            if not progress:
+                for entity, message in errors.values():
+                    create_result(entity=entity, messages=[message])
+
+                break
+
+            entities = protected
+
+    def progress(self, job):
+        count = job.data.get('deleted_count', 0)
+
+        return JobProgress(
+            percentage=None,
+            label=ngettext('{count} entity has been deleted.',
+                           '{count} entities have been deleted.',
+                           count
+                          ).format(count=count),
+        )
+
+    @property
+    def results_bricks(self):
+        from ..bricks import EntityJobErrorsBrick
+        return [EntityJobErrorsBrick()]
+
+    def get_description(self, job):
+        return [gettext('Delete the entities in the trash')]
+
+    def get_stats(self, job):
+        count = job.data.get('deleted_count', 0)
+
+        return [
+            ngettext('{count} entity has been deleted.',
+                     '{count} entities have been deleted.',
+                     count
+                    ).format(count=count),
+        ]
+
+
+trash_cleaner_type = _TrashCleanerType()
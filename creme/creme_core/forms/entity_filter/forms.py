@@ -2,7 +2,7 @@
 
 ################################################################################
 #    Creme is a free/open-source Customer Relationship Management software
-#    Copyright (C) 2009-2019  Hybird
+#    Copyright (C) 2009-2020  Hybird
 #
 #    This program is free software: you can redistribute it and/or modify
 #    it under the terms of the GNU Affero General Public License as published by
@@ -18,9 +18,11 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 ################################################################################
 
+from django.conf import settings
 from django.forms import ValidationError
 from django.utils.translation import gettext_lazy as _
 
+from creme.creme_core.core.entity_filter import EF_USER
 from creme.creme_core.models import EntityFilter
 from creme.creme_core.utils.id_generator import generate_string_id_and_save
 
@@ -46,7 +48,9 @@ class _EntityFilterForm(CremeModelForm):
 
     error_messages = {
         'no_condition':    _('The filter must have at least one condition.'),
-        'foreign_private': _('A private filter must belong to you (or one of your teams).')
+        'foreign_private': _('A private filter must belong to you (or one of your teams).'),
+        'volatile':        _('The filter cannot be materialised, because its conditions '
+                             'depend on the current user or on the current date.'),
     }
 
     # _CONDITIONS_FIELD_NAMES = ('fields_conditions', 'datefields_conditions',
@@ -57,7 +61,7 @@ class _EntityFilterForm(CremeModelForm):
 
     # blocks = CremeModelForm.blocks.new(('conditions', _('Conditions'), _CONDITIONS_FIELD_NAMES))
     blocks = FieldBlockManager(
-        ('general',    _('General information'), ('name', 'user', 'is_private', 'use_or')),
+        ('general',    _('General information'), ('name', 'user', 'is_private', 'use_or', 'is_materialized')),
         ('conditions', _('Conditions'),          '*'),
     )
 
@@ -76,6 +80,9 @@ class _EntityFilterForm(CremeModelForm):
         fields = self.fields
         fields['user'].empty_label = _('All users')
 
+        if not settings.ENTITY_FILTERS_MATERIALIZATION or efilter_registry.id != EF_USER:
+            del fields['is_materialized']
+
         self.conditions_field_names = fnames = []
         f_kwargs = {
             'user': self.user,
@@ -126,8 +133,24 @@ class _EntityFilterForm(CremeModelForm):
             except EntityFilter.PrivacyError as e:
                 raise ValidationError(e) from e
 
+            if cdata.get('is_materialized') and \
+               EntityFilter.conditions_are_volatile(self.get_cleaned_conditions()):
+                self.add_error('is_materialized', self.error_messages['volatile'])
+
         return cdata
 
+    def _refresh_materialization(self):
+        instance = self.instance
+
+        if instance.is_materialized:
+            # NB: the results are outdated by set_conditions()
+            if instance.materialized_at is None:
+                from creme.creme_core.creme_jobs import materialized_filters_type
+
+                materialized_filters_type.refresh_job()
+        elif 'is_materialized' in self.changed_data:
+            instance.clear_materialization()
+
 
 class EntityFilterCreateForm(_EntityFilterForm):
     def __init__(self, ctype, *args, **kwargs):
@@ -157,6 +180,7 @@ class EntityFilterCreateForm(_EntityFilterForm):
             check_cycles=False,
             check_privacy=False,  # Already checked in clean()
         )
+        self._refresh_materialization()
 
         return instance
 
@@ -197,5 +221,6 @@ class EntityFilterEditForm(_EntityFilterForm):
         instance.set_conditions(self.cleaned_data['all_conditions'],
                                 check_cycles=False, check_privacy=False,  # Already checked in clean()
                                )
+        self._refresh_materialization()
 
         return instance
@@ -19,7 +19,7 @@
 ################################################################################
 
 from functools import partial
-from itertools import zip_longest
+from itertools import islice, zip_longest
 import logging
 from os.path import splitext
 
@@ -56,6 +56,7 @@ from ..models import (
     EntityCredentials,
     FieldsConfig,
     CustomField, CustomFieldValue, CustomFieldEnumValue,
+    HistoryLine,
     MassImportJobResult,
 )
 from ..utils.meta import ModelFieldEnumerator
@@ -1018,6 +1019,8 @@ class ImportForm(CremeModelForm):
     ]  # Overloaded by factory
     header_dict = {}  # Idem
 
+    chunk_size = 100  # Number of lines imported in a transaction (see process())
+
     blocks = FieldBlockManager(
         ('general', _('Update mode'),  ('step', 'document', 'has_header', 'key_fields')),
         ('fields',  _('Field values'), '*'),
@@ -1026,6 +1029,7 @@ class ImportForm(CremeModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.import_errors = []
+        self._delayed_instances = []
         get_fconf = FieldsConfig.LocalCache().get_4_model
 
         def field_excluder(field, deep):
@@ -1088,6 +1092,37 @@ class ImportForm(CremeModelForm):
     def _pre_instance_save(self, instance, line):  # Overload me
         pass
 
+    def _get_position(self, job):
+        "Get the number of lines of the file (header excluded) which have already been imported."
+        position = job.data.get('position')
+
+        # NB: jobs created by a previous version store no position ; the
+        #     results were saved line by line.
+        return MassImportJobResult.objects.filter(job=job).count() if position is None else position
+
+    def _set_position(self, job, position):
+        job_data = job.data
+        job_data['position'] = position
+        job.data = job_data
+        job.save(update_fields=('raw_data',))
+
+    def _delay_save(self, instance):
+        """Register an instance (CremeProperty, Relation, CustomFieldValue...),
+        which will be saved at the end of the current chunk of lines.
+        If the import of the current line fails, the instance is dropped.
+        Useful in _post_instance_creation().
+        """
+        self._delayed_instances.append(instance)
+
+    def _save_delayed_instances(self, instances):  # Overload me
+        """Save the instances registered with _delay_save() by a chunk of lines.
+        @param instances: List of instances (not saved yet), in the order of registration.
+        """
+        # NB: we do not use bulk_create(), because the signal post_save must be
+        #     sent (search index, caches, materialised filters...).
+        for instance in instances:
+            instance.save()
+
     def process(self, job):
         model_class = self._meta.model
         get_cleaned = self.cleaned_data.get
@@ -1122,96 +1157,116 @@ class ImportForm(CremeModelForm):
                 next(lines)
 
             # Resuming
-            for i in range(MassImportJobResult.objects.filter(job=job).count()):
-                next(lines)
+            position = self._get_position(job)
+            lines = islice(lines, position, None)
 
             append_error = self.append_error
             key_fields = frozenset(get_cleaned('key_fields'))
             is_empty_value = lambda s: s is None or isinstance(s, str) and not s.strip()
 
-            for i, line in enumerate(filter(None, lines), start=1):
-                job_result = MassImportJobResult(job=job, line=line)
+            # NB: the lines are imported by chunks ; each chunk is imported in
+            #     a transaction, which stores the position in the file too (so
+            #     a crashed job can be resumed without importing twice a line).
+            while True:
+                chunk = [*islice(lines, self.chunk_size)]
+                if not chunk:
+                    break
+
+                with atomic(), HistoryLine.buffered():
+                    job_results = []
+                    delayed_instances = []
+
+                    for line in filter(None, chunk):
+                        job_result = MassImportJobResult(job=job, line=line)
+                        job_results.append(job_result)
+
+                        try:
+                            with atomic(), HistoryLine.buffered():
+                                instance = model_class()
+                                updated = False  # 'True' means: object has been updated, not created from scratch
+
+                                extr_values = []
+                                for fname, extractor in extractor_fields:
+                                    extr_value, err_msg = extractor.extract_value(line)
+
+                                    # TODO: Extractor.extract_value() should return a ExtractedValue
+                                    #       instead of a tuple (an so we could remove the ugly following line...)
+                                    is_empty = not extractor._column_index or \
+                                               is_empty_value(line[extractor._column_index - 1])
+                                    extr_values.append((fname, extr_value, is_empty))
+
+                                    append_error(err_msg)
+
+                                if key_fields:
+                                    # We avoid using exception within 'atomic' block
+                                    found = self._find_existing_instances(
+                                        model=model_class,
+                                        field_names=key_fields,
+                                        extracted_values=extr_values,
+                                    )[:2]
+
+                                    if found:
+                                        if len(found) == 1:
+                                            try:
+                                                instance = model_class.objects.select_for_update().get(pk=found[0].pk)
+                                            except model_class.DoesNotExist:
+                                                pass
+                                            else:
+                                                job_result.updated = updated = True
+                                        else:
+                                            append_error(gettext(
+                                                'Several entities corresponding to the search have been found. '
+                                                'So a new entity have been created to avoid errors.'
+                                            ))
+
+                                for fname, cleaned_value in regular_fields:
+                                    setattr(instance, fname, cleaned_value)
+
+                                for fname, extr_value, is_empty in extr_values:
+                                    if updated and is_empty:
+                                        continue
+
+                                    setattr(instance, fname, extr_value)
+
+                                self._pre_instance_save(instance, line)
+
+                                instance.full_clean()
+                                instance.save()
+
+                                self._post_instance_creation(instance, line, updated)
+
+                                for m2m in self._meta.model._meta.many_to_many:
+                                    extractor = get_cleaned(m2m.name)  # Can be a regular_field ????
+                                    if extractor:
+                                        # TODO: factorise
+                                        extr_value, err_msg = extractor.extract_value(line)
+                                        getattr(instance, m2m.name).set(extr_value)
+                                        append_error(err_msg)
+
+                                job_result.entity = instance
+                        except Exception as e:
+                            logger.exception('Exception in Mass importing')
+
+                            try:
+                                for messages in e.message_dict.values():
+                                    for message in messages:
+                                        append_error(str(message))
+                            except:
+                                append_error(str(e))
+                        else:
+                            delayed_instances.extend(self._delayed_instances)
 
-                try:
-                    with atomic():
-                        instance = model_class()
-                        updated = False  # 'True' means: object has been updated, not created from scratch
-
-                        extr_values = []
-                        for fname, extractor in extractor_fields:
-                            extr_value, err_msg = extractor.extract_value(line)
-
-                            # TODO: Extractor.extract_value() should return a ExtractedValue
-                            #       instead of a tuple (an so we could remove the ugly following line...)
-                            is_empty = not extractor._column_index or is_empty_value(line[extractor._column_index - 1])
-                            extr_values.append((fname, extr_value, is_empty))
-
-                            append_error(err_msg)
-
-                        if key_fields:
-                            # We avoid using exception within 'atomic' block
-                            found = self._find_existing_instances(
-                                model=model_class,
-                                field_names=key_fields,
-                                extracted_values=extr_values,
-                            )[:2]
-
-                            if found:
-                                if len(found) == 1:
-                                    try:
-                                        instance = model_class.objects.select_for_update().get(pk=found[0].pk)
-                                    except model_class.DoesNotExist:
-                                        pass
-                                    else:
-                                        job_result.updated = updated = True
-                                else:
-                                    append_error(gettext(
-                                        'Several entities corresponding to the search have been found. '
-                                        'So a new entity have been created to avoid errors.'
-                                    ))
-
-                        for fname, cleaned_value in regular_fields:
-                            setattr(instance, fname, cleaned_value)
-
-                        for fname, extr_value, is_empty in extr_values:
-                            if updated and is_empty:
-                                continue
-
-                            setattr(instance, fname, extr_value)
-
-                        self._pre_instance_save(instance, line)
-
-                        instance.full_clean()
-                        instance.save()
-
-                        self._post_instance_creation(instance, line, updated)
-
-                        for m2m in self._meta.model._meta.many_to_many:
-                            extractor = get_cleaned(m2m.name)  # Can be a regular_field ????
-                            if extractor:
-                                # TODO: factorise
-                                extr_value, err_msg = extractor.extract_value(line)
-                                getattr(instance, m2m.name).set(extr_value)
-                                append_error(err_msg)
-
-                        job_result.entity = instance
                         if self.import_errors:
                             job_result.messages = self.import_errors
-                        job_result.save()
-                except Exception as e:
-                    logger.exception('Exception in Mass importing')
 
-                    try:
-                        for messages in e.message_dict.values():
-                            for message in messages:
-                                append_error(str(message))
-                    except:
-                        append_error(str(e))
+                        self.import_errors = []
+                        self._delayed_instances = []
 
-                    job_result.messages = self.import_errors
-                    job_result.save()
+                    self._save_delayed_instances(delayed_instances)
+                    MassImportJobResult.objects.bulk_create(job_results)
 
-                self.import_errors.clear()
+                    position += len(chunk)
+                    self._set_position(job, position)
 
 
 class ImportForm4CremeEntity(ImportForm):
@@ -1298,37 +1353,55 @@ class ImportForm4CremeEntity(ImportForm):
                 if err_msg is not None:
                     self.append_error(err_msg)
                 elif value is not None and value != '':
-                    CustomFieldValue.save_values_for_entities(cfield, [instance], value)
+                    cvalue_klass = cfield.get_value_class()
 
-        # Properties -----
-        create_prop = partial(CremeProperty.objects.create if not updated else
-                              # CremeProperty.objects.get_or_create,
-                              CremeProperty.objects.safe_get_or_create,
-                              creme_entity=instance,
-                             )
+                    if updated or cvalue_klass._meta.many_to_many:
+                        CustomFieldValue.save_values_for_entities(cfield, [instance], value)
+                    else:
+                        cvalue = cvalue_klass(custom_field=cfield, entity=instance)
+
+                        if cvalue.set_value(value):
+                            self._delay_save(cvalue)
 
+        # Properties -----
         for prop_type in cdata['property_types']:
-            create_prop(type=prop_type)
+            self._delay_save(CremeProperty(type=prop_type, creme_entity=instance))
 
         # Relationships -----
-        relations = [
-            Relation(subject_entity=instance,
-                     type=rtype,
-                     object_entity=entity,
-                     user=user,
-                    ) for rtype, entity in cdata['fixed_relations']
-        ]
+        for rtype, entity in cdata['fixed_relations']:
+            self._delay_save(Relation(subject_entity=instance,
+                                      type=rtype,
+                                      object_entity=entity,
+                                      user=user,
+                                     ))
 
         for (rtype, entity), err_msg in cdata['dyn_relations'].extract_value(line, user):
             if err_msg:
                 self.append_error(err_msg)
             elif entity is not None:
-                relations.append(Relation(subject_entity=instance,
+                self._delay_save(Relation(subject_entity=instance,
                                           type=rtype,
                                           object_entity=entity,
                                           user=user,
-                                ))
+                                         ))
+
+    def _save_delayed_instances(self, instances):
+        # NB: the CremeProperties & the Relations are saved with their
+        #     signals (history, symmetrical relationships...).
+        properties = []
+        relations = []
+        other_instances = []
+
+        for instance in instances:
+            if isinstance(instance, CremeProperty):
+                properties.append(instance)
+            elif isinstance(instance, Relation):
+                relations.append(instance)
+            else:
+                other_instances.append(instance)
 
+        super()._save_delayed_instances(other_instances)
+        CremeProperty.objects.safe_multi_save(properties)
         Relation.objects.safe_multi_save(relations)
 
 
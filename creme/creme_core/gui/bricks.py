@@ -19,6 +19,7 @@
 ################################################################################
 
 from collections import defaultdict
+from json import loads as json_load
 import logging
 
 from django.conf import settings
@@ -29,8 +30,10 @@ from django.template.loader import get_template
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _, gettext
 
+from ..auth.entity_credentials import EntityCredentials
 from ..constants import MODELBRICK_ID
 from ..core.entity_cell import EntityCellRegularField
+from ..core.paginator import FlowPaginator, FlowPage
 from ..core.sorter import cell_sorter_registry
 from ..models import (
     CremeEntity,
@@ -112,7 +115,21 @@ class Brick:
     #  to be reloaded (but it is still reloaded when the dependant bricks are reloaded of course).
     read_only = False
 
+    # 'True' means that the brick is not rendered with the page (see {% brick_display %}) ;
+    # a placeholder is rendered instead, & the browser loads the brick (with the
+    # reloading view of the page) after the page has been displayed, or when it
+    # is expanded if it's collapsed. It's useful for costly bricks which are
+    # generally at the bottom of the page.
+    deferred = False
+
+    # 'True' means that the rendered HTML of the brick is cached (if the cache
+    # is enabled, see settings.BRICKS_CACHE_ALIAS & creme_core.core.brick_cache) ;
+    # the rendering must only depend on the current entity & on the instances
+    # of the dependencies (& on data which rarely change).
+    cacheable = False
+
     template_name = 'OVERLOAD_ME.html'  # Used to render the brick of course
+    deferred_template_name = 'creme_core/bricks/generic/deferred.html'  # Used to render the placeholder
     context_class = _BrickContext  # Class of the instance which stores the context in the session.
 
     # ATTRIBUTES USED BY THE CONFIGURATION GUI FOR THE BRICKS (ie: in creme_config) ------------------------------------
@@ -159,6 +176,19 @@ class Brick:
         """Helper method to build a basic detailview_display() method for classes that inherit Brick."""
         return self._render(self.get_template_context(context))
 
+    def deferred_display(self, context):
+        """Render the placeholder of a deferred brick (see the attribute 'deferred').
+        @param context: Template context (contains 'request' etc...).
+        """
+        context['brick_id'] = self.id_
+        context['state'] = BricksManager.get(context).get_state(self.id_, context['user'])
+        context['dependencies'] = [*self._iter_dependencies_info()]
+        context['reloading_info'] = self._reloading_info
+        context['read_only'] = self.read_only
+        context['verbose_name'] = self.verbose_name
+
+        return get_template(self.deferred_template_name).render(context)
+
     def _iter_dependencies_info(self):
         for dep in self.dependencies:
             if isinstance(dep, type) and issubclass(dep, Model):
@@ -233,7 +263,9 @@ class _PaginatedBrickContext(_BrickContext):
         return {'page': self.page}
 
     def update(self, template_context):
-        page = template_context['page'].number
+        page = template_context['page']
+        # NB: with a FlowPaginator, the information of the page (a dictionary) is stored.
+        page = page.info() if isinstance(page, FlowPage) else page.number
 
         if self.page != page:
             modified = True
@@ -251,10 +283,7 @@ class PaginatedBrick(Brick):
     context_class = _PaginatedBrickContext
     page_size     = settings.BLOCK_SIZE  # Number of items in the page
 
-    def _build_template_context(self, context, brick_id, brick_context, **extra_kwargs):
-        request = context['request']
-        objects = extra_kwargs.pop('objects')
-
+    def _build_page(self, request, brick_id, brick_context, objects):
         page_index = request.GET.get('{}_page'.format(brick_id))
         if page_index is not None:
             try:
@@ -265,6 +294,9 @@ class PaginatedBrick(Brick):
         else:
             page_index = brick_context.page
 
+            if not isinstance(page_index, int):  # Stored by a FlowPaginator
+                page_index = 1
+
         paginator = Paginator(objects, self.page_size)
 
         try:
@@ -272,6 +304,21 @@ class PaginatedBrick(Brick):
         except (EmptyPage, InvalidPage):
             page = paginator.page(paginator.num_pages)
 
+        return page
+
+    def _build_template_context(self, context, brick_id, brick_context, **extra_kwargs):
+        page = self._build_page(request=context['request'],
+                                brick_id=brick_id,
+                                brick_context=brick_context,
+                                objects=extra_kwargs.pop('objects'),
+                               )
+
+        # Optimisation time !! (the permissions are generally used by the template)
+        EntityCredentials.populate(
+            context['user'],
+            [obj for obj in page.object_list if isinstance(obj, CremeEntity)],
+        )
+
         return super()._build_template_context(
                 context=context, brick_id=brick_id, brick_context=brick_context, page=page,
                 **extra_kwargs
@@ -332,6 +379,19 @@ class QuerysetBrick(PaginatedBrick):
     order_by = ''
     cell_sorter_registry = cell_sorter_registry
 
+    # If True, a creme_core.core.paginator.FlowPaginator is used instead of the
+    # Django's Paginator: a page is retrieved with a KEYSET query (the first
+    # ordering field is the key), so going to the next/previous page is fast
+    # even far in a big table, & the objects are not counted.
+    # The pager only proposes the first/previous/next pages, & the field
+    # 'order_by' must be set (if the order is invalid, the classical
+    # pagination is used).
+    # BEWARE: the template must not use the attributes of the Django's
+    #  Page/Paginator like 'number' or 'count' (the base templates
+    #  "creme_core/bricks/base/paginated*.html" are OK), & the title should
+    #  not display a {count} (a COUNT query is performed in this case).
+    flow_pagination = False
+
     def _is_order_valid(self, model, order):
         # fname = order[1:] if order.startswith('-') else order
         fname = OrderedField(order).field_name
@@ -358,7 +418,14 @@ class QuerysetBrick(PaginatedBrick):
 
             if self._is_order_valid(model=objects.model, order=raw_order_by):
                 order_by = raw_order_by
-                extra_kwargs['objects'] = objects.order_by(order_by)
+
+                if self.flow_pagination:
+                    # NB: the lines must always have the same order (see FlowPaginator).
+                    extra_kwargs['objects'] = objects.order_by(
+                        order_by, '-pk' if order_by.startswith('-') else 'pk',
+                    )
+                else:
+                    extra_kwargs['objects'] = objects.order_by(order_by)
 
         return super()._build_template_context(
                 context=context, brick_id=brick_id, brick_context=brick_context,
@@ -367,6 +434,39 @@ class QuerysetBrick(PaginatedBrick):
                 **extra_kwargs
         )
 
+    def _build_page(self, request, brick_id, brick_context, objects):
+        ordering = objects.query.order_by
+
+        if not self.flow_pagination or not ordering:
+            return super()._build_page(request=request, brick_id=brick_id,
+                                       brick_context=brick_context, objects=objects,
+                                      )
+
+        try:
+            paginator = FlowPaginator(queryset=objects, key=ordering[0], per_page=self.page_size)
+        except ValueError as e:
+            logger.warning('QuerysetBrick: the flow pagination cannot be used for brick %s (%s).',
+                           brick_id, e,
+                          )
+            return super()._build_page(request=request, brick_id=brick_id,
+                                       brick_context=brick_context, objects=objects,
+                                      )
+
+        page_info = request.GET.get('{}_page'.format(brick_id))
+        if page_info is not None:
+            try:
+                page_info = json_load(page_info)
+            except ValueError:
+                logger.warning('QuerysetBrick: invalid page information for brick %s: %s',
+                               brick_id, page_info,
+                              )
+                page_info = None
+        else:
+            page_info = brick_context.page
+
+        # NB: invalid information (old key, integer...) => first page.
+        return paginator.get_page(page_info if isinstance(page_info, dict) else None)
+
     def get_template_context(self, context, queryset, **extra_kwargs):
         """@param queryset: Set of objects to display in the brick."""
         return PaginatedBrick.get_template_context(self, context, objects=queryset, **extra_kwargs)
@@ -3,6 +3,6 @@ from .smart_columns import smart_columns_registry
 from .search import search_field_registry, ListViewSearchFieldRegistry
 from .buttons import (
     ListViewButtonList, ListViewButton, CreationButton,
-    MassExportButton, MassExportHeaderButton,
+    MassExportButton, MassExportHeaderButton, MassExportJobButton,
     MassImportButton, BatchProcessButton
 )
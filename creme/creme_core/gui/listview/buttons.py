@@ -97,6 +97,21 @@ class MassExportHeaderButton(MassExportButton):
     template_name = 'creme_core/listview/buttons/mass-export-header.html'
 
 
+class MassExportJobButton(MassExportButton):
+    "Export in background ; only the backends which support it are proposed."
+    template_name = 'creme_core/listview/buttons/mass-export-job.html'
+
+    def get_context(self, request, lv_context):
+        context = super().get_context(request=request, lv_context=lv_context)
+        context['backend_choices'] = [
+            (backend.id, backend.verbose_name)
+                for backend in self.export_backend_registry.backends
+                    if backend.background
+        ]
+
+        return context
+
+
 class MassImportButton(ListViewButton):
     template_name = 'creme_core/listview/buttons/mass-import.html'
 
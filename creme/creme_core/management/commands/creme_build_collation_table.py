@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+#    Creme is a free/open-source Customer Relationship Management software
+#    Copyright (C) 2020  Hybird
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Compile the table used by the Unicode collation (see creme_core.utils.unicode_collation) ' \
+           'in a binary file which is memory-mapped by the server processes.'
+
+    requires_system_checks = False
+
+    def add_arguments(self, parser):
+        from creme.creme_core.utils.unicode_collation import (DEFAULT_FILENAME,
+                DEFAULT_COMPILED_FILENAME)
+
+        add_argument = parser.add_argument
+        add_argument('-s', '--source', default=DEFAULT_FILENAME,
+                     help='Path of the source table (format of allkeys.txt). [default: %(default)s]',
+                    )
+        add_argument('-o', '--output', default=DEFAULT_COMPILED_FILENAME,
+                     help='Path of the compiled table. [default: %(default)s]',
+                    )
+
+    def handle(self, **options):
+        from creme.creme_core.utils.unicode_collation import build_compiled_table
+
+        output = options['output']
+
+        try:
+            build_compiled_table(options['source'], output)
+        except OSError as e:
+            raise CommandError(str(e)) from e
+
+        if options.get('verbosity'):
+            self.stdout.write('The collation table has been compiled in "{}"'.format(output))
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+#    Creme is a free/open-source Customer Relationship Management software
+#    Copyright (C) 2020  Hybird
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+from itertools import islice
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Build the index used by the global search (see settings.SEARCH_BACKEND) ' \
+           'for all the types of entity, or only the given ones.'
+    chunk_size = 256
+
+    def add_arguments(self, parser):
+        parser.add_argument('args', metavar='models', nargs='*',
+                            help='Optionally one or more models, with the format "app_label.ModelName".',
+                           )
+
+    def handle(self, *model_labels, **options):
+        from creme.creme_core.core.search import get_search_backend
+        from creme.creme_core.registry import creme_registry
+
+        verbosity = options.get('verbosity')
+
+        if model_labels:
+            try:
+                models = [apps.get_model(label) for label in model_labels]
+            except (LookupError, ValueError) as e:
+                raise CommandError(str(e)) from e
+        else:
+            models = [*creme_registry.iter_entity_models()]
+
+        backend = get_search_backend()
+        chunk_size = self.chunk_size
+
+        for model in models:
+            count = 0
+            entities_it = model.objects.order_by('id').iterator(chunk_size=chunk_size)
+
+            while True:
+                entities = [*islice(entities_it, chunk_size)]
+                if not entities:
+                    break
+
+                backend.index_entities(model, entities)
+                count += len(entities)
+
+            if verbosity:
+                self.stdout.write('{}: {} entities indexed'.format(model._meta.label, count))
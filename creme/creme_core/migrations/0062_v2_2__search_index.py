@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+from django.db import migrations, models
+from django.db.models.deletion import CASCADE
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('creme_core', '0061_v2_1__set_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.ForeignKey(editable=False, on_delete=CASCADE, related_name='+', to='creme_core.CremeEntity')),
+                ('field_name', models.CharField(editable=False, max_length=100)),
+                ('token', models.CharField(db_index=True, editable=False, max_length=50)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+from django.db import migrations, models
+from django.db.models.deletion import CASCADE
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('creme_core', '0062_v2_2__search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entityfilter',
+            name='is_materialized',
+            field=models.BooleanField(
+                default=False, verbose_name='Materialise the results?',
+                help_text='The entities accepted by a materialised filter are stored, '
+                          'so the lists which use it are faster ; '
+                          'it is useful for heavy filters on big lists.',
+            ),
+        ),
+        migrations.AddField(
+            model_name='entityfilter',
+            name='materialized_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='EntityFilterResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('efilter', models.ForeignKey(editable=False, on_delete=CASCADE, related_name='+', to='creme_core.EntityFilter')),
+                ('entity_id', models.PositiveIntegerField(editable=False)),
+            ],
+            options={
+                'unique_together': {('efilter', 'entity_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+from django.db import migrations, models
+from django.db.models.deletion import CASCADE
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('creme_core', '0063_v2_2__materialized_filters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntityFilterChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('efilter', models.ForeignKey(editable=False, on_delete=CASCADE, related_name='+', to='creme_core.EntityFilter')),
+                ('entity_id', models.PositiveIntegerField(editable=False, null=True)),
+            ],
+        ),
+    ]
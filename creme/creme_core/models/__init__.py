@@ -17,7 +17,7 @@ from .custom_field import *
 
 from .fields_config import FieldsConfig  # NOQA
 from .header_filter import HeaderFilter  # NOQA
-from .entity_filter import EntityFilter, EntityFilterCondition  # EntityFilterVariable   # NOQA
+from .entity_filter import EntityFilter, EntityFilterCondition, EntityFilterResult, EntityFilterChange  # EntityFilterVariable   # NOQA
 
 from .lock import Mutex, MutexAutoLock  # NOQA
 
@@ -32,7 +32,7 @@ from .reminder import DateReminder  # NOQA
 
 from .history import HistoryLine, HistoryConfigItem  # NOQA
 from .imprint import Imprint  # NOQA
-from .search import SearchConfigItem  # NOQA
+from .search import SearchConfigItem, SearchIndexToken  # NOQA
 
 from .job import Job, JobResult, EntityJobResult, MassImportJobResult  # NOQA
 from .deletion import DeletionCommand, CREME_REPLACE_NULL, CREME_REPLACE  # NOQA
@@ -23,6 +23,7 @@ from functools import reduce
 import logging
 from operator import or_ as or_op
 from re import compile as re_compile
+from time import perf_counter
 import uuid
 
 import pytz
@@ -39,6 +40,7 @@ from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _, gettext
 
 from ..auth.entity_credentials import EntityCredentials
+from ..core.config_cache import config_cache
 from ..utils import split_filter
 from ..utils.unicode_collation import collator
 
@@ -47,6 +49,141 @@ from .fields import CTypeForeignKey
 logger = logging.getLogger(__name__)
 
 
+def _user_filtering_q(user):
+    "@return: A Q instance which retrieves the entities owned by the user (or his teams)."
+    teams = user.teams
+    return Q(user__in=[user.id, *(team.id for team in teams)]) if teams else Q(user=user.id)
+
+
+def _is_efilter_reusable(efilter):
+    """Can the Q built by an EntityFilter be used later (eg: in another request) ?
+    The Q of the conditions on dates depends on the current date.
+    """
+    from ..core.entity_filter.condition_handler import DateFieldHandlerMixin
+
+    for condition in efilter.get_conditions():
+        handler = condition.handler
+
+        if isinstance(handler, DateFieldHandlerMixin):
+            return False
+
+        subfilter = handler.subfilter  # NB: <False> if there is no sub-filter
+        if subfilter and not _is_efilter_reusable(subfilter):
+            return False
+
+    return True
+
+
+class CompiledCredentials:
+    """Predicate built from some SetCredentials, which filters a QuerySet of
+    entities (see SetCredentials.filter() & filter_entities()).
+    """
+    __slots__ = ('empty', 'filter_q', 'exclude_qs', 'cacheable')
+
+    def __init__(self, *, empty=False, filter_q=None, exclude_qs=(), cacheable=True):
+        """Constructor.
+        @param empty: Boolean ; <True> means "no entity is allowed".
+        @param filter_q: Instance of Q used to filter the entities, or None.
+        @param exclude_qs: Sequence of Q instances used to exclude entities.
+        @param cacheable: Boolean ; <False> means that the Qs must be re-built
+               for each request (they depend on the current date).
+        """
+        self.empty = empty
+        self.filter_q = filter_q
+        self.exclude_qs = exclude_qs
+        self.cacheable = cacheable
+
+    def apply(self, queryset):
+        "@return: A new (filtered) QuerySet."
+        if self.empty:
+            return queryset.none()
+
+        if self.filter_q is not None:
+            queryset = queryset.filter(self.filter_q)
+
+        for q in self.exclude_qs:
+            queryset = queryset.exclude(q)
+
+        return queryset
+
+
+class CompiledCredentialsCache:
+    """Memoize the instances of CompiledCredentials between requests.
+
+    The cache is per-process, but it is validated with the generations of the
+    models used to build the credentials, which are stored in the configuration
+    cache (see creme_core.core.config_cache) ; so the cache is only used if the
+    configuration cache is enabled (see settings.CONFIG_CACHE_ALIAS).
+
+    Attributes used for statistics:
+        - hits: number of lookups which have found a compiled instance.
+        - misses: number of compilations.
+        - compilation_time: total time spent to compile credentials (in seconds).
+    """
+    def __init__(self):
+        self._compiled = {}
+        self._generations = None
+        self.hits = 0
+        self.misses = 0
+        self.compilation_time = 0.0
+
+    @staticmethod
+    def _get_generations():
+        from .entity_filter import EntityFilter, EntityFilterCondition
+
+        return config_cache.get_generations(UserRole, SetCredentials,
+                                            EntityFilter, EntityFilterCondition,
+                                           )
+
+    def get(self, key, builder):
+        """Get a compiled instance from the cache, or build it.
+        @param key: Hashable object identifying the credentials
+               (typically a tuple with the role, the user, the model...).
+        @param builder: Callable without argument which returns a CompiledCredentials instance.
+        @return: A CompiledCredentials instance.
+        """
+        generations = self._get_generations()
+        compiled = None
+
+        if generations is not None:
+            if generations != self._generations:
+                self._compiled = {}
+                self._generations = generations
+            else:
+                compiled = self._compiled.get(key)
+
+        if compiled is None:
+            logger.debug('CompiledCredentialsCache: Cache MISS for key=%s', key)
+            self.misses += 1
+            start = perf_counter()
+            compiled = builder()
+            self.compilation_time += perf_counter() - start
+
+            if generations is not None and compiled.cacheable:
+                self._compiled[key] = compiled
+        else:
+            self.hits += 1
+
+        return compiled
+
+    @property
+    def stats(self):
+        return {
+            'hits':             self.hits,
+            'misses':           self.misses,
+            'compilation_time': self.compilation_time,
+        }
+
+    def clear(self):
+        self._compiled = {}
+        self._generations = None
+        self.hits = self.misses = 0
+        self.compilation_time = 0.0
+
+
+compiled_credentials_cache = CompiledCredentialsCache()
+
+
 class UserRole(models.Model):
     name              = models.CharField(_('Name'), max_length=100, unique=True)
     # superior         = ForeignKey('self', verbose_name=_('Superior'), null=True) #related_name='subordinates'
@@ -75,6 +212,7 @@ class UserRole(models.Model):
         self._creatable_ctypes_set = None
         self._exportable_ctypes_set = None
         self._setcredentials = None
+        self._compiled_credentials = {}
 
     def __str__(self):
         return self.name
@@ -195,6 +333,22 @@ class UserRole(models.Model):
 
         return setcredentials
 
+    def _get_compiled_credentials(self, key, user, builder):
+        """Get the CompiledCredentials corresponding to a key (& a user) ;
+        they are cached in the instance & in <compiled_credentials_cache>.
+        """
+        key = (user.id, tuple(sorted(team.id for team in user.teams)), *key)
+        compiled = self._compiled_credentials.get(key)
+
+        if compiled is None:
+            compiled = builder() if self.id is None else \
+                       compiled_credentials_cache.get(key=(self.id, *key), builder=builder)
+
+            if compiled.cacheable:
+                self._compiled_credentials[key] = compiled
+
+        return compiled
+
     def get_perms(self, user, entity):
         """@return (can_view, can_change, can_delete, can_link, can_unlink) 5 boolean tuple."""
         real_entity_class = entity.entity_type.model_class()
@@ -206,6 +360,33 @@ class UserRole(models.Model):
 
         return perms
 
+    def get_perms_for_entities(self, user, entities):
+        """Bulk version of get_perms() ; the entities are grouped by ContentType,
+        & the EntityFilters of the credentials are used with one query per group.
+        @param user: A django.contrib.auth.get_user_model() instance.
+        @param entities: Sequence of CremeEntities (or child classes) instances.
+        @return: A dictionary {entity_id: perms}.
+        """
+        entities_per_ctype = defaultdict(list)
+
+        for entity in entities:
+            entities_per_ctype[entity.entity_type_id].append(entity)
+
+        get_ct = ContentType.objects.get_for_id
+        perms = {}
+
+        for ctype_id, ctype_entities in entities_per_ctype.items():
+            model = get_ct(ctype_id).model_class()
+
+            if self.is_app_allowed_or_administrable(model._meta.app_label):
+                perms.update(SetCredentials.get_perms_for_entities(
+                    self._get_setcredentials(), user, model, ctype_entities,
+                ))
+            else:
+                perms.update((entity.id, EntityCredentials.NONE) for entity in ctype_entities)
+
+        return perms
+
     # TODO: factorise
     def filter(self, user, queryset, perm):
         """Filter a QuerySet of CremeEntities by the credentials related to this role.
@@ -222,7 +403,14 @@ class UserRole(models.Model):
         assert model is not CremeEntity
 
         if self.is_app_allowed_or_administrable(model._meta.app_label):
-            queryset = SetCredentials.filter(self._get_setcredentials(), user, queryset, perm)
+            queryset = self._get_compiled_credentials(
+                key=('model', ContentType.objects.get_for_model(model).id, perm),
+                user=user,
+                builder=lambda: SetCredentials._compile_filter(
+                    model=model, sc_sequence=self._get_setcredentials(),
+                    user=user, perm=perm,
+                ),
+            ).apply(queryset)
         else:
             queryset = queryset.none()
 
@@ -252,16 +440,23 @@ class UserRole(models.Model):
 
         is_app_allowed = self.is_app_allowed_or_administrable
 
-        return SetCredentials.filter_entities(
-            sc_sequence=self._get_setcredentials(),
-            user=user, queryset=queryset,
-            perm=perm,
-            models=[model
-                        for model in creme_registry.iter_entity_models()
-                            if is_app_allowed(model._meta.app_label)
-                   ],
-            as_model=as_model,
-        )
+        return self._get_compiled_credentials(
+            key=('entities',
+                 None if as_model is None else ContentType.objects.get_for_model(as_model).id,
+                 perm,
+                ),
+            user=user,
+            builder=lambda: SetCredentials._compile_entities_filter(
+                sc_sequence=self._get_setcredentials(),
+                user=user,
+                perm=perm,
+                models=[model
+                            for model in creme_registry.iter_entity_models()
+                                if is_app_allowed(model._meta.app_label)
+                       ],
+                as_model=as_model,
+            ),
+        ).apply(queryset)
 
 
 class SetCredentials(models.Model):
@@ -344,8 +539,11 @@ class SetCredentials(models.Model):
 
         return format_str.format(**args)
 
-    def _get_perms(self, user, entity):
-        """@return An integer with binary flags for permissions."""
+    def _get_perms(self, user, entity, accepted_ids=None):
+        """@return An integer with binary flags for permissions.
+        @param accepted_ids: Set of IDs of the entities accepted by the
+               EntityFilter (if it has already been applied with a query).
+        """
         ctype_id = self.ctype_id
 
         if not ctype_id or ctype_id == entity.entity_type_id:
@@ -358,26 +556,71 @@ class SetCredentials(models.Model):
                 if user.id == user_id or any(user_id == t.id for t in user.teams):
                     return self.value
             else:  # SetCredentials.ESET_FILTER
-                if self.efilter.accept(entity=entity, user=user):
+                if (entity.id in accepted_ids) if accepted_ids is not None else \
+                   self.efilter.accept(entity=entity, user=user):
                     return self.value
 
         return EntityCredentials.NONE
 
     @staticmethod
-    def get_perms(sc_sequence, user, entity):
-        """@param sc_sequence: Sequence of SetCredentials instances."""
+    def _reduce_perms(sc_sequence, get_sc_perms):
         perms = reduce(
             or_op,
-            (sc._get_perms(user, entity) for sc in sc_sequence if not sc.forbidden),
+            (get_sc_perms(sc) for sc in sc_sequence if not sc.forbidden),
             EntityCredentials.NONE
         )
 
         for sc in sc_sequence:
             if sc.forbidden:
-                perms &= ~sc._get_perms(user, entity)
+                perms &= ~get_sc_perms(sc)
 
         return perms
 
+    @classmethod
+    def get_perms(cls, sc_sequence, user, entity):
+        """@param sc_sequence: Sequence of SetCredentials instances."""
+        return cls._reduce_perms(sc_sequence, lambda sc: sc._get_perms(user, entity))
+
+    @classmethod
+    def get_perms_for_entities(cls, sc_sequence, user, model, entities):
+        """Bulk version of get_perms() ; the EntityFilters are applied on all
+        the entities at once (see EntityFilter.accept_many()), so the data they
+        use (relations, properties...) are retrieved with a few queries.
+        @param sc_sequence: Sequence of SetCredentials instances.
+        @param model: Class inheriting CremeEntity.
+        @param entities: Sequence of instances of CremeEntity (or of <model>),
+               which are related to <model> (see 'entity_type').
+        @return: A dictionary {entity_id: perms}.
+        """
+        ctype_id = ContentType.objects.get_for_model(model).id
+        filter_creds = [
+            sc for sc in sc_sequence
+                if sc.set_type == cls.ESET_FILTER and sc.ctype_id in (None, ctype_id)
+        ]
+        accepted_ids = {}
+
+        if filter_creds:
+            from .entity import CremeEntity
+
+            base_entities = [entity for entity in entities if not isinstance(entity, model)]
+            if base_entities:
+                CremeEntity.populate_real_entities(base_entities)
+
+            real_entities = [
+                entity if isinstance(entity, model) else entity.get_real_entity()
+                    for entity in entities
+            ]
+
+            for sc in filter_creds:
+                accepted_ids[sc.id] = sc.efilter.accept_many(entities=real_entities, user=user)
+
+        return {
+            entity.id: cls._reduce_perms(
+                sc_sequence,
+                lambda sc: sc._get_perms(user, entity, accepted_ids=accepted_ids.get(sc.id)),
+            ) for entity in entities
+        }
+
     @classmethod
     def _can_do(cls, sc_sequence, user, model, owner=None, perm=EntityCredentials.VIEW):
         if owner is None:
@@ -408,7 +651,8 @@ class SetCredentials(models.Model):
         return allowed_found
 
     @classmethod
-    def _aux_filter(cls, model, sc_sequence, user, queryset, perm):
+    def _compile_filter(cls, model, sc_sequence, user, perm):
+        "@return: A CompiledCredentials instance."
         get_ct = ContentType.objects.get_for_model
         allowed_ctype_ids = {None, get_ct(CremeEntity).id, get_ct(model).id}
         ESET_ALL = cls.ESET_ALL
@@ -425,16 +669,13 @@ class SetCredentials(models.Model):
         )
 
         if not allowed:
-            return queryset.none()
+            return CompiledCredentials(empty=True)
 
         if any(f.set_type == ESET_ALL for f in forbidden):
-            return queryset.none()
+            return CompiledCredentials(empty=True)
 
-        def user_filtering_kwargs():  # TODO: cache/lazy
-            teams = user.teams
-            return {'user__in': [user, *teams]} if teams else {'user': user}
-
-        filtered_qs = queryset
+        efilters = []
+        filter_q = None
 
         q = Q()
         for cred in allowed:
@@ -444,20 +685,32 @@ class SetCredentials(models.Model):
                 break
 
             if set_type == ESET_OWN:
-                q |= Q(**user_filtering_kwargs())
+                q |= _user_filtering_q(user)
             else:  # SetCredentials.ESET_FILTER
                 # TODO: distinct ? (see EntityFilter.filter())
+                efilters.append(cred.efilter)
                 q |= cred.efilter.get_q(user=user)
         else:
-            filtered_qs = filtered_qs.filter(q)
+            filter_q = q
 
+        exclude_qs = []
         for cred in forbidden:
             if cred.set_type == ESET_OWN:
-                filtered_qs = filtered_qs.exclude(**user_filtering_kwargs())
+                exclude_qs.append(_user_filtering_q(user))
             else:  # SetCredentials.ESET_FILTER
-                filtered_qs = filtered_qs.exclude(cred.efilter.get_q(user=user))
+                efilters.append(cred.efilter)
+                exclude_qs.append(cred.efilter.get_q(user=user))
+
+        return CompiledCredentials(
+            filter_q=filter_q, exclude_qs=exclude_qs,
+            cacheable=all(map(_is_efilter_reusable, efilters)),
+        )
 
-        return filtered_qs
+    @classmethod
+    def _aux_filter(cls, model, sc_sequence, user, queryset, perm):
+        return cls._compile_filter(model=model, sc_sequence=sc_sequence,
+                                   user=user, perm=perm,
+                                  ).apply(queryset)
 
     @classmethod
     def filter(cls, sc_sequence, user, queryset, perm):
@@ -503,6 +756,16 @@ class SetCredentials(models.Model):
         from .entity import CremeEntity
         assert queryset.model is CremeEntity
 
+        return cls._compile_entities_filter(
+            sc_sequence=sc_sequence, user=user, perm=perm,
+            models=models, as_model=as_model,
+        ).apply(queryset)
+
+    @classmethod
+    def _compile_entities_filter(cls, sc_sequence, user, perm, models, as_model=None):
+        """See filter_entities().
+        @return: A CompiledCredentials instance.
+        """
         get_for_model = ContentType.objects.get_for_model
         entity_ct_id = get_for_model(CremeEntity).id
 
@@ -521,9 +784,8 @@ class SetCredentials(models.Model):
             narrowed_sc = [sc for sc in sc_sequence if sc.ctype_id in narrowed_ct_ids]
             _check_efilters(narrowed_sc)
 
-            return cls._aux_filter(
-                model=as_model, sc_sequence=narrowed_sc, user=user,
-                queryset=queryset, perm=perm,
+            return cls._compile_filter(
+                model=as_model, sc_sequence=narrowed_sc, user=user, perm=perm,
             )
 
         all_ct_ids = {
@@ -594,39 +856,40 @@ class SetCredentials(models.Model):
                 )].append(ct_id)
 
         if not ctypes_filtering:
-            queryset = queryset.none()
-        else:
-            def _user_filtering_q():  # TODO: cached/lazy ?
-                teams = user.teams
-                return Q(**{'user__in': [user, *teams]} if teams else {'user': user})
-
-            def _efilter_ids_to_Q(efilter_ids):
-                filters_q = Q()
-
-                for filter_id in efilter_ids:
-                    # TODO: condexpr
-                    if filter_id is not None:  # None == ESET_ALL
-                        if filter_id == OWN_FILTER_ID:
-                            filter_q = _user_filtering_q()
-                        else:
-                            # TODO: distinct ??
-                            filter_q = efilters_per_id[filter_id].get_q(user=user)
-
-                        filters_q |= filter_q
-
-                return filters_q
-
-            q = Q()
-            for (forbidden_filter_ids, allowed_filter_ids), ct_ids in ctypes_filtering.items():
-                q |= (
-                    (Q(entity_type_id=ct_ids[0]) if len(ct_ids) == 1 else Q(entity_type_id__in=ct_ids))
-                    & _efilter_ids_to_Q(allowed_filter_ids)
-                    & ~_efilter_ids_to_Q(forbidden_filter_ids)
-                )
+            return CompiledCredentials(empty=True)
 
-            queryset = queryset.filter(q)
+        used_efilters = []
 
-        return queryset
+        def _efilter_ids_to_Q(efilter_ids):
+            filters_q = Q()
+
+            for filter_id in efilter_ids:
+                # TODO: condexpr
+                if filter_id is not None:  # None == ESET_ALL
+                    if filter_id == OWN_FILTER_ID:
+                        filter_q = _user_filtering_q(user)
+                    else:
+                        # TODO: distinct ??
+                        efilter = efilters_per_id[filter_id]
+                        used_efilters.append(efilter)
+                        filter_q = efilter.get_q(user=user)
+
+                    filters_q |= filter_q
+
+            return filters_q
+
+        q = Q()
+        for (forbidden_filter_ids, allowed_filter_ids), ct_ids in ctypes_filtering.items():
+            q |= (
+                (Q(entity_type_id=ct_ids[0]) if len(ct_ids) == 1 else Q(entity_type_id__in=ct_ids))
+                & _efilter_ids_to_Q(allowed_filter_ids)
+                & ~_efilter_ids_to_Q(forbidden_filter_ids)
+            )
+
+        return CompiledCredentials(
+            filter_q=q,
+            cacheable=all(map(_is_efilter_reusable, used_efilters)),
+        )
 
     def save(self, *args, **kwargs):
         if self.set_type == self.ESET_FILTER:
@@ -1063,6 +1326,8 @@ for fname in ('password', 'last_login'):
 
 del get_user_field
 
+config_cache.register(UserRole, SetCredentials)
+
 
 class Sandbox(models.Model):
     """When a CremeEntity is associated to a sandbox, only the user related to this sandbox
@@ -175,9 +175,18 @@ class CustomFieldValue(CremeModel):
 
         return field
 
-    def set_value_n_save(self, value):
+    def set_value(self, value):
+        """Set the value without saving the instance.
+        @return: True if the instance has been modified (& so should be saved).
+        """
         if self.value != value:
             self.value = value
+            return True
+
+        return False
+
+    def set_value_n_save(self, value):
+        if self.set_value(value):
             self.save()
 
     @staticmethod
@@ -292,11 +301,13 @@ class CustomFieldBoolean(CustomFieldValue):
     def _get_formfield(**kwargs):
         return forms.NullBooleanField(**kwargs)
 
-    def set_value_n_save(self, value):
+    def set_value(self, value):
         # Boolean default value is False
         if value is not None:
             self.value = value
-            self.save()
+            return True
+
+        return False
 
 
 class CustomFieldEnumValue(CremeModel):
@@ -343,11 +354,13 @@ class CustomFieldEnum(CustomFieldValue):
     def _set_formfield_value(self, field):
         field.initial = self.value_id
 
-    def set_value_n_save(self, value):
+    def set_value(self, value):
         value = int(value)
         if self.value_id != value:
             self.value_id = value
-            self.save()
+            return True
+
+        return False
 
 
 class CustomFieldMultiEnum(CustomFieldValue):
@@ -387,6 +400,11 @@ class CustomFieldMultiEnum(CustomFieldValue):
     def _set_formfield_value(self, field):
         field.initial = self.value.all().values_list('id', flat=True)
 
+    def set_value(self, value):
+        raise TypeError('CustomFieldMultiEnum.set_value() is not possible (M2M field) ; '
+                        'use set_value_n_save() instead.'
+                       )
+
     def set_value_n_save(self, value):
         if not self.pk:
             self.save()  # M2M field need a pk
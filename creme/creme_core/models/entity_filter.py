@@ -2,7 +2,7 @@
 
 ################################################################################
 #    Creme is a free/open-source Customer Relationship Management software
-#    Copyright (C) 2009-2019  Hybird
+#    Copyright (C) 2009-2020  Hybird
 #
 #    This program is free software: you can redistribute it and/or modify
 #    it under the terms of the GNU Affero General Public License as published by
@@ -24,20 +24,23 @@ from json import loads as json_load  # dumps as json_dump
 import logging
 from re import compile as compile_re
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import models, transaction, connections
 # from django.db.models.fields import FieldDoesNotExist
 from django.db.models.query_utils import Q
 from django.db.models.signals import pre_delete
 from django.dispatch import receiver
 from django.urls import reverse
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _, gettext, pgettext_lazy, ngettext
-# from django.utils.timezone import now
 
+from ..core.config_cache import config_cache
 from ..core.entity_filter import entity_filter_registries, EF_USER
 from ..global_info import get_global_info
 from ..utils import update_model_instance
+from ..utils.chunktools import iter_as_chunk
 # from ..utils.date_range import date_range_registry
 # from ..utils.dates import date_2_dict, make_aware_dt
 # from ..utils.meta import is_date_field, FieldInfo
@@ -116,9 +119,24 @@ class EntityFilter(models.Model):  # CremeModel ???
         default=False,
     ).set_tags(viewable=False)
 
+    is_materialized = models.BooleanField(
+        _('Materialise the results?'),
+        default=False,
+        help_text=_('The entities accepted by a materialised filter are stored, '
+                    'so the lists which use it are faster ; '
+                    'it is useful for heavy filters on big lists.'
+                   ),
+    ).set_tags(viewable=False)
+    materialized_at = models.DateTimeField(
+        null=True, editable=False,
+    ).set_tags(viewable=False)
+
     creation_label = _('Create a filter')
     save_label     = _('Save the filter')
 
+    # Size of the batches of results inserted by materialize()
+    materialization_batch_size = 1024
+
     _conditions_cache = None
     _connected_filter_cache = None
     _subfilter_conditions_cache = None
@@ -142,6 +160,9 @@ class EntityFilter(models.Model):  # CremeModel ???
     class PrivacyError(Exception):
         pass
 
+    class MaterializationError(Exception):
+        pass
+
     def __str__(self):
         return self.name
 
@@ -164,6 +185,39 @@ class EntityFilter(models.Model):  # CremeModel ???
 
         return any(accepted) if self.use_or else all(accepted)
 
+    def accept_many(self, entities, user):
+        """Bulk version of accept() ; each condition retrieves the data it
+        needs (relations, properties, custom-values...) once for all the
+        entities, & the conditions are only checked for the entities which
+        have not been accepted/refused yet.
+
+        @param entities: Sequence of instances of <CremeEntity>.
+        @param user: See accept().
+        @return: A set containing the IDs of the accepted entities.
+        """
+        entities = [*entities]
+
+        if self.use_or:
+            accepted_ids = set()
+
+            for condition in self.get_conditions():
+                if not entities:
+                    break
+
+                accepted_ids.update(condition.accept_many(entities=entities, user=user))
+                entities = [entity for entity in entities if entity.id not in accepted_ids]
+
+            return accepted_ids
+
+        for condition in self.get_conditions():
+            if not entities:
+                break
+
+            condition_ids = condition.accept_many(entities=entities, user=user)
+            entities = [entity for entity in entities if entity.id in condition_ids]
+
+        return {entity.id for entity in entities}
+
     @property
     def applicable_on_entity_base(self):
         """Can this filter be applied on CremeEntity (QuerySet or simple instance)?
@@ -483,6 +537,7 @@ class EntityFilter(models.Model):  # CremeModel ???
                            ).format(', '.join(parents))
                 )
 
+        self._delete_materialized_results(self._get_materialized_results())
         super().delete(*args, **kwargs)
 
     @property
@@ -496,7 +551,32 @@ class EntityFilter(models.Model):  # CremeModel ???
     def registry(self):
         return entity_filter_registries[self.filter_type]
 
-    def filter(self, qs, user=None):
+    @property
+    def can_be_materialized(self):
+        """Can the accepted entities be materialised (see the field
+        "is_materialized")? It's not possible for the filters of credentials,
+        & for the filters with volatile conditions (sub-filters included).
+        """
+        return self.filter_type == EF_USER and not self.is_volatile
+
+    @staticmethod
+    def conditions_are_volatile(conditions):
+        "See FilterConditionHandler.is_volatile."
+        return any(condition.handler.is_volatile for condition in conditions)
+
+    @property
+    def is_volatile(self):
+        return self.conditions_are_volatile(self.get_conditions())
+
+    @property
+    def uses_materialization(self):
+        """Does filter() use the materialised results? (they must have been
+        computed & be up to date -- see materialize()).
+        """
+        return settings.ENTITY_FILTERS_MATERIALIZATION and \
+               self.is_materialized and self.materialized_at is not None
+
+    def _filter_by_conditions(self, qs, user=None):
         qs = qs.filter(self.get_q(user))
 
         if not self.entities_are_distinct:
@@ -504,6 +584,212 @@ class EntityFilter(models.Model):  # CremeModel ???
 
         return qs
 
+    def filter(self, qs, user=None):
+        if self.uses_materialization:
+            # NB: the DB performs a (semi-)join with the table of results,
+            #     instead of evaluating the conditions.
+            return qs.filter(id__in=self._get_materialized_results().values('entity_id'))
+
+        return self._filter_by_conditions(qs, user)
+
+    def _get_materialized_results(self):
+        return EntityFilterResult.objects.filter(efilter=self.id)
+
+    @staticmethod
+    def _delete_materialized_results(qs):
+        # NB: no signal is sent for these lines, so we avoid the retrieving of
+        #     the instances by the deletion Collector (they can be numerous).
+        qs._raw_delete(qs.db)
+
+    @staticmethod
+    def _select_for_update(qs, skip_locked=False):
+        """Lock the rows of a QuerySet until the end of the current transaction.
+        @param skip_locked: If True, the rows which are already locked by
+               another transaction are ignored instead of waited for
+               (if the DB does not support it, the lock is waited for).
+        """
+        return qs.select_for_update(
+            skip_locked=skip_locked and connections[qs.db].features.has_select_for_update_skip_locked,
+        )
+
+    def _lock(self, skip_locked=False, **kwargs):
+        """Lock the row of the filter until the end of the current transaction.
+        @param skip_locked: See _select_for_update().
+        @param kwargs: Additional conditions on the row.
+        @return: True if the row (matching the conditions) has been locked.
+        """
+        return bool([
+            *self._select_for_update(type(self).objects.filter(id=self.id, **kwargs),
+                                     skip_locked=skip_locked,
+                                    ).values_list('id', flat=True),
+        ])
+
+    def _update_materialized_results(self, entities_ids):
+        "The row of the filter must be locked."
+        model = self.entity_type.model_class()
+        accepted_ids = {
+            *self._filter_by_conditions(model._default_manager.filter(id__in=entities_ids))
+                 .values_list('id', flat=True),
+        }
+        results = self._get_materialized_results()
+        stored_ids = {
+            *results.filter(entity_id__in=entities_ids).values_list('entity_id', flat=True),
+        }
+
+        removed_ids = stored_ids - accepted_ids
+        if removed_ids:
+            self._delete_materialized_results(results.filter(entity_id__in=removed_ids))
+
+        added_ids = accepted_ids - stored_ids
+        if added_ids:
+            # NB: a concurrent transaction could have added the same lines.
+            EntityFilterResult.objects.bulk_create(
+                [EntityFilterResult(efilter_id=self.id, entity_id=entity_id)
+                    for entity_id in added_ids
+                ],
+                ignore_conflicts=True,
+            )
+
+    def _apply_materialization_changes(self):
+        """Check again the entities recorded in EntityFilterChange (i.e.
+        modified while the row of the filter was locked). The row of the
+        filter must be locked.
+        @return: False if the results have been marked as outdated.
+        """
+        changes = [
+            *EntityFilterChange.objects.filter(efilter=self.id).values_list('id', 'entity_id'),
+        ]
+        if not changes:
+            return True
+
+        EntityFilterChange.objects.filter(id__in=[change_id for change_id, __ in changes]).delete()
+        entities_ids = {entity_id for __, entity_id in changes}
+
+        if None in entities_ids:
+            return False
+
+        self._update_materialized_results(entities_ids)
+
+        return True
+
+    def materialize(self):
+        """Compute & store the IDs of all the entities accepted by the filter.
+        @raise EntityFilter.MaterializationError if the filter cannot be materialised.
+        """
+        if not self.can_be_materialized:
+            raise self.MaterializationError(
+                'The filter "{}" cannot be materialised '
+                '(filter of credentials or volatile conditions)'.format(self.id)
+            )
+
+        model = self.entity_type.model_class()
+
+        # NB: the row of the filter is locked while the results are computed &
+        #     stored ; the modifications of entities made meanwhile do not wait
+        #     for the lock, they are recorded (see update_materialization())
+        #     & applied at the end.
+        with transaction.atomic():
+            self._lock()
+            entities_ids = [
+                *self._filter_by_conditions(model._default_manager.order_by())
+                     .values_list('id', flat=True),
+            ]
+            materialized_at = now()
+
+            self._delete_materialized_results(self._get_materialized_results())
+
+            for ids_chunk in iter_as_chunk(entities_ids, self.materialization_batch_size):
+                EntityFilterResult.objects.bulk_create([
+                    EntityFilterResult(efilter_id=self.id, entity_id=entity_id)
+                        for entity_id in ids_chunk
+                ])
+
+            if not self._apply_materialization_changes():
+                materialized_at = None
+
+            type(self).objects.filter(id=self.id).update(materialized_at=materialized_at)
+
+        self.materialized_at = materialized_at
+
+    def apply_materialization_changes(self):
+        """Check again the entities which have been modified while the results
+        were locked (see update_materialization()).
+        """
+        with transaction.atomic():
+            if self._lock(materialized_at__isnull=False) and \
+               not self._apply_materialization_changes():
+                self.materialized_at = None
+                type(self).objects.filter(id=self.id).update(materialized_at=None)
+
+    def update_materialization(self, entities_ids):
+        """Update the materialised results for some entities (which have been
+        modified, or whose relationships/properties/custom-values have been modified).
+        @param entities_ids: Collection of IDs of entities (of any type ;
+               the IDs of other types are ignored).
+        @return: False if the row of the filter is locked by another
+                 transaction (e.g. materialize()) ; the entities have been
+                 recorded & are checked again later
+                 (see apply_materialization_changes()).
+        """
+        with transaction.atomic():
+            # NB: we do not wait for the lock, because the results can be
+            #     computed by materialize() (which can be long).
+            if self._lock(skip_locked=True, materialized_at__isnull=False):
+                self._update_materialized_results(entities_ids)
+                return True
+
+            # NB: the results could have been marked as outdated.
+            if not type(self).objects.filter(id=self.id, materialized_at__isnull=False).exists():
+                return True
+
+            EntityFilterChange.record(self.id, entities_ids)
+
+            return False
+
+    @classmethod
+    def outdate_materializations(cls, efilter_ids):
+        """Mark the results of some materialised filters as outdated.
+        @param efilter_ids: Collection of IDs of filters.
+        @return: True if some results have been marked (or recorded to be marked).
+        """
+        outdated = False
+
+        with transaction.atomic():
+            qs = cls.objects.filter(id__in=efilter_ids, materialized_at__isnull=False)
+            # NB: the rows are locked in the same order everywhere to avoid dead-locks.
+            locked_ids = [
+                *cls._select_for_update(qs.order_by('id'), skip_locked=True)
+                    .values_list('id', flat=True),
+            ]
+
+            if locked_ids:
+                outdated = bool(cls.objects.filter(id__in=locked_ids).update(materialized_at=None))
+
+            # NB: the rows locked by another transaction are marked later.
+            for efilter_id in qs.exclude(id__in=locked_ids).values_list('id', flat=True):
+                EntityFilterChange.record(efilter_id, [None])
+                outdated = True
+
+        return outdated
+
+    def clear_materialization(self):
+        "Remove the materialised results (e.g. the filter is not materialised anymore)."
+        self._delete_materialized_results(self._get_materialized_results())
+        EntityFilterChange.objects.filter(efilter=self.id).delete()
+
+        if self.materialized_at is not None:
+            self.materialized_at = None
+            type(self).objects.filter(id=self.id).update(materialized_at=None)
+
+    def get_related_entity_models(self):
+        "See FilterConditionHandler.related_entity_models."
+        entity_models = set()
+
+        for condition in self.get_conditions():
+            entity_models.update(condition.handler.related_entity_models)
+
+        return entity_models
+
     def _get_subfilter_conditions(self):
         sfc = self._subfilter_conditions_cache
 
@@ -644,6 +930,7 @@ class EntityFilter(models.Model):  # CremeModel ???
 
         old_conditions = EntityFilterCondition.objects.filter(filter=self).order_by('id')
         conds2del = []
+        changed = False
 
         for old_condition, condition in zip_longest(old_conditions, conditions):
             if not condition:  # Less new conditions that old conditions => delete conditions in excess
@@ -651,15 +938,23 @@ class EntityFilter(models.Model):  # CremeModel ???
             elif not old_condition:
                 condition.filter = self
                 condition.save()
+                changed = True
             elif old_condition.update(condition):
                 old_condition.save()
                 condition.pk = old_condition.pk  # If there is an error we delete it
+                changed = True
 
         if conds2del:
             EntityFilterCondition.objects.filter(pk__in=conds2del).delete()
+            changed = True
 
         self._build_conditions_cache(conditions)
 
+        if changed and self.is_materialized and self.materialized_at is not None:
+            # NB: the results are computed again by the job "materialized_filters".
+            self.materialized_at = None
+            type(self).objects.filter(id=self.id).update(materialized_at=None)
+
     # TODO: in the manager ?
     # @staticmethod
     @classmethod
@@ -1061,6 +1356,14 @@ class EntityFilterCondition(models.Model):
         """
         return self.handler.accept(entity=entity, user=user)
 
+    def accept_many(self, entities, user):
+        """Bulk version of accept().
+        @param entities: Sequence of instances of <CremeEntity>.
+        @param user: See accept().
+        @return: A set containing the IDs of the accepted entities.
+        """
+        return self.handler.accept_many(entities=entities, user=user)
+
     @staticmethod
     def conditions_equal(conditions1, conditions2):
         """Compare 2 sequences on EntityFilterConditions related to the _same_
@@ -1348,6 +1651,42 @@ class EntityFilterCondition(models.Model):
         return changed
 
 
+class EntityFilterResult(models.Model):
+    """ID of an entity accepted by a materialised EntityFilter
+    (see EntityFilter.is_materialized).
+
+    NB: the entity is not a ForeignKey, in order to keep the deletion of the
+        entities fast ; the lines of the deleted entities are ignored by
+        EntityFilter.filter() & removed by the materialisation.
+    """
+    efilter   = models.ForeignKey(EntityFilter, related_name='+', on_delete=models.CASCADE, editable=False)
+    entity_id = models.PositiveIntegerField(editable=False)
+
+    class Meta:
+        app_label = 'creme_core'
+        unique_together = ('efilter', 'entity_id')
+
+
+class EntityFilterChange(models.Model):
+    """ID of an entity modified while the row of a materialised EntityFilter
+    was locked (see EntityFilter.update_materialization()) ; the entity is
+    checked again by EntityFilter.apply_materialization_changes().
+
+    NB: an empty entity means that all the results are outdated.
+    """
+    efilter   = models.ForeignKey(EntityFilter, related_name='+', on_delete=models.CASCADE, editable=False)
+    entity_id = models.PositiveIntegerField(null=True, editable=False)
+
+    class Meta:
+        app_label = 'creme_core'
+
+    @classmethod
+    def record(cls, efilter_id, entities_ids):
+        cls.objects.bulk_create([
+            cls(efilter_id=efilter_id, entity_id=entity_id) for entity_id in entities_ids
+        ])
+
+
 # @receiver(pre_delete, sender=RelationType)
 # def _delete_relationtype_efc(sender, instance, **kwargs):
 #     EntityFilterCondition.objects.filter(type__in=(EntityFilterCondition.EFC_RELATION,
@@ -1377,3 +1716,9 @@ def _delete_related_efc(sender, instance, **kwargs):
 
     if q:
         EntityFilterCondition.objects.filter(q).delete()
+
+
+# NB: the generations of these models are used to validate the compiled
+#     credentials shared between requests (see models.auth.CompiledCredentialsCache) ;
+#     without them a modified credentials filter would keep its old predicates.
+config_cache.register(EntityFilter, EntityFilterCondition)
@@ -26,6 +26,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.db.models import TextField, FieldDoesNotExist
 from django.utils.translation import gettext_lazy as _, gettext
 
+from ..core.config_cache import config_cache
 from ..core.entity_cell import EntityCellRegularField
 from ..global_info import get_per_request_cache
 from ..utils.serializers import json_encode
@@ -245,20 +246,37 @@ class FieldsConfig(CremeModel):
             else:
                 result[model] = fc
 
-        # Step 2: fill 'result' with configs in DB
-        for fc in cls.objects.filter(content_type__in=not_cached_ctypes):
-            ct = fc.content_type
-            result[ct.model_class()] = cache[cache_key_fmt(ct.id)] = fc
+        # Step 2: fill 'result' with configs shared between requests
+        if not_cached_ctypes:
+            shared_configs = config_cache.get_many(cls, (ct.id for ct in not_cached_ctypes))
 
-        # Step 3: fill 'result' with empty configs for remaining models
+            for fc in shared_configs.values():
+                result[fc.content_type.model_class()] = cache[cache_key_fmt(fc.content_type_id)] = fc
+
+            not_cached_ctypes = [ct for ct in not_cached_ctypes if ct.id not in shared_configs]
+
+        # Step 3: fill 'result' with configs in DB
+        to_share = {}
+
+        if not_cached_ctypes:
+            for fc in cls.objects.filter(content_type__in=not_cached_ctypes):
+                ct = fc.content_type
+                result[ct.model_class()] = cache[cache_key_fmt(ct.id)] = to_share[ct.id] = fc
+
+        # Step 4: fill 'result' with empty configs for remaining models
         for model in models:
             if model not in result:
                 ct = get_ct(model)
-                result[model] = cache[cache_key_fmt(ct.id)] = cls(
+                result[model] = cache[cache_key_fmt(ct.id)] = fc = cls(
                     content_type=ct,
                     descriptions=(),
                 )
 
+                if ct in not_cached_ctypes:
+                    to_share[ct.id] = fc
+
+        config_cache.set_many(cls, to_share)
+
         return result
 
     @property
@@ -287,3 +305,6 @@ class FieldsConfig(CremeModel):
     def update_form_fields(self, form_fields):
         for field_name in self._get_hidden_field_names():
             form_fields.pop(field_name, None)
+
+
+config_cache.register(FieldsConfig)
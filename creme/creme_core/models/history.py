@@ -18,6 +18,7 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 ################################################################################
 
+from contextlib import contextmanager
 from datetime import date, time, datetime
 from decimal import Decimal
 from functools import partial
@@ -30,6 +31,7 @@ from django.core.exceptions import ValidationError
 from django.db.models import (Model, PositiveSmallIntegerField, CharField, TextField,
         ForeignKey, OneToOneField, SET_NULL, CASCADE, FieldDoesNotExist)
 from django.db.models.base import ModelState
+from django.db import connection
 from django.db.models.signals import post_save, post_init, pre_delete
 from django.db.transaction import atomic
 from django.dispatch import receiver
@@ -221,13 +223,21 @@ class _HistoryLineType:
                 if fname in excluded_fields or not field.get_tag('viewable'):
                     continue
 
-                old_value = getattr(old_instance, fname)
-                new_value = getattr(instance, fname)
-
                 if isinstance(field, ForeignKey):
-                    old_value = old_value and old_value.pk
-                    new_value = new_value and new_value.pk
+                    if field.target_field.primary_key:
+                        # NB: the related instances are not retrieved (queries)
+                        attname = field.attname
+                        old_value = field.to_python(getattr(old_instance, attname))
+                        new_value = field.to_python(getattr(instance, attname))
+                    else:
+                        old_value = getattr(old_instance, fname)
+                        old_value = old_value and old_value.pk
+                        new_value = getattr(instance, fname)
+                        new_value = new_value and new_value.pk
                 else:
+                    old_value = getattr(old_instance, fname)
+                    new_value = getattr(instance, fname)
+
                     try:
                         # Sometimes a form sets a unicode representing an int in an IntegerField (for example)
                         # => the type difference leads to a useless log like: Set field “My field” from “X” to “X”
@@ -318,11 +328,13 @@ class _HLTEntityEdition(_HistoryLineType):
         modifs = _HistoryLineType._build_fields_modifs(entity)
 
         if modifs:
-            hline = HistoryLine._create_line_4_instance(entity, cls.type_id,
-                                                        date=entity.modified,
-                                                        modifs=modifs,
-                                                       )
-            _HLTRelatedEntity.create_lines(entity, hline)
+            with HistoryLine.buffered():
+                hline = HistoryLine._create_line_4_instance(entity, cls.type_id,
+                                                            date=entity.modified,
+                                                            modifs=modifs,
+                                                           )
+                _HLTRelatedEntity.create_lines(entity, hline)
+
             cls._create_entity_backup(entity)
 
 
@@ -354,7 +366,7 @@ class _HLTRelatedEntity(_HistoryLineType):
             object_entities = [r.object_entity for r in relations]
             create_line = partial(HistoryLine._create_line_4_instance,
                                   ltype=cls.type_id, date=entity.modified,
-                                  related_line_id=related_line.id,
+                                  related_line=related_line,
                                  )
 
             CremeEntity.populate_real_entities(object_entities)  # Optimisation
@@ -407,15 +419,16 @@ class _HLTRelation(_HistoryLineType):
     @classmethod
     def _create_lines(cls, relation, sym_cls, date=None):
         create_line = partial(HistoryLine._create_line_4_instance, date=date)
-        hline     = create_line(relation.subject_entity, cls.type_id)
-        hline_sym = create_line(relation.object_entity, sym_cls.type_id,
-                                modifs=[relation.type.symmetric_type_id],
-                                related_line_id=hline.id,
-                               )
-        hline.value = HistoryLine._encode_attrs(hline.entity, modifs=[relation.type_id],
-                                                related_line_id=hline_sym.id
-                                               )
-        hline.save()
+
+        with HistoryLine.buffered() as buffer:
+            hline     = create_line(relation.subject_entity, cls.type_id,
+                                    modifs=[relation.type_id],
+                                   )
+            hline_sym = create_line(relation.object_entity, sym_cls.type_id,
+                                    modifs=[relation.type.symmetric_type_id],
+                                    related_line=hline,
+                                   )
+            buffer.link(hline, hline_sym)
 
     @classmethod
     def create_lines(cls, relation, created):
@@ -569,6 +582,130 @@ class _HLTEntityExport(_HistoryLineType):
         )
 
 
+class _HistoryLinesBuffer:
+    """Stores the HistoryLines to create, in order to insert them with some
+    bulk queries (see HistoryLine.buffered()).
+    The ID of a line which is related to another one (see
+    _HistoryLineType.has_related_line) is stored when the other line is saved.
+    """
+    def __init__(self, size):
+        self.size = size  # The buffer is flushed when this number of lines is reached
+        self.lines = []  # Lines to insert
+        self.links = []  # Tuples (line, related_line) ; the ID of related_line is unknown yet
+        self.detachments = []  # Tuples (line, entity) ; see detach_entity()
+        self.flushes_count = 0
+
+    def __len__(self):
+        return len(self.lines)
+
+    def mark(self):
+        "Get a marker used by rollback()."
+        return self.flushes_count, len(self.lines), len(self.links), len(self.detachments)
+
+    def rollback(self, mark):
+        """Drop the lines (not flushed yet) which have been added since the
+        marker has been gotten (& cancel the detachments done since).
+        """
+        flushes_count, lines_count, links_count, detachments_count = mark
+
+        if flushes_count == self.flushes_count:
+            del self.lines[lines_count:]
+            del self.links[links_count:]
+
+            # NB: the deletion of the entities is rolled back too.
+            for line, entity in reversed(self.detachments[detachments_count:]):
+                line.entity = entity
+
+            del self.detachments[detachments_count:]
+        else:
+            # NB: the flushed lines are removed by the rollback of the transaction.
+            self.lines = []
+            self.links = []
+            self.detachments = []
+
+    def add(self, line, related_line=None):
+        if not HistoryLine.ENABLED:
+            return
+
+        line.user = get_global_info('user')
+        self.lines.append(line)
+
+        if related_line is not None:
+            self.link(line, related_line)
+
+    def detach_entity(self, entity_id):
+        """The lines related to this entity (which is going to be deleted) do
+        not reference it anymore (like the saved lines, see HistoryLine.entity).
+        The lines are kept in the buffer ; so they are not lost if the deletion
+        is done in a savepoint which is rolled back (see rollback()).
+        """
+        detachments = self.detachments
+
+        for line in self.lines:
+            if line.entity_id == entity_id:
+                detachments.append((line, line.entity))
+                line.entity = None
+
+    def link(self, line, related_line):
+        "Store the ID of <related_line> in <line> (now, or when it's known)."
+        if related_line.id is not None and line.id is None:
+            line._set_related_line_id(related_line.id)
+        else:
+            self.links.append((line, related_line))
+
+    def flush(self):
+        lines = self.lines
+        links = self.links
+
+        if not lines and not links:
+            return
+
+        self.lines = []
+        self.links = []
+        self.detachments = []
+        self.flushes_count += 1
+
+        with atomic(savepoint=False):
+            if not connection.features.can_return_ids_from_bulk_insert:
+                # NB: the IDs are not retrieved by bulk_create() with this DB,
+                #     so the lines referenced by other lines are inserted one
+                #     by one (in the creation order, so the ID of the line
+                #     referenced by another one is generally known before the
+                #     insertion), & the other lines are inserted in bulk.
+                referenced = {id(related_line) for __, related_line in links}
+                pending = {id(line): related_line for line, related_line in links}
+
+                for line in lines:
+                    related_line = pending.get(id(line))
+
+                    if related_line is not None and related_line.id is not None:
+                        line._set_related_line_id(related_line.id)
+                        del pending[id(line)]
+
+                    if id(line) in referenced:
+                        line.save()
+
+                # The referenced lines have been saved ; so the lines inserted
+                # in bulk get the ID of their related line before the insertion.
+                for line in lines:
+                    related_line = pending.get(id(line))
+
+                    if related_line is not None and line.id is None and related_line.id is not None:
+                        line._set_related_line_id(related_line.id)
+                        del pending[id(line)]
+
+                links = [(line, related_line) for line, related_line in links if id(line) in pending]
+                lines = [line for line in lines if line.id is None]
+
+            HistoryLine.objects.bulk_create(lines)
+
+            if links:
+                for line, related_line in links:
+                    line._set_related_line_id(related_line.id)
+
+                HistoryLine.objects.bulk_update([line for line, _ in links], ['value'])
+
+
 class HistoryLine(Model):
     entity       = ForeignKey(CremeEntity, null=True, on_delete=SET_NULL)
     entity_ctype = CTypeForeignKey()  # We do not use entity.entity_type because
@@ -671,6 +808,62 @@ class HistoryLine(Model):
         """
         instance._hline_reassigned = (old_reference, new_reference, field_name)
 
+    @staticmethod
+    @contextmanager
+    def buffered(size=1024):
+        """Context manager which buffers the HistoryLines created in its block
+        (by the saving of entities, relationships...), & inserts them with some
+        bulk queries when the block is exited (or when the buffer is full).
+        Useful for mass operations, like jobs which create/modify many entities.
+
+        The nested blocks use the buffer of the outermost block. When an
+        exception is raised in a block, the lines buffered by this block are
+        dropped (the changes they describe are generally rolled back too).
+        Beware: the lines are saved later, so they have no ID within the block.
+
+        @param size: Number of lines which causes the buffer to be flushed.
+        @return: An instance of _HistoryLinesBuffer.
+
+        >> with atomic(), HistoryLine.buffered():
+        ..     for contact in contacts:
+        ..         contact.save()
+        """
+        buffer = get_global_info('history_buffer')
+
+        if buffer is None:
+            buffer = _HistoryLinesBuffer(size=size)
+            set_global_info(history_buffer=buffer)
+
+            try:
+                yield buffer
+            finally:
+                set_global_info(history_buffer=None)
+
+            buffer.flush()
+        else:
+            mark = buffer.mark()
+
+            try:
+                yield buffer
+            except BaseException:
+                buffer.rollback(mark)
+                raise
+
+            if len(buffer) >= buffer.size:
+                buffer.flush()
+
+    @staticmethod
+    @contextmanager
+    def _unbuffered():
+        "The lines created in this block are saved immediately, even within a buffered() block."
+        buffer = get_global_info('history_buffer')
+        set_global_info(history_buffer=None)
+
+        try:
+            yield
+        finally:
+            set_global_info(history_buffer=buffer)
+
     @classmethod
     def _encode_attrs(cls, instance, modifs=(), related_line_id=None):
         value = [str(instance)]
@@ -736,6 +929,22 @@ class HistoryLine(Model):
 
         return self._related_line_id
 
+    def _set_related_line_id(self, line_id):
+        value = json_load(self.value)
+        value.insert(1, line_id)
+        self.value = _JSONEncoder().encode(value)
+        self._related_line_id = line_id
+
+    @staticmethod
+    def log_edition(instance):
+        """Create the lines related to the edition of an instance (entity or
+        auxiliary instance) which has not been saved with its method save()
+        (e.g. it has been modified with QuerySet.update()).
+        The instance must have been retrieved before its modification, & its
+        attributes must contain the new values.
+        """
+        _log_creation_edition(sender=type(instance), instance=instance, created=False)
+
     @staticmethod
     def populate_users(hlines, user):
         """Set the internal cache for 'user' in some HistoryLines, to optimize queries.
@@ -771,24 +980,29 @@ class HistoryLine(Model):
         return self._related_line
 
     @classmethod
-    def _create_line_4_instance(cls, instance, ltype, date=None, modifs=(), related_line_id=None):
+    def _create_line_4_instance(cls, instance, ltype, date=None, modifs=(), related_line=None):
         """Builder.
         @param ltype: See TYPE_*
         @param date: If not given, will be 'now'.
         @param modifs: List of tuples containing JSONifiable values.
-        @param related_line_id: HistoryLine.id.
+        @param related_line: HistoryLine instance (it can be not saved yet,
+               within a buffered() block).
+        @return: A HistoryLine instance ; it's not saved yet within a buffered() block.
         """
         kwargs = {'entity': instance,
                   'entity_ctype': instance.entity_type,
                   'entity_owner': instance.user,
                   'type': ltype,
-                  'value': cls._encode_attrs(instance, modifs=modifs,
-                                             related_line_id=related_line_id,
-                                            ),
+                  'value': cls._encode_attrs(instance, modifs=modifs),
                  }
         if date: kwargs['date'] = date
 
-        return cls.objects.create(**kwargs)
+        line = cls(**kwargs)
+
+        with cls.buffered() as buffer:
+            buffer.add(line, related_line=related_line)
+
+        return line
 
     def save(self, *args, **kwargs):
         if self.ENABLED:
@@ -885,25 +1099,37 @@ def _log_deletion(sender, instance, **kwargs):
     # several 'level' of class. We don't want to create several HistoryLines
     # (and some things are deleted by higher levels that make objects
     # inconsistent & that can cause 'crashes').
+    # NB: the lines reference instances which are going to be deleted, so
+    #     they cannot be buffered.
+    #     The buffered lines are not flushed here: the deletion can happen in
+    #     a savepoint, & so the flushed lines would be lost if this savepoint
+    #     is rolled back. The buffered lines related to a deleted entity are
+    #     just detached from it.
     try:
-        if isinstance(instance, CremeProperty):
-            _HLTPropertyDeletion.create_line(instance)
-        elif isinstance(instance, Relation):
-            _HLTRelationDeletion.create_lines(instance)
-        elif hasattr(instance, 'get_related_entity'):
-            if not isinstance(instance, CremeEntity) or _final_entity(instance):
-                entity = instance.get_related_entity()
-
-                if entity is None:
-                    logger.debug('_log_deletion(): an auxiliary entity seems orphan (id=%s)'
-                                 ' -> can not create HistoryLine',
-                                 instance.id,
-                                )
-                elif entity.id not in _get_deleted_entity_ids():
-                    _HLTAuxDeletion.create_line(instance)
-        elif isinstance(instance, CremeEntity) and _final_entity(instance):
-            _get_deleted_entity_ids().add(instance.id)
-            _HLTEntityDeletion.create_line(instance)
+        buffer = get_global_info('history_buffer')
+
+        if buffer is not None and isinstance(instance, CremeEntity):
+            buffer.detach_entity(instance.id)
+
+        with HistoryLine._unbuffered():
+            if isinstance(instance, CremeProperty):
+                _HLTPropertyDeletion.create_line(instance)
+            elif isinstance(instance, Relation):
+                _HLTRelationDeletion.create_lines(instance)
+            elif hasattr(instance, 'get_related_entity'):
+                if not isinstance(instance, CremeEntity) or _final_entity(instance):
+                    entity = instance.get_related_entity()
+
+                    if entity is None:
+                        logger.debug('_log_deletion(): an auxiliary entity seems orphan (id=%s)'
+                                     ' -> can not create HistoryLine',
+                                     instance.id,
+                                    )
+                    elif entity.id not in _get_deleted_entity_ids():
+                        _HLTAuxDeletion.create_line(instance)
+            elif isinstance(instance, CremeEntity) and _final_entity(instance):
+                _get_deleted_entity_ids().add(instance.id)
+                _HLTEntityDeletion.create_line(instance)
     except Exception:
         logger.exception('Error in _log_deletion() ; HistoryLine may not be created.')
 
@@ -919,4 +1145,8 @@ class HistoryConfigItem(Model):
 def _handle_merge(sender, other_entity, **kwargs):
     # We do not want these lines to be re-assigned to the remaining entity.
     # TODO: should we clone/copy for TYPE_RELATED
+    buffer = get_global_info('history_buffer')
+    if buffer is not None:
+        buffer.flush()
+
     HistoryLine.objects.filter(entity=other_entity.id).update(entity=None)
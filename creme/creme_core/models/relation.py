@@ -143,15 +143,18 @@ class RelationManager(models.Manager):
                                    .values_list('type', 'subject_entity', 'object_entity'):
                     unique_relations.pop(rel_sig, None)
 
+            from .history import HistoryLine
+
             # Creation (we take the first of each group to guaranty uniqueness)
-            for relation in unique_relations.values():
-                try:
-                    # NB: Relation.save is already @atomic'd
-                    relation.save()
-                except IntegrityError:
-                    logger.exception('Avoid a Relation duplicate: %s ?!', relation)
-                else:
-                    count += 1
+            with HistoryLine.buffered():
+                for relation in unique_relations.values():
+                    try:
+                        # NB: Relation.save is already @atomic'd
+                        relation.save()
+                    except IntegrityError:
+                        logger.exception('Avoid a Relation duplicate: %s ?!', relation)
+                    else:
+                        count += 1
 
         return count
 
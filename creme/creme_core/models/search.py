@@ -23,13 +23,19 @@ import logging
 
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
-from django.db.models import TextField, ForeignKey, BooleanField, Q, FieldDoesNotExist, CASCADE
+from django.db.models import (TextField, CharField, ForeignKey, BooleanField,
+        Q, FieldDoesNotExist, CASCADE)
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _, gettext, pgettext_lazy
 
+from ..core.config_cache import config_cache
+from ..signals import post_replace_in_bulk
 from ..utils import find_first
 from ..utils.meta import FieldInfo, ModelFieldEnumerator
 from .auth import UserRole
 from .base import CremeModel
+from .entity import CremeEntity
 from .fields import EntityCTypeForeignKey, DatePeriodField
 
 logger = logging.getLogger(__name__)
@@ -218,23 +224,84 @@ class SearchConfigItem(CremeModel):
 #
 #        for ctype in ctypes:
 #            yield sc_items.get(ctype) or SearchConfigItem(content_type=ctype)
+        # NB: the configuration items shared between requests are stored per role
+        key_fmt = '{}-{}'.format
+        role_key = 'superuser' if user.is_superuser else user.role_id
+        shared_items = config_cache.get_many(SearchConfigItem,
+                                             (key_fmt(ctype.id, role_key) for ctype in ctypes),
+                                            )
+        missing_ctypes = [ctype for ctype in ctypes
+                              if key_fmt(ctype.id, role_key) not in shared_items
+                         ]
+
         sc_items_per_ctid = defaultdict(list)
-        for sci in SearchConfigItem.objects.filter(content_type__in=ctypes).filter(role_query):
-            sc_items_per_ctid[sci.content_type_id].append(sci)
+        if missing_ctypes:
+            for sci in SearchConfigItem.objects.filter(content_type__in=missing_ctypes).filter(role_query):
+                sc_items_per_ctid[sci.content_type_id].append(sci)
+
+        items = []
+        to_share = {}
 
         for ctype in ctypes:
-            sc_items = sc_items_per_ctid.get(ctype.id)
+            key = key_fmt(ctype.id, role_key)
+            sci = shared_items.get(key)
 
-            if sc_items:
-                try:
-                    yield find_first(sc_items, filter_func)
-                except IndexError:
-                    yield sc_items[0]
-            else:
-                yield SearchConfigItem(content_type=ctype)
+            if sci is None:
+                sc_items = sc_items_per_ctid.get(ctype.id)
+
+                if sc_items:
+                    try:
+                        sci = find_first(sc_items, filter_func)
+                    except IndexError:
+                        sci = sc_items[0]
+                else:
+                    sci = SearchConfigItem(content_type=ctype)
+
+                to_share[key] = sci
+
+            items.append(sci)
+
+        config_cache.set_many(SearchConfigItem, to_share)
+
+        yield from items
 
     def save(self, *args, **kwargs):
         if self.superuser and self.role_id:
             raise ValueError('"role" must be NULL if "superuser" is True')
 
         super().save(*args, **kwargs)
+
+
+class SearchIndexToken(CremeModel):
+    """Normalised word contained in a searchable field of an entity.
+    These lines are used (& updated) by <creme_core.core.search.IndexSearchBackend>.
+    """
+    entity     = ForeignKey(CremeEntity, related_name='+', on_delete=CASCADE, editable=False)
+    field_name = CharField(max_length=100, editable=False)
+    token      = CharField(max_length=50, db_index=True, editable=False)
+
+    class Meta:
+        app_label = 'creme_core'
+
+    def __str__(self):
+        return self.token
+
+
+config_cache.register(SearchConfigItem)
+
+
+@receiver(post_save)
+def _update_search_index(sender, instance, **kwargs):
+    if isinstance(instance, CremeEntity):
+        from ..core.search import get_search_backend
+
+        get_search_backend().index_entities(sender, [instance])
+
+
+@receiver(post_replace_in_bulk)
+def _update_search_index_on_bulk_replace(sender, instances, **kwargs):
+    # NB: the job "Deletor" has updated some entities without sending post_save.
+    if issubclass(sender, CremeEntity):
+        from ..core.search import get_search_backend
+
+        get_search_backend().index_entities(sender, instances)
@@ -2,7 +2,7 @@
 
 ################################################################################
 #    Creme is a free/open-source Customer Relationship Management software
-#    Copyright (C) 2009-2019  Hybird
+#    Copyright (C) 2009-2020  Hybird
 #
 #    This program is free software: you can redistribute it and/or modify
 #    it under the terms of the GNU Affero General Public License as published by
@@ -71,6 +71,11 @@ class Populator(BasePopulator):
                              'status':   Job.STATUS_OK,
                             },
                   )
+        create_job(type_id=creme_jobs.materialized_filters_type.id,
+                   defaults={'language': settings.LANGUAGE_CODE,
+                             'status':   Job.STATUS_OK,
+                            },
+                  )
 
         # ---------------------------
 
@@ -2,7 +2,7 @@
 
 ################################################################################
 #
-# Copyright (c) 2012-2019 Hybird
+# Copyright (c) 2012-2020 Hybird
 #
 # Permission is hereby granted, free of charge, to any person obtaining a copy
 # of this software and associated documentation files (the "Software"), to deal
@@ -34,6 +34,11 @@ pre_replace_related = Signal(providing_args=['old_instance', 'new_instance'])
 # Signal sent by the job "Deletor" (deleting instance of 'small' models in creme_config).
 # <sender> is the instance to delete.
 pre_replace_and_delete = Signal(providing_args=['model_field', 'replacing_instance'])
+# Signal sent by the job "Deletor" when a batch of instances has been updated
+# with an UPDATE query (so the signal post_save has not been sent).
+# <sender> is the model of the updated instances ; <instances> is a list of
+# instances (with the new values).
+post_replace_in_bulk = Signal(providing_args=['model_field', 'instances'])
 
 pre_uninstall_flush  = Signal(providing_args=['content_types', 'verbosity',
                                               'stdout_write', 'stderr_write', 'style',
@@ -688,10 +688,23 @@ creme.bricks.Brick = creme.component.Component.sub({
     },
 
     setState: function(state) {
+        var self = this;
+
         this._state = $.extend(this._state, state || {});
         this._renderState();
         this.trigger('state-update', [this._state]);
-        this._deferredStateSave();
+
+        if (this.isDeferred() && !this._state.collapsed) {
+            // The deferred brick is rendered by the server with the saved state,
+            // so the state is saved before the loading.
+            this._stateSaveQuery().onComplete(function() {
+                                       creme.bricks.deferredBricksLoader().add(self);
+                                   })
+                                   .start();
+        } else {
+            this._deferredStateSave();
+        }
+
         return this;
     },
 
@@ -701,18 +714,25 @@ creme.bricks.Brick = creme.component.Component.sub({
         return this.setState(state);
     },
 
+    _stateSaveQuery: function() {
+        var state = this._state;
+
+        if (!this.isBound() || Object.isEmpty(this._stateSaveURL)) {
+            return new creme.component.Action(function() {
+                this.cancel('brick is not bound or has no state URL');
+            });
+        }
+
+        return creme.ajax.query(this._stateSaveURL, {action: 'post'}, {
+                                    id:                this._id,
+                                    is_open:           state.collapsed ? 0 : 1,
+                                    show_empty_fields: state.reduced ? 0 : 1
+                                });
+    },
+
     saveState: function() {
-        if (this.isBound()) {
-            var state = this._state;
-
-            if (!Object.isEmpty(this._stateSaveURL)) {
-                creme.ajax.query(this._stateSaveURL, {action: 'post'}, {
-                               id:                this._id,
-                               is_open:           state.collapsed ? 0 : 1,
-                               show_empty_fields: state.reduced ? 0 : 1
-                           })
-                           .start();
-            }
+        if (this.isBound() && !Object.isEmpty(this._stateSaveURL)) {
+            this._stateSaveQuery().start();
         }
 
         return this;
@@ -815,6 +835,10 @@ creme.bricks.Brick = creme.component.Component.sub({
         return this.isBound() && (this._element.attr('data-brick-readonly') === 'true');
     },
 
+    isDeferred: function() {
+        return this.isBound() && (this._element.attr('data-brick-deferred') === 'true');
+    },
+
     reloadingInfo: function() {
         if (!this.isBound()) {
             return {};
@@ -924,6 +948,24 @@ creme.bricks.BricksReloader.prototype = {
         return this;
     },
 
+    bricks: function(bricks) {
+        var ids = {};
+
+        bricks.forEach(function(brick) {
+            ids[brick.id()] = true;
+        });
+
+        if (bricks.length > 0) {
+            this.containerFromNode(bricks[0]._element);
+        }
+
+        this._brickFilter = function(brick) {
+            return ids[brick.id()] === true;
+        };
+
+        return this;
+    },
+
     sourceBrick: function(brick) {
         this.containerFromNode(brick._element);
         var src_deps = brick.dependencies();
@@ -1037,6 +1079,68 @@ creme.bricks.BricksReloader.prototype = {
     }
 };
 
+/*
+ * Loads the deferred bricks (ie: bricks which have been rendered as placeholders
+ * by the server ; see the attribute "deferred" of the python class Brick).
+ * The bricks which are added in the same event loop are loaded with one query.
+ */
+creme.bricks.DeferredBricksLoader = function(options) {
+    this._options = $.extend({
+        delay: 0
+    }, options || {});
+
+    this._pending = [];
+    this._timeout = null;
+};
+
+creme.bricks.DeferredBricksLoader.prototype = {
+    add: function(brick) {
+        if (this._pending.indexOf(brick) === -1) {
+            this._pending.push(brick);
+        }
+
+        if (this._timeout === null) {
+            this._timeout = window.setTimeout(this.flush.bind(this), this._options.delay);
+        }
+
+        return this;
+    },
+
+    pending: function() {
+        return this._pending.slice();
+    },
+
+    flush: function() {
+        var bricks = this._pending.filter(function(brick) {
+            return brick.isDeferred() && !brick.state().collapsed;
+        });
+
+        if (this._timeout !== null) {
+            window.clearTimeout(this._timeout);
+            this._timeout = null;
+        }
+
+        this._pending = [];
+
+        if (bricks.length > 0) {
+            new creme.bricks.BricksReloader().bricks(bricks)
+                                             .action()
+                                             .start();
+        }
+
+        return this;
+    }
+};
+
+var __deferredBricksLoader = null;
+
+creme.bricks.deferredBricksLoader = function() {
+    if (__deferredBricksLoader === null) {
+        __deferredBricksLoader = new creme.bricks.DeferredBricksLoader();
+    }
+
+    return __deferredBricksLoader;
+};
 
 creme.bricks.BrickLauncher = creme.widget.declare('brick', {
     _create: function(element, options, cb, sync, args) {
@@ -1046,6 +1150,11 @@ creme.bricks.BrickLauncher = creme.widget.declare('brick', {
 
         element.addClass('widget-ready');
         brick.trigger('ready', [options]);
+
+        // NB: the collapsed deferred bricks are loaded when they are expanded.
+        if (brick.isDeferred() && !brick.state().collapsed) {
+            creme.bricks.deferredBricksLoader().add(brick);
+        }
     },
 
     _destroy: function(element) {
@@ -42,4 +42,29 @@ creme.exports.exportAs = function(url, formats, fieldname) {
                          })
                         .open();
 };
+
+creme.exports.exportInBackground = function(url, formats, fieldname) {
+    formats = formats || [['', 'No backend found']];
+
+    return creme.dialogs.choice(gettext("Select the export format"), {
+                             title: gettext("Export in background"),
+                             choices: formats.map(function(item) {
+                                 return {value: item[0], label: item[1]};
+                             }),
+                             required: true
+                         })
+                        .onOk(function(event, data) {
+                            var urlinfo = new creme.ajax.URL(url);
+                            var args = {};
+                            args[fieldname] = data;
+                            urlinfo.searchData($.extend({}, urlinfo.searchData(), args));
+
+                            creme.utils.ajaxQuery(urlinfo.href(), {action: 'post', warnOnFail: true})
+                                       .onDone(function(event, redirectUrl) {
+                                            creme.utils.goTo(redirectUrl);
+                                        })
+                                       .start();
+                         })
+                        .open();
+};
 }(jQuery));
@@ -885,4 +885,61 @@ QUnit.test('creme.bricks.Brick.refresh (wildcard deps)', function(assert) {
     ], this.mockBackendUrlCalls('mock/brick/all/reload'));
 });
 
+QUnit.test('creme.bricks.Brick.isDeferred', function(assert) {
+    var brick = new creme.bricks.Brick();
+    equal(false, brick.isDeferred());
+
+    brick.bind($('<div class="brick ui-creme-widget" widget="brick" id="brick-A"></div>'));
+    equal(false, brick.isDeferred());
+
+    brick = new creme.bricks.Brick();
+    brick.bind($('<div class="brick ui-creme-widget" widget="brick" id="brick-B" data-brick-deferred="true"></div>'));
+    equal(true, brick.isDeferred());
+});
+
+QUnit.test('creme.bricks.DeferredBricksLoader', function(assert) {
+    var htmlA = '<div class="brick ui-creme-widget" widget="brick" id="brick-A" data-brick-deferred="true"></div>';
+    var htmlB = '<div class="brick ui-creme-widget" widget="brick" id="brick-B" data-brick-deferred="true"></div>';
+    var htmlC = '<div class="brick ui-creme-widget is-collapsed" widget="brick" id="brick-C" data-brick-deferred="true"></div>';
+    var htmlD = '<div class="brick ui-creme-widget" widget="brick" id="brick-D"></div>';
+
+    [htmlA, htmlB, htmlC, htmlD].forEach(function(html) {
+        creme.widget.create($(html).appendTo(this.qunitFixture()));
+    }.bind(this));
+
+    var loader = creme.bricks.deferredBricksLoader();
+    deepEqual(['brick-A', 'brick-B'], loader.pending().map(function(brick) { return brick.id(); }));
+    deepEqual([], this.mockBackendUrlCalls('mock/brick/all/reload'));
+
+    // One query for all the deferred bricks
+    loader.flush();
+    deepEqual([
+        ['GET', {"brick_id": ["brick-A", "brick-B"], "extra_data": "{}"}]
+    ], this.mockBackendUrlCalls('mock/brick/all/reload'));
+    deepEqual([], loader.pending());
+
+    // The loaded bricks are not deferred anymore
+    equal(false, $('#brick-A').creme().widget().brick().isDeferred());
+    equal(true, $('#brick-C').creme().widget().brick().isDeferred());
+});
+
+QUnit.test('creme.bricks.DeferredBricksLoader (expand a collapsed brick)', function(assert) {
+    var html = '<div class="brick ui-creme-widget is-collapsed" widget="brick" id="brick-A" data-brick-deferred="true"></div>';
+    var brick = creme.widget.create($(html).appendTo(this.qunitFixture())).brick();
+    var loader = creme.bricks.deferredBricksLoader();
+
+    deepEqual([], loader.pending());
+
+    brick.toggleState('collapsed');
+    deepEqual([
+        ['POST', {id: 'brick-A', is_open: 1, show_empty_fields: 1}]
+    ], this.mockBackendUrlCalls('mock/brick/status'));
+    deepEqual([brick], loader.pending());
+
+    loader.flush();
+    deepEqual([
+        ['GET', {"brick_id": ["brick-A"], "extra_data": "{}"}]
+    ], this.mockBackendUrlCalls('mock/brick/all/reload'));
+});
+
 }(jQuery));
@@ -22,10 +22,12 @@ import logging
 
 from django.template import Library, TemplateSyntaxError
 from django.template.base import TextNode
+from django.template.loader import get_template
 from django.utils.safestring import mark_safe, SafeData
 from django.utils.translation import gettext as _, gettext_lazy
 
 from ..core.entity_cell import EntityCellRegularField
+from ..core.paginator import FlowPaginator
 from ..core.sorter import cell_sorter_registry
 from ..gui.bricks import Brick, brick_registry, BricksManager
 from ..gui.bulk_update import bulk_update_registry
@@ -95,7 +97,19 @@ def brick_header_title(context, title, plural=None, empty=None, icon='info', cou
         ...
     """
     if count is None:
-        count = context.get('page').paginator.count if 'page' in context else 0
+        page = context.get('page')
+
+        if page is None:
+            count = 0
+        elif not isinstance(page.paginator, FlowPaginator):
+            count = page.paginator.count
+        elif page.has_other_pages() and any('{count}' in str(fmt) for fmt in (title, plural) if fmt):
+            # NB: the FlowPaginator does not count the objects ; we avoid the
+            #     query if the count is not displayed.
+            count = page.paginator.queryset.count()
+        else:
+            # NB: only used to know if the brick is empty.
+            count = len(page.object_list)
 
     if count == 0:
         title_fmt = empty or title
@@ -737,14 +751,40 @@ def brick_card_action_for_field(context, instance, field, user, **kwargs):
     )
 
 
-@register.inclusion_tag('creme_core/templatetags/bricks/pager.html')
+class BrickPagerRenderer:
+    template_name = 'creme_core/templatetags/bricks/pager.html'
+
+    def render(self, page):
+        return get_template(self.template_name).render(self.get_context(page))
+
+    def get_context(self, page):
+        context = PagerContext(page)
+        return {
+            'links': context.links,
+            'first': context.first,
+            'last': context.last,
+        }
+
+
+class FlowBrickPagerRenderer(BrickPagerRenderer):
+    template_name = 'creme_core/templatetags/bricks/pager-fast.html'
+
+    def get_context(self, page):
+        return {
+            'page': page,
+            'first_page_info': {'type': 'first'},
+        }
+
+
+PAGINATOR_RENDERERS = {
+    FlowPaginator: FlowBrickPagerRenderer,
+}
+
+
+@register.simple_tag
 def brick_pager(page):
-    context = PagerContext(page)
-    return {
-        'links': context.links,
-        'first': context.first,
-        'last': context.last,
-    }
+    renderer_class = PAGINATOR_RENDERERS.get(page.paginator.__class__, BrickPagerRenderer)
+    return renderer_class().render(page)
 
 
 @register.simple_tag(takes_context=True)
@@ -875,6 +915,12 @@ def brick_display(context, *bricks, **kwargs):
     Possible values are:
        - 'detail'  => detailview_display() (default value)
        - 'home'    => home_display()
+
+    The bricks with the attribute "deferred=True" are rendered as placeholders,
+    which are loaded by the browser with the bricks' reloading URL of the page.
+    You can render them immediately with the keyword argument 'deferred':
+
+        {% brick_display my_brick1 my_brick2 deferred=False %}
     """
     from creme.creme_core.views.bricks import render_detailview_brick, render_home_brick
 
@@ -890,6 +936,13 @@ def brick_display(context, *bricks, **kwargs):
             '{% brick_display %}: "render" argument must be in {detail|home}.'
         )
 
+    if kwargs.get('deferred', True):
+        render_now = render
+
+        def render(brick, context):
+            return brick.deferred_display(context) if getattr(brick, 'deferred', False) else \
+                   render_now(brick, context)
+
     bricks_to_render = []
 
     def pop_group(brick_id):
@@ -2,7 +2,7 @@
 
 ################################################################################
 #    Creme is a free/open-source Customer Relationship Management software
-#    Copyright (C) 2009-2019  Hybird
+#    Copyright (C) 2009-2020  Hybird
 #
 #    This program is free software: you can redistribute it and/or modify
 #    it under the terms of the GNU Affero General Public License as published by
@@ -21,8 +21,8 @@
 from collections import defaultdict
 import logging
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-# from django.conf import settings
 # from django.db.models import ForeignKey, ManyToManyField, BooleanField, DateField
 from django.template import Library
 from django.template.loader import get_template
@@ -79,6 +79,7 @@ def listview_entity_filters(*, model, user, efilters, show_buttons):
         'can_edit': can_edit,
         'can_delete': can_delete,
         'show_buttons': show_buttons,
+        'materialization_enabled': settings.ENTITY_FILTERS_MATERIALIZATION,
     }
 
 
@@ -400,6 +400,14 @@ class FilterConditionHandlerTestCase(CremeTestCase):
         self.assertIs(handler.accept(entity=doc2, user=user), False)
         self.assertIs(handler.accept(entity=doc3, user=user), False)
 
+        # Bulk version: the folders are retrieved with one query
+        docs = [*FakeDocument.objects.filter(id__in=[doc1.id, doc2.id, doc3.id])]
+
+        with self.assertNumQueries(1):
+            accepted_ids = handler.accept_many(entities=docs, user=user)
+
+        self.assertSetEqual({doc1.id}, accepted_ids)
+
     def test_regularfield_accept_fk04(self):
         "Nullable nested ForeignKey (sub-field)."
         user = self.login()
@@ -1723,6 +1731,15 @@ class FilterConditionHandlerTestCase(CremeTestCase):
         self.assertIs(handler1.accept(entity=redtail,   user=user), False)
         self.assertIs(handler1.accept(entity=bebop,     user=user), True)
 
+        # Bulk version (custom-values + enum-values => 2 queries)
+        orgas = [*FakeOrganisation.objects.filter(id__in=[bebop.id, swordfish.id, redtail.id])]
+        self.assertIs(handler1.custom_field, handler1.custom_field)  # Cached
+
+        with self.assertNumQueries(2):
+            accepted_ids = handler1.accept_many(entities=orgas, user=user)
+
+        self.assertSetEqual({swordfish.id, bebop.id}, accepted_ids)
+
         # ISEMPTY ---
         handler2 = CustomFieldConditionHandler(
             model=FakeOrganisation,
@@ -2889,6 +2906,46 @@ class FilterConditionHandlerTestCase(CremeTestCase):
         self.assertIs(handler4.accept(entity=shinji, user=user), True)
         self.assertIs(handler4.accept(entity=asuka,  user=user), False)
 
+    def test_relation_accept_many(self):
+        user = self.login()
+        loves = RelationType.create(('test-subject_love', 'Is loving'),
+                                    ('test-object_love',  'Is loved by')
+                                   )[0]
+
+        create_contact = partial(FakeContact.objects.create, user=user)
+        shinji = create_contact(last_name='Ikari',     first_name='Shinji')
+        rei    = create_contact(last_name='Ayanami',   first_name='Rei')
+        misato = create_contact(last_name='Katsuragi', first_name='Misato')
+
+        nerv = FakeOrganisation.objects.create(user=user, name='Nerv')
+
+        create_rel = partial(Relation.objects.create, user=user, type=loves)
+        create_rel(subject_entity=shinji, object_entity=rei)
+        create_rel(subject_entity=misato, object_entity=nerv)
+
+        contacts = [*FakeContact.objects.filter(id__in=[shinji.id, rei.id, misato.id])]
+
+        handler1 = RelationConditionHandler(model=FakeContact, rtype=loves.id)
+
+        # Relations + real object entities (1 query per ContentType)
+        with self.assertNumQueries(3):
+            self.assertSetEqual({shinji.id, misato.id},
+                                handler1.accept_many(entities=contacts, user=user)
+                               )
+
+        # The relations are cached
+        handler2 = RelationConditionHandler(model=FakeContact, rtype=loves.id, exclude=True)
+
+        with self.assertNumQueries(0):
+            self.assertSetEqual({rei.id}, handler2.accept_many(entities=contacts, user=user))
+
+        handler3 = RelationConditionHandler(
+            model=FakeContact,
+            rtype=loves.id,
+            ctype=ContentType.objects.get_for_model(FakeContact),
+        )
+        self.assertSetEqual({shinji.id}, handler3.accept_many(entities=contacts, user=user))
+
     def test_relation_description01(self):
         user = self.login()
 
@@ -3855,6 +3912,36 @@ class FilterConditionHandlerTestCase(CremeTestCase):
         self.assertIs(handler2.accept(entity=shinji, user=user), True)
         self.assertIs(handler2.accept(entity=misato, user=user), True)
 
+    def test_property_accept_many(self):
+        user = self.login()
+        create_ptype = CremePropertyType.create
+        cute = create_ptype(str_pk='test-prop_cute',  text='Cute')
+        pilot = create_ptype(str_pk='test-prop_pilot', text='Pilot')
+
+        create_contact = partial(FakeContact.objects.create, user=user)
+        shinji = create_contact(last_name='Ikari',     first_name='Shinji')
+        rei    = create_contact(last_name='Ayanami',   first_name='Rei')
+        misato = create_contact(last_name='Katsuragi', first_name='Misato')
+
+        create_prop = CremeProperty.objects.create
+        create_prop(creme_entity=rei,    type=cute)
+        create_prop(creme_entity=shinji, type=pilot)
+
+        contacts = [*FakeContact.objects.filter(id__in=[shinji.id, rei.id, misato.id])]
+
+        handler1 = PropertyConditionHandler(model=FakeContact, ptype=cute.id)
+
+        with self.assertNumQueries(1):
+            self.assertSetEqual({rei.id}, handler1.accept_many(entities=contacts, user=user))
+
+        # The properties are cached
+        handler2 = PropertyConditionHandler(model=FakeContact, ptype=cute.id, exclude=True)
+
+        with self.assertNumQueries(0):
+            self.assertSetEqual({shinji.id, misato.id},
+                                handler2.accept_many(entities=contacts, user=user)
+                               )
+
     def test_property_description01(self):
         user = self.login()
         cute = CremePropertyType.create(str_pk='test-prop_cute', text='Cute')
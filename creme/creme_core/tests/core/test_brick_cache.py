@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+try:
+    from django.contrib.sessions.backends.base import SessionBase
+    from django.core.cache import caches
+    from django.test import RequestFactory
+    from django.test.utils import override_settings
+
+    from creme.creme_core.core.brick_cache import brick_cache
+    from creme.creme_core.gui.bricks import Brick
+    from creme.creme_core.models import (CremeProperty, CremePropertyType,
+            FakeContact, FakeOrganisation)
+    from creme.creme_core.tests.base import CremeTestCase
+    from creme.creme_core.views.bricks import build_context, render_detailview_brick
+except Exception as e:
+    print('Error in <{}>: {}'.format(__name__, e))
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'creme_core-tests-default',
+    },
+    'bricks': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'creme_core-tests-bricks',
+    },
+}
+
+
+class _CountingBrick(Brick):
+    id_ = Brick.generate_id('creme_core', 'BrickCacheTestCase')
+    dependencies = (CremeProperty,)
+    cacheable = True
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def detailview_display(self, context):
+        self.calls += 1
+
+        return '<div>{} #{}</div>'.format(context['object'], self.calls)
+
+
+@override_settings(CACHES=CACHES, BRICKS_CACHE_ALIAS='bricks')
+class BrickCacheTestCase(CremeTestCase):
+    def setUp(self):
+        super().setUp()
+        caches['bricks'].clear()
+        self.factory = RequestFactory()
+
+    def _build_context(self, entity, url='/', user=None):
+        request = self.factory.get(url)
+        request.session = SessionBase()
+        request.user = user or self.user
+
+        return build_context(request, object=entity)
+
+    def _render(self, brick, entity, **kwargs):
+        return render_detailview_brick(brick, self._build_context(entity, **kwargs))
+
+    def test_cached(self):
+        user = self.login()
+        ptype = CremePropertyType.create(str_pk='test-prop_foobar', text='is foobar')
+
+        create_contact = FakeContact.objects.create
+        spike = create_contact(user=user, first_name='Spike', last_name='Spiegel')
+        jet   = create_contact(user=user, first_name='Jet',   last_name='Black')
+
+        brick = _CountingBrick()
+        html = self._render(brick, spike)
+        self.assertEqual(1, brick.calls)
+        self.assertEqual(html, self._render(brick, spike))
+        self.assertEqual(1, brick.calls)
+
+        # Other entity/user/page
+        self._render(brick, jet)
+        self.assertEqual(2, brick.calls)
+
+        self._render(brick, spike, user=self.other_user)
+        self.assertEqual(3, brick.calls)
+
+        self._render(brick, spike, url='/?{}_page=2'.format(brick.id_))
+        self.assertEqual(4, brick.calls)
+
+        # Invalidation by an instance linked to the entity
+        CremeProperty.objects.create(type=ptype, creme_entity=jet)
+        self.assertEqual(html, self._render(brick, spike))
+        self.assertEqual(4, brick.calls)
+
+        CremeProperty.objects.create(type=ptype, creme_entity=spike)
+        self.assertNotEqual(html, self._render(brick, spike))
+        self.assertEqual(5, brick.calls)
+
+        # Invalidation by the entity
+        spike.description = 'Bounty hunter'
+        spike.save()
+        self._render(brick, spike)
+        self.assertEqual(6, brick.calls)
+
+    def test_not_cacheable(self):
+        user = self.login()
+        spike = FakeContact.objects.create(user=user, first_name='Spike', last_name='Spiegel')
+
+        brick = _CountingBrick()
+        brick.cacheable = False
+        self._render(brick, spike)
+        self._render(brick, spike)
+        self.assertEqual(2, brick.calls)
+
+    @override_settings(BRICKS_CACHE_ALIAS=None)
+    def test_disabled(self):
+        user = self.login()
+        spike = FakeContact.objects.create(user=user, first_name='Spike', last_name='Spiegel')
+
+        brick = _CountingBrick()
+        self._render(brick, spike)
+        self._render(brick, spike)
+        self.assertEqual(2, brick.calls)
+
+    def test_concerned_by(self):
+        user = self.login()
+        ptype = CremePropertyType.create(str_pk='test-prop_foobar', text='is foobar')
+        spike = FakeContact.objects.create(user=user, first_name='Spike', last_name='Spiegel')
+        bebop = FakeOrganisation.objects.create(user=user, name='Bebop')
+
+        models, entities_ids = brick_cache.concerned_by(spike)
+        self.assertEqual(FakeContact, models[0])
+        self.assertIn(spike.id, entities_ids)
+
+        prop = CremeProperty.objects.create(type=ptype, creme_entity=bebop)
+        self.assertEqual(((CremeProperty,), {bebop.id}), brick_cache.concerned_by(prop))
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+try:
+    from unittest.mock import patch
+
+    from django.core.cache import caches
+    from django.test.utils import override_settings
+
+    from creme.creme_core.core.config_cache import ConfigCache, config_cache
+    from creme.creme_core.models import FieldsConfig, FakeContact, FakeOrganisation
+    from creme.creme_core.tests.base import CremeTestCase
+except Exception as e:
+    print('Error in <{}>: {}'.format(__name__, e))
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'creme_core-tests-default',
+    },
+    'config': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'creme_core-tests-config',
+    },
+}
+
+
+@override_settings(CACHES=CACHES, CONFIG_CACHE_ALIAS='config')
+class ConfigCacheTestCase(CremeTestCase):
+    def setUp(self):
+        super().setUp()
+        caches['config'].clear()
+
+    @override_settings(CONFIG_CACHE_ALIAS=None)
+    def test_disabled(self):
+        cache = ConfigCache()
+        self.assertIsNone(cache.backend)
+
+        cache.set_many(FakeContact, {1: 'foo'})
+        self.assertDictEqual({}, cache.get_many(FakeContact, [1]))
+
+        with self.assertNoException():
+            cache.invalidate(FakeContact)
+
+    def test_get_n_set(self):
+        cache = ConfigCache()
+        self.assertIs(caches['config'], cache.backend)
+        self.assertDictEqual({}, cache.get_many(FakeContact, [1, 2]))
+
+        cache.set_many(FakeContact, {1: 'foo', 2: 'bar'})
+        cache.set_many(FakeOrganisation, {1: 'baz'})
+        self.assertDictEqual({1: 'foo', 2: 'bar'}, cache.get_many(FakeContact, [1, 2, 3]))
+        self.assertDictEqual({1: 'baz'}, cache.get_many(FakeOrganisation, [1, 2]))
+        self.assertDictEqual({}, cache.get_many(FakeContact, []))
+
+        # Not stored in the default cache
+        self.assertFalse(any(
+            key.startswith(':1:' + cache.key_prefix)
+                for key in caches['default']._cache.keys()
+        ))
+
+    def test_invalidate(self):
+        cache = ConfigCache()
+        cache.set_many(FakeContact, {1: 'foo'})
+        cache.set_many(FakeOrganisation, {1: 'bar'})
+
+        cache.invalidate(FakeContact)
+        self.assertDictEqual({}, cache.get_many(FakeContact, [1]))
+        self.assertDictEqual({1: 'bar'}, cache.get_many(FakeOrganisation, [1]))
+
+        cache.set_many(FakeContact, {1: 'baz'})
+        self.assertDictEqual({1: 'baz'}, cache.get_many(FakeContact, [1]))
+
+    def test_get_generations(self):
+        cache = ConfigCache()
+        generations = cache.get_generations(FakeContact, FakeOrganisation)
+        self.assertIsInstance(generations, tuple)
+        self.assertEqual(2, len(generations))
+        self.assertEqual(generations, cache.get_generations(FakeContact, FakeOrganisation))
+
+        cache.invalidate(FakeOrganisation)
+        generations2 = cache.get_generations(FakeContact, FakeOrganisation)
+        self.assertEqual(generations[0], generations2[0])
+        self.assertNotEqual(generations[1], generations2[1])
+
+        with override_settings(CONFIG_CACHE_ALIAS=None):
+            self.assertIsNone(cache.get_generations(FakeContact))
+
+    def test_invalidate_evicted_generation(self):
+        "The generation has been evicted, but not the values."
+        cache = ConfigCache()
+        cache.set_many(FakeContact, {1: 'foo'})
+
+        caches['config'].delete(cache._generation_key(FakeContact))
+        self.assertDictEqual({}, cache.get_many(FakeContact, [1]))
+
+    def test_invalidate_on_commit(self):
+        cache = ConfigCache()
+        cache.set_many(FakeContact, {1: 'foo'})
+        cache.set_many(FakeOrganisation, {1: 'bar'})
+
+        with patch('django.db.transaction.on_commit') as on_commit:
+            cache.invalidate_on_commit(FakeContact)
+
+        self.assertDictEqual({}, cache.get_many(FakeContact, [1]))
+        self.assertDictEqual({1: 'bar'}, cache.get_many(FakeOrganisation, [1]))
+        on_commit.assert_called_once()
+
+        # A concurrent request has cached an old value before the commit
+        cache.set_many(FakeContact, {1: 'baz'})
+        on_commit.call_args[0][0]()
+        self.assertDictEqual({}, cache.get_many(FakeContact, [1]))
+        self.assertDictEqual({1: 'bar'}, cache.get_many(FakeOrganisation, [1]))
+
+    def test_signals(self):
+        "FieldsConfig is registered."
+        config_cache.set_many(FieldsConfig, {1: 'foo'})
+
+        fconf = FieldsConfig.create(FakeContact)
+        self.assertDictEqual({}, config_cache.get_many(FieldsConfig, [1]))
+
+        config_cache.set_many(FieldsConfig, {1: 'foo'})
+        fconf.delete()
+        self.assertDictEqual({}, config_cache.get_many(FieldsConfig, [1]))
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+try:
+    from unittest.mock import patch
+
+    from django.core.cache import caches
+    from django.test.utils import override_settings
+
+    from creme.creme_core.core import entity_count
+    from creme.creme_core.core.entity_count import (EntitiesCounter,
+            CachedEntitiesCounter, EstimatedEntitiesCounter, get_entities_counter)
+    from creme.creme_core.models import FakeContact, FakeOrganisation
+    from creme.creme_core.signals import post_replace_in_bulk
+    from creme.creme_core.tests.base import CremeTestCase
+except Exception as e:
+    print('Error in <{}>: {}'.format(__name__, e))
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'creme_core-tests-default',
+    },
+    'config': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'creme_core-tests-config',
+    },
+}
+
+
+class _Compute:
+    def __init__(self, count):
+        self.count = count
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.count
+
+
+@override_settings(CACHES=CACHES, CONFIG_CACHE_ALIAS='config')
+class EntitiesCounterTestCase(CremeTestCase):
+    def setUp(self):
+        super().setUp()
+        caches['config'].clear()
+
+    def test_get_entities_counter(self):
+        with override_settings(ENTITIES_COUNT_MODE='exact'):
+            self.assertIs(type(get_entities_counter()), EntitiesCounter)
+
+        with override_settings(ENTITIES_COUNT_MODE='cached', ENTITIES_COUNT_CACHE_TIMEOUT=60):
+            counter = get_entities_counter()
+            self.assertIs(type(counter), CachedEntitiesCounter)
+            self.assertEqual(60, counter.timeout)
+
+        with override_settings(ENTITIES_COUNT_MODE='estimated'):
+            self.assertIs(type(get_entities_counter()), EstimatedEntitiesCounter)
+
+        with override_settings(ENTITIES_COUNT_MODE='invalid'):
+            self.assertIs(type(get_entities_counter()), EntitiesCounter)
+
+    def test_exact(self):
+        user = self.login()
+        compute = _Compute(12)
+        counter = EntitiesCounter()
+
+        self.assertEqual((12, False), counter.count(model=FakeContact, user=user, compute=compute))
+        self.assertEqual((12, False), counter.count(model=FakeContact, user=user, compute=compute))
+        self.assertEqual(2, compute.calls)
+
+    @override_settings(ENTITIES_COUNT_MODE='cached')
+    def test_cached01(self):
+        user = self.login()
+        other_user = self.other_user
+        counter = CachedEntitiesCounter(timeout=60)
+
+        compute = _Compute(12)
+        self.assertEqual((12, False), counter.count(model=FakeContact, user=user, compute=compute))
+        self.assertEqual((12, False), counter.count(model=FakeContact, user=user, compute=compute))
+        self.assertEqual(1, compute.calls)
+
+        # Other model/user/key => other counts
+        self.assertEqual((3, False), counter.count(model=FakeOrganisation, user=user, compute=_Compute(3)))
+        self.assertEqual((4, False), counter.count(model=FakeContact, user=other_user, compute=_Compute(4)))
+        self.assertEqual((5, False), counter.count(model=FakeContact, user=user, compute=_Compute(5), key='foo'))
+        self.assertEqual((12, False), counter.count(model=FakeContact, user=user, compute=compute))
+
+        # Invalidation
+        FakeContact.objects.create(user=user, first_name='Spike', last_name='Spiegel')
+        self.assertEqual((13, False), counter.count(model=FakeContact, user=user, compute=_Compute(13)))
+        self.assertEqual((3, False), counter.count(model=FakeOrganisation, user=user, compute=_Compute(33)))
+
+    @override_settings(ENTITIES_COUNT_MODE='cached')
+    def test_cached_bulk_replace(self):
+        "Invalidation by the signal post_replace_in_bulk."
+        user = self.login()
+        counter = CachedEntitiesCounter(timeout=60)
+
+        self.assertEqual((12, False), counter.count(model=FakeContact, user=user, compute=_Compute(12)))
+        self.assertEqual((3, False), counter.count(model=FakeOrganisation, user=user, compute=_Compute(3)))
+
+        contact = FakeContact.objects.create(user=user, first_name='Spike', last_name='Spiegel')
+        self.assertEqual((13, False), counter.count(model=FakeContact, user=user, compute=_Compute(13)))
+
+        post_replace_in_bulk.send(sender=FakeContact,
+                                  model_field=FakeContact._meta.get_field('sector'),
+                                  instances=[contact],
+                                 )
+        self.assertEqual((14, False), counter.count(model=FakeContact, user=user, compute=_Compute(14)))
+        self.assertEqual((3, False), counter.count(model=FakeOrganisation, user=user, compute=_Compute(33)))
+
+    @override_settings(ENTITIES_COUNT_MODE='cached', CONFIG_CACHE_ALIAS=None)
+    def test_cached02(self):
+        "Cache disabled."
+        user = self.login()
+        compute = _Compute(12)
+        counter = CachedEntitiesCounter(timeout=60)
+
+        self.assertEqual((12, False), counter.count(model=FakeContact, user=user, compute=compute))
+        self.assertEqual((12, False), counter.count(model=FakeContact, user=user, compute=compute))
+        self.assertEqual(2, compute.calls)
+
+    @override_settings(ENTITIES_COUNT_MODE='estimated', FAST_QUERY_MODE_THRESHOLD=1000)
+    def test_estimated(self):
+        user = self.login()
+        counter = EstimatedEntitiesCounter(timeout=60)
+
+        with patch.object(entity_count, 'estimate_rows_count', return_value=5000):
+            self.assertEqual((5000, True),
+                             counter.count(model=FakeContact, user=user,
+                                           compute=_Compute(4999), unfiltered=True,
+                                          )
+                            )
+
+            # Filtered list => cached exact count
+            self.assertEqual((12, False),
+                             counter.count(model=FakeContact, user=user,
+                                           compute=_Compute(12), key='foo',
+                                          )
+                            )
+
+            # Not a super-user (the credentials filter the entities)
+            self.assertEqual((4, False),
+                             counter.count(model=FakeContact, user=self.other_user,
+                                           compute=_Compute(4), unfiltered=True,
+                                          )
+                            )
+
+        # Small table
+        with patch.object(entity_count, 'estimate_rows_count', return_value=500):
+            self.assertEqual((498, False),
+                             counter.count(model=FakeOrganisation, user=user,
+                                           compute=_Compute(498), unfiltered=True,
+                                          )
+                            )
+
+        # No statistics
+        with patch.object(entity_count, 'estimate_rows_count', return_value=None):
+            self.assertEqual((6, False),
+                             counter.count(model=FakeContact, user=user,
+                                           compute=_Compute(6), unfiltered=True, key='bar',
+                                          )
+                            )
@@ -2,13 +2,25 @@
 
 try:
     from datetime import timedelta
+    from io import StringIO
+    import os
+    from os.path import join
+    import socket
+    import sys
+    from tempfile import TemporaryDirectory
+    from threading import Thread
+    from unittest import skipIf
+    from unittest.mock import patch
 
     from django.test.utils import override_settings
     from django.utils.timezone import now
 
     from ..base import CremeTestCase
 
-    from creme.creme_core.core.job import JobManager, _JobTypeRegistry
+    from creme.creme_core.core import job as job_module
+    from creme.creme_core.core.job import (JobManager, _JobTypeRegistry,
+            _JobWorker, _JobWorkersPool, job_type_registry,
+            _UnixSocketJobManagerQueue, CMD_START, CMD_END, CMD_REFRESH, CMD_PING)
     from creme.creme_core.core.reminder import Reminder, reminder_registry
     from creme.creme_core.creme_jobs import reminder_type
     from creme.creme_core.creme_jobs.base import JobType
@@ -90,6 +102,168 @@ class JobTypeRegistryTestCase(CremeTestCase):
                          str(cm.exception)
                         )
 
+    def test_serve(self):
+        job = Job.objects.get(type_id=reminder_type.id)
+        output = StringIO()
+        job_type_registry.serve(input_file=StringIO('{}\n'.format(job.id)),
+                                output_file=output,
+                                close_connections=False,
+                               )
+
+        job = self.refresh(job)
+        self.assertEqual(Job.STATUS_OK, job.status)
+
+        job_id, max_rss = output.getvalue().split('-')
+        self.assertEqual(str(job.id), job_id)
+        self.assertTrue(max_rss.endswith('\n'))
+        self.assertGreaterEqual(int(max_rss), 0)
+
+
+class JobWorkersPoolTestCase(CremeTestCase):
+    def test_must_be_recycled(self):
+        class FakeWorker:
+            def __init__(self, jobs_count, max_rss):
+                self.jobs_count = jobs_count
+                self.max_rss = max_rss
+
+        pool = _JobWorkersPool(size=2, max_jobs=10, max_memory=100)
+        self.assertFalse(pool._must_be_recycled(FakeWorker(jobs_count=9,  max_rss=100 * 1024)))
+        self.assertTrue(pool._must_be_recycled(FakeWorker(jobs_count=10, max_rss=1024)))
+        self.assertTrue(pool._must_be_recycled(FakeWorker(jobs_count=1,  max_rss=100 * 1024 + 1)))
+
+        pool = _JobWorkersPool(size=2, max_jobs=10, max_memory=0)
+        self.assertFalse(pool._must_be_recycled(FakeWorker(jobs_count=1, max_rss=10 ** 9)))
+
+    def test_get_max_rss(self):
+        class FakeUsage:
+            ru_maxrss = 2048
+
+        with patch.object(job_module, 'getrusage', return_value=FakeUsage()):
+            with patch.object(sys, 'platform', 'linux'):
+                self.assertEqual(2048, job_module._get_max_rss())
+
+            with patch.object(sys, 'platform', 'darwin'):  # In bytes
+                self.assertEqual(2, job_module._get_max_rss())
+
+        with patch.object(job_module, 'getrusage', None):
+            self.assertEqual(0, job_module._get_max_rss())
+
+    @skipIf(sys.platform == 'win32', 'The pipes cannot be polled on Windows')
+    def test_release_finished_workers(self):
+        "The worker of a job which has crashed (no command END) is released."
+        class FakeProcess:
+            def __init__(self):
+                read_fd, write_fd = os.pipe()
+                self.stdout = os.fdopen(read_fd, 'r')
+                self.stdin = os.fdopen(write_fd, 'w')
+
+        class FakeWorker(_JobWorker):
+            def __init__(self):
+                self.process = FakeProcess()
+                self.jobs_count = 1
+                self.max_rss = 0
+
+            def stop(self):
+                self.process.stdin.close()
+                self.process.stdout.close()
+
+        class FakePool:
+            def __init__(self):
+                self.released = []
+
+            def release(self, worker):
+                self.released.append((worker, worker.wait_job()))
+
+        worker1 = FakeWorker()
+        worker2 = FakeWorker()
+
+        manager = JobManager()
+        manager._pool = pool = FakePool()
+        manager._workers = {1: worker1, 2: worker2}
+        manager._running_userjob_ids = {1, 2}
+
+        try:
+            manager._release_finished_workers()
+            self.assertFalse(pool.released)
+
+            # The job 1 has crashed before sending END ; serve() writes its line anyway
+            worker1.process.stdin.write('1-1024\n')
+            worker1.process.stdin.flush()
+
+            manager._release_finished_workers()
+            self.assertListEqual([(worker1, True)], pool.released)
+            self.assertEqual(1024, worker1.max_rss)
+            self.assertDictEqual({2: worker2}, manager._workers)
+            self.assertSetEqual({2}, manager._running_userjob_ids)
+        finally:
+            worker1.stop()
+            worker2.stop()
+
+
+@skipIf(not hasattr(socket, 'AF_UNIX'), 'Unix domain sockets are not available')
+class UnixSocketJobManagerQueueTestCase(CremeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = TemporaryDirectory()
+        self.queue = _UnixSocketJobManagerQueue(path=join(self.tmp_dir.name, 'jobs.sock'))
+
+    def tearDown(self):
+        super().tearDown()
+        self.queue.close()
+        self.tmp_dir.cleanup()
+
+    def test_commands(self):
+        queue = self.queue
+        queue.clear()  # Binds the socket
+        job = Job.objects.get(type_id=reminder_type.id)
+
+        self.assertFalse(queue.start_job(job))
+        queue.end_job(job)
+        self.assertFalse(queue.refresh_job(job, {'enabled': False}))
+
+        cmd1 = queue.get_command(1)
+        self.assertEqual(CMD_START, cmd1.type)
+        self.assertEqual(job.id,    cmd1.data_id)
+
+        cmd2 = queue.get_command(1)
+        self.assertEqual(CMD_END, cmd2.type)
+        self.assertEqual(job.id,  cmd2.data_id)
+
+        cmd3 = queue.get_command(1)
+        self.assertEqual(CMD_REFRESH,        cmd3.type)
+        self.assertEqual(job.id,             cmd3.data_id)
+        self.assertEqual({'enabled': False}, cmd3.data)
+
+        self.assertIsNone(queue.get_command(1))  # Timeout
+
+    def test_no_manager(self):
+        queue = self.queue
+        job = Job.objects.get(type_id=reminder_type.id)
+
+        with self.assertLogs(level='CRITICAL'):
+            self.assertTrue(queue.start_job(job))
+
+        self.assertEqual(str(queue._manager_error), queue.ping())
+
+    def test_ping(self):
+        manager_queue = self.queue
+        manager_queue.clear()
+        pings = []
+
+        def manager():
+            cmd = manager_queue.get_command(5)
+            pings.append(cmd)
+            manager_queue.pong(cmd.data_id)
+
+        thread = Thread(target=manager)
+        thread.start()
+
+        self.assertIsNone(_UnixSocketJobManagerQueue(path=manager_queue._path).ping())
+        thread.join()
+
+        self.assertEqual(1, len(pings))
+        self.assertEqual(CMD_PING, pings[0].type)
+
 
 class JobManagerTestCase(CremeTestCase):
     def setUp(self):
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+try:
+    from functools import partial
+
+    from django.contrib.contenttypes.models import ContentType
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+
+    from creme.creme_core.core.search import (
+        Searcher, get_search_backend,
+        FieldsSearchBackend, IndexSearchBackend,
+    )
+    from creme.creme_core.models import SearchConfigItem, SearchIndexToken, FieldsConfig
+    from creme.creme_core.tests.base import CremeTestCase
+    from creme.creme_core.tests.fake_models import FakeContact, FakeOrganisation, FakeSector
+except Exception as e:
+    print('Error in <{}>: {}'.format(__name__, e))
+
+
+class SearchBackendTestCase(CremeTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls._sci_backup = [*SearchConfigItem.objects.all()]
+        SearchConfigItem.objects.all().delete()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+
+        SearchConfigItem.objects.all().delete()
+        SearchConfigItem.objects.bulk_create(cls._sci_backup)
+
+    def _build_contacts(self):
+        SearchConfigItem.create_if_needed(FakeContact, ['first_name', 'last_name', 'sector__title'])
+        sector = FakeSector.objects.create(title='Linux dev')
+
+        create_contact = partial(FakeContact.objects.create, user=self.user)
+        self.linus  = create_contact(first_name='Linus',  last_name='Torvalds')
+        self.alan   = create_contact(first_name='Alan',   last_name='Cox', description='Cool beard')
+        self.andrew = create_contact(first_name='Andrew', last_name='Morton', sector=sector)
+        self.emile  = create_contact(first_name='Émile',  last_name='Zola-Martin')
+
+    def _search(self, backend, *words):
+        fields = [*SearchConfigItem.objects.get(
+            content_type=ContentType.objects.get_for_model(FakeContact),
+        ).searchfields]
+        return {*backend.search(FakeContact, words, fields)}
+
+    def test_default_backend(self):
+        self.assertIsInstance(get_search_backend(), FieldsSearchBackend)
+
+        with override_settings(SEARCH_BACKEND='creme.creme_core.core.search.IndexSearchBackend'):
+            self.assertIsInstance(get_search_backend(), IndexSearchBackend)
+
+    def test_fields_backend(self):
+        self.login()
+        self._build_contacts()
+
+        backend = FieldsSearchBackend()
+        self.assertEqual({self.linus, self.andrew}, self._search(backend, 'linu'))
+        self.assertEqual({self.linus},              self._search(backend, 'linu', 'orva'))
+        self.assertEqual(set(),                     self._search(backend, 'beard'))
+
+        self.assertFalse(SearchIndexToken.objects.exists())
+
+    def test_tokenize(self):
+        tokenize = IndexSearchBackend().tokenize
+        self.assertEqual({'emile', 'zola', 'martin'}, tokenize('Émile Zola-Martin'))
+        self.assertEqual({'42'}, tokenize(42))
+        self.assertEqual(set(), tokenize(' - '))
+        self.assertEqual({'a' * 50}, tokenize('a' * 60))
+
+    @override_settings(SEARCH_BACKEND='creme.creme_core.core.search.IndexSearchBackend')
+    def test_index_backend(self):
+        self.login()
+        self._build_contacts()
+
+        linus = self.linus
+        self.assertSetEqual(
+            {('first_name', 'linus'), ('last_name', 'torvalds')},
+            {*SearchIndexToken.objects.filter(entity=linus.id).values_list('field_name', 'token')},
+        )
+        self.assertTrue(SearchIndexToken.objects.filter(entity=self.andrew.id,
+                                                        field_name='sector__title',
+                                                        token='linux',
+                                                       ).exists()
+                       )
+        # Not a search field
+        self.assertFalse(SearchIndexToken.objects.filter(token='beard').exists())
+
+        backend = IndexSearchBackend()
+        self.assertEqual({linus, self.andrew}, self._search(backend, 'linu'))
+        self.assertEqual({linus},              self._search(backend, 'LINU', 'torv'))
+        self.assertEqual({self.emile},         self._search(backend, 'emile'))
+        self.assertEqual({self.emile},         self._search(backend, 'zola-mar'))
+        # A word must be the beginning of a token
+        self.assertEqual(set(),                self._search(backend, 'orva'))
+        # A word without token matches nothing
+        self.assertEqual(set(),                self._search(backend, '!!'))
+        self.assertEqual(set(),                self._search(backend, 'linu', '!!'))
+
+        # Update
+        linus.last_name = 'Benedict'
+        linus.save()
+        self.assertEqual(set(),    self._search(backend, 'torv'))
+        self.assertEqual({linus}, self._search(backend, 'bene'))
+
+        # Deletion
+        linus.delete()
+        self.assertFalse(SearchIndexToken.objects.filter(entity=linus.id).exists())
+
+    @override_settings(SEARCH_BACKEND='creme.creme_core.core.search.IndexSearchBackend')
+    def test_index_backend_default_config(self):
+        "No configuration => all the fields are indexed."
+        user = self.login()
+        orga = FakeOrganisation.objects.create(user=user, name='Nerv', description='Secret base')
+
+        tokens = {*SearchIndexToken.objects.filter(entity=orga.id).values_list('field_name', 'token')}
+        self.assertIn(('name', 'nerv'), tokens)
+        self.assertIn(('description', 'secret'), tokens)
+
+    @override_settings(SEARCH_BACKEND='creme.creme_core.core.search.IndexSearchBackend')
+    def test_searcher(self):
+        self.login()
+        self._build_contacts()
+        FieldsConfig.create(FakeContact, descriptions=[('sector', {FieldsConfig.HIDDEN: True})])
+
+        searcher = Searcher([FakeContact], self.user)
+        self.assertIsInstance(searcher.backend, IndexSearchBackend)
+        self.assertEqual({self.linus}, {*searcher.search(FakeContact, 'torvalds')})
+        # Hidden field
+        self.assertEqual({self.linus}, {*searcher.search(FakeContact, 'linu')})
+
+        searcher = Searcher([FakeContact], self.user, backend=FieldsSearchBackend())
+        self.assertIsInstance(searcher.backend, FieldsSearchBackend)
+        self.assertEqual({self.linus}, {*searcher.search(FakeContact, 'orva')})
+
+    def test_command(self):
+        self.login()
+        self._build_contacts()
+        self.assertFalse(SearchIndexToken.objects.exists())
+
+        with override_settings(SEARCH_BACKEND='creme.creme_core.core.search.IndexSearchBackend'):
+            call_command('creme_search_index', 'creme_core.FakeContact', verbosity=0)
+
+        self.assertEqual({self.linus, self.andrew}, self._search(IndexSearchBackend(), 'linu'))
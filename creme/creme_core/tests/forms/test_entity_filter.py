@@ -6,6 +6,7 @@ try:
 
     from django.contrib.contenttypes.models import ContentType
     from django.core.exceptions import ValidationError
+    from django.test.utils import override_settings
     from django.utils.translation import gettext as _
 
     from .base import FieldTestCase
@@ -2440,6 +2441,55 @@ class EntityFilterFormsTestCase(FieldTestCase):
         self.assertIsInstance(prop_f, PropertiesConditionsField)
         self.assertEqual(FakeOrganisation, prop_f.model)
 
+    @override_settings(ENTITY_FILTERS_MATERIALIZATION=True)
+    def test_creation_form03(self):
+        "Materialisation."
+        user = self.login()
+        efilter_registry = _EntityFilterRegistry(
+            id=EF_USER,
+            verbose_name='Test',
+        ).register_condition_handlers(
+            RegularFieldConditionHandler,
+            DateRegularFieldConditionHandler,
+        ).register_operators(*operators.all_operators)
+
+        kwargs = {
+            'ctype': ContentType.objects.get_for_model(FakeContact),
+            'user': user,
+            'efilter_registry': efilter_registry,
+        }
+        self.assertIn('is_materialized', EntityFilterCreateForm(**kwargs).fields)
+
+        with override_settings(ENTITY_FILTERS_MATERIALIZATION=False):
+            self.assertNotIn('is_materialized', EntityFilterCreateForm(**kwargs).fields)
+
+        def build_data(**range_data):
+            return {
+                'name': 'Born...',
+                'use_or': 'False',
+                'is_materialized': 'on',
+                'dateregularfieldcondition': json_dump([
+                    {'field': {'name': 'birthday', 'type': 'date__null'}, 'range': range_data},
+                ]),
+            }
+
+        form1 = EntityFilterCreateForm(data=build_data(type='current_year'), **kwargs)
+        self.assertFalse(form1.is_valid())
+        self.assertEqual(
+            [_('The filter cannot be materialised, because its conditions '
+               'depend on the current user or on the current date.'
+              ),
+            ],
+            form1.errors.get('is_materialized')
+        )
+
+        form2 = EntityFilterCreateForm(data=build_data(type='', start='2001-1-1'), **kwargs)
+        self.assertFalse(form2.errors)
+
+        efilter = form2.save()
+        self.assertIs(efilter.is_materialized, True)
+        self.assertIsNone(efilter.materialized_at)
+
     def test_edition_form01(self):
         user = self.login()
         efilter_registry = _EntityFilterRegistry(
@@ -1,5 +1,6 @@
 try:
     from functools import partial
+    from json import dumps as json_dump
 
     from django.contrib.sessions.backends.base import SessionBase
     from django.test import RequestFactory
@@ -9,6 +10,7 @@ try:
     from ..fake_models import FakeContact, FakeOrganisation, FakeImage
     from creme.creme_core.constants import MODELBRICK_ID
     from creme.creme_core.core.entity_cell import EntityCellRegularField, EntityCellRelation
+    from creme.creme_core.core.paginator import FlowPage
     from creme.creme_core.gui.bricks import (Brick, SimpleBrick, QuerysetBrick,
             EntityBrick, SpecificRelationsBrick, CustomBrick, _BrickRegistry, BricksManager)
     from creme.creme_core.models import (Relation, RelationType,
@@ -1270,6 +1272,73 @@ class BrickTestCase(CremeTestCase):
 
         self._assertPageOrderedLike(page, [cranel, crozzo, wallen])
 
+    def test_queryset_brick_flow_pagination01(self):
+        user = self.login()
+
+        create_contact = partial(FakeContact.objects.create, user=user)
+        aiz  = create_contact(first_name='Aiz',      last_name='Wallenstein')
+        lili = create_contact(first_name='Liliruca', last_name='Arde')
+        bell = create_contact(first_name='Bell',     last_name='Cranel')
+        welf = create_contact(first_name='Welf',     last_name='Crozzo')
+        hest = create_contact(first_name='Hestia',   last_name='Goddess')
+
+        brick = self.OrderedBrick()
+        brick.page_size = 2
+        brick.flow_pagination = True
+
+        request = self._build_request()
+        page1 = brick.get_template_context(build_context(request), FakeContact.objects.all())['page']
+        self.assertIsInstance(page1, FlowPage)
+        self.assertEqual([lili, bell], [*page1.object_list])
+        self.assertFalse(page1.has_previous())
+        self.assertTrue(page1.has_next())
+
+        # Next page
+        request = self._build_request('/?{}_page={}'.format(brick.id_, json_dump(page1.next_page_info())))
+        template_context = brick.get_template_context(build_context(request), FakeContact.objects.all())
+        page2 = template_context['page']
+        self.assertEqual([welf, hest], [*page2.object_list])
+        self.assertTrue(page2.has_previous())
+
+        # Page stored in the session
+        self.assertEqual(page2.info(),
+                         request.session['brickcontexts_manager']['/'][brick.id_]['page']
+                        )
+
+        request.GET = request.GET.copy()
+        request.GET.pop('{}_page'.format(brick.id_))
+        page2 = brick.get_template_context(build_context(request), FakeContact.objects.all())['page']
+        self.assertEqual([welf, hest], [*page2.object_list])
+
+        # Last page
+        request.GET['{}_page'.format(brick.id_)] = json_dump(page2.next_page_info())
+        page3 = brick.get_template_context(build_context(request), FakeContact.objects.all())['page']
+        self.assertEqual([aiz], [*page3.object_list])
+        self.assertFalse(page3.has_next())
+
+        # Order changes => first page
+        request.GET['{}_order'.format(brick.id_)] = 'first_name'
+        page = brick.get_template_context(build_context(request), FakeContact.objects.all())['page']
+        self.assertEqual([aiz, bell], [*page.object_list])
+
+    def test_queryset_brick_flow_pagination02(self):
+        "Invalid page information => first page."
+        user = self.login()
+
+        create_contact = partial(FakeContact.objects.create, user=user)
+        create_contact(first_name='Aiz',      last_name='Wallenstein')
+        lili = create_contact(first_name='Liliruca', last_name='Arde')
+        bell = create_contact(first_name='Bell',     last_name='Cranel')
+
+        brick = self.OrderedBrick()
+        brick.page_size = 2
+        brick.flow_pagination = True
+
+        for page_info in ('NaN', '2', '{"type": "forward"}'):
+            request = self._build_request('/?{}_page={}'.format(brick.id_, page_info))
+            page = brick.get_template_context(build_context(request), FakeContact.objects.all())['page']
+            self.assertEqual([lili, bell], [*page.object_list])
+
     def test_specific_relations_brick01(self):
         predicate = 'loves'
         rtype = RelationType.create(('test-subject_loves', predicate),
@@ -6,6 +6,7 @@ try:
     from django.apps import apps
     from django.conf import settings
     from django.contrib.contenttypes.models import ContentType
+    from django.core.cache import caches
     from django.core.exceptions import PermissionDenied
     from django.db.models import QuerySet
     from django.db.models.deletion import ProtectedError
@@ -13,6 +14,7 @@ try:
     from django.utils.translation import gettext as _
 
     from ..base import CremeTestCase, skipIfNotInstalled
+    from ..core.test_config_cache import CACHES
 
     from creme.creme_core import constants
     from creme.creme_core.auth import EntityCredentials, SUPERUSER_PERM
@@ -29,6 +31,7 @@ try:
         EntityFilter,
         FakeContact, FakeOrganisation, FakeInvoice, FakeInvoiceLine,
     )
+    from creme.creme_core.models.auth import compiled_credentials_cache
     from creme.creme_core.sandboxes import OnlySuperusersType
 
     from creme.creme_config.models import FakeConfigEntity
@@ -2219,6 +2222,264 @@ class CredentialsTestCase(CremeTestCase):
         self.assertFalse(user.has_perm_to_link(contact))
         self.assertTrue(user.has_perm_to_unlink(contact))
 
+    @override_settings(CACHES=CACHES, CONFIG_CACHE_ALIAS='config')
+    def test_compiled_credentials_cache01(self):
+        "The compiled credentials are shared between requests, & invalidated by changes."
+        caches['config'].clear()
+        cache = compiled_credentials_cache
+        cache.clear()
+
+        user = self.user
+        contact1 = self.contact1
+        contact2 = self.contact2
+        VIEW = EntityCredentials.VIEW
+
+        self._create_role(
+            'Coder', ['creme_core'], users=[user],
+            set_creds=[SetCredentials(value=VIEW, set_type=SetCredentials.ESET_OWN)],
+        )
+
+        qs = self._build_contact_qs()
+        self.assertListEqual([contact1], [*EntityCredentials.filter(self.refresh(user), qs)])
+        self.assertDictContainsSubset({'hits': 0, 'misses': 1}, cache.stats)
+
+        # New request (the role is retrieved again)
+        self.assertListEqual([contact1], [*EntityCredentials.filter(self.refresh(user), qs)])
+        self.assertDictContainsSubset({'hits': 1, 'misses': 1}, cache.stats)
+
+        # Same role instance => no lookup in the shared cache
+        user = self.refresh(user)
+        EntityCredentials.filter(user, qs)
+        EntityCredentials.filter(user, qs)
+        self.assertDictContainsSubset({'hits': 2, 'misses': 1}, cache.stats)
+
+        # Other permission/model => other predicates
+        EntityCredentials.filter(user, qs, perm=EntityCredentials.CHANGE)
+        self.assertDictContainsSubset({'hits': 2, 'misses': 2}, cache.stats)
+
+        # Invalidation
+        sc = user.role.credentials.get()
+        sc.set_type = SetCredentials.ESET_ALL
+        sc.save()
+        self.assertListEqual([contact1, contact2],
+                             [*EntityCredentials.filter(self.refresh(user), qs.order_by('id'))]
+                            )
+        self.assertDictContainsSubset({'hits': 2, 'misses': 3}, cache.stats)
+        self.assertGreater(cache.stats['compilation_time'], 0)
+
+    @override_settings(CACHES=CACHES, CONFIG_CACHE_ALIAS='config')
+    def test_compiled_credentials_cache02(self):
+        "Filter on dates => the credentials are not shared."
+        caches['config'].clear()
+        cache = compiled_credentials_cache
+        cache.clear()
+
+        user = self.user
+        VIEW = EntityCredentials.VIEW
+
+        # NB: the conditions on date are not registered for credentials filters
+        #     (yet), so we use a regular filter.
+        efilter = EntityFilter.objects.create(
+            id='creme_core-test_auth',
+            entity_type=FakeContact,
+        )
+        efilter.set_conditions(
+            [condition_handler.DateRegularFieldConditionHandler.build_condition(
+                model=FakeContact, field_name='birthday', date_range='current_year',
+             ),
+            ],
+            check_cycles=False, check_privacy=False,
+        )
+        self._create_role(
+            'Coder', ['creme_core'], users=[user],
+            set_creds=[
+                SetCredentials(value=VIEW, set_type=SetCredentials.ESET_FILTER,
+                               ctype=FakeContact, efilter=efilter,
+                              ),
+            ],
+        )
+
+        qs = self._build_contact_qs()
+        EntityCredentials.filter(self.refresh(user), qs)
+        EntityCredentials.filter(self.refresh(user), qs)
+        self.assertDictContainsSubset({'hits': 0, 'misses': 2}, cache.stats)
+
+    def test_compiled_credentials_cache03(self):
+        "Configuration cache disabled => the credentials are not shared."
+        cache = compiled_credentials_cache
+        cache.clear()
+
+        user = self.user
+        self._create_role(
+            'Coder', ['creme_core'], users=[user],
+            set_creds=[SetCredentials(value=EntityCredentials.VIEW, set_type=SetCredentials.ESET_OWN)],
+        )
+
+        qs = self._build_contact_qs()
+        EntityCredentials.filter(self.refresh(user), qs)
+        EntityCredentials.filter(self.refresh(user), qs)
+        self.assertDictContainsSubset({'hits': 0, 'misses': 2}, cache.stats)
+
+    @override_settings(CACHES=CACHES, CONFIG_CACHE_ALIAS='config')
+    def test_compiled_credentials_cache04(self):
+        "The conditions of a credentials filter are modified => invalidation."
+        caches['config'].clear()
+        compiled_credentials_cache.clear()
+
+        user = self.user
+        contact1 = self.contact1
+        contact2 = self.contact2
+
+        efilter = EntityFilter.objects.create(
+            id='creme_core-test_auth',
+            entity_type=FakeContact,
+            filter_type=EF_CREDENTIALS,
+        )
+        build_cond = partial(condition_handler.RegularFieldConditionHandler.build_condition,
+                             model=FakeContact, operator=operators.IEQUALS,
+                             field_name='last_name', filter_type=EF_CREDENTIALS,
+                            )
+        set_conditions = partial(efilter.set_conditions,
+                                 check_cycles=False, check_privacy=False,
+                                )
+        set_conditions([build_cond(values=[contact1.last_name])])
+
+        self._create_role(
+            'Coder', ['creme_core'], users=[user],
+            set_creds=[
+                SetCredentials(value=EntityCredentials.VIEW,
+                               set_type=SetCredentials.ESET_FILTER,
+                               ctype=FakeContact, efilter=efilter,
+                              ),
+            ],
+        )
+
+        qs = self._build_contact_qs()
+        user = self.refresh(user)
+        self.assertListEqual([contact1], [*EntityCredentials.filter(user, qs)])
+        self.assertTrue(user.has_perm_to_view(contact1))
+        self.assertFalse(user.has_perm_to_view(contact2))
+
+        # The condition is modified
+        set_conditions([build_cond(values=[contact2.last_name])])
+
+        user = self.refresh(user)
+        self.assertListEqual([contact2], [*EntityCredentials.filter(user, qs)])
+        self.assertFalse(user.has_perm_to_view(contact1))
+        self.assertTrue(user.has_perm_to_view(contact2))
+
+    def test_populate_credentials01(self):
+        "ESET_FILTER + ESET_OWN + forbidden."
+        user = self.user
+        other = self.other_user
+        VIEW = EntityCredentials.VIEW
+        CHANGE = EntityCredentials.CHANGE
+
+        contact1 = self.contact1
+        contact2 = self.contact2
+        contact3 = FakeContact.objects.create(user=other, first_name='Ito', last_name=contact1.last_name)
+        contact4 = FakeContact.objects.create(user=user, first_name='Denshichiro', last_name='Yoshioka')
+
+        efilter = EntityFilter.objects.create(
+            id='creme_core-test_auth',
+            entity_type=FakeContact,
+            filter_type=EF_CREDENTIALS,
+        )
+        efilter.set_conditions(
+            [condition_handler.RegularFieldConditionHandler.build_condition(
+                model=FakeContact,
+                operator=operators.IEQUALS,
+                field_name='last_name', values=[contact1.last_name],
+                filter_type=EF_CREDENTIALS,
+             ),
+            ],
+            check_cycles=False, check_privacy=False,
+        )
+
+        self._create_role(
+            'Coder', ['creme_core'], users=[user],
+            set_creds=[
+                SetCredentials(value=VIEW, set_type=SetCredentials.ESET_FILTER,
+                               ctype=FakeContact, efilter=efilter,
+                              ),
+                SetCredentials(value=VIEW | CHANGE, set_type=SetCredentials.ESET_OWN),
+                SetCredentials(value=CHANGE, set_type=SetCredentials.ESET_FILTER,
+                               ctype=FakeContact, efilter=efilter, forbidden=True,
+                              ),
+            ],
+        )
+
+        user = self.refresh(user)
+        contacts = [*FakeContact.objects.filter(
+            id__in=[contact1.id, contact2.id, contact3.id, contact4.id],
+        ).order_by('id')]
+
+        # NB: the role, its credentials & their filters are retrieved
+        user.has_perm_to_view(self.refresh(contact2))
+
+        # The filters are applied in memory (regular field => no query)
+        with self.assertNumQueries(0):
+            EntityCredentials.populate(user, contacts)
+
+        with self.assertNumQueries(0):
+            perms = [(user.has_perm_to_view(c), user.has_perm_to_change(c)) for c in contacts]
+
+        self.assertListEqual(
+            [(True, False), (False, False), (True, False), (True, True)],
+            perms,
+        )
+
+        # Same results than the non-bulk way
+        for contact in self.refresh(contact1), self.refresh(contact2), \
+                       self.refresh(contact3), self.refresh(contact4):
+            self.assertTupleEqual(
+                (user.has_perm_to_view(contact), user.has_perm_to_change(contact)),
+                perms[contacts.index(contact)],
+            )
+
+        # Already cached => no query
+        with self.assertNumQueries(0):
+            EntityCredentials.populate(user, contacts)
+
+    def test_populate_credentials02(self):
+        "Sandbox, super-user, not allowed app, CremeEntity instances."
+        user = self.user
+        self._create_role(
+            'Coder', ['creme_core'], users=[user],
+            set_creds=[
+                SetCredentials(value=EntityCredentials.VIEW, set_type=SetCredentials.ESET_ALL),
+            ],
+        )
+
+        sandbox = Sandbox.objects.create()
+        contact1 = self.contact1
+        contact3 = FakeContact.objects.create(user=user, sandbox=sandbox,
+                                              first_name='Ito', last_name='Ittosaï',
+                                             )
+        config_entity = FakeConfigEntity.objects.create(user=user, name='Ittosaï')
+
+        entities = [*CremeEntity.objects.filter(
+            id__in=[contact1.id, contact3.id, config_entity.id],
+        ).order_by('id')]
+
+        user = self.refresh(user)
+        user.role._get_setcredentials()
+        EntityCredentials.populate(user, entities)
+
+        with self.assertNumQueries(0):
+            perms = [user.has_perm_to_view(e) for e in entities]
+
+        self.assertListEqual([True, False, False], perms)
+
+        super_user = self.other_user
+        super_user.is_superuser = True
+
+        with self.assertNumQueries(0):
+            EntityCredentials.populate(super_user, entities)
+            perms = [super_user.has_perm_to_change(e) for e in entities]
+
+        self.assertListEqual([True, True, True], perms)
+
     def test_filter_entities01(self):
         "Super user."
         user = self.user
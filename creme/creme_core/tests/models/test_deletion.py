@@ -5,13 +5,18 @@ try:
 
     from django.contrib.contenttypes.models import ContentType
     from django.db.models.deletion import ProtectedError
+    from django.test.utils import override_settings
     from django.utils.translation import gettext as _, ngettext
 
     from creme.creme_core.core.deletion import FixedValueReplacer, SETReplacer
     from creme.creme_core.creme_jobs import deletor_type
+    from creme.creme_core.creme_jobs.deletor import _has_save_logic
     from creme.creme_core.models import (Job, DeletionCommand, JobResult,
+        CremeEntity, HistoryLine, Relation, history,
+        SearchConfigItem, SearchIndexToken,
         FakeContact, FakeOrganisation, FakeCivility, FakeSector,
         FakeTicket, FakeTicketPriority)
+    from creme.creme_core.signals import post_replace_in_bulk
     from creme.creme_core.utils.translation import get_model_verbose_name
 
     from ..base import CremeTestCase
@@ -344,4 +349,105 @@ class DeletionCommandTestCase(CremeTestCase):
              )),
             ],
             jresult.messages
-        )
\ No newline at end of file
+        )
+    def test_deletor_job05(self):
+        "Replacement in bulk, by batches ; HistoryLines & search field."
+        user = self.login()
+
+        civ = FakeCivility.objects.create(title='Sama')
+        civ2del = FakeCivility.objects.create(title='Kun')
+
+        create_contact = partial(FakeContact.objects.create, user=user, civility=civ2del)
+        contacts = [create_contact(last_name='Hattori', first_name='Hanzo #{}'.format(i)) for i in range(5)]
+        other = create_contact(last_name='Fuma', first_name='Kotaro', civility=civ)
+
+        self.assertFalse(_has_save_logic(FakeContact))
+
+        job = Job.objects.create(type_id=deletor_type.id, user=user)
+        dcom = DeletionCommand.objects.create(
+            job=job,
+            instance_to_delete=civ2del,
+            replacers=[
+                FixedValueReplacer(
+                    model_field=FakeContact._meta.get_field('civility'),
+                    value=civ,
+                ),
+            ],
+            total_count=5,
+        )
+
+        old_hline_id = HistoryLine.objects.order_by('-id').values_list('id', flat=True)[0]
+
+        with self.assertNoException():
+            deletor_type.batch_size = 2
+            try:
+                deletor_type.execute(job)
+            finally:
+                del deletor_type.batch_size
+
+        self.assertDoesNotExist(civ2del)
+        self.assertFalse(JobResult.objects.filter(job=job))
+        self.assertEqual(5, self.refresh(dcom).updated_count)
+
+        for contact in contacts:
+            contact = self.refresh(contact)
+            self.assertEqual(civ, contact.civility)
+            self.assertEqual(str(contact),
+                             CremeEntity.objects.get(id=contact.id).header_filter_search_field
+                            )
+
+        hlines = HistoryLine.objects.filter(id__gt=old_hline_id, type=history.TYPE_EDITION)
+        self.assertSetEqual({c.id for c in contacts}, {hline.entity_id for hline in hlines})
+        self.assertListEqual([['civility', civ2del.id, civ.id]], hlines[0].modifications)
+
+        self.assertEqual(civ, self.refresh(other).civility)
+
+    @override_settings(SEARCH_BACKEND='creme.creme_core.core.search.IndexSearchBackend')
+    def test_deletor_job06(self):
+        "Replacement in bulk: search index & signal."
+        user = self.login()
+        SearchConfigItem.create_if_needed(FakeContact, ['last_name', 'sector__title'])
+
+        sector = FakeSector.objects.create(title='Ninja')
+        sector2del = FakeSector.objects.create(title='Samurai')
+
+        create_contact = partial(FakeContact.objects.create, user=user, sector=sector2del)
+        contacts = [create_contact(last_name='Hattori #{}'.format(i)) for i in range(3)]
+
+        calls = []
+
+        def _receiver(sender, model_field, instances, **kwargs):
+            calls.append((sender, model_field.name, {i.id for i in instances}))
+
+        post_replace_in_bulk.connect(_receiver)
+
+        job = Job.objects.create(type_id=deletor_type.id, user=user)
+        DeletionCommand.objects.create(
+            job=job,
+            instance_to_delete=sector2del,
+            replacers=[
+                FixedValueReplacer(
+                    model_field=FakeContact._meta.get_field('sector'),
+                    value=sector,
+                ),
+            ],
+            total_count=3,
+        )
+
+        try:
+            deletor_type.execute(job)
+        finally:
+            post_replace_in_bulk.disconnect(_receiver)
+
+        self.assertDoesNotExist(sector2del)
+
+        contacts_ids = {c.id for c in contacts}
+        self.assertListEqual([(FakeContact, 'sector', contacts_ids)], calls)
+
+        tokens = SearchIndexToken.objects.filter(field_name='sector__title')
+        self.assertSetEqual(contacts_ids, {*tokens.filter(token='ninja').values_list('entity', flat=True)})
+        self.assertFalse(tokens.filter(token='samurai').exists())
+
+    def test_has_save_logic(self):
+        self.assertFalse(_has_save_logic(FakeOrganisation))
+        self.assertTrue(_has_save_logic(Relation))  # save() is overridden
@@ -5,9 +5,11 @@ try:
     from functools import partial
     from logging import info
 
+    from django.conf import settings
     from django.contrib.contenttypes.models import ContentType
     from django.contrib.auth import get_user_model
     from django.db.models.query import QuerySet
+    from django.test.utils import override_settings
     from django.utils.timezone import now
     from django.utils.translation import gettext as _
 
@@ -27,6 +29,8 @@ try:
         CustomFieldConditionHandler, DateCustomFieldConditionHandler,
         PropertyConditionHandler, RelationConditionHandler,
     )
+    from creme.creme_core.core.entity_filter.materialization import get_materialized_filters_info
+    from creme.creme_core.creme_jobs import materialized_filters_type
     from creme.creme_core.global_info import set_global_info
     from creme.creme_core.models import (
         CremeEntity,
@@ -35,7 +39,8 @@ try:
         CremeProperty, CremePropertyType,
         CustomField, CustomFieldInteger, CustomFieldString, CustomFieldFloat,
         CustomFieldBoolean, CustomFieldDateTime, CustomFieldEnum, CustomFieldEnumValue,
-        EntityFilter, EntityFilterCondition,
+        EntityFilter, EntityFilterCondition, EntityFilterResult, EntityFilterChange,
+        Job,
         Language,
         FakeContact, FakeCivility, FakeOrganisation, FakeImage,
     )
@@ -1685,6 +1690,347 @@ class EntityFiltersTestCase(CremeTestCase):
         self.assertIs(accept(contacts['rei']),    True)
         self.assertIs(accept(contacts['spike']),  False)
 
+    def test_accept_many(self):
+        user = CremeUser.objects.create(
+            username='Kanna', email='kanna@century.jp',
+            first_name='Kanna', last_name='Gendou',
+            password='uselesspw',
+        )
+        conditions = [
+            RegularFieldConditionHandler.build_condition(
+                model=FakeContact,
+                operator=operators.IEQUALS,
+                field_name='last_name', values=['IKARI'],
+            ),
+            RegularFieldConditionHandler.build_condition(
+                model=FakeContact,
+                operator=operators.IENDSWITH,
+                field_name='first_name', values=['I'],
+            ),
+        ]
+        contacts = self.contacts
+        entities = [contacts[name] for name in ('shinji', 'yui', 'gendou', 'rei', 'spike')]
+
+        # AND
+        efilter1 = EntityFilter.create('test-filter01', 'Ikari', FakeContact,
+                                       conditions=conditions,
+                                      )
+        self.assertSetEqual({contacts['shinji'].id, contacts['yui'].id},
+                            efilter1.accept_many(entities=entities, user=user)
+                           )
+        self.assertSetEqual(set(), efilter1.accept_many(entities=[], user=user))
+
+        # OR
+        efilter2 = EntityFilter.create('test-filter02', 'Ikari or I', FakeContact,
+                                       use_or=True, conditions=conditions,
+                                      )
+        self.assertSetEqual(
+            {contacts[name].id for name in ('shinji', 'yui', 'gendou', 'rei')},
+            efilter2.accept_many(entities=entities, user=user)
+        )
+
+        # Same results than accept()
+        for efilter in (efilter1, efilter2):
+            self.assertSetEqual(
+                {e.id for e in entities if efilter.accept(entity=e, user=user)},
+                efilter.accept_many(entities=entities, user=user),
+            )
+
+    def _build_ikari_filter(self):
+        efilter = EntityFilter.create(
+            'test-filter01', 'Ikari', FakeContact, is_custom=True,
+            conditions=[
+                RegularFieldConditionHandler.build_condition(
+                    model=FakeContact, operator=operators.IEQUALS,
+                    field_name='last_name', values=['Ikari'],
+                ),
+            ],
+        )
+        efilter.is_materialized = True
+        efilter.save()
+
+        return efilter
+
+    @override_settings(ENTITY_FILTERS_MATERIALIZATION=True)
+    def test_materialize01(self):
+        "Regular field ; incremental updates."
+        efilter = self._build_ikari_filter()
+        self.assertTrue(efilter.can_be_materialized)
+        self.assertFalse(efilter.uses_materialization)  # Not computed yet
+
+        efilter.materialize()
+        self.assertIsNotNone(efilter.materialized_at)
+        self.assertTrue(efilter.uses_materialization)
+
+        ikaris = self._list_contact_ids('shinji', 'yui', 'gendou')
+        self.assertSetEqual(
+            {*ikaris},
+            {*EntityFilterResult.objects.filter(efilter=efilter).values_list('entity_id', flat=True)}
+        )
+        self.assertExpectedFiltered(efilter, FakeContact, ikaris)
+
+        with override_settings(ENTITY_FILTERS_MATERIALIZATION=False):
+            self.assertFalse(efilter.uses_materialization)
+
+        # Creation
+        toji = FakeContact.objects.create(user=self.user, first_name='Toji', last_name='Ikari')
+        efilter = self.refresh(efilter)
+        self.assertIsNotNone(efilter.materialized_at)
+        self.assertExpectedFiltered(efilter, FakeContact, [*ikaris, toji.id])
+
+        # Edition
+        toji.last_name = 'Suzuhara'
+        toji.save()
+        self.assertExpectedFiltered(efilter, FakeContact, ikaris)
+
+        # Deletion
+        yui = self.contacts['yui']
+        yui_id = yui.id
+        yui.delete()
+        self.assertExpectedFiltered(efilter, FakeContact, self._list_contact_ids('shinji', 'gendou'))
+        self.assertFalse(EntityFilterResult.objects.filter(efilter=efilter, entity_id=yui_id).exists())
+
+        # Outdated results (eg: marked as outdated while another process was
+        # waiting for the lock) => not updated
+        EntityFilter.objects.filter(id=efilter.id).update(materialized_at=None)
+        shinji = self.contacts['shinji']
+        FakeContact.objects.filter(id=shinji.id).update(last_name='Nagisa')
+        efilter.update_materialization([shinji.id])
+        self.assertTrue(EntityFilterResult.objects.filter(efilter=efilter, entity_id=shinji.id).exists())
+
+        # Not materialised anymore
+        efilter.is_materialized = False
+        efilter.save()
+        efilter.clear_materialization()
+        self.assertIsNone(efilter.materialized_at)
+        self.assertFalse(EntityFilterResult.objects.filter(efilter=efilter).exists())
+
+    @override_settings(ENTITY_FILTERS_MATERIALIZATION=True)
+    def test_materialize02(self):
+        "Volatile conditions."
+        efilter1 = EntityFilter.create(
+            'test-filter01', 'Born this year', FakeContact, is_custom=True,
+            conditions=[
+                DateRegularFieldConditionHandler.build_condition(
+                    model=FakeContact, field_name='birthday', date_range='current_year',
+                ),
+            ],
+        )
+        self.assertTrue(efilter1.is_volatile)
+        self.assertFalse(efilter1.can_be_materialized)
+
+        with self.assertRaises(EntityFilter.MaterializationError):
+            efilter1.materialize()
+
+        efilter2 = EntityFilter.create(
+            'test-filter02', 'Mine', FakeContact, is_custom=True,
+            conditions=[
+                RegularFieldConditionHandler.build_condition(
+                    model=FakeContact, operator=operators.EQUALS,
+                    field_name='user', values=[operands.CurrentUserOperand.type_id],
+                ),
+            ],
+        )
+        self.assertTrue(efilter2.is_volatile)
+
+        # Sub-filter
+        efilter3 = EntityFilter.create(
+            'test-filter03', 'Sub', FakeContact, is_custom=True,
+            conditions=[SubFilterConditionHandler.build_condition(efilter1)],
+        )
+        self.assertTrue(efilter3.is_volatile)
+
+        # Fixed range
+        efilter4 = EntityFilter.create(
+            'test-filter04', 'Born in 2001', FakeContact, is_custom=True,
+            conditions=[
+                DateRegularFieldConditionHandler.build_condition(
+                    model=FakeContact, field_name='birthday',
+                    start=date(year=2001, month=1, day=1),
+                    end=date(year=2001, month=12, day=31),
+                ),
+            ],
+        )
+        self.assertFalse(efilter4.is_volatile)
+        self.assertTrue(efilter4.can_be_materialized)
+
+    @override_settings(ENTITY_FILTERS_MATERIALIZATION=True)
+    def test_materialize03(self):
+        "Relationships ; outdating by the related entities."
+        self._aux_test_relations()
+        loves = self.loves
+        contacts = self.contacts
+
+        efilter1 = EntityFilter.create(
+            'test-filter01', 'Loves someone', FakeContact, is_custom=True,
+            conditions=[
+                RelationConditionHandler.build_condition(model=FakeContact, rtype=loves, has=True),
+            ],
+        )
+        self.assertSetEqual(set(), efilter1.get_related_entity_models())
+
+        efilter1.is_materialized = True
+        efilter1.save()
+        efilter1.materialize()
+
+        lovers = self._list_contact_ids('faye', 'shinji', 'gendou', 'jet')
+        self.assertExpectedFiltered(efilter1, FakeContact, lovers)
+
+        rel = Relation.objects.create(user=self.user, type=loves,
+                                      subject_entity=contacts['misato'],
+                                      object_entity=contacts['shinji'],
+                                     )
+        self.assertExpectedFiltered(efilter1, FakeContact, [*lovers, contacts['misato'].id])
+
+        rel.delete()
+        self.assertExpectedFiltered(efilter1, FakeContact, lovers)
+
+        # Sub-filter through relationships
+        subfilter = EntityFilter.create(
+            'test-filter02', 'Rei', FakeContact, is_custom=True,
+            conditions=[
+                RegularFieldConditionHandler.build_condition(
+                    model=FakeContact, operator=operators.EQUALS,
+                    field_name='first_name', values=['Rei'],
+                ),
+            ],
+        )
+        efilter2 = EntityFilter.create(
+            'test-filter03', 'Loves Rei', FakeContact, is_custom=True,
+            conditions=[
+                RelationSubFilterConditionHandler.build_condition(
+                    model=FakeContact, rtype=loves, subfilter=subfilter,
+                ),
+            ],
+        )
+        self.assertSetEqual({FakeContact}, efilter2.get_related_entity_models())
+
+        efilter2.is_materialized = True
+        efilter2.save()
+        efilter2.materialize()
+        self.assertExpectedFiltered(efilter2, FakeContact, self._list_contact_ids('shinji', 'gendou'))
+
+        rei = contacts['rei']
+        rei.first_name = 'Lilith'
+        rei.save()
+
+        efilter2 = self.refresh(efilter2)
+        self.assertIsNone(efilter2.materialized_at)
+        self.assertFalse(efilter2.uses_materialization)
+        self.assertExpectedFiltered(efilter2, FakeContact, [])
+
+        self.assertIsNotNone(self.refresh(efilter1).materialized_at)
+
+    @override_settings(ENTITY_FILTERS_MATERIALIZATION=True)
+    def test_materialize_changes(self):
+        "Modifications recorded while the filter was locked."
+        efilter = self._build_ikari_filter()
+        efilter.materialize()
+
+        job = self.get_object_or_fail(Job, type_id=materialized_filters_type.id)
+        now_value = now()
+        self.assertNotEqual(now_value, materialized_filters_type.next_wakeup(job, now_value))
+
+        def result_exists(contact):
+            return EntityFilterResult.objects.filter(efilter=efilter, entity_id=contact.id).exists()
+
+        shinji = self.contacts['shinji']
+        FakeContact.objects.filter(id=shinji.id).update(last_name='Nagisa')
+        EntityFilterChange.record(efilter.id, [shinji.id])
+        self.assertTrue(result_exists(shinji))
+        self.assertEqual(now_value, materialized_filters_type.next_wakeup(job, now_value))
+
+        materialized_filters_type.execute(job)
+        self.assertFalse(result_exists(shinji))
+        self.assertFalse(EntityFilterChange.objects.filter(efilter=efilter).exists())
+        self.assertIsNotNone(self.refresh(efilter).materialized_at)
+
+        # The changes are applied by materialize() too
+        misato = self.contacts['misato']
+        FakeContact.objects.filter(id=misato.id).update(last_name='Ikari')
+        EntityFilterChange.record(efilter.id, [misato.id])
+        efilter.materialize()
+        self.assertTrue(result_exists(misato))
+        self.assertFalse(EntityFilterChange.objects.filter(efilter=efilter).exists())
+
+        # Empty entity => outdated results
+        EntityFilterChange.record(efilter.id, [None])
+        efilter.apply_materialization_changes()
+        self.assertIsNone(efilter.materialized_at)
+        self.assertIsNone(self.refresh(efilter).materialized_at)
+        self.assertFalse(EntityFilterChange.objects.filter(efilter=efilter).exists())
+
+        efilter.materialize()
+        self.assertTrue(EntityFilter.outdate_materializations([efilter.id]))
+        self.assertIsNone(self.refresh(efilter).materialized_at)
+        self.assertFalse(EntityFilter.outdate_materializations([efilter.id]))
+
+    @override_settings(ENTITY_FILTERS_MATERIALIZATION=True, CONFIG_CACHE_ALIAS=None)
+    def test_materialized_filters_info(self):
+        "The information is cached per request (even if the config cache is disabled)."
+        efilter = self._build_ikari_filter()
+        contact_ct_id = ContentType.objects.get_for_model(FakeContact).id
+
+        self.assertListEqual([(efilter.id, contact_ct_id, frozenset())],
+                             get_materialized_filters_info()
+                            )
+
+        with self.assertNumQueries(0):
+            get_materialized_filters_info()
+
+        # The related models depend on the conditions
+        efilter.set_conditions([
+            RegularFieldConditionHandler.build_condition(
+                model=FakeContact, operator=operators.ISTARTSWITH,
+                field_name='image__name', values=['Ikari'],
+            ),
+        ])
+        self.assertListEqual(
+            [(efilter.id, contact_ct_id, frozenset([ContentType.objects.get_for_model(FakeImage).id]))],
+            get_materialized_filters_info()
+        )
+
+    def test_materialize_job(self):
+        job = self.get_object_or_fail(Job, type_id=materialized_filters_type.id)
+        now_value = now()
+        self.assertIsNone(materialized_filters_type.next_wakeup(job, now_value))
+
+        efilter = self._build_ikari_filter()
+        self.assertEqual(now_value, materialized_filters_type.next_wakeup(job, now_value))
+
+        materialized_filters_type.execute(job)
+        efilter = self.refresh(efilter)
+        self.assertIsNotNone(efilter.materialized_at)
+        self.assertExpectedFiltered(efilter, FakeContact, self._list_contact_ids('shinji', 'yui', 'gendou'))
+        self.assertEqual(
+            efilter.materialized_at + timedelta(seconds=settings.ENTITY_FILTERS_MATERIALIZATION_REFRESH),
+            materialized_filters_type.next_wakeup(job, now_value)
+        )
+
+        # The results are outdated by new conditions
+        efilter.set_conditions([
+            RegularFieldConditionHandler.build_condition(
+                model=FakeContact, operator=operators.EQUALS,
+                field_name='first_name', values=['Rei'],
+            ),
+        ])
+        self.assertIsNone(efilter.materialized_at)
+        self.assertIsNone(self.refresh(efilter).materialized_at)
+
+        materialized_filters_type.execute(job)
+        self.assertExpectedFiltered(self.refresh(efilter), FakeContact, self._list_contact_ids('rei'))
+
+        # Volatile filter => the option is disabled
+        efilter = self.refresh(efilter)
+        efilter.set_conditions([
+            DateRegularFieldConditionHandler.build_condition(
+                model=FakeContact, field_name='birthday', date_range='current_year',
+            ),
+        ])
+        materialized_filters_type.execute(job)
+        self.assertFalse(self.refresh(efilter).is_materialized)
+        self.assertIsNone(materialized_filters_type.next_wakeup(job, now_value))
+
     def test_condition_update(self):
         # build = partial(EntityFilterCondition.build_4_field, model=FakeContact)
         build = partial(RegularFieldConditionHandler.build_condition, model=FakeContact)
@@ -4,8 +4,11 @@ try:
     from json import loads as json_load, dumps as json_dump
 
     from django.contrib.contenttypes.models import ContentType
+    from django.core.cache import caches
+    from django.test.utils import override_settings
 
     from ..base import CremeTestCase
+    from ..core.test_config_cache import CACHES
     from ..fake_forms import FakeContactForm
 
     from creme.creme_core.global_info import set_global_info
@@ -172,6 +175,36 @@ class FieldsConfigTestCase(CremeTestCase):
         with self.assertNumQueries(0):
             FieldsConfig.get_4_model(model1)
 
+    @override_settings(CACHES=CACHES, CONFIG_CACHE_ALIAS='config')
+    def test_get_4_models_shared_cache(self):
+        "The configurations are shared between requests."
+        caches['config'].clear()
+        model1 = FakeContact
+        model2 = FakeOrganisation
+
+        FieldsConfig.create(model1, descriptions=[('phone', {FieldsConfig.HIDDEN: True})])
+
+        with self.assertNumQueries(1):
+            FieldsConfig.get_4_models([model1, model2])
+
+        set_global_info(per_request_cache={})  # New request
+
+        with self.assertNumQueries(0):
+            fconfigs = FieldsConfig.get_4_models([model1, model2])
+
+        self.assertTrue(fconfigs[model1].is_fieldname_hidden('phone'))
+        self.assertFalse(fconfigs[model2].is_fieldname_hidden('url_site'))
+
+        # Invalidation
+        FieldsConfig.create(model2, descriptions=[('url_site', {FieldsConfig.HIDDEN: True})])
+        set_global_info(per_request_cache={})
+
+        with self.assertNumQueries(1):
+            fconfigs = FieldsConfig.get_4_models([model1, model2])
+
+        self.assertTrue(fconfigs[model1].is_fieldname_hidden('phone'))
+        self.assertTrue(fconfigs[model2].is_fieldname_hidden('url_site'))
+
     def _create_contact_conf(self):
         FieldsConfig.create(FakeContact,
                             descriptions=[('phone',  {FieldsConfig.HIDDEN: True}),
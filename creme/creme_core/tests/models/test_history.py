@@ -4,9 +4,12 @@ try:
     from datetime import date, time
     from decimal import Decimal
     from time import sleep
+    from unittest.mock import patch
 
     from django.contrib.auth import get_user_model
     from django.contrib.contenttypes.models import ContentType
+    from django.db import connection
+    from django.db.transaction import atomic
     from django.urls import reverse
     from django.utils.formats import date_format, number_format
     from django.utils.timezone import now
@@ -1162,4 +1165,191 @@ about this fantastic animation studio."""
             h_user1 = hline1.user
         self.assertEqual(admin, h_user1)
 
+    def test_buffered01(self):
+        "Creations, edition, relationships, properties."
+        user = self.user
+        old_ids = [*HistoryLine.objects.values_list('id', flat=True)]
+        rtype, srtype = RelationType.create(('test-subject_works6', 'is employed'),
+                                            ('test-object_works6',  'employs')
+                                           )
+        ptype = CremePropertyType.create(str_pk='test-prop_foobar', text='Is very important')
+
+        with HistoryLine.buffered():
+            nerv = FakeOrganisation.objects.create(user=user, name='Nerv')
+            rei  = FakeContact.objects.create(user=user, first_name='Rei', last_name='Ayanami')
+
+            rei = self.refresh(rei)
+            rei.phone = '123456'
+            rei.save()
+
+            Relation.objects.create(user=user, subject_entity=rei, object_entity=nerv, type=rtype)
+            CremeProperty.objects.create(type=ptype, creme_entity=nerv)
+
+            self.assertFalse(HistoryLine.objects.exclude(id__in=old_ids))
+
+        hlines = [*HistoryLine.objects.exclude(id__in=old_ids).order_by('id')]
+        self.assertListEqual(
+            [TYPE_CREATION, TYPE_CREATION, TYPE_EDITION, TYPE_RELATION, TYPE_SYM_RELATION, TYPE_PROP_ADD],
+            [hline.type for hline in hlines]
+        )
+        self.assertListEqual(
+            [nerv.id, rei.id, rei.id, rei.id, nerv.id, nerv.id],
+            [hline.entity_id for hline in hlines]
+        )
+        self.assertEqual([['phone', '123456']], hlines[2].modifications)
+
+        hline, hline_sym = hlines[3:5]
+        self.assertEqual(str(rei), hline.entity_repr)
+        self.assertEqual([rtype.id], hline.modifications)
+        self.assertEqual([srtype.id], hline_sym.modifications)
+        self.assertEqual(hline_sym.id, hline.related_line.id)
+        self.assertEqual(hline.id,     hline_sym.related_line.id)
+
+    def test_buffered02(self):
+        "Related lines."
+        user = self.user
+        rtype = RelationType.create(('test-subject_works7', 'is employed'),
+                                    ('test-object_works7',  'employs')
+                                   )[0]
+        HistoryConfigItem.objects.create(relation_type=rtype)
+
+        nerv = FakeOrganisation.objects.create(user=user, name='Nerv')
+        rei  = FakeContact.objects.create(user=user, first_name='Rei', last_name='Ayanami')
+        Relation.objects.create(user=user, subject_entity=rei, object_entity=nerv, type=rtype)
+        old_ids = [*HistoryLine.objects.values_list('id', flat=True)]
+
+        with HistoryLine.buffered():
+            rei = self.refresh(rei)
+            rei.phone = '123456'
+            rei.save()
+
+        hlines = [*HistoryLine.objects.exclude(id__in=old_ids).order_by('id')]
+        self.assertListEqual([TYPE_EDITION, TYPE_RELATED], [hline.type for hline in hlines])
+        self.assertEqual(nerv.id, hlines[1].entity_id)
+        self.assertEqual(hlines[0].id, hlines[1].related_line.id)
+
+    def test_buffered03(self):
+        "Exception => lines are dropped ; nested blocks ; size."
+        user = self.user
+        old_count = HistoryLine.objects.count()
+
+        with self.assertRaises(ValueError):
+            with HistoryLine.buffered():
+                FakeOrganisation.objects.create(user=user, name='Nerv')
+                raise ValueError('Invalid')
+
+        self.assertEqual(old_count, HistoryLine.objects.count())
+
+        with HistoryLine.buffered(size=2):
+            with HistoryLine.buffered():
+                FakeOrganisation.objects.create(user=user, name='Seele')
+
+            self.assertEqual(old_count, HistoryLine.objects.count())
+
+            with HistoryLine.buffered():
+                FakeOrganisation.objects.create(user=user, name='Gainax')
+
+            self.assertEqual(old_count + 2, HistoryLine.objects.count())
+
+            FakeOrganisation.objects.create(user=user, name='Ghibli')
+            self.assertEqual(old_count + 2, HistoryLine.objects.count())
+
+        self.assertEqual(old_count + 3, HistoryLine.objects.count())
+
+    def test_buffered04(self):
+        "Exception in a nested block => only its lines are dropped."
+        user = self.user
+        old_count = HistoryLine.objects.count()
+
+        with HistoryLine.buffered():
+            FakeOrganisation.objects.create(user=user, name='Nerv')
+
+            try:
+                with atomic(), HistoryLine.buffered():
+                    FakeOrganisation.objects.create(user=user, name='Seele')
+                    raise ValueError('Invalid')
+            except ValueError:
+                pass
+
+        self.assertEqual(old_count + 1, HistoryLine.objects.count())
+        self.assertEqual(TYPE_CREATION, HistoryLine.objects.order_by('-id').first().type)
+
+    def test_buffered05(self):
+        "Deletion of an entity created in the block."
+        user = self.user
+        old_ids = [*HistoryLine.objects.values_list('id', flat=True)]
+
+        with HistoryLine.buffered():
+            nerv = FakeOrganisation.objects.create(user=user, name='Nerv')
+            nerv.delete()
+
+        # NB: the line of deletion is not buffered, so it is saved before the line of creation.
+        hlines = [*HistoryLine.objects.exclude(id__in=old_ids).order_by('type')]
+        self.assertListEqual([TYPE_CREATION, TYPE_DELETION], [hline.type for hline in hlines])
+        self.assertIsNone(hlines[0].entity_id)
+        self.assertIsNone(hlines[1].entity_id)
+
+    def test_buffered06(self):
+        "Deletion in a savepoint which is rolled back => the buffered lines are kept."
+        user = self.user
+        old_ids = [*HistoryLine.objects.values_list('id', flat=True)]
+
+        with HistoryLine.buffered():
+            nerv = FakeOrganisation.objects.create(user=user, name='Nerv')
+            seele = FakeOrganisation.objects.create(user=user, name='Seele')
+
+            try:
+                with atomic(), HistoryLine.buffered():
+                    nerv.delete()
+                    raise ValueError('Invalid')
+            except ValueError:
+                pass
+
+            seele.delete()
+
+        self.assertStillExists(nerv)
+
+        hlines = [*HistoryLine.objects.exclude(id__in=old_ids)]
+        self.assertCountEqual([TYPE_CREATION, TYPE_CREATION, TYPE_DELETION],
+                              [hline.type for hline in hlines]
+                             )
+        self.assertCountEqual([nerv.id, None, None], [hline.entity_id for hline in hlines])
+
+    def test_buffered07(self):
+        "The DB cannot return the IDs of the lines inserted in bulk."
+        user = self.user
+        rtype = RelationType.create(('test-subject_works8', 'is employed'),
+                                    ('test-object_works8',  'employs')
+                                   )[0]
+        HistoryConfigItem.objects.create(relation_type=rtype)
+        rtype2 = RelationType.create(('test-subject_pilots', 'pilots'),
+                                     ('test-object_pilots',  'is piloted by')
+                                    )[0]
+
+        nerv = FakeOrganisation.objects.create(user=user, name='Nerv')
+        rei  = FakeContact.objects.create(user=user, first_name='Rei', last_name='Ayanami')
+        Relation.objects.create(user=user, subject_entity=rei, object_entity=nerv, type=rtype)
+        old_ids = [*HistoryLine.objects.values_list('id', flat=True)]
+
+        with patch.object(connection.features, 'can_return_ids_from_bulk_insert', False):
+            with HistoryLine.buffered():
+                FakeOrganisation.objects.create(user=user, name='Seele')
+
+                rei = self.refresh(rei)
+                rei.phone = '123456'
+                rei.save()
+
+                Relation.objects.create(user=user, subject_entity=rei, object_entity=nerv, type=rtype2)
+
+        hlines = [*HistoryLine.objects.exclude(id__in=old_ids).order_by('id')]
+        self.assertListEqual(
+            [TYPE_EDITION, TYPE_RELATION, TYPE_SYM_RELATION, TYPE_CREATION, TYPE_RELATED],
+            [hline.type for hline in hlines]
+        )
+
+        hline_edition, hline, hline_sym, __, hline_related = hlines
+        self.assertEqual(hline_edition.id, hline_related.related_line.id)
+        self.assertEqual(hline_sym.id,     hline.related_line.id)
+        self.assertEqual(hline.id,         hline_sym.related_line.id)
+
     # TODO: test populate related lines + query counter ??
@@ -2,10 +2,13 @@
 
 try:
     from django.contrib.contenttypes.models import ContentType
+    from django.core.cache import caches
+    from django.test.utils import override_settings
     from django.utils.translation import gettext as _
 
     from creme.creme_core.models import SearchConfigItem, UserRole
     from ..base import CremeTestCase
+    from ..core.test_config_cache import CACHES
     from ..fake_models import FakeContact, FakeOrganisation
 except Exception as e:
     print('Error in <{}>: {}'.format(__name__, e))
@@ -228,6 +231,44 @@ class SearchConfigTestCase(CremeTestCase):
         self.assertEqual(1, len(configs))
         self.assertEqual(sc_item, configs[0])
 
+    @override_settings(CACHES=CACHES, CONFIG_CACHE_ALIAS='config')
+    def test_get_4_models_shared_cache(self):
+        "The items are shared between requests, per role."
+        caches['config'].clear()
+        user = self.login()
+
+        sc_item = SearchConfigItem.create_if_needed(FakeContact, ['first_name', 'last_name'])
+
+        with self.assertNumQueries(1):
+            configs = [*SearchConfigItem.get_4_models([FakeContact, FakeOrganisation], user)]
+
+        self.assertEqual(sc_item, configs[0])
+        self.assertIsNone(configs[1].pk)
+
+        with self.assertNumQueries(0):
+            configs = [*SearchConfigItem.get_4_models([FakeContact, FakeOrganisation], user)]
+
+        self.assertEqual(sc_item, configs[0])
+        self.assertEqual(['first_name', 'last_name'], [sf.name for sf in configs[0].searchfields])
+        self.assertIsNone(configs[1].pk)
+
+        # Other role
+        role = UserRole.objects.create(name='CEO')
+        other = self.other_user
+        other.role = role
+        other.is_superuser = False
+
+        with self.assertNumQueries(1):
+            configs = [*SearchConfigItem.get_4_models([FakeContact], other)]
+
+        self.assertEqual(sc_item, configs[0])
+
+        # Invalidation
+        sc_item2 = SearchConfigItem.create_if_needed(FakeContact, ['description'], role='superuser')
+
+        configs = [*SearchConfigItem.get_4_models([FakeContact, FakeOrganisation], user)]
+        self.assertEqual(sc_item2, configs[0])
+
     def test_get_4_models04(self):
         "One model, 2 configs in DB"
         self.login()
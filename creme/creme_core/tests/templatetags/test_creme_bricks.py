@@ -138,6 +138,49 @@ class CremeBricksTagsTestCase(CremeTestCase, BrickTestCaseMixin):
 
         self.assertFalse(render.strip())
 
+    def test_brick_display_deferred(self):
+        self.login()
+
+        class FooBrick(Brick):
+            id_ = Brick.generate_id('creme_core', 'CremeBricksTagsTestCase__brick_test_brick_display_deferred')
+            verbose_name = 'Testing purpose'
+            dependencies = (FakeContact,)
+            deferred = True
+            brick_str = '<div>FOO</div>'
+
+            def detailview_display(self, context):
+                return self.brick_str
+
+        context = RequestContext(self._build_request(), {'my_brick': FooBrick()})
+
+        with self.assertNoException():
+            render = Template('{% load creme_bricks %}'
+                              '{% brick_declare my_brick %}'
+                              '{% brick_display my_brick %}'
+                             ).render(context)
+
+        self.assertNotIn(FooBrick.brick_str, render)
+
+        brick_node = self.get_brick_node(self.get_html_tree(render), FooBrick.id_)
+        self.assertEqual('true', brick_node.attrib.get('data-brick-deferred'))
+        self.assertBrickHasClass(brick_node, 'brick-deferred')
+        self.assertEqual('["creme_core.fakecontact"]', brick_node.attrib.get('data-brick-deps'))
+
+        title_node = brick_node.find('.//span[@class="brick-title"]')
+        self.assertIsNotNone(title_node)
+        self.assertEqual(FooBrick.verbose_name, title_node.attrib.get('title'))
+
+        # Rendered immediately
+        context = RequestContext(self._build_request(), {'my_brick': FooBrick()})
+
+        with self.assertNoException():
+            render = Template('{% load creme_bricks %}'
+                              '{% brick_declare my_brick %}'
+                              '{% brick_display my_brick deferred=False %}'
+                             ).render(context)
+
+        self.assertEqual(FooBrick.brick_str, render.strip())
+
     def test_brick_end(self):
         self.login()
 
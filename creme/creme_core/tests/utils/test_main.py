@@ -3,6 +3,7 @@
 try:
     from datetime import datetime, date, timedelta
     from functools import partial
+    import os
     from os.path import join
     import string
 
@@ -526,6 +527,84 @@ class UnicodeCollationTestCase(CremeTestCase):
                          sort(['hats', 'gloves', 'shoes', 'ĝloves']),
                         )
 
+    def _build_allkeys(self, dir_path):
+        path = join(dir_path, 'allkeys.txt')
+
+        with open(path, 'w') as f:
+            f.write('@version 7.0.0\n'
+                    '0041  ; [.1C47.0020.0008] # LATIN CAPITAL LETTER A\n'
+                    '0061  ; [.1C47.0020.0002] # LATIN SMALL LETTER A\n'
+                    '0062  ; [.1C60.0020.0002] # LATIN SMALL LETTER B\n'
+                    '0063  ; [.1C7A.0020.0002] # LATIN SMALL LETTER C\n'
+                    '0301  ; [.0000.0024.0002] # COMBINING ACUTE ACCENT\n'
+                    '0063 0068 ; [.1C7A.0020.0002][.1D18.0020.0002] # CH\n'
+                   )
+
+        return path
+
+    def test_uca_compiled_table01(self):
+        from tempfile import TemporaryDirectory
+        from creme.creme_core.utils.unicode_collation import (_Collator,
+                _CollationTable, build_compiled_table, compile_table)
+
+        with TemporaryDirectory() as dir_path:
+            path = self._build_allkeys(dir_path)
+
+            table = _CollationTable(compile_table(path))
+            self.assertEqual([(0x1C47, 0x20, 0x2)], table.collation_elements([0x61]))
+            self.assertEqual([(0x1C47, 0x20, 0x8), (0x1C60, 0x20, 0x2)],
+                             table.collation_elements([0x41, 0x62])
+                            )
+            self.assertEqual([(0x1C7A, 0x20, 0x2), (0x1D18, 0x20, 0x2)],
+                             table.collation_elements([0x63, 0x68])
+                            )
+            self.assertEqual([(0x1C47, 0x20, 0x2), (0x1C7A, 0x20, 0x2)],
+                             table.collation_elements([0x61, 0x63])
+                            )
+            # Implicit weights
+            self.assertEqual([(0xFB40 + (0x4E00 >> 15), 0x20, 0x2, 0x1),
+                              ((0x4E00 & 0x7FFF) | 0x8000, 0, 0, 0),
+                             ],
+                             table.collation_elements([0x4E00])
+                            )
+
+            collator1 = _Collator(filename=path)
+            self.assertEqual(path + '.bin', collator1.compiled_filename)
+            sort_key = collator1.sort_key('ac')  # Compiled in memory
+
+            build_compiled_table(path, collator1.compiled_filename)
+            collator2 = _Collator(filename=path)
+            self.assertEqual(sort_key, collator2.sort_key('ac'))
+            self.assertEqual(['a', 'a\u0301', 'b', 'c', 'ch'],
+                             sorted(['ch', 'b', 'a\u0301', 'c', 'a'], key=collator2.sort_key)
+                            )
+
+    def test_uca_compiled_table02(self):
+        "Invalid/outdated compiled files."
+        from tempfile import TemporaryDirectory
+        from creme.creme_core.utils.unicode_collation import (
+            _CollationTable, CompiledTableError, compile_table,
+        )
+
+        with TemporaryDirectory() as dir_path:
+            path = self._build_allkeys(dir_path)
+            data = compile_table(path)
+
+            with self.assertRaises(CompiledTableError):
+                _CollationTable(b'')
+
+            with self.assertRaises(CompiledTableError):
+                _CollationTable(b'INVALID!' + data[8:])
+
+            with self.assertRaises(CompiledTableError):
+                _CollationTable(data[:-2])
+
+            with self.assertRaises(CompiledTableError):
+                _CollationTable(data, source_size=1)
+
+            with self.assertNoException():
+                _CollationTable(data, source_size=os.stat(path).st_size)
+
     # NB: keep this comment (until we use the real 'pyuca' lib)
     # def test_uca02(self):
     #     "Original lib"
@@ -12,6 +12,7 @@ try:
     from django.contrib.auth import get_user_model
     from django.core.exceptions import ValidationError
     from django.db.models import Max
+    from django.test.utils import override_settings
     from django.urls import reverse
     from django.utils.translation import gettext as _, ngettext
 
@@ -20,6 +21,7 @@ try:
     from creme.creme_core import constants
     from creme.creme_core.auth.entity_credentials import EntityCredentials
     from creme.creme_core.bricks import TrashBrick
+    from creme.creme_core.creme_jobs import trash_cleaner_type
     from creme.creme_core.forms.bulk import _CUSTOMFIELD_FORMAT, BulkDefaultEditForm
     from creme.creme_core.gui import bulk_update
     from creme.creme_core.models import (
@@ -28,6 +30,7 @@ try:
         CremePropertyType, CremeProperty,
         SetCredentials, Sandbox,
         HistoryLine, history,
+        Job, EntityJobResult,
         FieldsConfig,
         CustomField, CustomFieldInteger, CustomFieldFloat, CustomFieldBoolean,
         CustomFieldString, CustomFieldDateTime,
@@ -459,6 +462,18 @@ class EntityViewsTestCase(ViewsTestCase, BrickTestCaseMixin):
         entity = self.get_object_or_fail(FakeOrganisation, pk=entity.pk)
         self.assertFalse(entity.is_deleted)
 
+    def _empty_trash(self):
+        response = self.assertPOST200(self.EMPTY_TRASH_URL)
+
+        job = self.get_object_or_fail(Job, type_id=trash_cleaner_type.id)
+        self.assertEqual(self.user, job.user)
+        self.assertEqual(Job.STATUS_WAIT, job.status)
+        self.assertEqual(job.get_absolute_url(), response.content.decode())
+
+        trash_cleaner_type.execute(job)
+
+        return self.refresh(job)
+
     def test_empty_trash01(self):
         user = self.login(is_superuser=False, allowed_apps=('creme_core',))  # 'persons'
 
@@ -470,11 +485,21 @@ class EntityViewsTestCase(ViewsTestCase, BrickTestCaseMixin):
         self.assertTrue(user.has_perm_to_delete(contact1))
         self.assertFalse(user.has_perm_to_delete(contact3))
 
-        url = self.EMPTY_TRASH_URL
-        self.assertGET404(url)
-        self.assertPOST200(url)
+        self.assertGET404(self.EMPTY_TRASH_URL)
+
+        job = self._empty_trash()
+        self.assertEqual(Job.STATUS_OK, job.status)
         self.assertFalse(FakeContact.objects.filter(id__in=[contact1.id, contact2.id]))
         self.assertStillExists(contact3)
+        self.assertFalse(EntityJobResult.objects.filter(job=job))
+
+        count = 2
+        msg = ngettext('{count} entity has been deleted.',
+                       '{count} entities have been deleted.',
+                       count
+                      ).format(count=count)
+        self.assertEqual([msg], trash_cleaner_type.get_stats(job))
+        self.assertEqual(msg, trash_cleaner_type.progress(job).label)
 
     def test_empty_trash02(self):
         "Dependencies problem."
@@ -499,26 +524,22 @@ class EntityViewsTestCase(ViewsTestCase, BrickTestCaseMixin):
                                    )[0]
         Relation.objects.create(user=user, type=rtype, subject_entity=entity01, object_entity=entity02)
 
-        response = self.assertPOST(409, self.EMPTY_TRASH_URL)
+        job = self._empty_trash()
         self.assertStillExists(entity01)
         self.assertStillExists(entity02)
         self.assertDoesNotExist(entity03)
         self.assertStillExists(entity04)
         self.assertDoesNotExist(entity05)
 
-        content = response.content.decode()
-        self.assertIn(
-            ngettext('The following entity cannot be deleted:',
-                     'The following entities cannot be deleted:',
-                     2
-                    ),
-            content
-        )
-
         msg_fmt = _('«{entity}» can not be deleted because of its dependencies.').format
-        self.assertIn(msg_fmt(entity=entity01), content)
-        self.assertIn(msg_fmt(entity=entity02), content)
-        self.assertNotIn(msg_fmt(entity=entity03), content)
+        self.assertDictEqual(
+            {entity01.id: [msg_fmt(entity=entity01)],
+             entity02.id: [msg_fmt(entity=entity02)],
+            },
+            {jresult.entity_id: jresult.messages
+                for jresult in EntityJobResult.objects.filter(job=job)
+            }
+        )
 
     def test_empty_trash03(self):
         "Credentials on specific ContentType."
@@ -549,7 +570,7 @@ class EntityViewsTestCase(ViewsTestCase, BrickTestCaseMixin):
         self.assertTrue(user.has_perm_to_delete(orga2))  # But not deleted
         self.assertTrue(user.has_perm_to_delete(orga3))
 
-        self.assertPOST200(self.EMPTY_TRASH_URL)
+        self._empty_trash()
         self.assertDoesNotExist(contact1)
         self.assertStillExists(contact2)
 
@@ -557,6 +578,37 @@ class EntityViewsTestCase(ViewsTestCase, BrickTestCaseMixin):
         self.assertDoesNotExist(orga1)
         self.assertDoesNotExist(orga3)
 
+    def test_empty_trash04(self):
+        "The entities referenced by a protecting ForeignKey are deleted after the referencing ones."
+        user = self.login()
+
+        folder = FakeFolder.objects.create(user=user, title='Earth', is_deleted=True)
+        doc = FakeDocument.objects.create(user=user, title='Pictures',
+                                          linked_folder=folder, is_deleted=True,
+                                         )
+        self.assertLess(folder.id, doc.id)
+
+        self.assertEqual([(doc.id, doc.entity_type_id), (folder.id, folder.entity_type_id)],
+                         trash_cleaner_type._sort([(folder.id, folder.entity_type_id),
+                                                   (doc.id, doc.entity_type_id),
+                                                  ])
+                        )
+
+        job = self._empty_trash()
+        self.assertDoesNotExist(doc)
+        self.assertDoesNotExist(folder)
+        self.assertFalse(EntityJobResult.objects.filter(job=job))
+
+    @override_settings(MAX_JOBS_PER_USER=1)
+    def test_empty_trash05(self):
+        "Too many jobs."
+        user = self.login()
+        Job.objects.create(type_id=trash_cleaner_type.id, user=user, data={})
+
+        response = self.assertPOST200(self.EMPTY_TRASH_URL)
+        self.assertEqual(reverse('creme_core__my_jobs'), response.content.decode())
+        self.assertEqual(1, Job.objects.filter(type_id=trash_cleaner_type.id).count())
+
     def _build_test_get_info_fields_url(self, model):
         ct = ContentType.objects.get_for_model(model)
 
@@ -1229,8 +1229,16 @@ class ListViewTestCase(ViewsTestCase):
                        )
         self.assertIn('&header=true', dl_header_uri)
 
-        self.assertEqual(reverse('creme_core__mass_import',   args=(ct_id,)), hrefs[3])
-        self.assertEqual(reverse('creme_core__batch_process', args=(ct_id,)), hrefs[4])
+        dl_job_uri = data_hrefs[3]
+        dl_job_url = '{}?ct_id={}'.format(reverse('creme_core__mass_export_job'), ct_id)
+        self.assertTrue(dl_job_uri.startswith(dl_job_url),
+                        'URI <{}> does not starts with <{}>'.format(dl_job_uri, dl_job_url)
+                       )
+        self.assertIn('hfilter={}'.format(hf.id), dl_job_uri)
+        self.assertIn('&search-regular_field-phone={}'.format(urlquote(searched_phone)), dl_job_uri)
+
+        self.assertEqual(reverse('creme_core__mass_import',   args=(ct_id,)), hrefs[4])
+        self.assertEqual(reverse('creme_core__batch_process', args=(ct_id,)), hrefs[5])
 
     @override_settings(FAST_QUERY_MODE_THRESHOLD=1000000, PAGE_SIZES=[10, 25], DEFAULT_PAGE_SIZE_IDX=1)
     def test_search_regularfields01(self):
@@ -12,6 +12,7 @@ try:
 
     from django.conf import settings
     from django.contrib.contenttypes.models import ContentType
+    from django.core import mail
     from django.db.models import Q
     from django.test.utils import override_settings
     from django.urls import reverse
@@ -35,6 +36,7 @@ try:
     )
     from creme.creme_core.core.entity_filter.operators import ISTARTSWITH
     from creme.creme_core.core.entity_filter.condition_handler import RegularFieldConditionHandler
+    from creme.creme_core.creme_jobs import mass_export_type
     from creme.creme_core.models import (
         RelationType, Relation,
         FieldsConfig,
@@ -42,6 +44,7 @@ try:
         FileRef,
         HeaderFilter,
         EntityFilter,  # EntityFilterCondition
+        Job,
     )
     from creme.creme_core.models.history import TYPE_EXPORT, HistoryLine
     from creme.creme_core.utils.queries import QSerializer
@@ -595,6 +598,238 @@ class MassExportViewsTestCase(ViewsTestCase):
         with self.assertRaises(StopIteration):
             next(it)
 
+    @override_settings(EXPORT_STREAMING=True)
+    def test_streaming_csv(self):
+        self.login()
+        hf = self._build_hf_n_contacts()
+        existing_hline_ids = [*HistoryLine.objects.values_list('id', flat=True)]
+
+        response = self.assertGET200(self._build_contact_dl_url())
+        self.assertTrue(response.streaming)
+        self.assertEqual('attachment; filename=fakecontact.csv', response['Content-Disposition'])
+
+        # The history line is created when the export starts
+        chunks = iter(response.streaming_content)
+        first_chunk = next(chunks)
+        self.assertEqual(1, HistoryLine.objects.exclude(id__in=existing_hline_ids).count())
+
+        it = (force_text(line)
+                for line in b''.join([first_chunk, *chunks]).splitlines()
+             )
+        self.assertEqual(next(it), ','.join('"{}"'.format(hfi.title) for hfi in hf.cells))
+        self.assertEqual(next(it), '"","Black","Jet","Bebop",""')
+        self.assertIn(next(it), ('"","Spiegel","Spike","Bebop/Swordfish",""',
+                                 '"","Spiegel","Spike","Swordfish/Bebop",""')
+                     )
+        self.assertIn(next(it), ('"","Valentine","Faye","","is a girl/is beautiful"',
+                                 '"","Valentine","Faye","","is beautiful/is a girl"')
+                     )
+        self.assertEqual(next(it), '"","Wong","Edward","","is a girl"')
+        self.assertRaises(StopIteration, next, it)
+
+        hlines = HistoryLine.objects.exclude(id__in=existing_hline_ids)
+        self.assertEqual(1, len(hlines))
+        self.assertEqual(TYPE_EXPORT, hlines[0].type)
+
+    @override_settings(EXPORT_STREAMING=True)
+    def test_streaming_csv_pages(self):
+        "One chunk per page."
+        self.login()
+        hf = self._build_hf_n_contacts()
+
+        from creme.creme_core.views.mass_export import MassExport
+
+        page_size = MassExport.page_size
+        try:
+            MassExport.page_size = 2
+            response = self.assertGET200(self._build_contact_dl_url())
+            chunks = [*response.streaming_content]
+        finally:
+            MassExport.page_size = page_size
+
+        self.assertEqual(3, len(chunks))  # Header + 2 pages
+        self.assertEqual(','.join('"{}"'.format(hfi.title) for hfi in hf.cells),
+                         force_text(chunks[0]).strip(),
+                        )
+        self.assertEqual(2, len(chunks[1].splitlines()))
+        self.assertEqual(2, len(chunks[2].splitlines()))
+
+    @skipIf(XlsMissing, "Skip tests, couldn't find xlwt or xlrd libs")
+    @override_settings(EXPORT_STREAMING=True)
+    def test_streaming_xls01(self):
+        "XLS cannot be streamed => regular export for small lists."
+        self.login()
+        cells = self._build_hf_n_contacts().cells
+        existing_fileref_ids = [*FileRef.objects.values_list('id', flat=True)]
+
+        response = self.assertGET200(self._build_contact_dl_url(doc_type='xls'), follow=True)
+        self.assertFalse(response.streaming)
+
+        it = iter(XlrdReader(None, file_contents=response.content))
+        self.assertEqual(next(it), [hfi.title for hfi in cells])
+        self.assertEqual(4, len([*it]))
+
+        self.assertEqual(1, FileRef.objects.exclude(id__in=existing_fileref_ids).count())
+        self.assertFalse(Job.objects.filter(type_id=mass_export_type.id))
+
+    @skipIf(XlsMissing, "Skip tests, couldn't find xlwt or xlrd libs")
+    @override_settings(EXPORT_STREAMING=True)
+    def test_streaming_xls02(self):
+        "XLS cannot be streamed => big lists are exported in background."
+        user = self.login()
+        cells = self._build_hf_n_contacts().cells
+
+        from creme.creme_core.views.mass_export import MassExport
+
+        threshold = MassExport.background_threshold
+        try:
+            MassExport.background_threshold = 3
+            response = self.client.get(self._build_contact_dl_url(doc_type='xls'))
+        finally:
+            MassExport.background_threshold = threshold
+
+        job = self.get_object_or_fail(Job, type_id=mass_export_type.id)
+        self.assertEqual(user, job.user)
+        self.assertRedirects(response, job.get_absolute_url())
+
+        mass_export_type.execute(job)
+        job = self.refresh(job)
+        self.assertEqual(Job.STATUS_OK, job.status)
+        self.assertEqual(4, job.data['count'])
+
+        fileref = self.get_object_or_fail(FileRef, id=job.data['fileref'])
+        self.assertEqual('fakecontact.xls', fileref.basename)
+
+        with open(fileref.filedata.path, 'rb') as f:
+            it = iter(XlrdReader(None, file_contents=f.read()))
+
+        self.assertEqual(next(it), [hfi.title for hfi in cells])
+        self.assertEqual(next(it), ['', 'Black', 'Jet', 'Bebop', ''])
+        self.assertEqual(3, len([*it]))
+
+    def _build_contact_job_url(self, **kwargs):
+        return self._build_contact_dl_url(**kwargs).replace(
+            reverse('creme_core__mass_export'),
+            reverse('creme_core__mass_export_job'),
+        )
+
+    def test_job01(self):
+        "CSV."
+        user = self.login()
+        hf = self._build_hf_n_contacts()
+        url = self._build_contact_job_url()
+        self.assertGET(405, url)
+
+        response = self.assertPOST200(url)
+        job = self.get_object_or_fail(Job, type_id=mass_export_type.id)
+        self.assertEqual(user, job.user)
+        self.assertEqual(Job.STATUS_WAIT, job.status)
+        self.assertEqual(job.get_absolute_url(), force_text(response.content))
+        self.assertEqual(self.ct.id, job.data['ctype'])
+        self.assertListEqual(
+            [_('Export «{model}» (format: {format})').format(
+                model=FakeContact._meta.verbose_name_plural, format='csv',
+            )],
+            job.description,
+        )
+
+        existing_hline_ids = [*HistoryLine.objects.values_list('id', flat=True)]
+
+        mass_export_type.execute(job)
+        job = self.refresh(job)
+        self.assertEqual(Job.STATUS_OK, job.status)
+        self.assertEqual(4, job.data['count'])
+        self.assertListEqual(
+            [_('{count} entities have been exported.').format(count=4)],
+            job.stats,
+        )
+
+        fileref = self.get_object_or_fail(FileRef, id=job.data['fileref'])
+        self.assertTrue(fileref.temporary)
+        self.assertEqual(user, fileref.user)
+        self.assertEqual('fakecontact.csv', fileref.basename)
+        self.assertEqual(join(settings.MEDIA_ROOT, 'upload', 'mass_export'),
+                         dirname(fileref.filedata.path)
+                        )
+
+        with open(fileref.filedata.path, 'rb') as f:
+            it = (force_text(line) for line in f.read().splitlines())
+
+        self.assertEqual(next(it), ','.join('"{}"'.format(hfi.title) for hfi in hf.cells))
+        self.assertEqual(next(it), '"","Black","Jet","Bebop",""')
+        self.assertEqual(3, len([*it]))
+
+        hlines = HistoryLine.objects.exclude(id__in=existing_hline_ids)
+        self.assertEqual(1, len(hlines))
+        self.assertEqual(TYPE_EXPORT, hlines[0].type)
+
+        # Notification
+        messages = mail.outbox
+        self.assertEqual(1, len(messages))
+        self.assertEqual([user.email], messages[0].to)
+        self.assertIn(reverse('creme_core__dl_file', args=(fileref.filedata,)),
+                      messages[0].body,
+                     )
+
+        # Download link
+        response = self.assertGET200(job.get_absolute_url())
+        self.assertContains(response, reverse('creme_core__dl_file', args=(fileref.filedata,)))
+
+    def test_job02(self):
+        "Filter, search & sorting."
+        self.login()
+        self._build_hf_n_contacts()
+
+        efilter = EntityFilter.create(
+            'test-filter01', 'Red', FakeContact,
+            conditions=[
+                RegularFieldConditionHandler.build_condition(
+                    model=FakeContact,
+                    operator=ISTARTSWITH,
+                    field_name='last_name', values=['Wong', 'Black', 'Valentine'],
+                ),
+            ],
+        )
+
+        self.assertPOST200(self._build_contact_job_url(
+            efilter_id=efilter.id, sort_key='regular_field-last_name', sort_order='DESC',
+            **{'search-regular_field-last_name': 'n'}
+        ))
+        job = self.get_object_or_fail(Job, type_id=mass_export_type.id)
+
+        mass_export_type.execute(job)
+        job = self.refresh(job)
+        self.assertEqual(Job.STATUS_OK, job.status)
+
+        with open(FileRef.objects.get(id=job.data['fileref']).filedata.path, 'rb') as f:
+            lines = [force_text(line) for line in f.read().splitlines()[1:]]
+
+        self.assertEqual(2, len(lines))
+        self.assertEqual('"","Wong","Edward","","is a girl"', lines[0])
+        self.assertIn(lines[1], ('"","Valentine","Faye","","is a girl/is beautiful"',
+                                 '"","Valentine","Faye","","is beautiful/is a girl"')
+                     )
+
+    def test_job_errors(self):
+        user = self.login()
+        self._build_hf_n_contacts()
+
+        self.assertPOST404(self._build_contact_job_url(doc_type='exe'))
+        self.assertPOST404(self._build_contact_job_url(efilter_id='test-unknown'))
+        self.assertFalse(Job.objects.filter(type_id=mass_export_type.id))
+
+        # Too many jobs
+        for i in range(settings.MAX_JOBS_PER_USER):
+            Job.objects.create(user=user, type_id=mass_export_type.id,
+                               data={'ctype': self.ct.id, 'GET': ''},
+                              )
+
+        response = self.assertPOST200(self._build_contact_job_url())
+        self.assertEqual(reverse('creme_core__my_jobs'), force_text(response.content))
+        self.assertEqual(settings.MAX_JOBS_PER_USER,
+                         Job.objects.filter(type_id=mass_export_type.id).count()
+                        )
+
     def test_print_integer01(self):
         "No choices"
         user = self.login()
@@ -18,10 +18,13 @@ try:
 
     from creme.creme_core.auth.entity_credentials import EntityCredentials
     from creme.creme_core.bricks import MassImportJobErrorsBrick, JobErrorsBrick
+    from creme.creme_core.core.entity_filter import operators
+    from creme.creme_core.core.entity_filter.condition_handler import CustomFieldConditionHandler
     from creme.creme_core.creme_jobs import mass_import_type, batch_process_type
+    from creme.creme_core.forms.mass_import import ImportForm
     from creme.creme_core.models import (CremePropertyType, CremeProperty,
             RelationType, Relation, FieldsConfig, CustomField, CustomFieldEnumValue,
-            Job, MassImportJobResult, SetCredentials,
+            Job, MassImportJobResult, SetCredentials, EntityFilter,
             FakeContact, FakeOrganisation, FakeAddress, FakeCivility, FakePosition, FakeSector,
             FakeEmailCampaign)
     from creme.creme_core.utils import update_model_instance
@@ -592,6 +595,50 @@ class MassImportViewsTestCase(ViewsTestCase, MassImportBaseTestCaseMixin, BrickT
                         )
         self.assertEqual(ryomou, jr_error.entity.get_real_entity())
 
+    @override_settings(ENTITY_FILTERS_MATERIALIZATION=True)
+    def test_mass_import_customfields_signals(self):
+        "The signal post_save is sent for the custom-values (eg: materialised filters)."
+        user = self.login()
+
+        cf_int = CustomField.objects.create(content_type=self.ct, name='Size (cm)',
+                                            field_type=CustomField.INT,
+                                           )
+        efilter = EntityFilter.create(
+            'test-filter01', 'Tall', FakeContact, is_custom=True,
+            conditions=[
+                CustomFieldConditionHandler.build_condition(
+                    custom_field=cf_int, operator=operators.GT, values=[170],
+                ),
+            ],
+        )
+        efilter.is_materialized = True
+        efilter.save()
+        efilter.materialize()
+
+        lines = [('Unchô', 'Kan-u', '180'),
+                 ('Gentoku', 'Ryûbi', '155'),
+                ]
+        doc = self._build_csv_doc(lines)
+        response = self.client.post(self._build_import_url(FakeContact),
+                                    follow=True,
+                                    data={
+                                        **self.lv_import_data,
+                                        'document': doc.id,
+                                        'user': user.id,
+
+                                        'custom_field_{}_colselect'.format(cf_int.id): 3,
+                                    },
+                                   )
+        self.assertNoFormError(response)
+        self._execute_job(response)
+
+        kanu = self.get_object_or_fail(FakeContact, first_name='Unchô', last_name='Kan-u')
+        efilter = self.refresh(efilter)
+        self.assertTrue(efilter.uses_materialization)
+        self.assertListEqual([kanu.id],
+                             [*efilter.filter(FakeContact.objects.all()).values_list('id', flat=True)]
+                            )
+
     def test_mass_import_customfields02(self):
         "CustomField.ENUM/MULTI_ENUM (no creation of choice)"
         user = self.login()
@@ -1367,7 +1414,8 @@ class MassImportViewsTestCase(ViewsTestCase, MassImportBaseTestCaseMixin, BrickT
         self.assertEqual(rei_info['email'], rei.email)
         self.assertIsNone(getattr(rei, hidden_fname))
 
-    def test_resume(self):
+    def test_resume01(self):
+        "No position in the job's data (old job) => results are counted."
         user = self.login()
         lines = [('Rei',   'Ayanami'),
                  ('Asuka', 'Langley'),
@@ -1393,6 +1441,82 @@ class MassImportViewsTestCase(ViewsTestCase, MassImportBaseTestCaseMixin, BrickT
         asuka_line = lines[1]
         self.get_object_or_fail(FakeContact, first_name=asuka_line[0], last_name=asuka_line[1])
 
+    def test_resume02(self):
+        "Position stored in the job's data."
+        user = self.login()
+        lines = [('Rei',   'Ayanami'),
+                 ('Asuka', 'Langley'),
+                 ('Shinji', 'Ikari'),
+                ]
+
+        count = FakeContact.objects.count()
+        doc = self._build_csv_doc(lines)
+        response = self.client.post(
+            self._build_import_url(FakeContact), follow=True,
+            data={**self.lv_import_data, 'document': doc.id, 'user': user.id},
+        )
+        self.assertNoFormError(response)
+
+        job = self._get_job(response)
+        job_data = job.data
+        job_data['position'] = 2  # We simulate an interrupted job
+        job.data = job_data
+        job.save()
+
+        mass_import_type.execute(job)
+        self.assertEqual(count + 1, FakeContact.objects.count())
+        self.get_object_or_fail(FakeContact, first_name='Shinji', last_name='Ikari')
+        self.assertEqual(3, self.refresh(job).data.get('position'))
+
+    def test_chunks(self):
+        "Several chunks ; errors, properties & relationships."
+        user = self.login()
+
+        ptype = CremePropertyType.create(str_pk='test-prop_pilot', text='Is a pilot')
+        rtype = RelationType.create(('test-subject_pilots', 'pilots'),
+                                    ('test-object_pilots',  'is piloted by')
+                                   )[0]
+        eva01 = FakeOrganisation.objects.create(user=user, name='Eva01')
+
+        lines = [('Rei',    'Ayanami'),
+                 ('Asuka',  ''),  # Error: last_name is required
+                 ('Shinji', 'Ikari'),
+                ]
+
+        count = FakeContact.objects.count()
+        doc = self._build_csv_doc(lines)
+        response = self.client.post(
+            self._build_import_url(FakeContact), follow=True,
+            data={
+                **self.lv_import_data,
+                'document': doc.id,
+                'user': user.id,
+                'property_types': [ptype.id],
+                'fixed_relations': self.formfield_value_multi_relation_entity((rtype.id, eva01)),
+            },
+        )
+        self.assertNoFormError(response)
+
+        chunk_size = ImportForm.chunk_size
+        ImportForm.chunk_size = 2
+
+        try:
+            job = self._execute_job(response)
+        finally:
+            ImportForm.chunk_size = chunk_size
+
+        self.assertEqual(count + 2, FakeContact.objects.count())
+        self.assertEqual(3, self.refresh(job).data.get('position'))
+
+        results = self._get_job_results(job)
+        self.assertEqual(3, len(results))
+        self.assertEqual(1, len([r for r in results if r.entity_id is None]))
+
+        for first_name, last_name in (('Rei', 'Ayanami'), ('Shinji', 'Ikari')):
+            contact = self.get_object_or_fail(FakeContact, first_name=first_name, last_name=last_name)
+            self.assertEqual([ptype.id], [p.type_id for p in contact.properties.all()])
+            self.assertRelationCount(1, contact, rtype, eva01)
+
     def _aux_test_dl_errors(self, doc_builder, result_builder, ext, header=False, follow=False):
         "CSV, no header"
         user = self.login()
@@ -162,7 +162,8 @@ creme_core_patterns = [
     re_path(r'^list_view/popup[/]?$', entity.EntitiesListPopup.as_view(), name='creme_core__listview_popup'),
 
     # re_path(r'^list_view/download[/]?$', list_view_export.dl_listview, name='creme_core__dl_listview'),
-    re_path(r'^mass_export[/]?$', mass_export.MassExport.as_view(), name='creme_core__mass_export'),
+    re_path(r'^mass_export[/]?$',     mass_export.MassExport.as_view(),            name='creme_core__mass_export'),
+    re_path(r'^mass_export/job[/]?$', mass_export.MassExportJobCreation.as_view(), name='creme_core__mass_export_job'),
 
     re_path(r'^mass_import/', include([
         re_path(r'^(?P<ct_id>\d+)[/]?$',            mass_import.mass_import,     name='creme_core__mass_import'),
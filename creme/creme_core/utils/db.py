@@ -167,6 +167,37 @@ def get_indexed_ordering(model, fields_pattern):
 
 
 # TODO: ManyToManyField too ?
+def estimate_rows_count(model):
+    """Get the number of rows of the table of a model, as estimated by the
+    statistics of the DB (so it's fast, but not exact).
+    @param model: A class inheriting DjangoModel.
+    @return An integer, or None if the estimation is not possible (SQLite,
+            statistics not computed yet...).
+
+    NB: the estimation is about the whole table ; it does not take care of the
+        parent tables (multi-table inheritance).
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    vendor = connection.vendor
+
+    if vendor == 'postgresql':
+        sql = 'SELECT reltuples FROM pg_class WHERE oid = %s::regclass'
+    elif vendor == 'mysql':
+        sql = 'SELECT TABLE_ROWS FROM information_schema.TABLES ' \
+              'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s'
+    else:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [model._meta.db_table])
+        row = cursor.fetchone()
+
+    # NB: PostgreSQL returns -1 (or 0 before PG14) if the table has never been analysed.
+    estimation = row[0] if row else None
+
+    return int(estimation) if estimation is not None and estimation > 0 else None
+
+
 def populate_related(instances, field_names):
     """Retrieve the given ForeignKeys values for some instances, in order to
     reduce the number of DB queries.
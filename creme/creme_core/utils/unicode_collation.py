@@ -37,108 +37,362 @@ allkeys.txt (1.6 MB) is available at:
     http://www.unicode.org/Public/UCA/latest/allkeys.txt
 
 but you can always subset this for just the characters you are dealing with.
+
+The table is compiled in a compact binary file (see compile_table() & the
+command "creme_build_collation_table") which is memory-mapped, so it is shared
+by all the processes of the server & loaded only when it's needed. When this
+file does not exist, the table is compiled in memory from allkeys.txt.
 """
 
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+import logging
+import mmap
+from os import replace, stat
+from os.path import dirname, join
 from re import compile as compile_re
-from logging import info
+import struct
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FILENAME = join(dirname(__file__), 'allkeys.txt')
+DEFAULT_COMPILED_FILENAME = join(dirname(__file__), 'allkeys.bin')
+
+# Header of the compiled file:
+#  - magic string.
+#  - version of the format.
+#  - byte order marker (the arrays are stored with the native byte order).
+#  - size of the source file (used to detect an outdated compiled file).
+#  - count of single code-points entries.
+#  - count of contractions.
+#  - max length of the contractions.
+#  - count of collation elements.
+#  - count of weights per collation element.
+#  - typecode of the weights ('H' or 'I').
+_MAGIC = b'CREMEUCA'
+_VERSION = 1
+_BYTE_ORDER_MARKER = 0x0102
+_HEADER = struct.Struct('=8sHHQIIIIIc')
+_ALIGNMENT = 8
+
+
+class CompiledTableError(Exception):
+    pass
+
+
+def _parse_allkeys(filename):
+    "Generator of tuples (code-points, collation-elements) ; both are lists of integers/tuples."
+    match = compile_re(r'^(?P<charList>[0-9A-F]{4,6}(?:[\s]+[0-9A-F]{4,6})*)[\s]*;[\s]*'
+                       r'(?P<collElement>(?:[\s]*\[(?:[\*|\.][0-9A-F]{4,6}){3,4}\])+)[\s]*'
+                       r'(?:#.*$|$)'
+                      ).match
+    findall_ce = compile_re(r'\[.([^\]]+)\]?').findall  # 'ce' means 'collation element'
+
+    with open(filename) as f:
+        for line in f:
+            re_result = match(line)
+
+            if re_result is not None:
+                group = re_result.group
+                yield ([int(ch, 16) for ch in group('charList').split()],
+                       [tuple(int(weight, 16) for weight in coll_element.split('.'))
+                            for coll_element in findall_ce(group('collElement'))
+                       ],
+                      )
+            elif not line.startswith(('#', '@')) and line.split():
+                logger.info('ERROR in line %s:', line)
+
+
+def _sections(singles_count, contractions_count, contraction_max_length,
+              ce_count, levels, weight_typecode):
+    "@return: List of tuples (typecode, items_count) ; one tuple per array of the file."
+    return [
+        ('I', singles_count),                                    # Code-points (sorted)
+        ('I', singles_count),                                    # Index of first CE
+        ('B', singles_count),                                    # Count of CEs
+        ('I', contractions_count * contraction_max_length),      # Code-points (0-padded)
+        ('B', contractions_count),                               # Length of the contraction
+        ('I', contractions_count),                               # Index of first CE
+        ('B', contractions_count),                               # Count of CEs
+        (weight_typecode, ce_count * levels),                    # Weights
+    ]
+
+
+def compile_table(filename=DEFAULT_FILENAME):
+    """Compile a collation elements table (format of allkeys.txt) in a binary
+    format which can be loaded by _CollationTable.
+    @param filename: Path of the source file.
+    @return: bytes.
+    """
+    singles = {}
+    contractions = {}
+
+    for codepoints, elements in _parse_allkeys(filename):
+        if len(codepoints) == 1:
+            singles[codepoints[0]] = elements
+        else:
+            contractions[tuple(codepoints)] = elements
+
+    all_elements = [*singles.values(), *contractions.values()]
+    levels = max((len(ce) for elements in all_elements for ce in elements), default=0)
+    max_weight = max((w for elements in all_elements for ce in elements for w in ce), default=0)
+    weight_typecode = 'H' if max_weight <= 0xFFFF else 'I'
+    max_length = max((len(codepoints) for codepoints in contractions), default=0)
+
+    weights = array(weight_typecode)
+    ce_count = 0
+
+    def add_elements(elements):
+        nonlocal ce_count
+        first = ce_count
+
+        for ce in elements:
+            weights.extend(ce)
+            weights.extend([0] * (levels - len(ce)))  # NB: 0 weights are ignored by sort keys
+
+        ce_count += len(elements)
+
+        return first, len(elements)
+
+    single_codepoints = sorted(singles.keys())
+    single_firsts = array('I')
+    single_counts = array('B')
+
+    for codepoint in single_codepoints:
+        first, count = add_elements(singles[codepoint])
+        single_firsts.append(first)
+        single_counts.append(count)
+
+    contraction_codepoints = array('I')
+    contraction_lengths = array('B')
+    contraction_firsts = array('I')
+    contraction_counts = array('B')
+
+    for codepoints, elements in contractions.items():
+        contraction_codepoints.extend(codepoints)
+        contraction_codepoints.extend([0] * (max_length - len(codepoints)))
+        contraction_lengths.append(len(codepoints))
+
+        first, count = add_elements(elements)
+        contraction_firsts.append(first)
+        contraction_counts.append(count)
+
+    arrays = [
+        array('I', single_codepoints), single_firsts, single_counts,
+        contraction_codepoints, contraction_lengths, contraction_firsts, contraction_counts,
+        weights,
+    ]
+    chunks = [_HEADER.pack(_MAGIC, _VERSION, _BYTE_ORDER_MARKER, stat(filename).st_size,
+                           len(single_codepoints), len(contractions), max_length,
+                           ce_count, levels, weight_typecode.encode(),
+                          ),
+             ]
+    size = _HEADER.size
+
+    for arr in arrays:
+        padding = -size % _ALIGNMENT
+        data = arr.tobytes()
+        chunks.append(b'\0' * padding)
+        chunks.append(data)
+        size += padding + len(data)
+
+    return b''.join(chunks)
+
+
+class _CollationTable:
+    """Collation elements table, backed by the compiled binary format
+    (see compile_table()). The arrays are not copied (they are views on the
+    buffer), so a memory-mapped file is shared between processes.
+    """
+    def __init__(self, buffer, source_size=None):
+        """Constructor.
+        @param buffer: Object supporting the buffer protocol (bytes, mmap...).
+        @param source_size: If not None, the compiled table must have been
+               built from a source file with this size.
+        @raise CompiledTableError.
+        """
+        view = memoryview(buffer)
+        header_size = _HEADER.size
+
+        if len(view) < header_size:
+            raise CompiledTableError('the file is truncated')
+
+        (magic, version, bom, compiled_source_size,
+         singles_count, contractions_count, max_length,
+         ce_count, levels, weight_typecode,
+        ) = _HEADER.unpack_from(view)
+
+        if magic != _MAGIC:
+            raise CompiledTableError('invalid magic string')
+
+        if version != _VERSION:
+            raise CompiledTableError('unsupported version: {}'.format(version))
+
+        if bom != _BYTE_ORDER_MARKER:
+            raise CompiledTableError('the byte order is not the native one')
+
+        if source_size is not None and compiled_source_size != source_size:
+            raise CompiledTableError('the file is outdated')
+
+        arrays = []
+        offset = header_size
+
+        for typecode, count in _sections(singles_count, contractions_count, max_length,
+                                         ce_count, levels, weight_typecode.decode(),
+                                        ):
+            offset += -offset % _ALIGNMENT
+            end = offset + count * array(typecode).itemsize
+
+            if end > len(view):
+                raise CompiledTableError('the file is truncated')
+
+            arrays.append(view[offset:end].cast(typecode))
+            offset = end
+
+        (self._codepoints, self._firsts, self._counts,
+         contraction_codepoints, contraction_lengths, contraction_firsts, contraction_counts,
+         self._weights,
+        ) = arrays
+        self._levels = levels
+
+        # NB: there are few contractions, so they are loaded in a dictionary.
+        #     <_contraction_starters> gives the maximum length of the
+        #     contractions for their first code-point.
+        self._contractions = contractions = {}
+        self._contraction_starters = starters = {}
+
+        for i in range(contractions_count):
+            length = contraction_lengths[i]
+            start = i * max_length
+            codepoints = tuple(contraction_codepoints[start:start + length])
+            contractions[codepoints] = self._elements(contraction_firsts[i],
+                                                      contraction_counts[i],
+                                                     )
+            first_codepoint = codepoints[0]
+            starters[first_codepoint] = max(length, starters.get(first_codepoint, 0))
+
+        # Fast path for ASCII/Latin-1
+        lookup = self._lookup
+        self._latin1 = [lookup(codepoint) for codepoint in range(256)]
+
+    def _elements(self, first, count):
+        levels = self._levels
+        weights = self._weights[first * levels:(first + count) * levels]
+
+        return [tuple(weights[i:i + levels]) for i in range(0, count * levels, levels)]
+
+    def _lookup(self, codepoint):
+        "@return: The list of collation elements of a code-point, or None."
+        codepoints = self._codepoints
+        i = bisect_left(codepoints, codepoint)
+
+        if i < len(codepoints) and codepoints[i] == codepoint:
+            return self._elements(self._firsts[i], self._counts[i])
+
+        return None
+
+    def collation_elements(self, codepoints):
+        "@return: The list of collation elements corresponding to a list of code-points."
+        contractions = self._contractions
+        starters = self._contraction_starters
+        latin1 = self._latin1
+        lookup = self._lookup
 
+        collation_elements = []
+        extend = collation_elements.extend
+        length = len(codepoints)
+        i = 0
 
-class _Node:
-    __slots__ = ('value', '_children')
+        while i < length:
+            codepoint = codepoints[i]
+            max_length = starters.get(codepoint)
 
-    def __init__(self):
-        self.value = None
-        self._children = None  # Memory optimisation: children are created only if needed
+            if max_length:
+                # The longest contraction is used
+                for size in range(min(max_length, length - i), 1, -1):
+                    value = contractions.get(tuple(codepoints[i:i + size]))
 
-    def get_next_node(self, key):
-        next_node = None
-        children = self._children
+                    if value is not None:
+                        extend(value)
+                        i += size
+                        break
+                else:
+                    max_length = None
 
-        if children:
-            next_node = children.get(key)
+                if max_length:
+                    continue
 
-        return next_node
+            value = latin1[codepoint] if codepoint < 256 else lookup(codepoint)
 
-    def set_next_node(self, key):
-        children = self._children
+            if not value:
+                # Calculate implicit weighting for CJK Ideographs
+                # contributed by David Schneider 2009-07-27
+                # http://www.unicode.org/reports/tr10/#Implicit_Weights
+                value = [(0xFB40 + (codepoint >> 15), 0x0020, 0x0002, 0x0001),
+                         ((codepoint & 0x7FFF) | 0x8000, 0x0000, 0x0000, 0x0000),
+                        ]
 
-        if children is None:
-            self._children = children = {}
+            extend(value)
+            i += 1
 
-        return children.setdefault(key, _Node())
+        return collation_elements
 
 
 class _Collator:
-    def __init__(self, filename=None):
-        self._root = _Node()
-
-        if filename is None:
-            from os.path import dirname, join
-            filename = join(dirname(__file__), 'allkeys.txt')
-
-        # weights = {} #cache of (int, int, int, int) elements
-        match = compile_re(r'^(?P<charList>[0-9A-F]{4,6}(?:[\s]+[0-9A-F]{4,6})*)[\s]*;[\s]*'
-                           r'(?P<collElement>(?:[\s]*\[(?:[\*|\.][0-9A-F]{4,6}){3,4}\])+)[\s]*'
-                           r'(?:#.*$|$)'
-                          ).match
-        findall_ce = compile_re(r'\[.([^\]]+)\]?').findall  # 'ce' means 'collation element'
-        add = self._add
-
-        with open(filename) as f:
-            for line in f:
-                re_result = match(line)
-
-                if re_result is not None:
-                    group = re_result.group
-                    add([int(ch, 16) for ch in group('charList').split()],
-                        [tuple(int(weight, 16) for weight in coll_element.split('.'))
-                            for coll_element in findall_ce(group('collElement'))
-                        ]
+    """Build sort keys for strings.
+    The collation table is loaded at the first use ; the compiled file
+    (see compile_table()) is used if it exists & is up to date.
+    """
+    sort_key_cache_size = 4096
+
+    def __init__(self, filename=None, compiled_filename=None):
+        """Constructor.
+        @param filename: Path of the source table (format of allkeys.txt).
+        @param compiled_filename: Path of the compiled table.
+        """
+        self.filename = filename or DEFAULT_FILENAME
+        self.compiled_filename = compiled_filename or (
+            DEFAULT_COMPILED_FILENAME if filename is None else filename + '.bin'
+        )
+        self._table = None
+        self.sort_key = lru_cache(maxsize=self.sort_key_cache_size)(self._sort_key)
+
+    def _load_table(self):
+        filename = self.filename
+        compiled_filename = self.compiled_filename
+
+        try:
+            source_size = stat(filename).st_size
+        except OSError:
+            source_size = None  # NB: the source file is not needed by the compiled file
+
+        try:
+            with open(compiled_filename, 'rb') as f:
+                # NB: the mapping stays valid after the file is closed.
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            return _CollationTable(buffer, source_size=source_size)
+        except (OSError, ValueError, CompiledTableError) as e:
+            logger.info('The compiled collation table "%s" cannot be used (%s) ; '
+                        'the table is compiled in memory (hint: use the command '
+                        '"creme_build_collation_table").',
+                        compiled_filename, e,
                        )
-                elif not line.startswith(('#', '@')) and line.split():
-                    info('ERROR in line %s:', line)
-
-    def _add(self, key, value):
-        curr_node = self._root
-
-        for part in key:
-            curr_node = curr_node.set_next_node(part)
-
-        curr_node.value = value
 
-    def _find_prefix(self, key):
-        curr_node = self._root
-        step = 0
+        return _CollationTable(compile_table(filename))
 
-        for part in key:
-            next_node = curr_node.get_next_node(part)
+    @property
+    def table(self):
+        table = self._table
 
-            if next_node is None:
-                break
+        if table is None:
+            self._table = table = self._load_table()
 
-            curr_node = next_node
-            step += 1
+        return table
 
-        return (curr_node.value, key[step:])
-
-    def sort_key(self, string):
-        find_prefix = self._find_prefix
-        collation_elements = []
-        extend = collation_elements.extend
-
-        lookup_key = [ord(ch) for ch in string]
-        while lookup_key:
-            value, lookup_key = find_prefix(lookup_key)
-            if not value:
-                # Calculate implicit weighting for CJK Ideographs
-                # contributed by David Schneider 2009-07-27
-                # http://www.unicode.org/reports/tr10/#Implicit_Weights
-                key = lookup_key[0]
-                value = [(0xFB40 + (key >> 15), 0x0020, 0x0002, 0x0001),
-                         ((key & 0x7FFF) | 0x8000, 0x0000, 0x0000, 0x0000),
-                        ]
-                lookup_key = lookup_key[1:]
-            extend(value)
+    def _sort_key(self, string):
+        collation_elements = self.table.collation_elements([ord(ch) for ch in string])
 
         sort_key = []
         append = sort_key.append
@@ -158,4 +412,16 @@ class _Collator:
         return tuple(sort_key)
 
 
+def build_compiled_table(filename=DEFAULT_FILENAME, compiled_filename=DEFAULT_COMPILED_FILENAME):
+    """Compile the table & write it in a file (which is replaced atomically,
+    because it can be mapped by running processes).
+    """
+    tmp_filename = compiled_filename + '.tmp'
+
+    with open(tmp_filename, 'wb') as f:
+        f.write(compile_table(filename))
+
+    replace(tmp_filename, compiled_filename)
+
+
 collator = _Collator()
@@ -31,6 +31,7 @@ from django.template.engine import Engine
 
 from .. import utils
 from ..auth.decorators import login_required
+from ..core.brick_cache import brick_cache
 from ..gui.bricks import brick_registry, BricksManager
 from ..models import CremeEntity, BrickState
 
@@ -65,7 +66,7 @@ def render_detailview_brick(brick, context):
     fun = getattr(brick, 'detailview_display', None)
 
     if fun:
-        return fun(context)
+        return brick_cache.render(brick, context, fun)
 
     logger.warning('Brick without detailview_display(): %s (id=%s)', brick.__class__, brick.id_)
 
@@ -74,7 +75,7 @@ def render_home_brick(brick, context):
     fun = getattr(brick, 'home_display', None)
 
     if fun:
-        return fun(context)
+        return brick_cache.render(brick, context, fun)
 
     logger.warning('Brick without home_display() : %s (id=%s)', brick.__class__, brick.id_)
 
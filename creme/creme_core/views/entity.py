@@ -22,35 +22,34 @@ from collections import defaultdict
 # from json import dumps as json_dumps
 import logging
 
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import PermissionDenied
 from django.db.models import Q, FieldDoesNotExist, ProtectedError
 from django.db.transaction import atomic
-from django.db.utils import NotSupportedError
 from django.forms.models import modelform_factory
 from django.http import HttpResponse, HttpResponseRedirect, Http404, HttpResponseBadRequest
 from django.shortcuts import get_object_or_404, render, redirect
 from django.urls import reverse
-from django.utils.html import format_html, format_html_join
+from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _, gettext, ngettext
 
 from .. import constants
 from ..auth.decorators import login_required, superuser_required
 from ..core.exceptions import ConflictError, SpecificProtectedError
-from ..core.paginator import FlowPaginator
 from ..forms import CremeEntityForm
 from ..forms.bulk import BulkDefaultEditForm
 from ..forms.merge import form_factory as merge_form_factory, MergeEntitiesBaseForm
 from ..gui import bulk_update  # NB: do no import <bulk_update_registry> to facilitate unit testing
 from ..gui.merge import merge_form_registry
-from ..models import CremeEntity, EntityCredentials, FieldsConfig, Relation, Sandbox
+from ..creme_jobs import trash_cleaner_type
+from ..models import CremeEntity, EntityCredentials, FieldsConfig, Job, Relation, Sandbox
 from ..models.fields import UnsafeHTMLField
 from ..utils import (
     get_ct_or_404,
     get_from_POST_or_404, get_from_GET_or_404,
     bool_from_str_extended,
 )
-from ..utils.collections import LimitedList
 from ..utils.html import sanitize_html
 from ..utils.meta import ModelFieldEnumerator
 from ..utils.serializers import json_encode
@@ -761,113 +760,21 @@ class Trash(generic.BricksView):
     template_name = 'creme_core/trash.html'
 
 
-# TODO: use a Job
 @login_required
 @POST_only
 def empty_trash(request):
-    # NB 1: we try to delete the remaining entities (which could not be deleted
-    #       because of relationships) when there are errors, while the previous
-    #       iteration managed to remove some entities.
-    #       It will not work with cyclic references (but it is certainly very unusual).
-    # NB 2: we do not use delete() method of queryset in order to send signals.
+    """The entities are deleted by a job (see creme_core.creme_jobs.trash_cleaner).
+    The response contains the URL to redirect to (detail-view of the job, or
+    the list of the user's jobs if there are too many running jobs).
+    """
     user = request.user
 
-    ctype_ids_qs = CremeEntity.objects.filter(is_deleted=True) \
-                                      .values_list('entity_type', flat=True)
-
-    try:
-        # NB: currently only supported by PostGreSQL
-        ctype_ids = [*ctype_ids_qs.order_by('entity_type_id').distinct('entity_type_id')]
-    except NotSupportedError:
-        ctype_ids = {*ctype_ids_qs}
-
-    entity_classes = [
-        ct.model_class()
-            for ct in map(ContentType.objects.get_for_id, ctype_ids)
-    ]
-
-    while True:
-        progress = False
-        errors = LimitedList(max_size=50)
-
-        # NB (#60): 'SELECT FOR UPDATE' in a query using an 'OUTER JOIN' and nullable ids will fail with postgresql (both 9.6 & 10.x).
-        # TODO: This bug may be fixed in django > 2.2 (see https://code.djangoproject.com/ticket/28010)
-
-        # for entity_class in entity_classes:
-        #     paginator = FlowPaginator(
-        #         queryset=EntityCredentials.filter(
-        #             user,
-        #             entity_class.objects.filter(is_deleted=True),
-        #             EntityCredentials.DELETE,
-        #         ).order_by('id').select_for_update(),
-        #         key='id',
-        #         per_page=256,
-        #     )
-        #
-        #     with atomic():
-        #         for entities_page in paginator.pages():
-        #             for entity in entities_page.object_list:
-        #                 entity = entity.get_real_entity()
-        for entity_class in entity_classes:
-            paginator = FlowPaginator(
-                queryset=EntityCredentials.filter(
-                    user,
-                    entity_class.objects.filter(is_deleted=True),
-                    EntityCredentials.DELETE,
-                ).order_by('id'),  # .select_for_update()
-                key='id',
-                per_page=256,
-            )
-
-            for entities_page in paginator.pages():
-                with atomic():
-                    # NB (#60): Move 'SELECT FOR UPDATE' here for now (see above).
-                    for entity in entity_class.objects.filter(pk__in=entities_page.object_list).select_for_update():
-                        try:
-                            entity.delete()
-                        except ProtectedError:
-                            errors.append(
-                                gettext('«{entity}» can not be deleted because of its dependencies.').format(
-                                    entity=entity.allowed_str(user)
-                                )
-                            )
-                        except Exception as e:
-                            logger.exception('Error when trying to empty the trash')
-                            errors.append(
-                                gettext('«{entity}» deletion caused an unexpected error [{error}].').format(
-                                    entity=entity.allowed_str(user),
-                                    error=e,
-                                )
-                            )
-                        else:
-                            progress = True
-
-        if not errors or not progress:
-            break
+    if Job.not_finished_jobs(user).count() >= settings.MAX_JOBS_PER_USER:
+        return HttpResponse(reverse('creme_core__my_jobs'), content_type='text/plain')
 
-    # TODO: factorise ??
-    if not errors:
-        status = 200
-        message = gettext('Operation successfully completed')
-    else:
-        status = 409
-        error_count = len(errors)
-        additional_count = error_count - errors.max_size
-        message = format_html(
-            '{}<br><ul>{}</ul><br>{}',
-            ngettext('The following entity cannot be deleted:',
-                     'The following entities cannot be deleted:',
-                     error_count,
-                    ),
-            format_html_join('', '<li>{}</li>', ((msg,) for msg in errors)),
-            '' if additional_count <= 0 else
-            ngettext('(and {count} other entity)',
-                     '(and {count} other entities)',
-                     additional_count,
-                    ).format(count=additional_count),
-        )
+    job = Job.objects.create(type_id=trash_cleaner_type.id, user=user, data={})
 
-    return HttpResponse(message, status=status)
+    return HttpResponse(job.get_absolute_url(), content_type='text/plain')
 
 
 @login_required
@@ -39,6 +39,7 @@ from django.views.generic.list import ListView
 from creme.creme_core.auth.entity_credentials import EntityCredentials
 from creme.creme_core.core import sorter
 from creme.creme_core.core.entity_cell import EntityCellActions
+from creme.creme_core.core.entity_count import get_entities_counter
 from creme.creme_core.core.paginator import FlowPaginator  # LastPage
 from creme.creme_core.forms.listview import ListViewSearchForm
 from creme.creme_core.gui import listview as lv_gui
@@ -498,6 +499,7 @@ class EntitiesList(base.PermissionsMixin, base.TitleMixin, ListView):
         lv_gui.CreationButton,
         lv_gui.MassExportButton,
         lv_gui.MassExportHeaderButton,
+        lv_gui.MassExportJobButton,
         lv_gui.MassImportButton,
         lv_gui.BatchProcessButton,
     ]
@@ -524,6 +526,7 @@ class EntitiesList(base.PermissionsMixin, base.TitleMixin, ListView):
 
         self.queryset = None  # We hide voluntarily the class attribute which SHOULD not be used.
         self.count = None
+        self.count_is_estimated = False
         self.fast_mode = None
         self.ordering = None  # Idem
 
@@ -657,6 +660,7 @@ class EntitiesList(base.PermissionsMixin, base.TitleMixin, ListView):
         context['is_selection_multiple'] = (self.mode is SelectionMode.MULTIPLE)
         context['buttons'] = self.get_buttons()
         context['page_sizes'] = settings.PAGE_SIZES
+        context['is_count_estimated'] = self.count_is_estimated
 
         # TODO: pass the bulk_update_registry in a list-view context (see listview_td_action_for_cell)
         # TODO: regroup registries ??
@@ -851,27 +855,50 @@ class EntitiesList(base.PermissionsMixin, base.TitleMixin, ListView):
         # ----
         # If the query does not use the real entities' specific fields to filter,
         # we perform a query on CremeEntity & so we avoid a JOIN.
+        model = self.model
+
         if filtered:
-            count = qs.count()
+            compute_count = qs.count
         else:
-            model = self.model
-            try:
-                count = EntityCredentials.filter_entities(
-                    user,
-                    CremeEntity.objects.filter(
-                        is_deleted=False,
-                        entity_type=ContentType.objects.get_for_model(model),
-                    ),
-                    as_model=model,
-                ).count()
-            except EntityCredentials.FilteringError as e:
-                logger.debug('%s.get_unordered_queryset_n_count() : fast count is not possible (%s)',
-                             type(self).__name__, e,
-                            )
-                count = qs.count()
+            def compute_count():
+                try:
+                    return EntityCredentials.filter_entities(
+                        user,
+                        CremeEntity.objects.filter(
+                            is_deleted=False,
+                            entity_type=ContentType.objects.get_for_model(model),
+                        ),
+                        as_model=model,
+                    ).count()
+                except EntityCredentials.FilteringError as e:
+                    logger.debug('%s.get_unordered_queryset_n_count() : fast count is not possible (%s)',
+                                 type(self).__name__, e,
+                                )
+                    return qs.count()
+
+        count, self.count_is_estimated = self.get_entities_counter().count(
+            model=model, user=user,
+            compute=compute_count,
+            key=self.get_count_key() if filtered else '',
+            unfiltered=not filtered,
+        )
 
         return qs, count
 
+    def get_count_key(self):
+        "Key identifying the filtering of the list ; see get_entities_counter()."
+        entity_filter = self.entity_filter
+
+        return '{}#{}#{}'.format(
+            entity_filter.id if entity_filter else '',
+            self.extra_q['total'],
+            self.search_form.search_q,
+        )
+
+    def get_entities_counter(self):
+        "@return: An instance of <creme_core.core.entity_count.EntitiesCounter>."
+        return get_entities_counter()
+
     def get_search_field_registry(self):
         return self.search_field_registry
 
@@ -979,7 +1006,9 @@ class EntitiesList(base.PermissionsMixin, base.TitleMixin, ListView):
         page = self.PAGE_BUILDERS[type(paginator)](self, paginator=paginator)
 
         # Optimisation time !!
-        self.header_filter.populate_entities(page.object_list, self.request.user)
+        user = self.request.user
+        self.header_filter.populate_entities(page.object_list, user)
+        EntityCredentials.populate(user, page.object_list)
 
         is_paginated = page.has_other_pages()
 
@@ -20,16 +20,21 @@
 
 import logging
 
-from django.http import Http404
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils.encoding import smart_str
+from django.utils.translation import gettext as _
 
 from ..backends import export_backend_registry
 from ..core import sorter
+from ..core.exceptions import ConflictError
+from ..creme_jobs import mass_export_type
 from ..core.paginator import FlowPaginator
 from ..forms.listview import ListViewSearchForm
 from ..gui.listview import search_field_registry  # ListViewState
-from ..models import EntityFilter, EntityCredentials, HeaderFilter
+from ..models import EntityFilter, EntityCredentials, HeaderFilter, Job
 from ..models.history import _HLTEntityExport
 from ..utils import get_from_GET_or_404, bool_from_str_extended
 from ..utils.meta import Order
@@ -40,7 +45,6 @@ from .generic import base
 logger = logging.getLogger(__name__)
 
 
-# TODO: stream response ??
 # TODO: factorise with generic.listview.EntitiesList ?
 class MassExport(base.EntityCTypeRelatedMixin, base.CheckedView):
     ct_id_arg = 'ct_id'
@@ -53,6 +57,11 @@ class MassExport(base.EntityCTypeRelatedMixin, base.CheckedView):
     extra_q_arg = 'extra_q'
 
     page_size = 1024
+    streaming = None  # None means <use settings.EXPORT_STREAMING>
+    # When the streaming is enabled, the exports with a backend which cannot
+    # stream (eg: XLS) are done in background beyond this number of entities.
+    background_threshold = 10000
+    job_type = mass_export_type
 
     cell_sorter_registry = sorter.cell_sorter_registry
     query_sorter_class   = sorter.QuerySorter
@@ -156,85 +165,189 @@ class MassExport(base.EntityCTypeRelatedMixin, base.CheckedView):
 
         return sort_info.field_names
 
-    def get(self, request, *args, **kwargs):
-        user = request.user
+    def get_streaming(self):
+        streaming = self.streaming
+        return settings.EXPORT_STREAMING if streaming is None else streaming
 
-        header_only = self.get_header_only()
-        backend = self.get_backend()
-        ct = self.get_ctype()
-        model = ct.model_class()
-        hf = self.get_header_filter()
+    def get_entities_queryset(self, *, model, cells):
+        request = self.request
+        entities_qs = model.objects.filter(is_deleted=False)
+        use_distinct = False
+
+        # ----
+        efilter = self.get_entity_filter()
+        if efilter is not None:
+            entities_qs = efilter.filter(entities_qs)
+
+        # ----
+        extra_q = request.GET.get(self.extra_q_arg)
+        if extra_q is not None:
+            entities_qs = entities_qs.filter(QSerializer().loads(extra_q))
+            use_distinct = True  # TODO: test + only if needed
+
+        # ----
+        search_form = self.get_search_form(cells=cells)
+        search_q = search_form.search_q
+        if search_q:
+            try:
+                entities_qs = entities_qs.filter(search_q)
+            except Exception as e:
+                logger.exception('Error when building the search queryset with Q=%s (%s).', search_q, e)
+            else:
+                use_distinct = True  # TODO: test + only if needed
 
-        cells = self.get_cells(header_filter=hf)
+        # ----
+        entities_qs = EntityCredentials.filter(request.user, entities_qs)
 
-        writer = backend()
-        writerow = writer.writerow
-        writerow([smart_str(cell.title) for cell in cells])  # Doesn't accept generator expression... ;(
+        if use_distinct:
+            entities_qs = entities_qs.distinct()
 
-        if not header_only:
-            ordering = self.get_ordering(model=model, cells=cells)
+        return entities_qs, efilter
 
-            entities_qs = model.objects.filter(is_deleted=False)
-            use_distinct = False
+    def iter_pages(self, *, header_filter, cells, paginator=None, efilter=None):
+        """Generator of pages of rows ; the first page contains only the header.
+        Each page of entities is populated & rendered only when it is consumed,
+        so this method can feed a streamed response.
+        @param paginator: FlowPaginator on the exported entities ;
+               <None> means that only the header is exported.
+        @param efilter: EntityFilter used to retrieve the entities (for history).
+        """
+        user = self.request.user
 
-            # ----
-            efilter = self.get_entity_filter()
-            if efilter is not None:
-                entities_qs = efilter.filter(entities_qs)
+        if paginator is not None:
+            # NB: the line is created when the export starts, so it exists even
+            #     if the client is disconnected during a streamed export.
+            _HLTEntityExport.create_line(
+                ctype=self.get_ctype(), user=user, count=paginator.queryset.count(),
+                hfilter=header_filter, efilter=efilter,
+            )
 
-            # ----
-            extra_q = request.GET.get(self.extra_q_arg)
-            if extra_q is not None:
-                entities_qs = entities_qs.filter(QSerializer().loads(extra_q))
-                use_distinct = True  # TODO: test + only if needed
+        yield [[smart_str(cell.title) for cell in cells]]
+
+        if paginator is None:
+            return
+
+        for entities_page in paginator.pages():
+            entities = entities_page.object_list
+
+            header_filter.populate_entities(entities, user)  # Optimisation time !!!
+
+            rows = []
+
+            for entity in entities:
+                line = []
+
+                for cell in cells:
+                    try:
+                        res = cell.render_csv(entity, user)
+                    except Exception as e:
+                        logger.debug('Exception in CSV export: %s', e)
+                        res = ''
+
+                    line.append(smart_str(res) if res else '')
 
-            # ----
-            search_form = self.get_search_form(cells=cells)
-            search_q = search_form.search_q
-            if search_q:
-                try:
-                    entities_qs = entities_qs.filter(search_q)
-                except Exception as e:
-                    logger.exception('Error when building the search queryset with Q=%s (%s).', search_q, e)
-                else:
-                    use_distinct = True  # TODO: test + only if needed
+                rows.append(line)
 
-            # ----
-            entities_qs = EntityCredentials.filter(user, entities_qs)
+            yield rows
 
-            if use_distinct:
-                entities_qs = entities_qs.distinct()
+    def get_pages(self):
+        "Get the generator of pages to export ; see iter_pages()."
+        ct = self.get_ctype()
+        hf = self.get_header_filter()
+        cells = self.get_cells(header_filter=hf)
+        paginator = efilter = None
 
+        if not self.get_header_only():
+            model = ct.model_class()
+            entities_qs, efilter = self.get_entities_queryset(model=model, cells=cells)
             paginator = self.get_paginator(queryset=entities_qs,
-                                           ordering=ordering,
+                                           ordering=self.get_ordering(model=model, cells=cells),
                                           )
 
-            total_count = 0
+        return self.iter_pages(header_filter=hf, cells=cells,
+                               paginator=paginator, efilter=efilter,
+                              )
+
+    def create_job(self):
+        """Create a Job which exports the entities in background
+        (see creme_jobs.mass_export) ; the arguments are the ones of the view.
+        @return: A Job instance, or None if the user has too many running jobs.
+        """
+        user = self.request.user
+
+        if Job.not_finished_jobs(user).count() >= settings.MAX_JOBS_PER_USER:
+            return None
+
+        # We check the arguments now, to avoid a useless job.
+        self.get_header_filter()
+        self.get_entity_filter()
+
+        return Job.objects.create(
+            type_id=self.job_type.id,
+            user=user,
+            data={
+                'ctype': self.get_ctype().id,
+                'GET':   self.request.GET.urlencode(),
+            },
+        )
 
-            for entities_page in paginator.pages():
-                entities = entities_page.object_list
+    def is_big_export(self):
+        "Are there more entities to export than <background_threshold>?"
+        if self.get_header_only():
+            return False
 
-                hf.populate_entities(entities, user)  # Optimisation time !!!
+        model = self.get_ctype().model_class()
+        entities_qs = self.get_entities_queryset(
+            model=model, cells=self.get_cells(header_filter=self.get_header_filter()),
+        )[0]
+        threshold = self.background_threshold
 
-                for entity in entities:
-                    total_count += 1
-                    line = []
+        return entities_qs.order_by().values('id')[threshold:threshold + 1].exists()
 
-                    for cell in cells:
-                        try:
-                            res = cell.render_csv(entity, user)
-                        except Exception as e:
-                            logger.debug('Exception in CSV export: %s', e)
-                            res = ''
+    def get(self, request, *args, **kwargs):
+        backend = self.get_backend()
+        ct = self.get_ctype()
+        writer = backend()
 
-                        line.append(smart_str(res) if res else '')
+        if self.get_streaming():
+            if writer.streamable:
+                return writer.streaming_response(pages=self.get_pages(), filename=ct.model)
 
-                    writerow(line)
+            # NB: the file would be built in memory & the request could time out.
+            if writer.background and self.is_big_export():
+                job = self.create_job()
 
-            _HLTEntityExport.create_line(
-                ctype=ct, user=user, count=total_count, hfilter=hf, efilter=efilter,
-            )
+                if job is not None:
+                    return HttpResponseRedirect(job.get_absolute_url())
+
+        pages = self.get_pages()
+
+        writerow = writer.writerow
+
+        for rows in pages:
+            for row in rows:
+                writerow(row)
 
         writer.save(ct.model)
 
         return writer.response
+
+
+class MassExportJobCreation(MassExport):
+    """Create a Job which exports the entities in background
+    (see creme_core.creme_jobs.mass_export) ; the GET arguments are the same
+    as the ones of MassExport.
+    The response contains the URL to redirect to (detail-view of the job, or
+    the list of the user's jobs if there are too many running jobs).
+    """
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        if not self.get_backend().background:
+            raise ConflictError(_('This type of file cannot be exported in background'))
+
+        job = self.create_job()
+
+        return HttpResponse(reverse('creme_core__my_jobs') if job is None else job.get_absolute_url(),
+                            content_type='text/plain',
+                           )
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+#    Creme is a free/open-source Customer Relationship Management software
+#    Copyright (C) 2020  Hybird
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+"""Engine which sends the emails of the campaigns: the emails are sent in
+parallel through a small pool of SMTP connections, the global rate is limited,
+& the statuses of the emails are saved by batches.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import logging
+from queue import Queue
+from threading import Lock
+from time import monotonic, sleep
+
+from django.core.mail import get_connection
+from django.db.transaction import atomic
+
+from creme.creme_core.models import HistoryLine
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Rate limiter ; each call to consume() takes a token, & waits if the
+    bucket is empty. The bucket is filled with <rate> tokens per second, & it
+    contains <capacity> tokens at most (i.e. the size of the bursts).
+    It can be shared by several threads.
+    """
+    def __init__(self, rate, capacity=1, clock=monotonic, sleep=sleep):
+        """Constructor.
+        @param rate: Number of tokens per second (strictly positive number).
+        @param capacity: Maximum number of tokens (integer >= 1).
+        @param clock: Callable returning the current time in seconds (monotonic).
+        @param sleep: Callable taking a duration in seconds.
+        """
+        if rate <= 0:
+            raise ValueError('TokenBucket: the rate must be positive ({})'.format(rate))
+
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._last_time = clock()
+        self._lock = Lock()
+
+    def consume(self):
+        "Take a token ; block until it is available."
+        with self._lock:
+            now_value = self._clock()
+            self._tokens = min(self.capacity,
+                               self._tokens + (now_value - self._last_time) * self.rate,
+                              )
+            self._last_time = now_value
+
+            # NB: the token is reserved even if the bucket is empty (the count
+            #     becomes negative), so the waiting threads are served in order.
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if delay:
+            self._sleep(delay)
+
+
+class ConnectionPool:
+    """Pool of email backends (see django.core.mail.get_connection()), which
+    are opened once & reused for all the emails.
+    """
+    def __init__(self, size, **connection_kwargs):
+        """Constructor.
+        @param size: Number of connections (integer >= 1).
+        @param connection_kwargs: Arguments passed to get_connection()
+               (host, port, username...).
+        """
+        self.size = size
+        self._connections = [get_connection(**connection_kwargs) for __ in range(size)]
+        self._available = Queue()
+
+        for connection in self._connections:
+            self._available.put(connection)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def acquire(self):
+        "Get an opened connection ; block until a connection is available."
+        connection = self._available.get()
+
+        try:
+            # NB: does nothing if the connection is already opened.
+            connection.open()
+        except Exception:
+            self._available.put(connection)
+            raise
+
+        return connection
+
+    def release(self, connection, broken=False):
+        """Give back a connection to the pool.
+        @param broken: True means the connection is closed (it will be re-opened
+               by the next acquire()).
+        """
+        if broken:
+            try:
+                connection.close()
+            except Exception as e:
+                logger.warning('ConnectionPool: error when closing a connection (%s)', e)
+
+        self._available.put(connection)
+
+    def close(self):
+        for connection in self._connections:
+            try:
+                connection.close()
+            except Exception as e:
+                logger.warning('ConnectionPool: error when closing a connection (%s)', e)
+
+
+class SendingEngine:
+    """Send emails with an EMailSender (see emails.utils).
+
+    The emails are sent by several threads (one per connection of the pool),
+    which do not perform any query ; the fields "status" & "sending_date" of
+    the emails are saved by the main thread at the end of each batch (with
+    bulk_update()), so a sending interrupted by a crash can be resumed by
+    sending again its emails which are not marked as sent (only the last
+    batch could be sent twice).
+    """
+    batch_size = 100
+
+    def __init__(self, sender, connections, rate=None, batch_size=None):
+        """Constructor.
+        @param sender: Instance of <emails.utils.EMailSender>.
+        @param connections: Instance of <ConnectionPool>.
+        @param rate: Maximum number of emails sent per second ; <None> or 0
+               means no limit.
+        @param batch_size: Number of emails sent between 2 savings of statuses.
+        """
+        self.sender = sender
+        self.connections = connections
+        self.rate_limiter = TokenBucket(rate) if rate else None
+
+        if batch_size is not None:
+            self.batch_size = batch_size
+
+    def _deliver(self, mail):
+        rate_limiter = self.rate_limiter
+        if rate_limiter is not None:
+            rate_limiter.consume()
+
+        try:
+            connection = self.connections.acquire()
+        except Exception as e:
+            logger.error('SendingEngine: cannot open a connection (%s)', e)
+            return False
+
+        ok = False
+        try:
+            ok = self.sender.deliver(mail, connection=connection)
+        finally:
+            # NB: after a sending error the connection may be in a bad state
+            #     (e.g. the server has closed it) ; it will be re-opened.
+            self.connections.release(connection, broken=not ok)
+
+        return ok
+
+    def _save_statuses(self, mails):
+        if mails:
+            with atomic(), HistoryLine.buffered():
+                type(mails[0])._default_manager.bulk_update(mails, ['status', 'sending_date'])
+
+                for mail in mails:
+                    HistoryLine.log_edition(mail)
+
+    def send(self, mails):
+        """Send some emails.
+        @param mails: Iterable of instances of <emails.models.mail._Email>
+               (the emails which are already sent must be excluded).
+        @return: Number of emails sent.
+        """
+        sent_count = 0
+        mails = iter(mails)
+        deliver = self._deliver
+
+        with ThreadPoolExecutor(max_workers=self.connections.size) as executor:
+            while True:
+                batch = [*islice(mails, self.batch_size)]
+                if not batch:
+                    break
+
+                sent_count += sum(executor.map(deliver, batch))
+                self._save_statuses(batch)
+
+        return sent_count
@@ -2,7 +2,7 @@
 
 ################################################################################
 #    Creme is a free/open-source Customer Relationship Management software
-#    Copyright (C) 2009-2019  Hybird
+#    Copyright (C) 2009-2020  Hybird
 #
 #    This program is free software: you can redistribute it and/or modify
 #    it under the terms of the GNU Affero General Public License as published by
@@ -29,7 +29,7 @@ from django.utils.translation import gettext_lazy as _
 from creme.creme_core.auth import EntityCredentials
 from creme.creme_core.forms import CremeModelForm, CreatorEntityField
 from creme.creme_core.forms.widgets import CalendarWidget
-from creme.creme_core.models import HistoryLine, SettingValue
+from creme.creme_core.models import SettingValue
 from creme.creme_core.utils.dates import make_aware_dt
 
 from .. import get_emailtemplate_model
@@ -151,28 +151,22 @@ class SendingCreateForm(CremeModelForm):
             *self._get_variables(template.body_html),
         ]
 
-        disable_history = HistoryLine.disable
-
-        for address, recipient_entity in instance.campaign.all_recipients():
-            mail = LightWeightEmail(sending=instance,
-                                    sender=instance.sender,
-                                    recipient=address,
-                                    sending_date=instance.sending_date,
-                                    recipient_entity=recipient_entity,
-                                   )
-
-            if recipient_entity:
-                context = {}
-
-                for varname in varlist:
-                    val = getattr(recipient_entity, varname, None)
-                    if val:
-                        context[varname] = val  # TODO: str(val) ?
+        def build_mails():
+            for address, entity_id, values in instance.campaign.all_recipients(fields=varlist):
+                mail = LightWeightEmail(sending=instance,
+                                        sender=instance.sender,
+                                        recipient=address,
+                                        sending_date=instance.sending_date,
+                                        recipient_entity_id=entity_id,
+                                       )
 
+                context = {varname: val for varname, val in values.items() if val}  # TODO: str(val) ?
                 if context:
                     mail.body = json_dump(context, separators=(',', ':'))
 
-            disable_history(mail)
-            mail.genid_n_save()
+                yield mail
+
+        # NB: no history line is created for the mails (bulk creation).
+        LightWeightEmail.genid_n_bulk_create(build_mails())
 
         return instance
@@ -2,7 +2,7 @@
 
 ################################################################################
 #    Creme is a free/open-source Customer Relationship Management software
-#    Copyright (C) 2009-2018  Hybird
+#    Copyright (C) 2009-2020  Hybird
 #
 #    This program is free software: you can redistribute it and/or modify
 #    it under the terms of the GNU Affero General Public License as published by
@@ -19,6 +19,7 @@
 ################################################################################
 
 from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
 from django.db.models import CharField, ManyToManyField
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
@@ -27,6 +28,8 @@ from creme.creme_core.models import CremeEntity
 
 from .recipient import EmailRecipient
 
+_MISSING = object()
+
 
 class AbstractEmailCampaign(CremeEntity):
     name          = CharField(_('Name of the campaign'), max_length=100)
@@ -62,7 +65,18 @@ class AbstractEmailCampaign(CremeEntity):
     def get_lv_absolute_url():
         return reverse('emails__list_campaigns')
 
-    def all_recipients(self):
+    def all_recipients(self, fields=()):
+        """Get the recipients of the mailing lists (& their children), without duplicates.
+        The persons are retrieved by queries which only return the needed values
+        (i.e. no instance of Contact/Organisation is built).
+        @param fields: Names of the fields of the persons (Contact/Organisation)
+               to retrieve ; the names which do not correspond to a field of the
+               model are ignored. The values of the ForeignKeys are the string
+               representations of the related instances.
+        @return: Iterable of tuples (address, entity_id, values) ; <entity_id> is
+                 None for the manual recipients (EmailRecipient) ; <values> is a
+                 dictionary {field_name: value}.
+        """
         # Merge all the mailing_lists and their children
         lists = {
             pk: ml
@@ -72,23 +86,54 @@ class AbstractEmailCampaign(CremeEntity):
 
         # Manual recipients
         recipients = {
-            addr: None
+            addr: (None, {})
                 for addr in EmailRecipient.objects.filter(ml__in=[ml.id for ml in lists])
                                                   .values_list('address', flat=True)
         }
 
         # Contacts & organisations recipients
-        def update(get_persons):
-            recipients.update((p.email, p)
-                                for ml in lists
-                                    for p in get_persons(ml).filter(is_deleted=False)
-                                        if p.email
-                             )
+        def update(m2m_name):
+            get_field = self.mailing_lists.model._meta.get_field(m2m_name).related_model._meta.get_field
+            fnames = []
+            fk_fields = {}  # {field_name: (related_model, {related_id: string})}
+
+            for fname in fields:
+                try:
+                    field = get_field(fname)
+                except FieldDoesNotExist:
+                    continue
+
+                if not field.concrete or field.many_to_many:
+                    continue
+
+                fnames.append(fname)
+
+                if field.is_relation:
+                    fk_fields[fname] = (field.remote_field.model, {None: None})
+
+            for ml in lists:
+                persons = getattr(ml, m2m_name).filter(is_deleted=False).exclude(email='')
+
+                for entity_id, email, *values in persons.values_list('id', 'email', *fnames).iterator():
+                    values = dict(zip(fnames, values))
+
+                    # NB: the related instances are retrieved once per distinct value.
+                    for fname, (related_model, strings) in fk_fields.items():
+                        related_id = values[fname]
+                        string = strings.get(related_id, _MISSING)
+
+                        if string is _MISSING:
+                            related = related_model._default_manager.filter(pk=related_id).first()
+                            strings[related_id] = string = None if related is None else str(related)
+
+                        values[fname] = string
+
+                    recipients[email] = (entity_id, values)
 
-        update(lambda ml: ml.contacts)
-        update(lambda ml: ml.organisations)
+        update('contacts')
+        update('organisations')
 
-        return recipients.items()
+        return ((address, entity_id, values) for address, (entity_id, values) in recipients.items())
 
     def restore(self):
         CremeEntity.restore(self)
@@ -2,7 +2,7 @@
 
 ################################################################################
 #    Creme is a free/open-source Customer Relationship Management software
-#    Copyright (C) 2009-2018  Hybird
+#    Copyright (C) 2009-2020  Hybird
 #
 #    This program is free software: you can redistribute it and/or modify
 #    it under the terms of the GNU Affero General Public License as published by
@@ -20,10 +20,9 @@
 
 from json import loads as json_load
 import logging
-from time import sleep
 
 from django.conf import settings
-from django.core.mail import send_mail, get_connection
+from django.core.mail import send_mail
 from django.db import IntegrityError
 from django.db.models import (ForeignKey, DateTimeField, PositiveSmallIntegerField,
         EmailField, CharField, TextField, ManyToManyField, SET_NULL, CASCADE)
@@ -35,9 +34,11 @@ from django.utils.timezone import localtime
 from django.utils.translation import gettext_lazy as _, gettext, pgettext, pgettext_lazy
 
 from creme.creme_core.models import CremeModel, CremeEntity
+from creme.creme_core.utils.chunktools import iter_as_chunk
 
-from ..constants import MAIL_STATUS_NOTSENT, MAIL_STATUS_SENDINGERROR
-from ..utils import generate_id, EMailSender, ImageFromHTMLError
+from ..constants import MAIL_STATUS_NOTSENT, MAIL_STATUS_SENDINGERROR, MAIL_STATUS_SENT
+from ..core.sending import ConnectionPool, SendingEngine
+from ..utils import generate_id, EMailSender, ImageFromHTMLError, BodyTemplate
 
 from .mail import _Email, ID_LENGTH
 from .signature import EmailSignature
@@ -121,6 +122,23 @@ class EmailSending(CremeModel):
     def get_related_entity(self):  # For generic views
         return self.campaign
 
+    def _iter_unsent_mails(self, chunk_size):
+        "Iterate on the mails to send, with a query per chunk of mails."
+        # NB: the queries are bounded by ID (the statuses are modified during the iteration).
+        mails = self.mails_set.filter(
+            status__in=[MAIL_STATUS_NOTSENT, MAIL_STATUS_SENDINGERROR],
+        ).order_by('id')
+        last_id = None
+
+        while True:
+            chunk = [*(mails if last_id is None else mails.filter(id__gt=last_id))[:chunk_size]]
+
+            if not chunk:
+                break
+
+            yield from chunk
+            last_id = chunk[-1].id
+
     def send_mails(self):
         try:
             sender = LightWeightEmailSender(sending=self)
@@ -139,35 +157,24 @@ class EmailSending(CremeModel):
 
             return SENDING_STATE_ERROR
 
-        connection = get_connection(host=settings.EMAILCAMPAIGN_HOST,
-                                    port=settings.EMAILCAMPAIGN_PORT,
-                                    username=settings.EMAILCAMPAIGN_HOST_USER,
-                                    password=settings.EMAILCAMPAIGN_PASSWORD,
-                                    use_tls=settings.EMAILCAMPAIGN_USE_TLS,
-                                   )
-
-        mails_count   = 0
-        one_mail_sent = False
-        SENDING_SIZE  = getattr(settings, 'EMAILCAMPAIGN_SIZE', 40)
-        SLEEP_TIME    = getattr(settings, 'EMAILCAMPAIGN_SLEEP_TIME', 2)
-
-        for mail in LightWeightEmail.objects.filter(sending=self):
-            if sender.send(mail, connection=connection):
-                mails_count += 1
-                one_mail_sent = True
-                logger.debug('Mail sent to %s', mail.recipient)
-
-            if mails_count > SENDING_SIZE:
-                logger.debug('Sending: waiting timeout')
-
-                mails_count = 0
-                sleep(SLEEP_TIME)  # Avoiding the mail to be classed as spam
-
-        if not one_mail_sent:
+        with ConnectionPool(size=max(1, settings.EMAILCAMPAIGN_CONNECTIONS),
+                            host=settings.EMAILCAMPAIGN_HOST,
+                            port=settings.EMAILCAMPAIGN_PORT,
+                            username=settings.EMAILCAMPAIGN_HOST_USER,
+                            password=settings.EMAILCAMPAIGN_PASSWORD,
+                            use_tls=settings.EMAILCAMPAIGN_USE_TLS,
+                           ) as connections:
+            engine = SendingEngine(sender=sender,
+                                   connections=connections,
+                                   rate=settings.EMAILCAMPAIGN_RATE,
+                                   batch_size=settings.EMAILCAMPAIGN_BATCH_SIZE,
+                                  )
+            sent_count = engine.send(self._iter_unsent_mails(settings.EMAILCAMPAIGN_BATCH_SIZE))
+
+        # NB: the mails sent before an interruption (crash...) are taken into account.
+        if not sent_count and not self.mails_set.filter(status=MAIL_STATUS_SENT).exists():
             return SENDING_STATE_ERROR
 
-        # TODO: close the connection ??
-
 
 class LightWeightEmail(_Email):
     """Used by campaigns.
@@ -220,23 +227,63 @@ class LightWeightEmail(_Email):
             else:
                 return
 
+    @classmethod
+    def _generate_ids(cls, count):
+        "@return: A set of <count> IDs which are not used by existing mails."
+        ids = set()
+
+        while len(ids) < count:
+            while len(ids) < count:
+                ids.add(generate_id())
+
+            # NB: collisions are very unlikely, but one query per batch is cheap.
+            ids.difference_update(cls.objects.filter(id__in=ids).values_list('id', flat=True))
+
+        return ids
+
+    @classmethod
+    def genid_n_bulk_create(cls, mails, batch_size=1024):
+        """Generate the IDs of some new mails & create them in bulk (one
+        query to check the IDs & one INSERT per batch) ; see genid_n_save().
+        Notice that the signals (post_save...) are not sent.
+        @param mails: Iterable of unsaved instances (it can be a generator).
+        @param batch_size: Number of mails created per query.
+        """
+        for batch in iter_as_chunk(mails, batch_size):
+            while True:
+                for mail, mail_id in zip(batch, cls._generate_ids(len(batch))):
+                    mail.id = mail_id
+
+                try:
+                    with atomic():
+                        cls.objects.bulk_create(batch)
+                except IntegrityError:  # An ID has been used by a concurrent creation
+                    logger.debug('Mail IDs already exist ; new IDs are generated.')
+                else:
+                    break
+
 
 class LightWeightEmailSender(EMailSender):
     def __init__(self, sending):
         super().__init__(body=sending.body,
                          body_html=sending.body_html,
                          signature=sending.signature,
-                         attachments=sending.attachments.all(),
+                         # NB: evaluated now, because the mails can be sent by other threads.
+                         attachments=[*sending.attachments.all()],
                         )
         self._sending = sending
-        self._body_template = Template(self._body)
-        self._body_html_template = Template(self._body_html)
+        self._body_template = BodyTemplate(self._body)
+        self._body_html_template = BodyTemplate(self._body_html)
+        self._constant_bodies = (self._body_template.is_constant and
+                                 self._body_html_template.is_constant
+                                )
 
     def get_subject(self, mail):
         return self._sending.subject
 
     def _process_bodies(self, mail):
         body = mail.body
-        context = Context(json_load(body) if body else {})
+        # NB: the context is not decoded when it's useless.
+        context = json_load(body) if body and not self._constant_bodies else {}
 
         return self._body_template.render(context), self._body_html_template.render(context)
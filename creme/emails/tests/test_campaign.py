@@ -1,9 +1,17 @@
 # -*- coding: utf-8 -*-
 
 try:
+    from functools import partial
+
     from django.urls import reverse
 
-    from .base import _EmailsTestCase, skipIfCustomEmailCampaign, EmailCampaign
+    from creme.persons.models import Civility
+    from creme.persons.tests.base import skipIfCustomContact, skipIfCustomOrganisation
+
+    from .base import (_EmailsTestCase, skipIfCustomEmailCampaign,
+            skipIfCustomMailingList, EmailCampaign, MailingList,
+            Contact, Organisation)
+    from ..models import EmailRecipient
 except Exception as e:
     print('Error in <{}>: {}'.format(__name__, e))
 
@@ -48,3 +56,59 @@ class CampaignTestCase(_EmailsTestCase):
         with self.assertNoException():
             # response.context['entities']
             response.context['page_obj']
+
+    @skipIfCustomMailingList
+    @skipIfCustomContact
+    @skipIfCustomOrganisation
+    def test_all_recipients(self):
+        user = self.user
+        camp = EmailCampaign.objects.create(user=user, name='camp01')
+
+        create_ml = MailingList.objects.create
+        mlist1 = create_ml(user=user, name='ml01')
+        mlist2 = create_ml(user=user, name='ml02')
+        camp.mailing_lists.set([mlist1, mlist2])
+
+        EmailRecipient.objects.create(ml=mlist1, address='vicious@reddragons.mrs')
+
+        civility = Civility.objects.create(title='Captain')
+        create_contact = partial(Contact.objects.create, user=user)
+        spike = create_contact(first_name='Spike', last_name='Spiegel', email='spike@bebop.mrs')
+        jet = create_contact(first_name='Jet', last_name='Black', email='jet@bebop.mrs',
+                             civility=civility,
+                            )
+        ed = create_contact(first_name='Ed', last_name='Wong', email='')
+        faye = create_contact(first_name='Faye', last_name='Valentine',
+                              email='faye@bebop.mrs', is_deleted=True,
+                             )
+        mlist1.contacts.set([spike, jet, ed, faye])
+        mlist2.contacts.set([jet])
+
+        nerv = Organisation.objects.create(user=user, name='NERV', email='contact@nerv.jp')
+        mlist2.organisations.add(nerv)
+
+        self.assertSetEqual(
+            {('vicious@reddragons.mrs', None, ()),
+             ('spike@bebop.mrs', spike.id, ()),
+             ('jet@bebop.mrs', jet.id, ()),
+             ('contact@nerv.jp', nerv.id, ()),
+            },
+            {(address, entity_id, tuple(values.items()))
+                for address, entity_id, values in camp.all_recipients()
+            }
+        )
+
+        recipients = {
+            address: (entity_id, values)
+                for address, entity_id, values in camp.all_recipients(
+                    fields=['first_name', 'civility', 'name', 'invalid'],
+                )
+        }
+        self.assertEqual((None, {}), recipients['vicious@reddragons.mrs'])
+        self.assertEqual((spike.id, {'first_name': 'Spike', 'civility': None}),
+                         recipients['spike@bebop.mrs']
+                        )
+        self.assertEqual((jet.id, {'first_name': 'Jet', 'civility': 'Captain'}),
+                         recipients['jet@bebop.mrs']
+                        )
+        self.assertEqual((nerv.id, {'name': 'NERV'}), recipients['contact@nerv.jp'])
@@ -15,7 +15,8 @@ try:
     from creme.creme_core.core.job import JobManagerQueue  # Should be a test queue
     from creme.creme_core.models import (HistoryLine, SetCredentials,
             SettingValue, Job, FakeOrganisation)
-    from creme.creme_core.models.history import TYPE_AUX_CREATION
+    from creme.creme_core.models.history import TYPE_AUX_CREATION, TYPE_AUX_EDITION
+    from creme.creme_core.tests.base import CremeTestCase
 
     from creme.persons.tests.base import skipIfCustomContact, skipIfCustomOrganisation
 
@@ -24,11 +25,13 @@ try:
             Contact, Organisation, EmailCampaign, EmailTemplate, MailingList)
 
     from ..bricks import MailsBrick
-    from ..constants import SETTING_EMAILCAMPAIGN_SENDER, MAIL_STATUS_NOTSENT
+    from ..constants import (SETTING_EMAILCAMPAIGN_SENDER, MAIL_STATUS_NOTSENT,
+            MAIL_STATUS_SENT, MAIL_STATUS_SENDINGERROR)
+    from ..core.sending import TokenBucket, ConnectionPool, SendingEngine
     from ..creme_jobs import campaign_emails_send_type
     from ..models import EmailSending, EmailRecipient, LightWeightEmail
     from ..models.sending import (SENDING_TYPE_IMMEDIATE, SENDING_TYPE_DEFERRED,
-            SENDING_STATE_DONE, SENDING_STATE_PLANNED)
+            SENDING_STATE_DONE, SENDING_STATE_PLANNED, SENDING_STATE_INPROGRESS)
 except Exception as e:
     print('Error in <{}>: {}'.format(__name__, e))
 
@@ -302,6 +305,34 @@ class SendingsTestCase(_EmailsTestCase):
         self.assertFalse(EmailSending.objects.exists())
         self.assertFalse(LightWeightEmail.objects.exists())
 
+    def test_genid_n_bulk_create(self):
+        user = self.login()
+        camp = EmailCampaign.objects.create(user=user, name='camp01')
+        sending = EmailSending.objects.create(campaign=camp, type=SENDING_TYPE_IMMEDIATE,
+                                              sending_date=now(), subject='Subject',
+                                              body='Hello', sender='vicious@reddragons.mrs',
+                                             )
+
+        existing_mail = LightWeightEmail(sending=sending, sender=sending.sender,
+                                         recipient='spike@bebop.mrs',
+                                         sending_date=sending.sending_date,
+                                        )
+        existing_mail.genid_n_save()
+
+        recipients = ['jet@bebop.mrs', 'faye@bebop.mrs', 'ed@bebop.mrs', 'ein@bebop.mrs', 'andy@bebop.mrs']
+        LightWeightEmail.genid_n_bulk_create(
+            (LightWeightEmail(sending=sending, sender=sending.sender,
+                              recipient=recipient, sending_date=sending.sending_date,
+                             ) for recipient in recipients
+            ),
+            batch_size=2,
+        )
+
+        mails = sending.mails_set.exclude(id=existing_mail.id)
+        self.assertSetEqual({*recipients}, {mail.recipient for mail in mails})
+        self.assertEqual(len(recipients), len({mail.id for mail in mails}))
+        self.assertTrue(all(mail.id for mail in mails))
+
     @skipIfCustomContact
     def test_create02(self):
         "Test template"
@@ -358,7 +389,7 @@ class SendingsTestCase(_EmailsTestCase):
 
     @skipIfCustomContact
     @skipIfCustomOrganisation
-    @override_settings(EMAILCAMPAIGN_SLEEP_TIME=0.1)
+    @override_settings(EMAILCAMPAIGN_RATE=None)
     def test_create03(self):
         "Job + outbox"
         queue = JobManagerQueue.get_main_queue()
@@ -746,6 +777,58 @@ class SendingsTestCase(_EmailsTestCase):
         self._send_mails(job)
         self.assertFalse(django_mail.outbox)
 
+    @override_settings(EMAILCAMPAIGN_RATE=None, EMAILCAMPAIGN_CONNECTIONS=2,
+                       EMAILCAMPAIGN_BATCH_SIZE=2,
+                      )
+    def test_job_resume(self):
+        "A sending which has been interrupted: the sent mails are not sent again."
+        user = self.login()
+        camp = EmailCampaign.objects.create(user=user, name='camp01')
+        sending = EmailSending.objects.create(
+            campaign=camp, type=SENDING_TYPE_IMMEDIATE,
+            sending_date=now(), subject='Subject', body='Hello', body_html='<p>Hello</p>',
+            sender='vicious@reddragons.mrs', state=SENDING_STATE_INPROGRESS,
+        )
+
+        def create_mail(recipient, status=MAIL_STATUS_NOTSENT):
+            mail = LightWeightEmail(sending=sending, sender=sending.sender,
+                                    recipient=recipient, status=status,
+                                    sending_date=sending.sending_date,
+                                   )
+            mail.genid_n_save()
+            return mail
+
+        sent_mail = create_mail('spike@bebop.mrs', status=MAIL_STATUS_SENT)
+        mails = [
+            create_mail('jet@bebop.mrs'),
+            create_mail('faye@bebop.mrs'),
+            create_mail('ed@bebop.mrs', status=MAIL_STATUS_SENDINGERROR),
+            create_mail('ein@bebop.mrs'),
+        ]
+        old_hline_id = HistoryLine.objects.order_by('-id').values_list('id', flat=True)[0]
+
+        self._send_mails()
+        self.assertEqual(SENDING_STATE_DONE, self.refresh(sending).state)
+
+        self.assertSetEqual({mail.recipient for mail in mails},
+                            {recipient
+                                for message in django_mail.outbox
+                                    for recipient in message.recipients()
+                            }
+                           )
+        self.assertEqual(len(mails), len(django_mail.outbox))
+
+        for mail in mails:
+            self.assertEqual(MAIL_STATUS_SENT, self.refresh(mail).status)
+
+        self.assertEqual(MAIL_STATUS_SENT, self.refresh(sent_mail).status)
+        self.assertEqual(len(mails),
+                         HistoryLine.objects.filter(id__gt=old_hline_id,
+                                                    type=TYPE_AUX_EDITION,
+                                                    entity=camp.id,
+                                                   ).count()
+                        )
+
     def test_refresh_job01(self):
         "Restore campaign with sending which has to be sent"
         self.login()
@@ -781,4 +864,84 @@ class SendingsTestCase(_EmailsTestCase):
         queue.clear()
 
         camp.restore()
-        self.assertFalse(queue.refreshed_jobs)
\ No newline at end of file
+        self.assertFalse(queue.refreshed_jobs)
+
+class _FakeClock:
+    def __init__(self):
+        self.time = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.time
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.time += delay
+
+
+class _FakeSender:
+    def __init__(self, failures=()):
+        self.failures = failures
+        self.delivered = []
+
+    def deliver(self, mail, connection=None):
+        self.delivered.append((mail, connection))
+
+        return mail not in self.failures
+
+
+class SendingEngineTestCase(CremeTestCase):
+    def test_token_bucket(self):
+        clock = _FakeClock()
+        bucket = TokenBucket(rate=4, clock=clock, sleep=clock.sleep)
+
+        bucket.consume()
+        self.assertFalse(clock.sleeps)
+
+        bucket.consume()
+        bucket.consume()
+        self.assertEqual([0.25, 0.25], clock.sleeps)
+
+        clock.time += 10  # Capacity == 1
+        bucket.consume()
+        bucket.consume()
+        self.assertEqual([0.25, 0.25, 0.25], clock.sleeps)
+
+    def test_token_bucket_capacity(self):
+        clock = _FakeClock()
+        bucket = TokenBucket(rate=2, capacity=3, clock=clock, sleep=clock.sleep)
+
+        for __ in range(3):
+            bucket.consume()
+
+        self.assertFalse(clock.sleeps)
+
+        bucket.consume()
+        self.assertEqual([0.5], clock.sleeps)
+
+    def test_token_bucket_errors(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+    def test_engine(self):
+        mails = [*range(5)]
+        sender = _FakeSender(failures=[3])
+        saved = []
+
+        with ConnectionPool(size=2) as connections:
+            engine = SendingEngine(sender=sender, connections=connections, batch_size=2)
+            engine._save_statuses = saved.append
+            self.assertIsNone(engine.rate_limiter)
+
+            self.assertEqual(4, engine.send(mails))
+
+        self.assertListEqual(mails, sorted(mail for mail, __ in sender.delivered))
+        self.assertLessEqual(len({id(connection) for __, connection in sender.delivered}), 2)
+        self.assertListEqual([[0, 1], [2, 3], [4]], saved)
+
+    def test_engine_rate(self):
+        with ConnectionPool(size=1) as connections:
+            engine = SendingEngine(sender=_FakeSender(), connections=connections, rate=10)
+
+        self.assertIsInstance(engine.rate_limiter, TokenBucket)
+        self.assertEqual(10, engine.rate_limiter.rate)
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 try:
+    from email.mime.base import MIMEBase
     from email.mime.image import MIMEImage
 
     from django.core import mail as django_mail
@@ -9,7 +10,7 @@ try:
 
     from .base import _EmailsTestCase, EntityEmail
     from ..models import EmailSignature
-    from ..utils import get_mime_image, EMailSender
+    from ..utils import get_mime_image, get_mime_attachment, EMailSender, BodyTemplate
 except Exception as e:
     print('Error in <{}>: {}'.format(__name__, e))
 
@@ -123,4 +124,58 @@ class UtilsTestCase(_EmailsTestCase, _DocumentsTestCase):
         self.assertIsInstance(attachments[0], MIMEImage)
         self.assertIsInstance(attachments[1], MIMEImage)
 
+    def test_sender03(self):
+        "Attachments are encoded once."
+        user = self.login()
+        doc = self._create_doc(title='Roadmap')
+
+        mime_attachment = get_mime_attachment(doc)
+        self.assertIsInstance(mime_attachment, MIMEBase)
+        self.assertIs(mime_attachment, get_mime_attachment(doc))
+        self.assertIn('attachment', mime_attachment['Content-Disposition'])
+
+        e_sender = self.TestEMailSender('Want to meet you', '<p>Want to meet you</p>',
+                                        attachments=[doc],
+                                       )
+
+        create_mail = EntityEmail
+        e_sender.send(create_mail(user=user, sender='m.kusanagi@section9.jp', recipient='bato@section9.jp'))
+        e_sender.send(create_mail(user=user, sender='m.kusanagi@section9.jp', recipient='togusa@section9.jp'))
+
+        messages = django_mail.outbox
+        self.assertEqual(2, len(messages))
+        self.assertListEqual([mime_attachment], messages[0].attachments)
+        self.assertListEqual([mime_attachment], messages[1].attachments)
+        self.assertIn(b'Roadmap : Content', messages[1].message().as_bytes())
+
+    def test_body_template01(self):
+        "Constant."
+        btemplate = BodyTemplate('<p>Want to meet you</p>')
+        self.assertTrue(btemplate.is_constant)
+        self.assertEqual('<p>Want to meet you</p>', btemplate.render({'name': 'Bato'}))
+
+        btemplate = BodyTemplate(None)
+        self.assertTrue(btemplate.is_constant)
+        self.assertEqual('', btemplate.render({}))
+
+    def test_body_template02(self):
+        "Simple variables."
+        btemplate = BodyTemplate('<p>Hello {{first_name}} {{ last_name }}</p>')
+        self.assertFalse(btemplate.is_constant)
+        self.assertIsNone(btemplate._template)
+        self.assertEqual('<p>Hello Batou </p>', btemplate.render({'first_name': 'Batou'}))
+        self.assertEqual('<p>Hello &lt;b&gt;Batou&lt;/b&gt; Smith</p>',
+                         btemplate.render({'first_name': '<b>Batou</b>', 'last_name': 'Smith'})
+                        )
+
+    def test_body_template03(self):
+        "Full template."
+        btemplate = BodyTemplate('<p>Hello {{first_name|upper}}{% if last_name %} {{last_name}}{% endif %}</p>')
+        self.assertFalse(btemplate.is_constant)
+        self.assertIsNotNone(btemplate._template)
+        self.assertEqual('<p>Hello BATOU</p>', btemplate.render({'first_name': 'Batou'}))
+        self.assertEqual('<p>Hello BATOU Smith</p>',
+                         btemplate.render({'first_name': 'Batou', 'last_name': 'Smith'})
+                        )
+
     # TODO: test_get_images_from_html03() -> 'attachments' parameter
@@ -2,7 +2,7 @@
 
 ################################################################################
 #    Creme is a free/open-source Customer Relationship Management software
-#    Copyright (C) 2009-2019  Hybird
+#    Copyright (C) 2009-2020  Hybird
 #
 #    This program is free software: you can redistribute it and/or modify
 #    it under the terms of the GNU Affero General Public License as published by
@@ -26,7 +26,9 @@ from re import compile as re_compile
 from string import ascii_letters, digits
 
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMessage, EmailMultiAlternatives
+from django.template import Template, Context
+from django.template.base import TextNode, Variable, VariableNode, render_value_in_context
 from django.utils.timezone import now
 
 from .constants import MAIL_STATUS_SENT, MAIL_STATUS_SENDINGERROR
@@ -81,6 +83,94 @@ def get_mime_image(image_entity):
     return mime_image
 
 
+_MIME_ATTACHMENT_CACHE = '_mime_attachment_cache'
+
+
+def get_mime_attachment(document):
+    """Get the MIME part corresponding to the file of a Document ; the file is
+    read & encoded once, so the part can be attached to many messages.
+    @throws IOError
+    """
+    try:
+        mime_attachment = getattr(document, _MIME_ATTACHMENT_CACHE)
+    except AttributeError:
+        msg = EmailMessage()
+        msg.attach_file(join(settings.MEDIA_ROOT, document.filedata.name))
+        mime_attachment = msg._create_attachment(*msg.attachments[0])
+
+        setattr(document, _MIME_ATTACHMENT_CACHE, mime_attachment)
+
+    return mime_attachment
+
+
+class BodyTemplate:
+    """Template used to render the bodies of the mails (text or HTML), with a
+    context built from a dictionary.
+
+    The bodies are compiled once, & rendered without the full Django's template
+    engine when it's possible:
+      - the bodies without variables are constant.
+      - the bodies which only contain simple variables (no filter, no
+        attribute like "{{foo.bar}}") are rendered by concatenation.
+    The other ones are rendered by a regular django.template.Template.
+    """
+    def __init__(self, source):
+        "@param source: String (<None> is considered as an empty string)."
+        source = source or ''
+        self._template = None
+        self._parts = None  # List of strings (text) & Variables
+        self._context = Context()  # Used to render the values (auto-escaping, localisation...)
+
+        if '{' not in source:
+            self._parts = [source]
+            return
+
+        template = Template(source)
+        parts = []
+
+        for node in template.nodelist:
+            if isinstance(node, TextNode):
+                parts.append(node.s)
+            elif isinstance(node, VariableNode) and not node.filter_expression.filters:
+                var = node.filter_expression.var
+
+                if not isinstance(var, Variable) or var.lookups is None or len(var.lookups) != 1:
+                    self._template = template
+                    return
+
+                parts.append(var)
+            else:
+                self._template = template
+                return
+
+        self._parts = parts
+
+    @property
+    def is_constant(self):
+        "@return: True if the rendering does not depend on the context."
+        parts = self._parts
+
+        return parts is not None and all(isinstance(part, str) for part in parts)
+
+    def render(self, context):
+        """@param context: Dictionary.
+        @return: String.
+        """
+        parts = self._parts
+
+        if parts is None:
+            return self._template.render(Context(context))
+
+        render_value = render_value_in_context
+        rcontext = self._context
+
+        return ''.join(
+            part if isinstance(part, str) else
+            render_value(context.get(part.lookups[0], ''), rcontext)
+                for part in parts
+        )
+
+
 class EMailSender:
     def __init__(self, body, body_html, signature=None, attachments=()):
         "@throws ImageFromHTMLError"
@@ -107,12 +197,49 @@ class EMailSender:
         self._attachments = attachments
         self._mime_images = mime_images
 
+        # NB: the attachments are read & encoded once for all the mails.
+        self._mime_attachments = [get_mime_attachment(attachment) for attachment in attachments]
+
     def get_subject(self, mail):
         raise NotImplementedError
 
     def _process_bodies(self, mail):
         return self._body, self._body_html
 
+    def deliver(self, mail, connection=None):
+        """Send a mail & update its fields "status" & "sending_date", but do
+        not save it (see send()).
+        It does not perform any query, so it can be called in another thread.
+        @param mail: Object with a class inheriting emails.models.mail._Email
+        @param connection: Email backend instance (see django.core.mail.get_connection()).
+        @return True means <OK mail was sent>
+        """
+        body, body_html = self._process_bodies(mail)
+
+        msg = EmailMultiAlternatives(self.get_subject(mail), body, mail.sender,
+                                     [mail.recipient], connection=connection,
+                                    )
+        msg.attach_alternative(body_html, 'text/html')
+
+        for mime_part in self._mime_images:
+            msg.attach(mime_part)
+
+        for mime_part in self._mime_attachments:
+            msg.attach(mime_part)
+
+        try:
+            msg.send()
+        except Exception:
+            logger.exception('Sending: error during sending mail.')
+            mail.status = MAIL_STATUS_SENDINGERROR
+
+            return False
+
+        mail.status = MAIL_STATUS_SENT
+        mail.sending_date = now()
+
+        return True
+
     def send(self, mail, connection=None):
         """
         @param mail: Object with a class inheriting emails.models.mail._Email
@@ -123,30 +250,7 @@ class EMailSender:
         if mail.status == MAIL_STATUS_SENT:
             logger.error('Mail already sent to the recipient')
         else:
-            body, body_html = self._process_bodies(mail)
-
-            msg = EmailMultiAlternatives(self.get_subject(mail), body, mail.sender,
-                                         [mail.recipient], connection=connection,
-                                        )
-            msg.attach_alternative(body_html, 'text/html')
-
-            for image in self._mime_images:
-                msg.attach(image)
-
-            MEDIA_ROOT = settings.MEDIA_ROOT
-            for attachment in self._attachments:
-                msg.attach_file(join(MEDIA_ROOT, attachment.filedata.name))
-
-            try:
-                msg.send()
-            except Exception:
-                logger.exception('Sending: error during sending mail.')
-                mail.status = MAIL_STATUS_SENDINGERROR
-            else:
-                mail.status = MAIL_STATUS_SENT
-                mail.sending_date = now()
-                ok = True
-
+            ok = self.deliver(mail, connection=connection)
             mail.save()
 
         return ok
@@ -2,7 +2,7 @@
 
 ################################################################################
 #    Creme is a free/open-source Customer Relationship Management software
-#    Copyright (C) 2015-2019  Hybird
+#    Copyright (C) 2015-2020  Hybird
 #
 #    This program is free software: you can redistribute it and/or modify
 #    it under the terms of the GNU Affero General Public License as published by
@@ -33,6 +33,7 @@ class ReportsConfig(CremeAppConfig):
         self.register_reports_charts()
 
         from . import signals
+        from .core import graph_cache  # NB: connect some signals
 
     def all_apps_ready(self):
         from . import get_report_model, get_rgraph_model
@@ -2,7 +2,7 @@
 
 ################################################################################
 #    Creme is a free/open-source Customer Relationship Management software
-#    Copyright (C) 2009-2019  Hybird
+#    Copyright (C) 2009-2020  Hybird
 #
 #    This program is free software: you can redistribute it and/or modify
 #    it under the terms of the GNU Affero General Public License as published by
@@ -126,6 +126,7 @@ class ReportGraphBrick(Brick):
                     context,
                     graph=fetcher.graph,
                     x=x, y=y,
+                    computed_at=fetcher.graph.computed_at,
                     error=fetcher.error,
                     volatile_column=fetcher.verbose_volatile_column,
                     # instance_block_id=self.instance_brick_id,
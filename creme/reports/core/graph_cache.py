@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+#    Creme is a free/open-source Customer Relationship Management software
+#    Copyright (C) 2020  Hybird
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+"""Cache for the data (X & Y values) computed by the ReportGraphs
+(see AbstractReportGraph.fetch()).
+"""
+
+from hashlib import sha1
+from json import dumps as json_dump
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import signals, ForeignKey
+from django.dispatch import receiver
+from django.utils.timezone import now
+from django.utils.translation import get_language
+
+from creme.creme_core.core.config_cache import ConfigCache
+from creme.creme_core.core.entity_filter.condition_handler import (
+        PropertyConditionHandler, BaseRelationConditionHandler,
+        BaseCustomFieldConditionHandler)
+from creme.creme_core.models import (UserRole, SetCredentials, Sandbox,
+        EntityFilter, EntityFilterCondition, Relation, RelationType, CremeProperty,
+        CustomField, CustomFieldValue, CustomFieldEnumValue, CustomFieldMultiEnum)
+from creme.creme_core.signals import post_replace_in_bulk
+from creme.creme_core.utils.queries import QSerializer
+
+from ..constants import RGT_FK, RGT_RELATION, RGT_CUSTOM_DAY
+
+logger = logging.getLogger(__name__)
+
+# Models which the conditions of filters depend on (by type of condition).
+_HANDLERS_DEPENDENCIES = (
+    (PropertyConditionHandler,        (CremeProperty,)),
+    (BaseRelationConditionHandler,    (Relation,)),
+    (BaseCustomFieldConditionHandler, (CustomFieldValue,)),
+)
+
+
+class GraphCache(ConfigCache):
+    """The data of the graphs are stored in the cache settings.REPORTS_GRAPHS_CACHE_ALIAS.
+
+    The key of the data contains:
+      - the ID of the graph, the order & the additional Q (volatile column).
+      - the language (the labels of the abscissa are translated).
+      - the credentials signature of the user (see credentials_signature()).
+      - the generation numbers of:
+          - the model of the graph ; it's incremented when an entity of this
+            type is saved/deleted.
+          - the models of the graphs & of the reports, the filters & the
+            credentials models (sandboxes included).
+          - the models used by the conditions of the report's filter & of
+            the credentials filters (properties, relationships, custom-fields,
+            related entities), recursively through the sub-filters.
+          - the models needed by the type of graph (relationships,
+            custom-fields, model referenced by a ForeignKey...).
+
+    The entries expire after settings.REPORTS_GRAPHS_CACHE_TIMEOUT seconds.
+    """
+    key_prefix = 'reports-graph_cache'
+
+    @property
+    def backend(self):
+        "@return: A Django's cache instance, or None if the cache is disabled."
+        alias = settings.REPORTS_GRAPHS_CACHE_ALIAS
+        return caches[alias] if alias else None
+
+    @staticmethod
+    def credentials_signature(user):
+        """Get a value which is shared by the users who see the same entities.
+        @return: A JSON-friendly value ; the users with a role whose
+                 credentials do not depend on the user (i.e. no credentials on
+                 the owned entities, no filter on the current user, no
+                 sandbox of user/team) share the signature of their role.
+        """
+        if user.is_superuser:
+            return 'superuser'
+
+        role = user.role
+
+        if role is None:
+            return ['user', user.id]
+
+        for sc in role._get_setcredentials():
+            set_type = sc.set_type
+
+            if set_type == SetCredentials.ESET_OWN or \
+               (set_type == SetCredentials.ESET_FILTER and sc.efilter.is_volatile):
+                return ['user', user.id]
+
+        # NB: the entities in the sandboxes of a user (or of their teams) are
+        #     only visible by this user (see EntityCredentials.filter()).
+        if Sandbox.objects.filter(user__isnull=False).exists():
+            return ['user', user.id]
+
+        return ['role', role.id]
+
+    @staticmethod
+    def _filter_dependencies(efilter, models, visited_ids):
+        "Add the models which the conditions of a filter (& its sub-filters) depend on."
+        if efilter.id in visited_ids:
+            return
+
+        visited_ids.add(efilter.id)
+
+        for condition in efilter.get_conditions():
+            handler = condition.handler
+
+            for handler_cls, handler_models in _HANDLERS_DEPENDENCIES:
+                if isinstance(handler, handler_cls):
+                    models.update(handler_models)
+
+            # NB: entities referenced by ForeignKeys or by relationships.
+            models.update(handler.related_entity_models)
+
+            subfilter = handler.subfilter
+            if subfilter:
+                GraphCache._filter_dependencies(subfilter, models, visited_ids)
+
+    @staticmethod
+    def dependencies(graph, user, extra_q=None):
+        """@return: The models which the data of a graph depend on ; the
+                    conditions of the report's filter & of the credentials
+                    filters of the user are used.
+        """
+        model = graph.model
+        models = [model, type(graph), type(graph.linked_report),
+                  EntityFilter, EntityFilterCondition,
+                  UserRole, SetCredentials, Sandbox,
+                 ]
+        graph_type = graph.type
+
+        if graph_type == RGT_RELATION or extra_q is not None:
+            models.append(Relation)
+            models.append(RelationType)
+
+        if graph_type >= RGT_CUSTOM_DAY or graph.ordinate.rpartition('__')[0].isdigit():
+            models.append(CustomField)
+            models.append(CustomFieldValue)
+            models.append(CustomFieldEnumValue)
+
+        if graph_type == RGT_FK:
+            try:
+                field = model._meta.get_field(graph.abscissa)
+            except Exception:
+                pass
+            else:
+                if isinstance(field, ForeignKey):
+                    models.append(field.remote_field.model)
+
+        efilters = []
+        report_filter = graph.linked_report.filter
+        if report_filter is not None:
+            efilters.append(report_filter)
+
+        if not user.is_superuser and user.role is not None:
+            efilters.extend(
+                sc.efilter
+                    for sc in user.role._get_setcredentials()
+                        if sc.set_type == SetCredentials.ESET_FILTER
+            )
+
+        filters_models = set()
+        visited_ids = set()
+        for efilter in efilters:
+            GraphCache._filter_dependencies(efilter, filters_models, visited_ids)
+
+        models.extend(sorted(filters_models, key=lambda m: m._meta.label_lower))
+
+        return [*dict.fromkeys(models)]  # NB: remove duplicates, keep the order
+
+    def _build_key(self, graph, user, extra_q, order):
+        key_data = json_dump(
+            [
+                graph.id,
+                get_language(),
+                self.get_generations(*self.dependencies(graph, user, extra_q)),
+                self.credentials_signature(user),
+                None if extra_q is None else QSerializer().serialize(extra_q),
+                order,
+            ],
+            default=str,
+        )
+
+        return '{}-{}'.format(self.key_prefix, sha1(key_data.encode()).hexdigest())
+
+    def fetch(self, graph, user, extra_q, order, compute, force=False):
+        """Get the data of a graph from the cache, or compute them.
+        @param graph: Instance of <reports.models.AbstractReportGraph>.
+        @param user: Instance of <django.contrib.auth.get_user_model()>.
+        @param extra_q: Instance of <django.db.models.Q>, or None.
+        @param order: 'ASC' or 'DESC'.
+        @param compute: Callable without argument which returns the tuple (X, Y).
+        @param force: If True, the data are computed (& stored) even if they are cached.
+        @return: A tuple (X, Y, computed_at) ; "computed_at" is the date of
+                 the computation, or None if the cache is disabled.
+        """
+        backend = self.backend
+
+        if backend is None:
+            x, y = compute()
+            return x, y, None
+
+        try:
+            key = self._build_key(graph, user, extra_q, order)
+        except Exception:
+            logger.exception('GraphCache: cannot build the key of the graph id=%s', graph.id)
+            x, y = compute()
+            return x, y, None
+
+        if not force:
+            cached = backend.get(key)
+
+            if cached is not None:
+                return cached
+
+        x, y = compute()
+        data = (x, y, now())
+        backend.set(key, data, timeout=settings.REPORTS_GRAPHS_CACHE_TIMEOUT)
+
+        return data
+
+
+graph_cache = GraphCache()
+
+
+def _concerned_models(model):
+    return (CustomFieldValue,) if issubclass(model, CustomFieldValue) else \
+           (model, *model._meta.get_parent_list())
+
+
+@receiver((signals.post_save, signals.post_delete))
+def _invalidate_graphs(sender, instance, **kwargs):
+    if settings.REPORTS_GRAPHS_CACHE_ALIAS:
+        graph_cache.invalidate_on_commit(*_concerned_models(type(instance)))
+
+
+@receiver(signals.m2m_changed, sender=CustomFieldMultiEnum.value.through)
+def _invalidate_graphs_on_multienum_change(sender, action, **kwargs):
+    if settings.REPORTS_GRAPHS_CACHE_ALIAS and \
+       action in ('post_add', 'post_remove', 'post_clear'):
+        graph_cache.invalidate(CustomFieldValue)
+
+
+@receiver(post_replace_in_bulk)
+def _invalidate_graphs_on_bulk_replace(sender, model_field, instances, **kwargs):
+    # NB: the job "Deletor" has updated some instances without sending post_save.
+    if settings.REPORTS_GRAPHS_CACHE_ALIAS:
+        graph_cache.invalidate_on_commit(*_concerned_models(sender))
@@ -18,6 +18,7 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 ################################################################################
 
+from collections import OrderedDict
 import logging
 
 from django.conf import settings
@@ -31,7 +32,7 @@ from django.utils.translation import gettext_lazy as _
 from creme.creme_core.auth.entity_credentials import EntityCredentials
 from creme.creme_core.core.function_field import function_field_registry
 from creme.creme_core.gui.field_printers import field_printers_registry
-from creme.creme_core.models import CremeEntity, RelationType, CustomField
+from creme.creme_core.models import CremeEntity, RelationType, Relation, CustomField
 from creme.creme_core.utils.meta import FieldInfo
 
 from ..constants import (
@@ -88,6 +89,33 @@ class ReportHand:
         self._report_field = report_field
         self._title = title
         self._support_subreport = support_subreport
+        self._related_cache = None  # See populate_entities()
+        self._scopes = None  # See populate_entities()
+
+    @staticmethod
+    def _build_related_map(entities, links, queryset):
+        """Build a dictionary {entity_id: [related instances]}.
+        @param entities: Sequence of CremeEntities.
+        @param links: Iterable of tuples (entity_id, related_instance_id).
+        @param queryset: QuerySet on the related instances (already filtered) ;
+               its order is kept.
+        """
+        links = [*links]
+        instances = OrderedDict(
+            (instance.id, instance)
+                for instance in queryset.filter(pk__in={link[1] for link in links})
+        )
+        order = {instance_id: i for i, instance_id in enumerate(instances.keys())}
+        related_ids = {entity.id: [] for entity in entities}
+
+        for entity_id, instance_id in links:
+            if instance_id in instances:
+                related_ids[entity_id].append(instance_id)
+
+        return {
+            entity_id: [instances[i] for i in sorted(instance_ids, key=order.__getitem__)]
+                for entity_id, instance_ids in related_ids.items()
+        }
 
     def _generate_flattened_report(self, entities, user, scope):
         columns = self._report_field.sub_report.columns
@@ -101,6 +129,45 @@ class ReportHand:
     def _get_related_instances(self, entity, user):
         raise NotImplementedError
 
+    def _get_related_instances_map(self, entities, user):
+        """Get the related instances (see _get_related_instances()) of several
+        entities with a fixed number of queries. The instances are filtered
+        like in _get_filtered_related_entities() (if there is a sub-report)
+        or in _get_value_no_subreport().
+        Overload this method in child classes which manage sub-reports.
+
+        @param entities: Sequence of CremeEntities.
+        @param user: User instance ; used to compute credentials.
+        @return: A dictionary {entity_id: [related instances]},
+                 or None if the batched retrieving is not supported.
+        """
+        return None
+
+    def _get_related_instances_groups(self, entities):
+        """Get the related instances (see _get_related_instances()) of several
+        entities with one QuerySet, in order to compute the aggregates of the
+        sub-report for all these entities with one query (see populate_scopes()).
+        Overload this method in child classes which manage sub-reports.
+
+        @param entities: Sequence of CremeEntities.
+        @return: A tuple (queryset, group_field) ; the QuerySet is not filtered
+                 by the credentials & the filter of the sub-report, & the values
+                 of the field "group_field" are the IDs of the entities.
+                 None if the grouped retrieving is not supported.
+        """
+        return None
+
+    def _filter_related_instances(self, queryset, user):
+        "Filter a QuerySet of related instances by credentials & filter of the sub-report."
+        if issubclass(queryset.model, CremeEntity):
+            queryset = EntityCredentials.filter(user, queryset)
+
+        sub_report = self._report_field.sub_report
+        if sub_report is not None and sub_report.filter is not None:
+            queryset = sub_report.filter.filter(queryset)
+
+        return queryset
+
     def _get_filtered_related_entities(self, entity, user):
         related_entities = EntityCredentials.filter(user, self._get_related_instances(entity, user))
         report = self._report_field.sub_report
@@ -110,6 +177,42 @@ class ReportHand:
 
         return related_entities
 
+    def _get_populated_related_instances(self, entity):
+        "@return: A list of instances retrieved by populate_entities(), or None."
+        cache = self._related_cache
+
+        return None if cache is None else cache.get(entity.id)
+
+    def _get_scope(self, entity, user):
+        "@return: The scope of the sub-report for an entity (see populate_entities())."
+        scopes = self._scopes
+        scope = None if scopes is None else scopes.get(entity.id)
+
+        return self._get_filtered_related_entities(entity, user) if scope is None else scope
+
+    def _populate_scopes(self, entities, user):
+        """Build the scopes of the sub-report for several entities, & give them
+        to the columns of the sub-report with the QuerySet which groups them.
+        """
+        groups = self._get_related_instances_groups(entities)
+        if groups is None:
+            return
+
+        queryset, group_field = groups
+        filtered_qs = self._filter_related_instances(queryset.model.objects.all(), user)
+
+        if filtered_qs.query.has_filters():
+            # NB: the conditions are used in a sub-query, because their JOINs
+            #     could duplicate some lines & so distort the aggregates.
+            queryset = queryset.filter(pk__in=filtered_qs.values('pk'))
+
+        self._scopes = scopes = {
+            entity.id: self._get_filtered_related_entities(entity, user) for entity in entities
+        }
+
+        for column in self._report_field.sub_report.columns:
+            column.hand.populate_scopes(scopes, queryset, group_field)
+
     def _get_value(self, entity, user, scope):
         # we are not building 'self._get_value' in __init__() because the
         # report_field.selected can change after the Hand building
@@ -132,29 +235,41 @@ class ReportHand:
         """Used as _get_value() method by subclasses which manage
         sub-reports (extended sub-report case).
         """
-        related_entities = self._get_filtered_related_entities(entity, user)
+        # NB: the QuerySet is the scope of the sub-report (used by aggregates) ;
+        #     it is not retrieved if the related entities have been populated.
+        related_entities = self._get_scope(entity, user)
+        instances = self._get_populated_related_instances(entity)
         gen_values = self._handle_report_values
 
         # "(None,)" : even if sub-scope if empty, with must generate empty columns for this line
-        return [gen_values(e, user, related_entities) for e in related_entities or (None,)]
+        return [gen_values(e, user, related_entities)
+                    for e in (related_entities if instances is None else instances) or (None,)
+               ]
 
     def _get_value_flattened_subreport(self, entity, user, scope):
         """Used as _get_value() method by subclasses which manage
         sub-reports (flattened sub-report case).
         """
-        return self._generate_flattened_report(self._get_filtered_related_entities(entity, user), user, scope)
+        instances = self._get_populated_related_instances(entity)
+        if instances is None:
+            instances = self._get_filtered_related_entities(entity, user)
+
+        return self._generate_flattened_report(instances, user, scope)
 
     def _get_value_no_subreport(self, entity, user, scope):
         """Used as _get_value() method by subclasses which manage
         sub-reports (no sub-report case).
         """
-        qs = self._get_related_instances(entity, user)
+        instances = self._get_populated_related_instances(entity)
         extract = self._related_model_value_extractor
 
-        if issubclass(qs.model, CremeEntity):
-            qs = EntityCredentials.filter(user, qs)
+        if instances is None:
+            instances = self._get_related_instances(entity, user)
+
+            if issubclass(instances.model, CremeEntity):
+                instances = EntityCredentials.filter(user, instances)
 
-        return ', '.join(str(extract(instance)) for instance in qs)
+        return ', '.join(str(extract(instance)) for instance in instances)
 
     def _get_value_single(self, entity, user, scope):
         """Used as _get_value() method by subclasses which does not manage
@@ -181,6 +296,48 @@ class ReportHand:
         """
         return None
 
+    def populate_entities(self, entities, user):
+        """Retrieve the data needed to compute the values of several entities
+        with a number of queries which does not depend on the number of entities ;
+        the next calls to get_value() with these entities use these data.
+        The columns of the sub-report (if it exists) are populated too.
+
+        @param entities: Sequence of CremeEntities.
+        @param user: User instance ; used to compute credentials.
+        """
+        if self._support_subreport:
+            self._related_cache = related_map = self._get_related_instances_map(entities, user)
+            self._scopes = None
+            sub_report = self._report_field.sub_report
+
+            if related_map and sub_report is not None:
+                related_instances = [
+                    *OrderedDict(
+                        (instance.id, instance)
+                            for instances in related_map.values()
+                                for instance in instances
+                    ).values()
+                ]
+
+                if related_instances:
+                    for column in sub_report.columns:
+                        column.populate_entities(related_instances, user)
+
+                if self._report_field.selected:
+                    self._populate_scopes(entities, user)
+
+    def populate_scopes(self, scopes, queryset, group_field):
+        """Retrieve the data which depend on the scopes (see get_value()) of
+        several entities with one query ; the next calls to get_value() with
+        these scopes use these data. Used by the columns of expanded sub-reports.
+
+        @param scopes: Dictionary {entity_id: scope}.
+        @param queryset: QuerySet which retrieves the instances of all the scopes.
+        @param group_field: Name of the field of "queryset" which contains
+               the keys of "scopes".
+        """
+        pass
+
     def get_value(self, entity, user, scope):
         """Extract the value from entity for a Report cell.
         @param entity: CremeEntity instance.
@@ -306,6 +463,10 @@ class RHForeignKey(RHRegularField):
 
     # NB: cannot rename to _get_related_instances() because forbidden entities are filtered instead of outputting '??'
     def _get_fk_instance(self, entity):
+        instances = self._get_populated_related_instances(entity)
+        if instances is not None:
+            return instances[0] if instances else None
+
         try:
             entity = self._qs.get(pk=getattr(entity, self._fk_attr_name))
         except ObjectDoesNotExist:
@@ -313,6 +474,20 @@ class RHForeignKey(RHRegularField):
 
         return entity
 
+    def _get_related_instances_map(self, entities, user):
+        # NB: the forbidden entities are not filtered (see _get_fk_instance())
+        attr_name = self._fk_attr_name
+        fk_ids = {getattr(entity, attr_name) for entity in entities}
+        fk_ids.discard(None)
+        instances = self._qs.in_bulk(fk_ids) if fk_ids else {}
+        related_map = {}
+
+        for entity in entities:
+            instance = instances.get(getattr(entity, attr_name))
+            related_map[entity.id] = [] if instance is None else [instance]
+
+        return related_map
+
     def _get_value_flattened_subreport(self, entity, user, scope):
         fk_entity = self._get_fk_instance(entity)
 
@@ -356,6 +531,34 @@ class RHManyToManyField(RHRegularField):
     def _get_related_instances(self, entity, user):
         return getattr(entity, self._field_info[0].name).all()
 
+    def _get_related_instances_map(self, entities, user):
+        m2m_field = self._field_info[0]
+        through = m2m_field.remote_field.through
+        source_attname = through._meta.get_field(m2m_field.m2m_field_name()).attname
+        target_attname = through._meta.get_field(m2m_field.m2m_reverse_field_name()).attname
+
+        return self._build_related_map(
+            entities,
+            links=through.objects.filter(**{source_attname + '__in': [e.id for e in entities]})
+                                 .values_list(source_attname, target_attname),
+            queryset=self._filter_related_instances(m2m_field.remote_field.model.objects.all(), user),
+        )
+
+    def _get_related_instances_groups(self, entities):
+        m2m_field = self._field_info[0]
+
+        if m2m_field.remote_field.is_hidden():
+            return None
+
+        group_field = m2m_field.related_query_name()
+
+        return (
+            m2m_field.remote_field.model.objects.filter(
+                **{group_field + '__in': [e.id for e in entities]}
+            ),
+            group_field,
+        )
+
     def get_linkable_ctypes(self):
         m2m_model = self._field_info[0].remote_field.model
 
@@ -375,6 +578,9 @@ class RHCustomField(ReportHand):
 
         super().__init__(report_field, title=cf.name)
 
+    def populate_entities(self, entities, user):
+        CremeEntity.populate_custom_values(entities, [self._cfield])
+
     def _get_value_single_on_allowed(self, entity, user, scope):
         cvalue = entity.get_custom_value(self._cfield)
         # return str(cvalue.value) if cvalue else ''
@@ -406,6 +612,31 @@ class RHRelation(ReportHand):
                                                   relations__object_entity=entity.id,
                                                  )
 
+    def _get_related_instances_map(self, entities, user):
+        return self._build_related_map(
+            entities,
+            links=Relation.objects.filter(type=self._rtype,
+                                          subject_entity__in=[e.id for e in entities],
+                                         )
+                                  .values_list('subject_entity_id', 'object_entity_id'),
+            queryset=self._filter_related_instances(self._related_model.objects.all(), user),
+        )
+
+    def _get_related_instances_groups(self, entities):
+        return (
+            self._related_model.objects.filter(relations__type=self._rtype.symmetric_type,
+                                               relations__object_entity__in=[e.id for e in entities],
+                                              ),
+            'relations__object_entity',
+        )
+
+    def populate_entities(self, entities, user):
+        if self._report_field.sub_report:
+            super().populate_entities(entities, user)
+        else:
+            # See _get_value_no_subreport()
+            CremeEntity.populate_relations(entities, [self._rtype.id])
+
     # TODO: add a feature in base class to retrieved efficiently real entities ??
     # TODO: extract algorithm that retrieve efficiently real entity from CremeEntity.get_related_entities()
     def _get_value_no_subreport(self, entity, user, scope):
@@ -437,6 +668,9 @@ class RHFunctionField(ReportHand):
 
         super().__init__(report_field, title=str(funcfield.verbose_name))
 
+    def populate_entities(self, entities, user):
+        self._funcfield.populate_entities(entities, user)
+
     def _get_value_single_on_allowed(self, entity, user, scope):
         return self._funcfield(entity, user).for_csv()
 
@@ -448,6 +682,7 @@ class RHAggregate(ReportHand):
     def __init__(self, report_field):
         self._cache_key   = None
         self._cache_value = None
+        self._scopes_values = {}  # See populate_scopes()
         self._decimal_pos = None
         field_name, aggregation_id = report_field.name.split('__', 1)
         aggregation = field_aggregation_registry.get(aggregation_id)
@@ -467,24 +702,42 @@ class RHAggregate(ReportHand):
     def _build_query_n_vname(self, report_field, field_name, aggregation):
         raise NotImplementedError
 
+    def _format_value(self, agg_result):
+        return number_format(
+            agg_result or 0,
+            use_l10n=True,
+            # NB: if we do not set this, computed Decimals have trailing '0's
+            decimal_pos=self._decimal_pos,
+        )
+
     def _get_value_single(self, entity, user, scope):
+        # NB: QuerySets are hashed by identity
+        result = self._scopes_values.get(scope)
+        if result is not None:
+            return result
+
         if self._cache_key is scope:
             return self._cache_value
 
         self._cache_key = scope
-
-        agg_result = scope.aggregate(
-            rh_calculated_agg=self._aggregation_q,
-        ).get('rh_calculated_agg') or 0
-        self._cache_value = result = number_format(
-            agg_result,
-            use_l10n=True,
-            # NB: if we do not set this, computed Decimals have trailing '0's
-            decimal_pos=self._decimal_pos,
+        self._cache_value = result = self._format_value(
+            scope.aggregate(rh_calculated_agg=self._aggregation_q).get('rh_calculated_agg')
         )
 
         return result
 
+    def populate_scopes(self, scopes, queryset, group_field):
+        agg_results = {
+            values[group_field]: values['rh_calculated_agg']
+                for values in queryset.order_by()
+                                      .values(group_field)
+                                      .annotate(rh_calculated_agg=self._aggregation_q)
+        }
+        self._scopes_values = {
+            scope: self._format_value(agg_results.get(entity_id))
+                for entity_id, scope in scopes.items()
+        }
+
 
 @REPORT_HANDS_MAP(RFT_AGG_FIELD)
 class RHAggregateRegularField(RHAggregate):
@@ -552,6 +805,34 @@ class RHRelated(ReportHand):
     def _get_related_instances(self, entity, user):
         return getattr(entity, self._attr_name).filter(is_deleted=False)
 
+    def _get_related_instances_map(self, entities, user):
+        related_field = self._related_field
+        fk_attname = related_field.field.attname
+        related_map = {entity.id: [] for entity in entities}
+        instances = self._filter_related_instances(
+            related_field.related_model.objects.filter(
+                is_deleted=False,
+                **{fk_attname + '__in': [*related_map.keys()]}
+            ),
+            user,
+        )
+
+        for instance in instances:
+            related_map[getattr(instance, fk_attname)].append(instance)
+
+        return related_map
+
+    def _get_related_instances_groups(self, entities):
+        fk_attname = self._related_field.field.attname
+
+        return (
+            self._related_field.related_model.objects.filter(
+                is_deleted=False,
+                **{fk_attname + '__in': [e.id for e in entities]}
+            ),
+            fk_attname,
+        )
+
     def get_linkable_ctypes(self):
         return (ContentType.objects.get_for_model(self._related_field.related_model),)
 
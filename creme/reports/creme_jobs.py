@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+#    Creme is a free/open-source Customer Relationship Management software
+#    Copyright (C) 2020  Hybird
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+from json import dumps as json_dump
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _, gettext, override as override_language
+
+from creme.creme_core.creme_jobs.base import JobType
+from creme.creme_core.models import InstanceBrickConfigItem
+
+logger = logging.getLogger(__name__)
+
+
+class _GraphsCacheWarmUpType(JobType):
+    """Job which computes the data of the graphs displayed in bricks (without
+    volatile column, like on the home page) for each credentials signature of
+    the active users & for each language (see settings.LANGUAGES), & stores
+    them in the cache of the graphs (see reports.core.graph_cache).
+    """
+    id           = JobType.generate_id('reports', 'graphs_cache_warm_up')
+    verbose_name = _('Pre-compute the data of the graphs')
+    periodic     = JobType.PERIODIC
+
+    def _execute(self, job):
+        if not settings.REPORTS_GRAPHS_CACHE_ALIAS:
+            return
+
+        from creme import reports
+        from .bricks import ReportGraphBrick
+        from .core.graph_cache import graph_cache
+
+        ReportGraph = reports.get_rgraph_model()
+
+        graph_ids = {
+            ibci.entity_id
+                for ibci in InstanceBrickConfigItem.objects.filter(
+                                brick_id__startswith=ReportGraphBrick.id_,
+                            )
+                    if not ibci.data  # NB: no volatile column
+        }
+        if not graph_ids:
+            return
+
+        # One user per signature (the users with the same signature see the same data)
+        users = {}
+        active_users = get_user_model().objects.filter(is_active=True, is_staff=False, is_team=False)
+
+        for user in active_users.select_related('role'):
+            users.setdefault(json_dump(graph_cache.credentials_signature(user)), user)
+
+        for graph in ReportGraph.objects.filter(id__in=graph_ids, is_deleted=False):
+            orders = ('ASC',) if graph.asc else ('ASC', 'DESC')
+
+            for language_code, __ in settings.LANGUAGES:
+                with override_language(language_code):
+                    for user in users.values():
+                        for order in orders:
+                            try:
+                                graph.fetch(user=user, order=order, force=True)
+                            except Exception as e:
+                                logger.warning('GraphsCacheWarmUpType: error with the graph id=%s: %s',
+                                               graph.id, e,
+                                              )
+
+    def get_description(self, job):
+        return [gettext('Compute the data of the graphs displayed in the bricks, '
+                        'in order to display them faster')]
+
+
+graphs_cache_warm_up_type = _GraphsCacheWarmUpType()
+jobs = (graphs_cache_warm_up_type,)
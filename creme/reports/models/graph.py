@@ -2,7 +2,7 @@
 
 ################################################################################
 #    Creme is a free/open-source Customer Relationship Management software
-#    Copyright (C) 2009-2019  Hybird
+#    Copyright (C) 2009-2020  Hybird
 #
 #    This program is free software: you can redistribute it and/or modify
 #    it under the terms of the GNU Affero General Public License as published by
@@ -49,6 +49,7 @@ class AbstractReportGraph(CremeEntity):
     save_label     = pgettext_lazy('reports-graphs', 'Save the graph')
 
     _hand = None
+    computed_at = None  # Date of the computation of the data (see fetch())
 
     class Meta:
         abstract = True
@@ -76,9 +77,7 @@ class AbstractReportGraph(CremeEntity):
         super().delete(*args, **kwargs)
 
     # TODO: use creme_core.utils.meta.Order
-    def fetch(self, user, extra_q=None, order='ASC'):
-        assert order == 'ASC' or order == 'DESC'
-
+    def _fetch(self, user, extra_q, order):
         report = self.linked_report
         entities = EntityCredentials.filter(
             user=user,
@@ -93,6 +92,25 @@ class AbstractReportGraph(CremeEntity):
 
         return self.hand.fetch(entities=entities, order=order, user=user)
 
+    def fetch(self, user, extra_q=None, order='ASC', force=False):
+        """Get the X & Y values ; they are stored in a cache
+        (see reports.core.graph_cache & settings.REPORTS_GRAPHS_CACHE_ALIAS).
+        The attribute "computed_at" is set with the date of the computation
+        (None if the cache is disabled).
+        @param force: If True, the values are computed even if they are cached.
+        @return: A tuple (X, Y) -- see ReportGraphHand.fetch().
+        """
+        assert order == 'ASC' or order == 'DESC'
+
+        from ..core.graph_cache import graph_cache
+
+        x, y, self.computed_at = graph_cache.fetch(
+            graph=self, user=user, extra_q=extra_q, order=order, force=force,
+            compute=lambda: self._fetch(user=user, extra_q=extra_q, order=order),
+        )
+
+        return x, y
+
     # @classmethod
     # def get_fetcher_from_instance_block(cls, instance_block_config):
     #     warnings.warn('AbstractReportGraph.get_fetcher_from_instance_block() is deprecated ; '
@@ -18,7 +18,7 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 ################################################################################
 
-from itertools import chain
+from itertools import chain, islice
 import logging
 
 from django.conf import settings
@@ -30,12 +30,14 @@ from django.utils.translation import gettext_lazy as _
 
 from creme.creme_core.auth.entity_credentials import EntityCredentials
 from creme.creme_core.core.entity_filter import EF_USER
+from creme.creme_core.core.paginator import FlowPaginator
 from creme.creme_core.models import (
     CremeModel, CremeEntity,
     EntityFilter,
     FieldsConfig,
 )
 from creme.creme_core.models.fields import EntityCTypeForeignKey
+from creme.creme_core.models.manager import LowNullsQuerySet, LowNullsQuery
 
 logger = logging.getLogger(__name__)
 
@@ -53,6 +55,9 @@ class AbstractReport(CremeEntity):
 
     _columns = None
 
+    # Number of entities which are populated together (see Field.populate_entities())
+    fetch_chunk_size = 256
+
     class Meta:
         abstract = True
         manager_inheritance_from_future = True
@@ -143,24 +148,72 @@ class AbstractReport(CremeEntity):
 
         fields = self.filtered_columns
 
-        return ([field.get_value(entity, scope=entities, user=user)
-                    for field in fields
-                ] for entity in entities[:limit_to]
-               )
+        for chunk in self._iter_entities_chunks(entities, limit_to=limit_to):
+            for field in fields:
+                field.populate_entities(chunk, user)
 
-    # TODO: transform into generator (--> StreamResponse)
-    def fetch_all_lines(self, limit_to=None, extra_q=None, user=None):
-        from ..core.report import ExpandableLine  # Lazy loading
+            for entity in chunk:
+                yield [field.get_value(entity, scope=entities, user=user) for field in fields]
 
-        lines = []
+    def _iter_entities_chunks(self, entities, limit_to=None):
+        """Generator of lists of entities (with a size <= fetch_chunk_size).
+        The whole QuerySet is iterated with a keyset pagination (see FlowPaginator)
+        in order to avoid big OFFSETs & to keep a bounded memory usage.
+        """
+        chunk_size = self.fetch_chunk_size
 
-        for values in self._fetch(limit_to=limit_to, extra_q=extra_q, user=user):
-            lines.extend(ExpandableLine(values).get_lines())
+        if limit_to is not None:
+            entities_it = iter(entities[:limit_to])
 
-            if limit_to is not None and len(lines) >= limit_to:  # Meh
-                break  # TODO: test
+            while True:
+                chunk = [*islice(entities_it, chunk_size)]
+                if not chunk:
+                    break
 
-        return lines
+                yield chunk
+        else:
+            # NB: the ID is used as last ordering field in order to get consistent pages
+            ordering = [*entities.model._meta.ordering]
+            if 'id' not in ordering:
+                ordering.append('id')
+
+            # NB: the keyset pagination needs the NULL values to be ordered as
+            #     the lowest values, & the default ordering can be on a nullable
+            #     field (eg: '-start' for activities).
+            if not isinstance(entities, LowNullsQuerySet):
+                entities = LowNullsQuerySet(model=entities.model,
+                                            query=entities.query.chain(LowNullsQuery),
+                                            using=entities.db,
+                                           )
+
+            paginator = FlowPaginator(queryset=entities.order_by(*ordering),
+                                      key=ordering[0],
+                                      per_page=chunk_size,
+                                     )
+
+            for page in paginator.pages():
+                yield page.object_list
+
+    def iter_all_lines(self, limit_to=None, extra_q=None, user=None):
+        """Generator of the lines of the report (lists of values) ; the entities
+        are retrieved & expanded lazily, so the memory usage does not depend
+        on the number of entities.
+        @param limit_to: Maximum number of lines (None means "no limit").
+        @param extra_q: Instance of Q used to filter the entities.
+        @param user: Instance of User ; only the entities which can be viewed are used.
+        """
+        from ..core.report import ExpandableLine  # Lazy loading
+
+        lines = chain.from_iterable(
+            ExpandableLine(values).get_lines()
+                for values in self._fetch(limit_to=limit_to, extra_q=extra_q, user=user)
+        )
+
+        yield from (lines if limit_to is None else islice(lines, limit_to))
+
+    def fetch_all_lines(self, limit_to=None, extra_q=None, user=None):
+        "Get the list of lines ; see iter_all_lines() (you should use it for big reports)."
+        return [*self.iter_all_lines(limit_to=limit_to, extra_q=extra_q, user=user)]
 
     def get_children_fields_flat(self):
         return chain.from_iterable(f.get_children_fields_flat() for f in self.filtered_columns)
@@ -284,6 +337,13 @@ class Field(CremeModel):
 
         return children
 
+    def populate_entities(self, entities, user):
+        """Retrieve the data needed by get_value() for several entities at once.
+        @param entities: Sequence of CremeEntities.
+        @param user: User instance, used to check credentials.
+        """
+        self.hand.populate_entities(entities, user)
+
     def get_value(self, entity, user, scope):
         """Return the value of the cell for this entity.
         @param entity CremeEntity instance, or None.
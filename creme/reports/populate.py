@@ -2,7 +2,7 @@
 
 ################################################################################
 #    Creme is a free/open-source Customer Relationship Management software
-#    Copyright (C) 2009-2019  Hybird
+#    Copyright (C) 2009-2020  Hybird
 #
 #    This program is free software: you can redistribute it and/or modify
 #    it under the terms of the GNU Affero General Public License as published by
@@ -22,14 +22,16 @@ from functools import partial
 import logging
 
 from django.apps import apps
+from django.conf import settings
 from django.utils.translation import gettext as _
 
 from creme.creme_core import bricks as core_bricks
 from creme.creme_core.core.entity_cell import EntityCellRegularField
 from creme.creme_core.management.commands.creme_populate import BasePopulator
-from creme.creme_core.models import SearchConfigItem, HeaderFilter, BrickDetailviewLocation
+from creme.creme_core.models import SearchConfigItem, HeaderFilter, BrickDetailviewLocation, Job
+from creme.creme_core.utils.date_period import date_period_registry
 
-from . import get_report_model, bricks, constants
+from . import get_report_model, bricks, constants, creme_jobs
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +52,17 @@ class Populator(BasePopulator):
         # ---------------------------
         SearchConfigItem.create_if_needed(Report, ['name'])
 
+        # ---------------------------
+        # NB: disabled by default, because the cache of the graphs is disabled
+        #     by default (see settings.REPORTS_GRAPHS_CACHE_ALIAS).
+        Job.objects.get_or_create(type_id=creme_jobs.graphs_cache_warm_up_type.id,
+                                  defaults={'language':    settings.LANGUAGE_CODE,
+                                            'periodicity': date_period_registry.get_period('hours', 1),
+                                            'status':      Job.STATUS_OK,
+                                            'enabled':     False,
+                                           }
+                                 )
+
         # ---------------------------
         # NB: no straightforward way to test that this populate script has not been already run
         if not BrickDetailviewLocation.objects.filter_for_model(Report).exists():
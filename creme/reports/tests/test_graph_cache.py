@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+try:
+    from functools import partial
+
+    from django.core.cache import caches
+    from django.test.utils import override_settings
+    from django.utils.translation import override as override_language
+
+    from creme.creme_core.auth.entity_credentials import EntityCredentials
+    from creme.creme_core.core.entity_filter.condition_handler import PropertyConditionHandler
+    from creme.creme_core.models import (SetCredentials, Sandbox, Job,
+        CremeUser, CremeProperty, CremePropertyType, EntityFilter,
+        FakeOrganisation)
+
+    from .base import (
+        BaseReportsTestCase,
+        skipIfCustomReport, skipIfCustomRGraph,
+        ReportGraph,
+    )
+
+    from ..constants import RGT_YEAR
+    from ..core.graph_cache import graph_cache
+    from ..creme_jobs import graphs_cache_warm_up_type
+except Exception as e:
+    print('Error in <{}>: {}'.format(__name__, e))
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'reports-tests-default',
+    },
+    'graphs': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'reports-tests-graphs',
+    },
+}
+
+
+@skipIfCustomReport
+@skipIfCustomRGraph
+@override_settings(CACHES=CACHES, REPORTS_GRAPHS_CACHE_ALIAS='graphs')
+class GraphCacheTestCase(BaseReportsTestCase):
+    def setUp(self):
+        super().setUp()
+        caches['graphs'].clear()
+
+    def _create_orgas_rgraph(self, user):
+        return ReportGraph.objects.create(
+            user=user, linked_report=self._create_simple_organisations_report(),
+            name='Number of orgas by creation date (period of 1 year)',
+            abscissa='creation_date',
+            type=RGT_YEAR,
+            ordinate='', is_count=True,
+        )
+
+    def test_cached(self):
+        user = self.login()
+        rgraph = self._create_orgas_rgraph(user)
+
+        create_orga = partial(FakeOrganisation.objects.create, user=user)
+        orga1 = create_orga(name='Orga1', creation_date='2013-06-22')
+        create_orga(name='Orga2', creation_date='2014-08-05')
+
+        x, y = rgraph.fetch(user)
+        self.assertEqual(['2013', '2014'], x)
+        computed_at = rgraph.computed_at
+        self.assertIsNotNone(computed_at)
+
+        # NB: no signal => the cached data are outdated
+        FakeOrganisation.objects.filter(id=orga1.id).update(creation_date='2015-01-01')
+        self.assertEqual((x, y), rgraph.fetch(user))
+        self.assertEqual(computed_at, rgraph.computed_at)
+
+        # Other order => other data
+        self.assertEqual(['2015', '2014'], rgraph.fetch(user, order='DESC')[0])
+
+        # Forced computing
+        self.assertEqual(['2014', '2015'], rgraph.fetch(user, force=True)[0])
+
+        # Invalidation by an entity of the graph's type
+        FakeOrganisation.objects.filter(id=orga1.id).update(creation_date='2016-01-01')
+        self.assertEqual(['2014', '2015'], rgraph.fetch(user)[0])
+
+        create_orga(name='Orga3', creation_date='2017-03-12')
+        self.assertEqual(['2014', '2016', '2017'], rgraph.fetch(user)[0])
+
+    @override_settings(REPORTS_GRAPHS_CACHE_ALIAS=None)
+    def test_disabled(self):
+        user = self.login()
+        rgraph = self._create_orgas_rgraph(user)
+
+        orga = FakeOrganisation.objects.create(user=user, name='Orga1', creation_date='2013-06-22')
+        self.assertEqual(['2013'], rgraph.fetch(user)[0])
+        self.assertIsNone(rgraph.computed_at)
+
+        FakeOrganisation.objects.filter(id=orga.id).update(creation_date='2015-01-01')
+        self.assertEqual(['2015'], rgraph.fetch(user)[0])
+
+    def test_credentials_signature(self):
+        user = self.login(is_superuser=False)
+        self.assertEqual('superuser', graph_cache.credentials_signature(self.other_user))
+
+        role = self.role
+        create_creds = partial(SetCredentials.objects.create, role=role,
+                               value=EntityCredentials.VIEW,
+                              )
+        create_creds(set_type=SetCredentials.ESET_ALL)
+        self.assertEqual(['role', role.id],
+                         graph_cache.credentials_signature(self.refresh(user))
+                        )
+
+        create_creds(set_type=SetCredentials.ESET_OWN)
+        self.assertEqual(['user', user.id],
+                         graph_cache.credentials_signature(self.refresh(user))
+                        )
+
+    def test_sandbox(self):
+        "The users of a role do not share their data when some sandboxes are related to users."
+        user = self.login(is_superuser=False, allowed_apps=['creme_core', 'reports'])
+        SetCredentials.objects.create(role=self.role,
+                                      value=EntityCredentials.VIEW,
+                                      set_type=SetCredentials.ESET_ALL,
+                                     )
+        user = self.refresh(user)
+        other = CremeUser.objects.create(username='chie', email='chie@noir.jp', role=self.role,
+                                         first_name='Chie', last_name='Nakamura',
+                                        )
+        self.assertEqual(['role', self.role.id], graph_cache.credentials_signature(user))
+
+        rgraph = self._create_orgas_rgraph(self.other_user)
+
+        create_orga = partial(FakeOrganisation.objects.create, user=user)
+        create_orga(name='Orga1', creation_date='2013-06-22')
+        self.assertEqual(['2013'], rgraph.fetch(user)[0])
+
+        sandbox = Sandbox.objects.create(type_id='creme_core-dont_care', user=user)
+        create_orga(name='Orga2', creation_date='2014-08-05', sandbox=sandbox)
+
+        user = self.refresh(user)
+        other = self.refresh(other)
+        self.assertEqual(['user', user.id],  graph_cache.credentials_signature(user))
+        self.assertEqual(['user', other.id], graph_cache.credentials_signature(other))
+
+        self.assertEqual(['2013', '2014'], rgraph.fetch(user)[0])
+        self.assertEqual(['2013'],         rgraph.fetch(other)[0])
+
+    def test_filter_dependencies(self):
+        "Conditions of the report's filter on properties."
+        user = self.login()
+        ptype = CremePropertyType.create(str_pk='test-prop_reports_cache', text='Is cached')
+        efilter = EntityFilter.create(
+            'test-reports_graph_cache', 'Cached', FakeOrganisation, is_custom=True,
+            conditions=[
+                PropertyConditionHandler.build_condition(model=FakeOrganisation, ptype=ptype),
+            ],
+        )
+        rgraph = self._create_orgas_rgraph(user)
+        report = rgraph.linked_report
+        report.filter = efilter
+        report.save()
+        rgraph = self.refresh(rgraph)
+
+        self.assertIn(CremeProperty, graph_cache.dependencies(rgraph, user))
+
+        orga = FakeOrganisation.objects.create(user=user, name='Orga1', creation_date='2013-06-22')
+        self.assertEqual([], rgraph.fetch(user)[0])
+
+        # NB: the entity is not saved
+        CremeProperty.objects.create(type=ptype, creme_entity=orga)
+        self.assertEqual(['2013'], rgraph.fetch(user)[0])
+
+    def test_job(self):
+        user = self.login()
+        rgraph = self._create_orgas_rgraph(user)
+        self.assertIsNotNone(rgraph.create_instance_brick_config_item())
+
+        orga = FakeOrganisation.objects.create(user=user, name='Orga1', creation_date='2013-06-22')
+
+        job = self.get_object_or_fail(Job, type_id=graphs_cache_warm_up_type.id)
+        self.assertFalse(job.enabled)
+
+        graphs_cache_warm_up_type.execute(job)
+
+        # NB: no signal => the data computed by the job are used
+        FakeOrganisation.objects.filter(id=orga.id).update(creation_date='2015-01-01')
+        rgraph = self.refresh(rgraph)
+        self.assertEqual(['2013'], rgraph.fetch(user)[0])
+        self.assertIsNotNone(rgraph.computed_at)
+
+        # All the languages are computed
+        for language_code in ('en', 'fr'):
+            with override_language(language_code):
+                self.assertEqual(['2013'], self.refresh(rgraph).fetch(user)[0])
+
+    def test_language(self):
+        "The data are cached by language."
+        user = self.login()
+        rgraph = self._create_orgas_rgraph(user)
+
+        orga = FakeOrganisation.objects.create(user=user, name='Orga1', creation_date='2013-06-22')
+
+        with override_language('en'):
+            self.assertEqual(['2013'], rgraph.fetch(user)[0])
+
+        # NB: no signal => the data computed in English are not used in French
+        FakeOrganisation.objects.filter(id=orga.id).update(creation_date='2015-01-01')
+
+        with override_language('fr'):
+            self.assertEqual(['2015'], self.refresh(rgraph).fetch(user)[0])
+
+        with override_language('en'):
+            self.assertEqual(['2013'], self.refresh(rgraph).fetch(user)[0])
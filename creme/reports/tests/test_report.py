@@ -8,6 +8,9 @@ try:
 
     from django.conf import settings
     from django.contrib.contenttypes.models import ContentType
+    from django.db import connection
+    from django.db.models import QuerySet
+    from django.test.utils import CaptureQueriesContext, override_settings
     from django.urls import reverse
     from django.utils.encoding import smart_str
     from django.utils.formats import date_format, number_format
@@ -41,6 +44,7 @@ try:
         FakeImage, FakeImageCategory,
         FakeEmailCampaign, FakeMailingList,
         FakeInvoice,
+        FakeActivity, FakeActivityType,
         FakeFolderCategory,
         FakeFolder as FakeCoreFolder,
         FakeDocument as FakeCoreDocument,
@@ -1130,6 +1134,48 @@ class ReportTestCase(BaseReportsTestCase):
         self.assertEqual(['Ayanami', user_str, '', 'Kawaii'], result[1])
         self.assertEqual(['Langley', user_str, '', ''],       result[2])
 
+    @override_settings(EXPORT_STREAMING=True)
+    def test_report_csv_streaming(self):
+        self.login()
+
+        self._create_persons()
+        report = self._create_report('trinita')
+        response = self.assertGET200(self._build_export_url(report), data={'doc_type': 'csv'})
+        self.assertTrue(response.streaming)
+        self.assertEqual('attachment; filename=trinita.csv', response['Content-Disposition'])
+
+        user_str = str(self.user)
+        self.assertListEqual(
+            [smart_str('"{}","{}","{}","{}"'.format(
+                 _('Last name'), _('Owner user'), _('owns'), _('Properties')
+             )),
+             '"Ayanami","{}","","Kawaii"'.format(user_str),
+             '"Katsuragi","{}","Nerv",""'.format(user_str),
+             '"Langley","{}","",""'.format(user_str),
+            ],
+            b''.join(response.streaming_content).decode().splitlines()
+        )
+
+    @override_settings(EXPORT_STREAMING=True)
+    def test_report_xls_streaming(self):
+        "XLS cannot be streamed => regular export."
+        self.login()
+
+        self._create_persons()
+        report = self._create_report('trinita')
+        response = self.assertGET200(self._build_export_url(report), data={'doc_type': 'xls'},
+                                     follow=True,
+                                    )
+        self.assertFalse(response.streaming)
+
+        result = [*XlrdReader(None, file_contents=response.content)]
+        self.assertEqual(4, len(result))
+
+        user_str = str(self.user)
+        self.assertEqual(['Ayanami',   user_str, '',     'Kawaii'], result[1])
+        self.assertEqual(['Katsuragi', user_str, 'Nerv', ''],       result[2])
+        self.assertEqual(['Langley',   user_str, '',     ''],       result[3])
+
     def _build_editfields_url(self, report):
         return reverse('reports__edit_fields', args=(report.id,))
 
@@ -1916,6 +1962,58 @@ class ReportTestCase(BaseReportsTestCase):
                          report.fetch_all_lines()
                         )
 
+    def test_fetch_field_chunks(self):
+        "Entities are retrieved by chunks (keyset pagination)."
+        user = self.login()
+
+        create_contact = partial(FakeContact.objects.create, user=user)
+        for i in range(7):
+            create_contact(last_name='Mister {}'.format(i), first_name='#{}'.format(i % 2))
+
+        # Duplicated keys
+        create_contact(last_name='Mister 3', first_name='#1')
+        create_contact(last_name='Mister 3', first_name='#1')
+
+        report = self._create_simple_contacts_report('Contacts report')
+        report.fetch_chunk_size = 2
+
+        expected = [[ln] for ln in FakeContact.objects.values_list('last_name', flat=True)]
+        self.assertEqual(9, len(expected))
+
+        lines = report.iter_all_lines()
+        self.assertFalse(isinstance(lines, list))
+        self.assertEqual(expected, [*lines])
+        self.assertEqual(expected, report.fetch_all_lines())
+        self.assertEqual(expected[:3], report.fetch_all_lines(limit_to=3))
+
+    def test_fetch_field_chunks_nulls(self):
+        "Keyset pagination on a nullable field (NULL values are the lowest ones)."
+        user = self.login()
+
+        create_act = partial(FakeActivity.objects.create,
+                             user=user, type=FakeActivityType.objects.first(),
+                            )
+        for i in range(7):
+            create_act(title='Activity #{}'.format(i),
+                       start=None if i % 2 else self.create_datetime(year=2020, month=3, day=i + 1),
+                      )
+
+        report = Report.objects.create(user=user, name='Activities report', ct=FakeActivity)
+        Field.objects.create(report=report, name='title', order=1,
+                             selected=False, sub_report=None, type=RFT_FIELD,
+                            )
+        report.fetch_chunk_size = 2
+
+        expected = [['Activity #{}'.format(i)] for i in (6, 4, 2, 0, 1, 3, 5)]
+        self.assertListEqual(expected, report.fetch_all_lines())
+
+        # Not a LowNullsQuerySet
+        qs = QuerySet(model=FakeActivity).filter(is_deleted=False)
+        self.assertListEqual(
+            [*FakeActivity.objects.order_by('-start', 'id').values_list('id', flat=True)],
+            [entity.id for chunk in report._iter_entities_chunks(qs) for entity in chunk],
+        )
+
     def test_fetch_field_02(self):
         "FK, date, filter, invalid one"
         self.login()
@@ -2381,6 +2479,40 @@ class ReportTestCase(BaseReportsTestCase):
                          report_camp.fetch_all_lines()
                         )
 
+    def _count_fetch_queries(self, report, **kwargs):
+        self.refresh(report).fetch_all_lines(**kwargs)  # Fill the global caches (ContentTypes...)
+
+        with CaptureQueriesContext(connection) as ctxt:
+            lines = report.fetch_all_lines(**kwargs)
+
+        return len(ctxt.captured_queries), lines
+
+    def test_fetch_m2m_06(self):
+        "Sub report (expanded) ; the number of queries does not depend on the number of entities."
+        self._aux_test_fetch_m2m()
+
+        report_camp = self.report_camp
+        rfield = report_camp.fields.get(name='mailing_lists__name')
+        rfield.sub_report = self.report_ml
+        rfield.selected = True
+        rfield.save()
+
+        count1, lines = self._count_fetch_queries(self.refresh(report_camp))
+        self.assertEqual(4, len(lines))
+
+        create_camp = partial(FakeEmailCampaign.objects.create, user=self.user)
+        create_ml = partial(FakeMailingList.objects.create, user=self.user)
+        create_prop = partial(CremeProperty.objects.create, type=self.ptype1)
+
+        for i in range(4, 9):
+            ml = create_ml(name='ML#{}'.format(i))
+            create_prop(creme_entity=ml)
+            create_camp(name='Camp#{}'.format(i)).mailing_lists.set([ml, self.ml1])
+
+        count2, lines = self._count_fetch_queries(self.refresh(report_camp))
+        self.assertEqual(14, len(lines))
+        self.assertEqual(count1, count2)
+
     def test_fetch_m2m_03(self):
         "Sub report (not expanded)"
         self._aux_test_fetch_m2m()
@@ -2686,6 +2818,53 @@ class ReportTestCase(BaseReportsTestCase):
         lines.pop()  # 'robb' line removed
         self.assertEqual(lines, report.fetch_all_lines(user=self.user))
 
+    def test_fetch_relation_06(self):
+        "Sub-report (expanded) with FK & custom field ; the number of queries does not depend on the number of entities."
+        self.login()
+        self._aux_test_fetch_persons()
+
+        cf = self._create_cf_int()
+        report_contact = self.report_contact
+        create_field = Field.objects.create
+        create_field(report=report_contact, name=cf.id,         type=RFT_CUSTOM, order=3)
+        create_field(report=report_contact, name='image__name', type=RFT_FIELD,  order=4)
+
+        report = self.report_orga
+        create_field(report=report, name=FAKE_REL_OBJ_EMPLOYED_BY, order=2,
+                     type=RFT_RELATION, selected=True, sub_report=report_contact,
+                    )
+        create_field(report=report, name=FAKE_REL_SUB_EMPLOYED_BY, order=3,
+                     type=RFT_RELATION, selected=False, sub_report=None,
+                    )
+
+        user = self.user
+        img = FakeImage.objects.create(user=user, name='Ned face')
+        ned = self.ned
+        ned.image = img
+        ned.save()
+        CustomFieldInteger.objects.create(custom_field=cf, entity=self.tyrion, value=135)
+
+        count1, lines = self._count_fetch_queries(self.refresh(report))
+        self.assertEqual(
+            [[self.lannisters.name, 'Lannister', 'Tyrion', '135', '',         ''],
+             [self.starks.name,     'Stark',     'Eddard', '',    img.name,   ''],
+             [self.starks.name,     'Stark',     'Robb',   '',    '',         ''],
+            ],
+            lines
+        )
+
+        create_orga = partial(FakeOrganisation.objects.create, user=user)
+        create_contact = partial(FakeContact.objects.create, user=user, image=img)
+        create_rel = partial(Relation.objects.create, type_id=FAKE_REL_OBJ_EMPLOYED_BY, user=user)
+
+        for i in range(5):
+            orga = create_orga(name='House #{}'.format(i))
+            create_rel(subject_entity=orga, object_entity=create_contact(last_name='#{}'.format(i)))
+
+        count2, lines = self._count_fetch_queries(self.refresh(report))
+        self.assertEqual(8, len(lines))
+        self.assertEqual(count1, count2)
+
     def test_fetch_relation_03(self):
         "Sub-report (not expanded)."
         self.login_as_basic_user()
@@ -2931,6 +3110,87 @@ class ReportTestCase(BaseReportsTestCase):
             report.fetch_all_lines()
         )
 
+    def test_fetch_aggregate_05(self):
+        "Aggregate in sub-lines (expanded sub-report) ; one query per sub-report, whatever the number of entities."
+        user = self.login()
+        self._aux_test_fetch_persons(create_contacts=False, report_4_contact=False)
+
+        report_invoice = Report.objects.create(user=user, name='Report on invoices', ct=FakeInvoice)
+
+        create_field = partial(Field.objects.create, selected=False, sub_report=None)
+        create_field(report=report_invoice, name='name',           type=RFT_FIELD,     order=1)
+        create_field(report=report_invoice, name='total_vat__sum', type=RFT_AGG_FIELD, order=2)
+
+        report = self.report_orga
+        create_field(report=report, name=FAKE_REL_OBJ_BILL_ISSUED, order=2,
+                     selected=True, sub_report=report_invoice, type=RFT_RELATION,
+                    )
+
+        starks = self.starks; lannisters = self.lannisters
+        guild = FakeOrganisation.objects.create(user=user, name='Guild of merchants')
+
+        create_invoice = partial(self._create_invoice, target=guild)
+        create_invoice(starks,     name='Invoice#1', total_vat=Decimal('100.5'))
+        create_invoice(lannisters, name='Invoice#2', total_vat=Decimal('200.5'))
+        create_invoice(lannisters, name='Invoice#3', total_vat=Decimal('50.1'))
+
+        count1, lines = self._count_fetch_queries(report)
+        self.assertEqual(3, len(lines))
+
+        for i in range(1, 6):
+            house = FakeOrganisation.objects.create(user=user, name='House #{}'.format(i))
+            create_invoice(house, name='Invoice#1-{}'.format(i), total_vat=Decimal(i))
+            create_invoice(house, name='Invoice#2-{}'.format(i), total_vat=Decimal('1.5'))
+
+        count2, lines = self._count_fetch_queries(report)
+        self.assertEqual(13, len(lines))
+        self.assertEqual(count1, count2)
+
+        def fmt_number(n):
+            return number_format(n, use_l10n=True, decimal_pos=2)
+
+        self.assertListEqual(
+            [
+                ['House #1', 'Invoice#1-1', fmt_number(Decimal('2.5'))],
+                ['House #1', 'Invoice#2-1', fmt_number(Decimal('2.5'))],
+            ],
+            lines[:2]
+        )
+        self.assertListEqual(
+            [
+                [lannisters.name, 'Invoice#2', fmt_number(Decimal('250.6'))],
+                [lannisters.name, 'Invoice#3', fmt_number(Decimal('250.6'))],
+                [starks.name,     'Invoice#1', fmt_number(Decimal('100.5'))],
+            ],
+            lines[-3:]
+        )
+
+        # Filter on the sub-report
+        report_invoice.filter = EntityFilter.create(
+            'test-filter_invoices', 'Invoices #2', FakeInvoice, is_custom=True,
+            conditions=[
+                condition_handler.RegularFieldConditionHandler.build_condition(
+                    model=FakeInvoice,
+                    operator=operators.STARTSWITH,
+                    field_name='name', values=['Invoice#2'],
+                ),
+            ],
+        )
+        report_invoice.save()
+
+        lines = self.refresh(report).fetch_all_lines()
+        self.assertListEqual(
+            ['House #1', 'Invoice#2-1', fmt_number(Decimal('1.5'))],
+            lines[0]
+        )
+        self.assertListEqual(
+            [
+                [lannisters.name, 'Invoice#2', fmt_number(Decimal('200.5'))],
+                [starks.name,     '',          ''],
+            ],
+            lines[-2:]
+        )
+
     def test_fetch_aggregate_04(self):
         "Decimal Custom field."
         self.login()
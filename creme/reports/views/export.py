@@ -18,8 +18,10 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 ################################################################################
 
+from itertools import islice
 import logging
 
+from django.conf import settings
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
@@ -118,6 +120,18 @@ class ExportFilterURL(generic.EntityEditionPopup):
         return self.export_url
 
 
+def _iter_export_pages(report, lines, page_size):
+    "Generator of pages of rows (see ExportBackend.iter_chunks()) ; the first page contains only the header."
+    yield [[smart_str(column.title) for column in report.get_children_fields_flat()]]
+
+    while True:
+        rows = [[smart_str(value) for value in line] for line in islice(lines, page_size)]
+        if not rows:
+            break
+
+        yield rows
+
+
 @login_required
 @permission_required('reports')
 def export(request, report_id):
@@ -139,12 +153,19 @@ def export(request, report_id):
         raise Http404('Unknown extension')
 
     writer = backend()
-    writerow = writer.writerow
+    pages = _iter_export_pages(report,
+                               lines=report.iter_all_lines(extra_q=q_filter, user=user),
+                               page_size=report.fetch_chunk_size,
+                              )
+
+    if writer.streamable and settings.EXPORT_STREAMING:
+        return writer.streaming_response(pages=pages, filename=smart_str(report.name))
 
-    writerow([smart_str(column.title) for column in report.get_children_fields_flat()])
+    writerow = writer.writerow
 
-    for line in report.fetch_all_lines(extra_q=q_filter, user=user):
-        writerow([smart_str(value) for value in line])
+    for rows in pages:
+        for row in rows:
+            writerow(row)
 
     writer.save(smart_str(report.name))
 